@@ -15,11 +15,18 @@ sys.path.insert(0, str(project_root))
 
 # Load environment variables (DATABASE_URL, etc.)
 load_dotenv()
-from src.database.db_manager import DatabaseManager
-from src.ui.admin_dashboard import run_admin_dashboard
 
-# Initialize database manager
-db_manager = DatabaseManager("data/database/conversations.db")
+# Database manager, created on first use so the login page renders without
+# importing SQLAlchemy/pandas or connecting to the database
+_db_manager = None
+
+
+def get_db_manager():
+    global _db_manager
+    if _db_manager is None:
+        from src.database.db_manager import DatabaseManager
+        _db_manager = DatabaseManager("data/database/conversations.db")
+    return _db_manager
 
 
 def main():
@@ -53,7 +60,8 @@ def main():
                 st.rerun()
 
     # Render the dashboard (authenticated or no password set)
-    run_admin_dashboard(db_manager)
+    from src.ui.admin_dashboard import run_admin_dashboard
+    run_admin_dashboard(get_db_manager())
 
 
 if __name__ == "__main__":
@@ -27,8 +27,12 @@ Usage (PowerShell):
     # Use a different model (optional)
     python scripts/agent_cli.py --message "..." --model gpt-4o
 
+    # Record model calls to a cassette, then replay them offline (no API calls)
+    python scripts/agent_cli.py --message "hello" --bot emotional --cassette-record data/cassettes/cli.jsonl
+    python scripts/agent_cli.py --message "hello" --bot emotional --cassette-replay data/cassettes/cli.jsonl
+
 Environment:
-    - OPENAI_API_KEY must be set (env var or .env file)
+    - OPENAI_API_KEY must be set (env var or .env file), except with --cassette-replay
     - DATABASE_URL optional; only used when --save is provided
 """
 
@@ -72,6 +76,10 @@ def main() -> int:
         help="Print the exact message payload (system/history/user) sent to the model"
     )
     parser.add_argument("--dry-run", action="store_true", help="Do not call the model; only print prompts/messages")
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--cassette-record", metavar="PATH", help="Record model calls to a cassette file")
+    cassette.add_argument("--cassette-replay", metavar="PATH", help="Serve model calls from a cassette file (no API calls)")
+    parser.add_argument("--preserve-timing", action="store_true", help="With --cassette-replay, replay the recorded chunk timings")
     args = parser.parse_args()
 
     # Load config and optionally override bot/model
@@ -79,6 +87,13 @@ def main() -> int:
     if args.model:
         config.setdefault("api", {})
         config["api"]["model"] = args.model
+    if args.cassette_record or args.cassette_replay:
+        config.setdefault("api", {})
+        config["api"]["cassette"] = {
+            "mode": "record" if args.cassette_record else "replay",
+            "path": args.cassette_record or args.cassette_replay,
+            "preserve_timing": bool(args.preserve_timing),
+        }
 
     # Determine whether to save
     should_save = bool(args.save) and not bool(args.no_save)
@@ -94,7 +109,7 @@ def main() -> int:
     # Create a session and force bot_type if provided
     sess = bot.create_new_session()
     if args.bot:
-        bot.sessions[sess["session_id"]]["bot_type"] = args.bot
+        bot.set_bot_type(sess["session_id"], args.bot)
 
     # Show the prompt that will be used
     bot_type = bot.sessions[sess["session_id"]]["bot_type"]
@@ -142,7 +157,9 @@ def main() -> int:
     # Save messages if needed
     if should_save:
         db.save_message(participant_id, message_num, "user", args.message)
-        db.save_message(participant_id, message_num, "bot", response["bot_response"], contains_crisis_keyword=response.get("crisis_detected", False))
+        db.save_message(participant_id, message_num, "bot", response["bot_response"],
+                        contains_crisis_keyword=response.get("crisis_detected", False),
+                        call_meta=bot.get_last_call(sess["session_id"]))
         db.mark_participant_completed(participant_id)
 
     # Print the reply and crisis info
@@ -0,0 +1,208 @@
+"""
+Crisis Matcher Benchmark
+Per-message cost of crisis keyword matching as the keyword list grows.
+
+Compares, over the seeker posts in docs/emotional-reactions-reddit-kb2.csv:
+    regex      the old approach: one compiled `\\b<keyword>\\b` pattern per keyword,
+               each searched in turn (here: finditer, to report all matches)
+    automaton  KeywordMatcher: one Aho-Corasick pass per message
+
+Keyword lists of 10, 1,000 and 10,000 phrases are the configured crisis
+keywords padded with two- and three-word phrases drawn from the corpus
+vocabulary (fixed seed), so larger lists still produce real matches.
+
+A second table covers spelling variants ("k1ll myself", "want  to die", ...):
+listing N variants per keyword as extra regexes versus one TextNormalizer
+pass against the 10 canonical keywords.
+
+A third table covers streamed bot replies: per-token cost of a MatchScanner
+fed each chunk versus re-running find_all over the accumulated reply on every
+token (quadratic over the reply).
+
+Usage:
+    python scripts/benchmark_crisis_matcher.py
+    python scripts/benchmark_crisis_matcher.py --sizes 10 1000 10000 --regex-posts 200
+"""
+
+import argparse
+import csv
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+# Add project root for imports
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from src.chatbot.keyword_matcher import KeywordMatcher
+from src.chatbot.text_normalizer import LEET, TextNormalizer
+
+BASE_KEYWORDS = ["suicide", "kill myself", "end it all", "want to die", "no reason to live",
+                 "better off dead", "hopeless", "self harm", "can't go on", "give up"]
+CORPUS = project_root / "docs" / "emotional-reactions-reddit-kb2.csv"
+
+
+def load_posts() -> list:
+    with open(CORPUS, newline="", encoding="utf-8") as f:
+        return [row["seeker_post"] for row in csv.DictReader(f) if row.get("seeker_post")]
+
+
+def keyword_list(size: int, posts: list, seed: int = 7) -> list:
+    """Configured keywords plus corpus phrases up to `size` entries."""
+    rng = random.Random(seed)
+    words = sorted({w for post in posts for w in re.findall(r"[a-z']{3,}", post.lower())})
+    keywords = list(BASE_KEYWORDS[:size])
+    seen = set(keywords)
+    while len(keywords) < size:
+        phrase = " ".join(rng.choice(words) for _ in range(rng.choice((2, 3))))
+        if phrase not in seen:
+            seen.add(phrase)
+            keywords.append(phrase)
+    return keywords
+
+
+def time_per_post(fn, posts: list) -> tuple:
+    started = time.perf_counter()
+    matches = sum(len(fn(post)) for post in posts)
+    return (time.perf_counter() - started) / len(posts), matches
+
+
+def bench(size: int, posts: list, regex_posts: int) -> dict:
+    keywords = keyword_list(size, posts)
+
+    started = time.perf_counter()
+    patterns = [(k, re.compile(r'\b' + re.escape(k) + r'\b', re.IGNORECASE)) for k in keywords]
+    regex_build = time.perf_counter() - started
+    started = time.perf_counter()
+    matcher = KeywordMatcher(keywords)
+    automaton_build = time.perf_counter() - started
+
+    def regex_all(post):
+        return [(k, m.start()) for k, p in patterns for m in p.finditer(post)]
+
+    # The regex loop is slow at 10k keywords; time it on a prefix of the corpus
+    sample = posts[:regex_posts] if regex_posts else posts
+    regex_s, regex_matches = time_per_post(regex_all, sample)
+    automaton_s, automaton_matches = time_per_post(matcher.find_all, posts)
+    _, automaton_sample_matches = time_per_post(matcher.find_all, sample)
+    return {
+        'size': size,
+        'regex_us': regex_s * 1e6,
+        'automaton_us': automaton_s * 1e6,
+        'regex_build_ms': regex_build * 1000,
+        'automaton_build_ms': automaton_build * 1000,
+        'matches': automaton_matches,
+        'agree': regex_matches == automaton_sample_matches,
+    }
+
+
+def variants(keyword: str, count: int, rng: random.Random) -> list:
+    """Up to `count` spellings of `keyword`: leetspeak, doubled spaces, upper-case letters."""
+    reverse = {}
+    for symbol, letter in LEET.items():
+        reverse.setdefault(letter, []).append(symbol)
+    found = {keyword}
+    for _ in range(count * 20):
+        if len(found) >= count:
+            break
+        chars = []
+        for c in keyword:
+            roll = rng.random()
+            if c in reverse and roll < 0.25:
+                c = rng.choice(reverse[c])
+            elif c == " " and roll < 0.3:
+                c = "  "
+            elif roll < 0.1:
+                c = c.upper()
+            chars.append(c)
+        found.add("".join(chars))
+    return sorted(found)
+
+
+def bench_variants(per_keyword: int, posts: list, regex_posts: int) -> dict:
+    rng = random.Random(per_keyword)
+    listed = [v for k in BASE_KEYWORDS for v in variants(k, per_keyword, rng)]
+    patterns = [re.compile(r'(?<!\w)' + re.escape(v) + r'(?!\w)', re.IGNORECASE) for v in listed]
+    matcher = KeywordMatcher(BASE_KEYWORDS, normalizer=TextNormalizer())
+
+    sample = posts[:regex_posts] if regex_posts else posts
+    regex_s, _ = time_per_post(lambda post: [m for p in patterns for m in p.finditer(post)], sample)
+    normalised_s, _ = time_per_post(matcher.find_all, posts)
+    return {'variants': len(listed), 'regex_us': regex_s * 1e6, 'normalised_us': normalised_s * 1e6}
+
+
+def load_responses() -> list:
+    with open(CORPUS, newline="", encoding="utf-8") as f:
+        return [row["response_post"] for row in csv.DictReader(f) if row.get("response_post")]
+
+
+def bench_stream(tokens: int, responses: list, replies: int = 30) -> dict:
+    """Per-token matching cost for replies of `tokens` word chunks."""
+    words = " ".join(responses).split(" ")
+    rng = random.Random(tokens)
+    matcher = KeywordMatcher(BASE_KEYWORDS, normalizer=TextNormalizer(stemming=True))
+    streams = []
+    for _ in range(replies):
+        start = rng.randrange(0, len(words) - tokens)
+        streams.append([w + " " for w in words[start:start + tokens]])
+
+    started = time.perf_counter()
+    for chunks in streams:
+        scanner = matcher.scanner()
+        for chunk in chunks:
+            scanner.feed(chunk)
+        scanner.finish()
+    incremental = (time.perf_counter() - started) / (replies * tokens)
+
+    started = time.perf_counter()
+    for chunks in streams:
+        text = ""
+        for chunk in chunks:
+            text += chunk
+            matcher.find_all(text)
+    rescan = (time.perf_counter() - started) / (replies * tokens)
+    return {'tokens': tokens, 'incremental_us': incremental * 1e6, 'rescan_us': rescan * 1e6}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark crisis keyword matching")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000], help="Keyword list sizes")
+    parser.add_argument("--regex-posts", type=int, default=300,
+                        help="Posts timed with the per-keyword regex loop (0 = all)")
+    parser.add_argument("--variants", type=int, nargs="+", default=[1, 10, 100],
+                        help="Spelling variants listed per keyword in the variant table")
+    parser.add_argument("--stream-tokens", type=int, nargs="+", default=[50, 200, 800],
+                        help="Reply lengths (chunks) in the streaming table")
+    args = parser.parse_args()
+
+    posts = load_posts()
+    chars = sum(len(p) for p in posts) / len(posts)
+    print(f"== Crisis keyword matching ({len(posts)} seeker posts, {chars:.0f} chars avg) ==")
+    print(f"{'keywords':>9}{'regex µs/msg':>14}{'automaton µs/msg':>18}{'speedup':>9}"
+          f"{'build ms (re/ac)':>20}{'matches':>9}")
+    for size in args.sizes:
+        r = bench(size, posts, args.regex_posts)
+        build = f"{r['regex_build_ms']:.1f}/{r['automaton_build_ms']:.1f}"
+        print(f"{r['size']:>9}{r['regex_us']:>14.1f}{r['automaton_us']:>18.1f}"
+              f"{r['regex_us'] / r['automaton_us']:>8.1f}x{build:>20}{r['matches']:>9}"
+              + ("" if r['agree'] else "  ✗ match counts differ"))
+
+    print(f"\n== Variant coverage ({len(BASE_KEYWORDS)} keywords) ==")
+    print(f"{'variants':>9}{'regex µs/msg':>14}{'normalised µs/msg':>19}")
+    for per_keyword in args.variants:
+        r = bench_variants(per_keyword, posts, args.regex_posts)
+        print(f"{r['variants']:>9}{r['regex_us']:>14.1f}{r['normalised_us']:>19.1f}")
+
+    responses = load_responses()
+    print(f"\n== Streamed replies ({len(BASE_KEYWORDS)} keywords, normalised, one word per chunk) ==")
+    print(f"{'chunks':>9}{'incremental µs/chunk':>22}{'rescan µs/chunk':>17}")
+    for tokens in args.stream_tokens:
+        r = bench_stream(tokens, responses)
+        print(f"{r['tokens']:>9}{r['incremental_us']:>22.2f}{r['rescan_us']:>17.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
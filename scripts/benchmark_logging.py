@@ -0,0 +1,137 @@
+"""
+Logging Overhead Benchmark
+Per-turn cost of logging on the hot path: crisis check + user and bot message
+writes against a local SQLite database.
+
+Modes:
+    off    no log output (records below WARNING are discarded)
+    sync   what print() did: every line written to the console on the caller's thread
+    async  structured_logging at INFO: JSON files + console via the background writer
+
+The console is a sink that can be slowed down (--sink-latency-ms) to model a
+busy terminal, container log driver or network pipe.
+
+Usage:
+    python scripts/benchmark_logging.py
+    python scripts/benchmark_logging.py --turns 500 --sink-latency-ms 2
+"""
+
+import argparse
+import logging
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add project root for imports
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from src.chatbot.crisis_detector import CrisisDetector
+from src.database.db_manager import DatabaseManager
+from src.utils.structured_logging import ROOT, configure_logging, shutdown_logging
+
+
+class SlowSink:
+    """Console stand-in whose writes take `latency` seconds."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.lines = 0
+
+    def write(self, text: str):
+        if self.latency:
+            time.sleep(self.latency)
+        self.lines += text.count("\n")
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def run_turns(db: DatabaseManager, detector: CrisisDetector, participant_id: str, turns: int):
+    durations = []
+    for n in range(1, turns + 1):
+        started = time.perf_counter()
+        detector.check_message("I have been feeling a bit low this week")
+        db.save_message(participant_id, n, "user", "I have been feeling a bit low this week")
+        db.save_message(participant_id, n, "bot", "Thanks for sharing that. What has been on your mind?")
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def bench(mode: str, turns: int, latency: float, workdir: Path) -> dict:
+    root = logging.getLogger(ROOT)
+    sink = SlowSink(latency)
+    handler = None
+    if mode == "off":
+        root.setLevel(logging.WARNING)
+    elif mode == "sync":
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+        root.propagate = False
+    else:
+        logs = workdir / mode
+        configure_logging({"logging": {
+            "enabled": True, "level": "INFO", "console": True,
+            "log_path": str(logs / "app"), "error_log_path": str(logs / "errors"),
+            "crisis_flag_path": str(logs / "crisis"),
+        }}, stream=sink)
+
+    db = DatabaseManager(str(workdir / f"{mode}.db"))
+    detector = CrisisDetector()
+    participant_id = f"PBENCH{mode.upper()}"
+    db.create_participant(participant_id, "control")
+    run_turns(db, detector, participant_id, min(20, turns))  # warm up
+    durations = run_turns(db, detector, participant_id, turns)
+
+    flushed = None
+    if mode == "async":
+        started = time.perf_counter()
+        shutdown_logging()
+        flushed = time.perf_counter() - started
+    if handler is not None:
+        root.removeHandler(handler)
+    root.setLevel(logging.NOTSET)
+    root.propagate = True
+    db.close()
+
+    ordered = sorted(durations)
+    return {
+        'mode': mode,
+        'mean_ms': statistics.fmean(durations) * 1000,
+        'p50_ms': ordered[len(ordered) // 2] * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000,
+        'drain_s': flushed,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure per-turn logging overhead")
+    parser.add_argument("--turns", type=int, default=300, help="Turns per mode")
+    parser.add_argument("--sink-latency-ms", type=float, default=0.0,
+                        help="Delay per console write (models a slow terminal or log pipe)")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("off", "sync", "async"):
+            results.append(bench(mode, args.turns, args.sink_latency_ms / 1000.0, Path(tmp)))
+
+    base = results[0]['mean_ms']
+    print(f"== Logging overhead ({args.turns} turns, console latency {args.sink_latency_ms:g} ms/line) ==")
+    print(f"{'mode':<8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'overhead':>11}")
+    for r in results:
+        overhead = f"{r['mean_ms'] - base:+.3f}"
+        print(f"{r['mode']:<8}{r['mean_ms']:>10.3f}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{overhead:>11}")
+    drain = results[-1]['drain_s']
+    if drain is not None:
+        print(f"✓ async backlog written {drain:.2f}s after the last turn (off the request path)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,351 @@
+"""
+Microbenchmark Suite
+Per-call cost of the hot functions, appended to a JSON Lines history so a
+regression shows up as a change between commits.
+
+Cases:
+    crisis.check_message            CrisisDetector, seeker posts with and without crisis phrasing
+    bot._truncate_words_nicely      replies under and over the word cap
+    bot.stream_shaping              BotManager.stream_bot_response over a canned token stream
+                                    (word cap, output crisis scan, history update; no network)
+    bot.system_prompt / build_messages
+    db.save_message / get_conversation   local SQLite file
+    db.get_statistics[N]            study fixture with N messages
+    timezone.fmt_az
+    export.<method>[N]              every CSVExporter export, study fixture with N messages
+
+Study fixtures are synthetic study databases (scripts/generate_study_db.py)
+with exactly N messages, built once per size from a fixed seed and cached
+under data/benchmarks/fixtures/, so every run measures the same data.
+
+Each run is compared with the latest run from another commit on this host
+(or --baseline <commit>); cases whose median moved more than --threshold are
+marked. --fail-on-regression makes that an exit code for CI.
+
+Usage:
+    python scripts/benchmark_suite.py
+    python scripts/benchmark_suite.py --sizes 1000 100000 --only crisis bot.
+    python scripts/benchmark_suite.py --baseline a4898e3 --fail-on-regression
+    python scripts/benchmark_suite.py --list
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import logging
+import os
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add project root for imports
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+import yaml
+from sqlalchemy import create_engine
+
+from src.chatbot.bot_manager import BotManager
+from src.chatbot.crisis_detector import CrisisDetector
+from src.chatbot.load_generator import CRISIS_MESSAGES, PromptSampler
+from src.database.csv_exporter import CSVExporter
+from src.database.db_manager import DatabaseManager
+from src.database.synthetic_study import SyntheticStudy
+from src.utils.microbench import (BenchmarkSuite, append_history, compare, find_baseline, format_us,
+                                  load_history)
+from src.utils.structured_logging import ROOT
+from src.utils.timezone import fmt_az
+
+CONFIG_PATH = project_root / "config" / "app_config.yaml"
+HISTORY_PATH = project_root / "data" / "benchmarks" / "history.jsonl"
+FIXTURES_DIR = project_root / "data" / "benchmarks" / "fixtures"
+# Bump when the fixture layout changes; cached fixtures of older versions are not reused
+FIXTURE_VERSION = 2
+EXPORTS = ("export_all_conversations", "export_participant_summary", "export_crisis_flags",
+           "export_bot_comparison")
+
+
+def size_label(rows: int) -> str:
+    for unit, scale in (("M", 1_000_000), ("k", 1_000)):
+        if rows >= scale and rows % scale == 0:
+            return f"{rows // scale}{unit}"
+    return str(rows)
+
+
+def build_study_fixture(path: Path, messages: int, seed: int = 0):
+    """Write a synthetic study database with exactly `messages` message rows (src/database/synthetic_study.py)."""
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        SyntheticStudy(messages=messages, seed=seed).write(engine)
+    finally:
+        engine.dispose()
+
+
+class Fixtures:
+    """Lazily built, shared fixtures for the suite (closed together at the end)."""
+
+    def __init__(self, workdir: Path, fixtures_dir: Path, seed: int = 0):
+        self.workdir = workdir
+        self.fixtures_dir = fixtures_dir
+        self.seed = seed
+        self._cache = {}
+        self._databases = []
+
+    def _once(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def config(self) -> dict:
+        def build():
+            with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+                return yaml.safe_load(f) or {}
+        return self._once("config", build)
+
+    def posts(self) -> list:
+        return self._once("posts", lambda: PromptSampler(parquet_path=None, seed=self.seed).messages(500))
+
+    def detector(self) -> CrisisDetector:
+        return self._once("detector", lambda: CrisisDetector(config_path=str(CONFIG_PATH)))
+
+    def _open(self, path: Path) -> DatabaseManager:
+        # Explicit URL: never benchmark against a DATABASE_URL from the environment
+        db = DatabaseManager(str(path), db_url=f"sqlite:///{path}", slow_query_ms=None)
+        self._databases.append(db)
+        return db
+
+    def scratch_db(self) -> DatabaseManager:
+        return self._once("scratch_db", lambda: self._open(self.workdir / "scratch.db"))
+
+    def study_db(self, messages: int) -> DatabaseManager:
+        def build():
+            path = self.fixtures_dir / f"study-{size_label(messages)}-seed{self.seed}-v{FIXTURE_VERSION}.db"
+            if not path.exists():
+                print(f"  building fixture {path.name} ...", flush=True)
+                self.fixtures_dir.mkdir(parents=True, exist_ok=True)
+                partial = path.with_suffix(".partial")
+                if partial.exists():
+                    partial.unlink()
+                build_study_fixture(partial, messages, seed=self.seed)
+                os.replace(partial, path)
+            return self._open(path)
+        return self._once(("study", messages), build)
+
+    def bot_manager(self) -> BotManager:
+        def build():
+            os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+            config = dict(self.config())
+            api = dict(config.get("api") or {})
+            api.pop("providers", None)
+            api["scheduler"] = {"enabled": False}
+            api["cassette"] = {"mode": "off"}
+            api["token_calibration"] = {"enabled": False}
+            config["api"] = api
+            config["session_store"] = {"backend": "none"}
+            return BotManager(self.scratch_db(), config)
+        return self._once("bot_manager", build)
+
+    def close(self):
+        for db in self._databases:
+            db.close()
+
+
+def words(posts: list, count: int) -> str:
+    text = []
+    for post in itertools.cycle(posts):
+        text.extend(post.split())
+        if len(text) >= count:
+            return " ".join(text[:count])
+
+
+def add_cases(suite: BenchmarkSuite, fx: Fixtures, sizes: list):
+    """Register every case; fixtures are built only for the cases that run."""
+    # ---- Crisis detection
+    def check_message(crisis: bool):
+        def setup():
+            detector = fx.detector()
+            posts = list(CRISIS_MESSAGES) * 20 if crisis else fx.posts()
+            messages = itertools.cycle(posts)
+            return lambda: detector.check_message(next(messages))
+        return setup
+
+    suite.add("crisis.check_message[post]", setup=check_message(False))
+    suite.add("crisis.check_message[crisis]", setup=check_message(True))
+
+    # ---- Reply shaping
+    def truncate(count: int):
+        def setup():
+            text = words(fx.posts(), count)
+            limit = fx.bot_manager().max_words
+            return lambda: BotManager._truncate_words_nicely(text, limit)
+        return setup
+
+    suite.add("bot._truncate_words_nicely[under cap]", setup=truncate(40))
+    suite.add("bot._truncate_words_nicely[over cap]", setup=truncate(250))
+
+    def stream(count: int):
+        def setup():
+            bot = fx.bot_manager()
+            text = words(fx.posts(), count)
+            tokens = [w + " " for w in text.split()]
+            # Canned provider stream: times the loop around the model, not the model
+            bot._open_stream = lambda messages, **kwargs: (token for token in tokens)
+            session_id = bot.create_new_session()["session_id"]
+            history = bot._get_session(session_id)["history"]
+
+            def run():
+                history.clear()
+                for _ in bot.stream_bot_response(session_id, "I have been feeling low"):
+                    pass
+            return run
+        return setup
+
+    suite.add("bot.stream_shaping[40 words]", setup=stream(40))
+    suite.add("bot.stream_shaping[word cap]", setup=stream(250))
+
+    def system_prompt(cached: bool):
+        def setup():
+            bot = fx.bot_manager()
+            if cached:
+                return lambda: bot._system_prompt("emotional")
+
+            def build():
+                bot._system_prompts.clear()
+                return bot._system_prompt("emotional")
+            return build
+        return setup
+
+    suite.add("bot.system_prompt[cached]", setup=system_prompt(True))
+    suite.add("bot.system_prompt[build]", setup=system_prompt(False))
+
+    def build_messages():
+        bot = fx.bot_manager()
+        posts = fx.posts()
+        sess = {"bot_type": "emotional", "history": []}
+        for n in range(10):
+            sess["history"].append({"role": "user", "content": posts[n]})
+            sess["history"].append({"role": "assistant", "content": words(posts[n + 10:], 50)})
+        return lambda: bot._build_messages(sess, posts[20])
+
+    suite.add("bot._build_messages[10 turns]", setup=build_messages)
+
+    # ---- Database (local SQLite)
+    def save_message():
+        db = fx.scratch_db()
+        db.create_participant("PBENCHSAVE", "emotional")
+        text = fx.posts()[0]
+        counter = itertools.count(1)
+        return lambda: db.save_message("PBENCHSAVE", next(counter), "user", text)
+
+    def get_conversation():
+        db = fx.scratch_db()
+        db.create_participant("PBENCHREAD", "emotional")
+        for n, post in enumerate(fx.posts()[:20]):
+            db.save_message("PBENCHREAD", n // 2 + 1, "user" if n % 2 == 0 else "bot", post)
+        return lambda: db.get_conversation("PBENCHREAD")
+
+    suite.add("db.save_message", setup=save_message)
+    suite.add("db.get_conversation[20 messages]", setup=get_conversation)
+    for rows in sizes:
+        suite.add(f"db.get_statistics[{size_label(rows)}]",
+                  setup=lambda rows=rows: fx.study_db(rows).get_statistics)
+
+    # ---- Timezone formatting
+    naive = datetime(2025, 3, 4, 18, 30, 5)
+    aware = naive.replace(tzinfo=timezone.utc)
+    suite.add("timezone.fmt_az[naive]", fn=lambda: fmt_az(naive, "%Y-%m-%d %H:%M:%S"))
+    suite.add("timezone.fmt_az[aware]", fn=lambda: fmt_az(aware, "%Y-%m-%d %H:%M:%S"))
+
+    # ---- Exports
+    def export(method: str, rows: int):
+        def setup():
+            exporter = CSVExporter(fx.study_db(rows))
+            exporter.export_dir = str(fx.workdir / "exports")
+            os.makedirs(exporter.export_dir, exist_ok=True)
+            run = getattr(exporter, method)
+
+            def call():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    return run(filename=f"{method}.csv")
+            return call
+        return setup
+
+    def conversation_as_dict(rows: int):
+        def setup():
+            exporter = CSVExporter(fx.study_db(rows))
+            return lambda: exporter.get_conversation_as_dict("P00000001")
+        return setup
+
+    for rows in sizes:
+        # A single batch at large sizes: one 1M-row export already takes seconds
+        repeat = 3 if rows <= 100_000 else 1
+        for method in EXPORTS:
+            suite.add(f"export.{method}[{size_label(rows)}]", setup=export(method, rows), repeat=repeat)
+        suite.add(f"export.get_conversation_as_dict[{size_label(rows)}]", setup=conversation_as_dict(rows))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run the microbenchmark suite and record the results")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000],
+                        help="Study fixture sizes (message rows) for statistics and exports")
+    parser.add_argument("--only", nargs="+", help="Run cases whose name contains any of these")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per timed batch")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed batches per case")
+    parser.add_argument("--seed", type=int, default=0, help="Fixture seed")
+    parser.add_argument("--history", default=str(HISTORY_PATH), help="JSON Lines result history")
+    parser.add_argument("--fixtures", default=str(FIXTURES_DIR), help="Cache directory for study fixtures")
+    parser.add_argument("--baseline", help="Commit to compare with (default: latest run from another commit)")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative median change that counts")
+    parser.add_argument("--no-save", action="store_true", help="Do not append this run to the history")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit 1 if any case regressed")
+    parser.add_argument("--list", action="store_true", help="List case names and exit")
+    args = parser.parse_args()
+
+    # Crisis matches and slow statements would otherwise log on every call
+    logging.getLogger(ROOT).setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fx = Fixtures(Path(tmp), Path(args.fixtures), seed=args.seed)
+        suite = BenchmarkSuite(min_time=args.min_time, repeat=args.repeat)
+        add_cases(suite, fx, args.sizes)
+        if args.list:
+            print("\n".join(suite.names()))
+            return 0
+
+        print("=" * 72)
+        print("MICROBENCHMARKS")
+        print("=" * 72)
+        try:
+            run = suite.run(select=args.only, progress=lambda name, r: print(
+                f"{name:<52}{format_us(r['median_us']):>12}  ±{format_us(r['stdev_us'])}", flush=True))
+        finally:
+            fx.close()
+
+    history = load_history(args.history)
+    baseline = find_baseline(history, run, ref=args.baseline)
+    if not args.no_save:
+        append_history(args.history, run)
+
+    rows = compare(run, baseline, threshold=args.threshold)
+    regressions = [r for r in rows if r['status'] == 'regression']
+    if baseline is None:
+        print(f"\n✓ {len(rows)} cases measured (no baseline yet)")
+    else:
+        note = "" if baseline.get('machine') == run['machine'] else f" (machine differs: {baseline.get('machine')})"
+        print(f"\nCompared with {baseline.get('commit')} from {baseline.get('timestamp')}{note}:")
+        for r in rows:
+            if r['status'] in ('regression', 'improvement'):
+                print(f"  {r['status']:<12}{r['name']:<52}{format_us(r['before_us']):>12} -> "
+                      f"{format_us(r['after_us'])} ({r['change']:+.0%})")
+        print(f"✓ {len(rows)} cases: {len(regressions)} regressions, "
+              f"{sum(1 for r in rows if r['status'] == 'improvement')} improvements "
+              f"(threshold {args.threshold:.0%})")
+    if not args.no_save:
+        print(f"  History: {args.history}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
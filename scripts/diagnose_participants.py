@@ -13,17 +13,41 @@ sys.path.insert(0, str(project_root))
 from dotenv import load_dotenv
 load_dotenv()
 
+from sqlalchemy import func
+
 from src.database.db_manager import DatabaseManager
 from src.database.models import Participant, Message
 
-def diagnose():
-    db_manager = DatabaseManager("data/database/conversations.db")
+def diagnose(db_manager: DatabaseManager = None):
+    db_manager = db_manager or DatabaseManager("data/database/conversations.db")
     session = db_manager.get_session()
     
     try:
         # Get all participants
         participants = session.query(Participant).order_by(Participant.start_time.desc()).all()
         
+        # Message counts for every participant in one query (instead of one count per participant)
+        msg_counts = dict(
+            session.query(Message.participant_id, func.count(Message.id))
+            .group_by(Message.participant_id)
+            .all()
+        )
+        
+        # First messages of the 10 most recent participants, also in one query
+        recent_ids = [p.id for p in participants[:10]]
+        first_messages = {}
+        if recent_ids:
+            rows = (
+                session.query(Message)
+                .filter(Message.participant_id.in_(recent_ids))
+                .order_by(Message.participant_id, Message.message_num, Message.id)
+                .all()
+            )
+            for msg in rows:
+                first_messages.setdefault(msg.participant_id, [])
+                if len(first_messages[msg.participant_id]) < 3:
+                    first_messages[msg.participant_id].append(msg)
+        
         print("\n" + "="*80)
         print("PARTICIPANT DIAGNOSIS")
         print("="*80)
@@ -32,8 +56,7 @@ def diagnose():
         print("-"*80)
         
         for i, p in enumerate(participants[:10], 1):
-            # Count messages for this participant
-            msg_count = session.query(Message).filter_by(participant_id=p.id).count()
+            msg_count = msg_counts.get(p.id, 0)
             
             print(f"\n{i}. Participant ID: {p.id}")
             print(f"   Prolific ID: {p.prolific_id or 'N/A'}")
@@ -43,7 +66,7 @@ def diagnose():
             print(f"   Completed: {'✓' if p.completed else '✗'}")
             
             # Get first few messages to show pattern
-            messages = session.query(Message).filter_by(participant_id=p.id).order_by(Message.message_num).limit(3).all()
+            messages = first_messages.get(p.id, [])
             if messages:
                 print(f"   First messages:")
                 for msg in messages:
@@ -57,7 +80,7 @@ def diagnose():
         print("="*80)
         
         # Count participants with only 1-2 messages (sign of the bug)
-        single_msg_participants = [p for p in participants if session.query(Message).filter_by(participant_id=p.id).count() <= 2]
+        single_msg_participants = [p for p in participants if msg_counts.get(p.id, 0) <= 2]
         
         if len(single_msg_participants) > 5:
             print(f"\n⚠️  WARNING: Found {len(single_msg_participants)} participants with ≤2 messages")
@@ -0,0 +1,283 @@
+"""
+Local LLM Stub
+OpenAI-compatible /v1/chat/completions server for offline tests and load runs.
+
+- Streams (SSE) or returns a canned reply, with configurable time-to-first-token
+  and inter-chunk delay
+- Fault injection: queued one-shot faults (HTTP errors, stalls, dropped streams)
+  or a random fault rate for load tests
+- Sends x-ratelimit-* headers and optional usage chunks like the real API
+
+Usage:
+    # Start a stub on port 8001 (point OPENAI_BASE_URL at http://127.0.0.1:8001/v1)
+    python scripts/llm_stub.py --port 8001 --ttft 0.3 --chunk-delay 0.02
+
+    # 5% of requests fail with a 500 or stall for 10s
+    python scripts/llm_stub.py --port 8001 --fault-rate 0.05
+
+In tests:
+    with LLMStubServer(ttft=0.0) as stub:
+        stub.add_fault(status=500)
+        config["api"]["base_url"] = stub.base_url
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, List, Optional
+
+
+DEFAULT_REPLY = (
+    "It sounds like you are carrying a lot right now, and it makes sense that you feel worn down. "
+    "Would it help to talk about what has been weighing on you most this week? "
+    "We can take it one step at a time."
+)
+
+
+class LLMStubServer:
+    """
+    Threaded OpenAI-compatible stub server.
+
+    Faults (consumed one per request, in order):
+        {"status": 500}                     HTTP error response
+        {"status": 429, "retry_after": 1}   Rate limited with Retry-After
+        {"delay": 2.0}                      Delay before response headers
+        {"stall": 5.0}                      Headers sent, then no data for N seconds
+        {"drop_after": 3}                   Close the connection after N chunks
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, reply: str = DEFAULT_REPLY,
+                 ttft: float = 0.0, chunk_delay: float = 0.0, fault_rate: float = 0.0,
+                 seed: Optional[int] = None, model_name: str = "stub-model"):
+        """
+        Initialize stub server.
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            reply: Text returned for every request (split into word chunks)
+            ttft: Seconds before the first chunk
+            chunk_delay: Seconds between chunks
+            fault_rate: Probability of a random fault (500 or long stall) per request
+            seed: Random seed for reproducible random faults
+            model_name: Model name echoed in responses
+        """
+        self.reply = reply
+        self.ttft = float(ttft)
+        self.chunk_delay = float(chunk_delay)
+        self.fault_rate = float(fault_rate)
+        self.model_name = model_name
+        self._rng = random.Random(seed)
+        self._faults: Deque[Dict] = deque()
+        self._lock = threading.Lock()
+        self.requests: List[Dict] = []  # Parsed request bodies, in arrival order
+        self.request_headers: List[Dict[str, str]] = []  # Matching request headers (lower-cased names)
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def add_fault(self, **fault):
+        """Queue a one-shot fault for the next request."""
+        with self._lock:
+            self._faults.append(fault)
+
+    def clear_faults(self):
+        with self._lock:
+            self._faults.clear()
+
+    def request_count(self) -> int:
+        with self._lock:
+            return len(self.requests)
+
+    def _next_fault(self) -> Dict:
+        with self._lock:
+            if self._faults:
+                return self._faults.popleft()
+            if self.fault_rate and self._rng.random() < self.fault_rate:
+                return self._rng.choice([{"status": 500}, {"stall": 10.0}])
+        return {}
+
+    def _record(self, body: Dict, headers: Optional[Dict[str, str]] = None):
+        with self._lock:
+            self.requests.append(body)
+            self.request_headers.append(headers or {})
+
+    def start(self) -> "LLMStubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "LLMStubServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------- HTTP handling ----------
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, str(v))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._send_json(200, {"object": "list", "data": [{"id": stub.model_name, "object": "model"}]})
+                else:
+                    self._send_json(404, {"error": {"message": "not found"}})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    body = {}
+                stub._record(body, {k.lower(): v for k, v in self.headers.items()})
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+
+                fault = stub._next_fault()
+                if fault.get("delay"):
+                    time.sleep(float(fault["delay"]))
+                status = int(fault.get("status") or 200)
+                if status != 200:
+                    headers = {"Connection": "close"}
+                    if fault.get("retry_after") is not None:
+                        headers["Retry-After"] = fault["retry_after"]
+                    self._send_json(status, {"error": {"message": f"stub fault {status}", "type": "stub_error"}}, headers)
+                    self.close_connection = True
+                    return
+
+                words = stub.reply.split(" ")
+                chunks = [w + (" " if i < len(words) - 1 else "") for i, w in enumerate(words)]
+                max_tokens = body.get("max_tokens")
+                finish_reason = "stop"
+                if max_tokens and len(chunks) > int(max_tokens):
+                    chunks = chunks[: max(1, int(max_tokens))]
+                    finish_reason = "length"
+                prompt_tokens = sum(len(str(m.get("content") or "")) for m in body.get("messages", [])) // 4
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(chunks),
+                    "total_tokens": prompt_tokens + len(chunks),
+                    "prompt_tokens_details": {"cached_tokens": 0},
+                }
+                rate_headers = {
+                    "x-ratelimit-limit-requests": 10000,
+                    "x-ratelimit-remaining-requests": 9999,
+                    "x-ratelimit-limit-tokens": 10000000,
+                    "x-ratelimit-remaining-tokens": 9999000,
+                }
+                completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+                model = body.get("model") or stub.model_name
+
+                if not body.get("stream"):
+                    if stub.ttft:
+                        time.sleep(stub.ttft)
+                    self._send_json(200, {
+                        "id": completion_id, "object": "chat.completion", "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "finish_reason": finish_reason,
+                                     "message": {"role": "assistant", "content": "".join(chunks)}}],
+                        "usage": usage,
+                    }, rate_headers)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                for k, v in rate_headers.items():
+                    self.send_header(k, str(v))
+                self.end_headers()
+                self.close_connection = True
+
+                def event(delta, finish=None, extra=None):
+                    payload = {
+                        "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if delta is not None else [],
+                    }
+                    payload.update(extra or {})
+                    self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+
+                try:
+                    if fault.get("stall"):
+                        self.wfile.flush()
+                        time.sleep(float(fault["stall"]))
+                    if stub.ttft:
+                        time.sleep(stub.ttft)
+                    event({"role": "assistant", "content": ""})
+                    for i, chunk in enumerate(chunks):
+                        if fault.get("drop_after") is not None and i >= int(fault["drop_after"]):
+                            # Abort mid-stream without the terminating [DONE]
+                            return
+                        if i and stub.chunk_delay:
+                            time.sleep(stub.chunk_delay)
+                        event({"content": chunk})
+                    event({}, finish=finish_reason)
+                    if (body.get("stream_options") or {}).get("include_usage"):
+                        event(None, extra={"usage": usage})
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client cancelled the stream
+                    return
+
+        return Handler
+
+
+def main():
+    """Run the stub server from the command line."""
+    parser = argparse.ArgumentParser(description="OpenAI-compatible local LLM stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--ttft", type=float, default=0.3, help="Seconds before the first chunk")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="Seconds between chunks")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="Probability of a random fault per request")
+    parser.add_argument("--seed", type=int, help="Random seed for faults")
+    args = parser.parse_args()
+
+    stub = LLMStubServer(args.host, args.port, ttft=args.ttft, chunk_delay=args.chunk_delay,
+                         fault_rate=args.fault_rate, seed=args.seed)
+    print(f"✓ LLM stub listening on {stub.base_url} (Ctrl+C to stop)")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
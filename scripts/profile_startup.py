@@ -0,0 +1,93 @@
+"""
+Startup Profile Script
+Report what a cold Streamlit process pays before the first page: `import src.app`,
+the first initialize_app() call, and the slowest modules and packages to import.
+
+Runs in a fresh interpreter with a temporary working directory and a throwaway
+SQLite database, so it is safe to run next to a live study.
+
+Usage:
+    python scripts/profile_startup.py
+    python scripts/profile_startup.py --top 40 --check
+    python scripts/profile_startup.py --json data/benchmarks/startup.json
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+import yaml
+
+from src.utils.startup_profile import HEAVY_MODULES, profile_startup
+
+
+def _load_config(config_path: str) -> dict:
+    with open(config_path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Profile app startup (imports and first initialize_app)")
+    parser.add_argument("--top", type=int, default=25, help="Modules and packages to list")
+    parser.add_argument("--config", default=str(project_root / "config" / "app_config.yaml"),
+                        help="Config file with the startup budgets")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if a startup budget is exceeded")
+    parser.add_argument("--json", help="Also write the full profile to this file")
+    args = parser.parse_args()
+
+    startup = _load_config(args.config).get("startup") or {}
+    profile = profile_startup(str(project_root))
+
+    print("=" * 60)
+    print("STARTUP PROFILE")
+    print("=" * 60)
+    print("\nSlowest modules (self time, -X importtime):")
+    for module in profile['modules'][:args.top]:
+        print(f"  {module['self_us'] / 1000:8.1f} ms  {module['cumulative_us'] / 1000:8.1f} ms cumul.  "
+              f"{module['module']}")
+    print("\nBy top-level package:")
+    for package, self_us in list(profile['packages'].items())[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {package}")
+
+    loaded = profile['heavy']
+    print(f"\nHeavy dependencies loaded ({', '.join(HEAVY_MODULES)}):")
+    print(f"  after import:          {', '.join(loaded['after_import']) or '-'}")
+    print(f"  after initialize_app:  {', '.join(loaded['after_initialize']) or '-'}")
+
+    over = []
+    print()
+    for label, key, budget_key in (("import src.app", "import_ms", "import_budget_ms"),
+                                   ("initialize_app()", "initialize_ms", "initialize_budget_ms")):
+        budget = startup.get(budget_key)
+        status = ""
+        if budget is not None:
+            ok = profile[key] <= budget
+            status = f"  (budget {budget} ms {'✓' if ok else '✗ OVER'})"
+            if not ok:
+                over.append(label)
+        print(f"  {label:<18} {profile[key]:8.1f} ms{status}")
+    print(f"  {'total':<18} {profile['total_ms']:8.1f} ms")
+    print("  (import times include -X importtime overhead)")
+
+    if args.json:
+        directory = os.path.dirname(args.json)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(profile, f, indent=2)
+        print(f"\n✓ Profile written to {args.json}")
+
+    if over:
+        print(f"\n✗ Over budget: {', '.join(over)}")
+        return 1 if args.check else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+Crisis Rescan Script
+Re-check every stored user message against the current crisis keywords and
+create the flags that are missing (e.g. after adding keywords).
+
+Safe to interrupt and re-run: progress is checkpointed per chunk and flags are
+only created once per message and keyword.
+
+Usage:
+    python scripts/rescan_crisis_flags.py
+    python scripts/rescan_crisis_flags.py --workers 4 --chunk-size 2000
+    python scripts/rescan_crisis_flags.py --keyword "self harm" --restart
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.chatbot.crisis_detector import CrisisDetector
+from src.chatbot.crisis_rescan import CrisisRescan
+from src.database.db_manager import DatabaseManager
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Rescan stored user messages for crisis keywords")
+    parser.add_argument("--db", default="data/database/conversations.db",
+                        help="SQLite path or SQLAlchemy URL (DATABASE_URL takes precedence)")
+    parser.add_argument("--config", default="config/app_config.yaml", help="Config with safety.crisis_keywords")
+    parser.add_argument("--keyword", action="append", default=[], help="Extra keyword for this run (repeatable)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count, 0: none)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Messages per chunk")
+    parser.add_argument("--checkpoint", default="data/checkpoints/crisis_rescan.json", help="Checkpoint file")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and scan every message")
+    args = parser.parse_args()
+
+    detector = CrisisDetector(config_path=args.config)
+    for keyword in args.keyword:
+        detector.add_keyword(keyword)
+    db = DatabaseManager(args.db)
+    rescan = CrisisRescan(db, detector, chunk_size=args.chunk_size, workers=args.workers,
+                          checkpoint_path=args.checkpoint)
+
+    print("=" * 60)
+    print("CRISIS RESCAN")
+    print("=" * 60)
+    print(f"Keywords: {len(detector.get_keyword_list())}  Workers: {rescan.workers}  Chunk: {rescan.chunk_size}")
+
+    def progress(report):
+        print(f"  {report['messages']:>9,} messages  {report['flags_created']:>6,} new flags  "
+              f"{report['messages_per_second']:>9,.0f} msg/s  (last id {report['last_message_id']})")
+
+    report = rescan.run(restart=args.restart, progress=progress)
+    if report['resumed_from']:
+        print(f"Resumed after message {report['resumed_from']}")
+    print(f"\n✓ {report['messages']:,} messages scanned in {report['seconds']:.2f}s "
+          f"({report['messages_per_second']:,.0f} messages/s), {report['flags_created']:,} new flags")
+    db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
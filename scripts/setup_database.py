@@ -93,6 +93,7 @@ def setup_database(reset: bool = False, force: bool = False):
     print("  - participants (participant information)")
     print("  - messages (conversation messages)")
     print("  - crisis_flags (safety monitoring)")
+    print("  - chat_sessions (live chat state shared between app processes)")
     print("  - export_logs (export tracking)")
     print()
     print("Database is ready for use.")
@@ -0,0 +1,82 @@
+"""
+Token Calibration Report
+Compare the configured max_tokens with the per-bot-type caps derived from
+observed tokens-per-word (api.token_calibration).
+
+For each bot type it prints the tokens-per-word distribution, the share of
+replies cut by the token cap (finish_reason "length") and the average
+completion tokens spent, before (observed) and after (estimated) calibration.
+
+Usage:
+    python scripts/token_calibration_report.py
+    python scripts/token_calibration_report.py --stats data/calibration/token_stats.json --percentile 0.95
+    python scripts/token_calibration_report.py --json
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add project root for imports
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from src.chatbot.token_calibration import TokenCalibrator
+
+
+def _load_config(config_path: str) -> dict:
+    import yaml
+    with open(config_path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Report tokens-per-word calibration per bot type")
+    parser.add_argument("--config", default="config/app_config.yaml", help="App config file")
+    parser.add_argument("--stats", help="Calibration samples file (defaults to api.token_calibration.path)")
+    parser.add_argument("--percentile", type=float, help="Override the tokens-per-word percentile (0-1)")
+    parser.add_argument("--headroom", type=float, help="Override the headroom multiplier")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    config = _load_config(args.config)
+    api = dict(config.get("api") or {})
+    cal = dict(api.get("token_calibration") or {}, enabled=True)
+    if args.stats:
+        cal["path"] = args.stats
+    if args.percentile is not None:
+        cal["percentile"] = args.percentile
+    if args.headroom is not None:
+        cal["headroom"] = args.headroom
+    api["token_calibration"] = cal
+
+    if not cal.get("path") or not Path(cal["path"]).exists():
+        print(f"✗ No calibration samples found at {cal.get('path')}")
+        return 1
+
+    calibrator = TokenCalibrator.from_config(api)
+    default = int(api.get("max_tokens", 1024))
+    report = calibrator.report(default)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"== Token calibration (max_words={calibrator.max_words}, p{calibrator.percentile * 100:g}, "
+          f"headroom {calibrator.headroom:g}) ==")
+    header = f"{'bot type':<14}{'n':>6}{'tpw p50':>9}{'tpw p95':>9}{'cap':>13}{'truncated':>17}{'avg tokens':>17}"
+    print(header)
+    print("-" * len(header))
+    for bot_type, r in report.items():
+        cap = f"{r['max_tokens_before']} -> {r['max_tokens_after']}"
+        truncated = f"{r['truncation_rate_before']:.0%} -> {r['truncation_rate_after']:.0%}"
+        spend = f"{r['avg_tokens_before']:g} -> {r['avg_tokens_after']:g}"
+        print(f"{bot_type:<14}{r['samples']:>6}{r['tokens_per_word_p50']:>9}{r['tokens_per_word_p95']:>9}"
+              f"{cap:>13}{truncated:>17}{spend:>17}")
+    if any(r['samples'] < calibrator.min_samples for r in report.values()):
+        print(f"⚠ Bot types with fewer than {calibrator.min_samples} samples are still sent api.max_tokens")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,8 +4,8 @@ Participant-facing Streamlit application for empathic AI chatbot research.
 """
 import sys
 import streamlit as st
-import yaml
 from pathlib import Path
+from contextlib import closing
 from dotenv import load_dotenv
 
 # Configure page FIRST before any other Streamlit commands
@@ -25,24 +25,29 @@ sys.path.insert(0, str(project_root))
 
 from src.database.db_manager import DatabaseManager
 from src.chatbot.bot_manager import BotManager
-from src.chatbot.conversation_handler import ConversationHandler
+from src.chatbot.conversation_handler import ConversationHandler, ConversationState
+from src.chatbot.turn_pipeline import TurnPipeline
 from src.ui.chat_interface import ChatInterface
+from src.utils.session_registry import get_session_registry
+from src.utils import metrics, tracing
+from src.utils.config_registry import get_registry
+from src.utils.structured_logging import configure_logging
 
 
 def load_config(config_path: str = "config/app_config.yaml") -> dict:
     """
     Load application configuration from YAML file.
+    The file is parsed and validated once per process; later calls return the
+    shared read-only snapshot (reloaded when the file changes).
     
     Args:
         config_path: Path to config file
         
     Returns:
-        Configuration dictionary
+        Configuration dictionary (read-only)
     """
     try:
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
-        return config
+        return get_registry(config_path).snapshot().config
     except Exception as e:
         st.error(f"Error loading configuration: {e}")
         st.stop()
@@ -53,28 +58,52 @@ def initialize_app():
     # Load configuration
     config = load_config()
     
-    # Initialize database manager
-    db_path = config['database']['path']
-    db_manager = DatabaseManager(db_path)
+    # Background log writer (starts once per process)
+    configure_logging(config)
     
-    # Initialize bot manager
-    bot_manager = BotManager(db_manager, config)
+    # Metrics endpoint / dump file (starts once per process)
+    metrics.start_from_config(config)
     
-    # Initialize conversation handler
-    max_messages = config['conversation']['max_messages']
-    conversation_handler = ConversationHandler(max_messages)
-    
-    # Initialize chat interface
-    chat_interface = ChatInterface(config)
+    with tracing.span("app.initialize"):
+        # Initialize database manager
+        db_path = config['database']['path']
+        db_manager = DatabaseManager(db_path, slow_query_ms=config['database'].get('slow_query_ms', 250))
+        
+        # Initialize bot manager
+        bot_manager = BotManager(db_manager, config)
+        
+        # Initialize conversation handler
+        max_messages = config['conversation']['max_messages']
+        conversation_handler = ConversationHandler(
+            max_messages,
+            session_registry=get_session_registry("conversation", config, record_type=ConversationState)
+        )
+        
+        # Initialize chat interface
+        chat_interface = ChatInterface(config)
+        
+        # Turn pipeline (message writes overlap with reply streaming)
+        turn_pipeline = TurnPipeline.from_config(config, db_manager, bot_manager)
     
-    return config, db_manager, bot_manager, conversation_handler, chat_interface
+    return config, db_manager, bot_manager, conversation_handler, chat_interface, turn_pipeline
 
 
 def main():
-    """Main application function."""
+    """Main application function; each Streamlit script run is one `streamlit.rerun` span."""
+    # Tracer is installed once per process, before the first span
+    tracing.configure_from_config(load_config())
+    with tracing.span("streamlit.rerun"):
+        _render_page()
+
+
+def _render_page():
+    """Render the current page and handle a submitted message."""
     
     # Initialize components
-    config, db_manager, bot_manager, conversation_handler, chat_interface = initialize_app()
+    config, db_manager, bot_manager, conversation_handler, chat_interface, turn_pipeline = initialize_app()
+    
+    # Create LLM SDK clients in the background while the page renders
+    bot_manager.warm_up()
     
     # Apply custom styling
     chat_interface.apply_custom_css()
@@ -102,12 +131,10 @@ def main():
                 if ext_id:
                     prior = db_manager.get_participant_by_prolific(ext_id)
                     if prior and getattr(prior, 'bot_type', None) in ("cognitive", "emotional", "motivational", "control"):
-                        # Override both session state and the in-memory BotManager session
+                        # Override both session state and the BotManager session (persisted to the store)
                         st.session_state.bot_type = prior.bot_type
                         try:
-                            sid = st.session_state.session_id
-                            if sid in getattr(bot_manager, 'sessions', {}):
-                                bot_manager.sessions[sid]['bot_type'] = prior.bot_type
+                            bot_manager.set_bot_type(st.session_state.session_id, prior.bot_type)
                         except Exception:
                             pass
             except Exception:
@@ -197,21 +224,23 @@ def main():
             st.session_state.conversation_complete = True
             st.rerun()
 
-        # Ensure BotManager has the session (Streamlit reruns recreate BotManager)
+        # Ensure BotManager has the session (Streamlit reruns recreate BotManager).
+        # It is normally loaded lazily from the session store; rebuilding from
+        # UI state is only a fallback when no store holds it.
         try:
             sess_id = st.session_state.session_id
-            if sess_id and sess_id not in getattr(bot_manager, 'sessions', {}):
-                # Rehydrate bot session from session_state
+            if sess_id and not bot_manager.has_session(sess_id):
                 hist = [
                     {"role": m.get("role"), "content": m.get("content")}
                     for m in st.session_state.messages[-10:]
                     if isinstance(m, dict) and m.get("role") in ("user", "assistant")
                 ]
-                bot_manager.sessions[sess_id] = {
-                    "participant_id": st.session_state.participant_id,
-                    "bot_type": st.session_state.bot_type,
-                    "history": hist,
-                }
+                bot_manager.restore_session(
+                    sess_id,
+                    st.session_state.participant_id,
+                    st.session_state.bot_type,
+                    hist,
+                )
         except Exception:
             # Non-fatal; bot_manager will raise a clear error on send if needed
             pass
@@ -248,14 +277,6 @@ def main():
                 'message_num': message_num
             })
             
-            # Save user message to database
-            db_manager.save_message(
-                st.session_state.participant_id,
-                message_num,
-                'user',
-                user_input
-            )
-
             # Immediately render the user's message so it appears without waiting
             try:
                 # Reuse existing UI helper to include turn caption
@@ -268,48 +289,42 @@ def main():
             
             # Get bot response (with crisis check and streaming for lower perceived latency)
             try:
-                # Crisis check first
-                is_crisis, detected_keyword, crisis_text = bot_manager.check_crisis(user_input)
-                if is_crisis:
-                    bot_response = crisis_text or ""
+                # Crisis check, then queue the user-message write; it runs on a
+                # background lane while the reply streams. The bot-message write
+                # (and crisis flag) is queued behind it once the reply is complete.
+                turn = turn_pipeline.begin(
+                    st.session_state.session_id,
+                    st.session_state.participant_id,
+                    message_num,
+                    user_input
+                )
+                if turn.crisis_detected:
+                    bot_response = "".join(turn.stream())
 
                     # Add bot message to display immediately
                     st.session_state.messages.append({
                         'role': 'assistant',
                         'content': bot_response
                     })
-
-                    # Save bot message to database and create crisis flag
-                    saved_msg = db_manager.save_message(
-                        st.session_state.participant_id,
-                        message_num,
-                        'bot',
-                        bot_response,
-                        contains_crisis_keyword=True
-                    )
-                    try:
-                        msg_id = getattr(saved_msg, 'id', None)
-                        if msg_id:
-                            db_manager.create_crisis_flag(
-                                participant_id=st.session_state.participant_id,
-                                message_id=msg_id,
-                                keyword_detected=str(detected_keyword or 'crisis')
-                            )
-                    except Exception:
-                        pass
                     st.warning("⚠ Crisis resources have been provided in the response above.")
                 else:
                     # Stream assistant response for faster feedback
                     with st.chat_message("assistant"):
                         placeholder = st.empty()
                         collected = ""
-                        for chunk in bot_manager.stream_bot_response(
-                            st.session_state.session_id,
-                            user_input
-                        ):
-                            collected += chunk
-                            # Update UI incrementally
-                            placeholder.markdown(collected)
+                        def _show_queue_position(position, waited):
+                            # Shown only while the turn waits for a free LLM slot
+                            ahead = f" ({position} ahead)" if position else ""
+                            placeholder.markdown(f"_Waiting for a free slot{ahead}…_")
+
+                        # A rerun or navigation interrupts the loop; closing the
+                        # turn stops the model stream instead of letting it run on
+                        with tracing.span("ui.stream_render", parent=turn.span), \
+                                closing(turn.stream(on_wait=_show_queue_position)) as reply:
+                            for chunk in reply:
+                                collected += chunk
+                                # Update UI incrementally
+                                placeholder.markdown(collected)
                     bot_response = collected
 
                     # Reflect the full assistant message into our session history
@@ -318,15 +333,6 @@ def main():
                         'content': bot_response
                     })
 
-                    # Save bot message to database
-                    db_manager.save_message(
-                        st.session_state.participant_id,
-                        message_num,
-                        'bot',
-                        bot_response,
-                        contains_crisis_keyword=False
-                    )
-
             except Exception as e:
                 st.error(f"An error occurred: {e}")
                 st.error("Please try sending your message again.")
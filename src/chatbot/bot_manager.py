@@ -2,28 +2,116 @@
 """
 Unified BotManager
 - Manages sessions (create_new_session / get_bot_response / end_session)
+- Optional external SessionStore so sessions survive reruns and replica restarts
 - Loads empathy prompts (cognitive/emotional/motivational/control)
-- Calls provider APIs (OpenAI, Gemini, Anthropic) using modern patterns
+- Calls provider APIs (OpenAI, Gemini, Anthropic) through OpenAI-compatible endpoints,
+  routed per bot type with latency-aware failover (api.providers / api.routing)
 - Crisis detection: short-circuits to crisis response
+- Optional record/replay cassette for offline, reproducible model calls
+- Process-wide admission control (LLMScheduler) in front of the provider API
+- Retries with deadlines, backoff and a circuit breaker (api.timeout / api.retry_attempts)
+- Optional hedged requests to cut the time-to-first-token tail (api.hedging)
 """
 
 import os
+import time
 import uuid
+import weakref
 import random
 from typing import Dict, Any, List, Optional
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
 
 # Try imports for flexible project layouts
 try:
-    from crisis_detector import CrisisDetector
+    from src.chatbot.crisis_detector import CrisisDetector
+except Exception:
+    try:
+        from crisis_detector import CrisisDetector
+    except Exception:
+        CrisisDetector = None  # Will disable if module not present
+
+try:
+    from src.chatbot.cancellation import get_cancellation_registry
+except Exception:
+    from cancellation import get_cancellation_registry
+
+try:
+    from src.chatbot.cassette import cassette_from_config, request_fingerprint
+except Exception:
+    from cassette import cassette_from_config, request_fingerprint
+
+try:
+    from src.utils.config_registry import get_registry
+except Exception:
+    from config_registry import get_registry
+
+try:
+    from src.utils.session_registry import SessionRecord, get_session_registry
+except Exception:
+    from session_registry import SessionRecord, get_session_registry
+
+try:
+    from src.chatbot.llm_scheduler import get_scheduler
+except Exception:
+    from llm_scheduler import get_scheduler
+
+try:
+    from src.chatbot.hedging import get_hedger
+except Exception:
+    from hedging import get_hedger
+
+try:
+    from src.chatbot.providers import ProviderRouter
+except Exception:
+    from providers import ProviderRouter
+
+try:
+    from src.chatbot.resilience import IncompleteStreamError, RetryPolicy, call_with_retries, resilient_stream
+except Exception:
+    from resilience import IncompleteStreamError, RetryPolicy, call_with_retries, resilient_stream
+
+try:
+    from src.chatbot.token_calibration import get_calibrator
+except Exception:
+    from token_calibration import get_calibrator
+
+try:
+    from src.utils import metrics
+except Exception:
+    import metrics
+
+try:
+    from src.utils import tracing
+except Exception:
+    import tracing
+
+try:
+    from src.utils.structured_logging import get_logger
 except Exception:
-    CrisisDetector = None  # Will disable if module not present
+    from structured_logging import get_logger
+
+try:
+    from src.database.session_store import session_store_from_config
+except Exception:
+    session_store_from_config = None  # External session store unavailable
 
 # ---- Utility helpers ---------------------------------------------------------
 
+_ENV_LOADED = False
+
+
+def _load_env():
+    """Load .env once per process (on first BotManager, not at import)."""
+    global _ENV_LOADED
+    if _ENV_LOADED:
+        return
+    _ENV_LOADED = True
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+
 def _get_cfg(cfg: dict, path: List[str], default=None):
     cur = cfg or {}
     for key in path:
@@ -48,33 +136,139 @@ def _read_text(paths: List[str]) -> str:
     except Exception:
         return ""
 
+# Shown to the participant when the model cannot be reached after all retries
+ERROR_REPLY = "I’m sorry, I’m having trouble responding right now. Please try sending your message again."
+
+# Appended after a partial reply when a dropped stream is resumed
+CONTINUE_INSTRUCTION = (
+    "Your previous reply was cut off. Continue it exactly from where it stopped, "
+    "without repeating any of it."
+)
+
+# Early stops that still complete the turn (history updated, reply saved)
+COMPLETED_STOPS = ("word_cap", "crisis_output")
+
+# ---- Session record ----------------------------------------------------------
+
+class BotSession(SessionRecord):
+    """In-memory chat state for one participant session."""
+
+    __slots__ = ("participant_id", "bot_type", "history", "last_call")
+
+log = get_logger("bot")
+
+# ---- Metrics -------------------------------------------------------------------
+
+TURN_SECONDS = metrics.histogram("bot_turn_seconds", "Model turn duration in seconds", ["bot_type", "mode"])
+TTFT_SECONDS = metrics.histogram("bot_ttft_seconds", "Streamed turn time to first token in seconds", ["bot_type"])
+TURNS = metrics.counter("bot_turns_total", "Bot turns by outcome (ok, failed, cancelled, crisis)",
+                        ["bot_type", "outcome"])
+TOKENS = metrics.counter("llm_tokens_total", "Tokens reported by providers", ["kind"])
+RETRIES = metrics.counter("llm_retries_total", "Model call attempts retried or failed over")
+SESSIONS = metrics.gauge("bot_sessions_in_memory", "Sessions held in the BotManager registry")
+OUTPUT_CRISIS = metrics.counter("bot_output_crisis_total", "Crisis keyword hits in streamed bot replies",
+                                ["action"])
+SCHEDULER = metrics.gauge("llm_scheduler", "Admission control state (in_flight, queued)", ["state"])
+
 # ---- BotManager --------------------------------------------------------------
 
+class _SlotStream:
+    """Token iterator holding an admitted scheduler ticket until it ends, fails or is closed."""
+
+    __slots__ = ("_tokens", "_scheduler", "_ticket")
+
+    def __init__(self, tokens, scheduler, ticket):
+        self._tokens = tokens
+        self._scheduler = scheduler
+        self._ticket = ticket
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        try:
+            return next(self._tokens)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        ticket, self._ticket = self._ticket, None
+        if ticket is None:
+            return
+        try:
+            self._tokens.close()
+        finally:
+            self._scheduler.release(ticket)
+
+    def __del__(self):
+        # Never-read streams (e.g. a losing hedge) must not keep their slot
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
 class BotManager:
     def __init__(self, db_manager, config: dict):
+        _load_env()
         self.db = db_manager
         self.config = config or {}
 
-        # API settings (OpenAI only)
-        self.api_provider = "openai"
+        # API settings
         self.model = _get_cfg(self.config, ["api", "model"], "gpt-4")
         self.temperature = float(_get_cfg(self.config, ["api", "temperature"], 0.7))
         self.max_tokens = int(_get_cfg(self.config, ["api", "max_tokens"], 1024))
         self.max_words = int(_get_cfg(self.config, ["api", "max_words"], 150))
 
+        # Providers and per-bot-type routes (a single "openai" provider unless api.providers is set)
+        self.router = ProviderRouter.from_config(_get_cfg(self.config, ["api"], {}))
+
+        # Deadlines, retries and fail-fast behaviour for provider calls
+        self.retry_policy = RetryPolicy.from_config(_get_cfg(self.config, ["api"], {}))
+
         # Paths (support both ./config and project root)
         self.app_cfg_path = _first_existing_path(["config/app_config.yaml", "app_config.yaml"])
         self.crisis_text_path = _first_existing_path(["config/crisis_response.txt", "crisis_response.txt"])
-        self.prompts = {
-            "cognitive": _read_text(["config/cognitive_empathy_prompt.txt", "cognitive_empathy_prompt.txt"]),
-            "emotional": _read_text(["config/emotional_empathy_prompt.txt", "emotional_empathy_prompt.txt"]),
-            "motivational": _read_text(["config/motivational_empathy_prompt.txt", "motivational_empathy_prompt.txt"]),
-            "control": ""  # neutral baseline
-        }
+        # Prompts and crisis text come from the process-wide config registry (read once, hot-reloaded)
+        self.registry = None
+        if self.app_cfg_path:
+            try:
+                self.registry = get_registry(self.app_cfg_path)
+            except Exception as e:
+                log.warning("Config registry unavailable, reading prompt files directly: %s", e)
+        if self.registry is not None:
+            self.prompts = dict(self.registry.snapshot().prompts)
+            self.registry.subscribe(self._on_prompts_changed, parts=("prompts",))
+        else:
+            self.prompts = {
+                "cognitive": _read_text(["config/cognitive_empathy_prompt.txt", "cognitive_empathy_prompt.txt"]),
+                "emotional": _read_text(["config/emotional_empathy_prompt.txt", "emotional_empathy_prompt.txt"]),
+                "motivational": _read_text(["config/motivational_empathy_prompt.txt", "motivational_empathy_prompt.txt"]),
+                "control": ""  # neutral baseline
+            }
+        # Rendered system prompt per bot type (rebuilt when the prompts change)
+        self._system_prompts: Dict[str, str] = {}
         self.bot_types = ["cognitive", "emotional", "motivational", "control"]
 
-        # Sessions (in memory)
-        self.sessions: Dict[str, Dict[str, Any]] = {}
+        # Sessions (in memory, bounded, shared across reruns; idle sessions expire after
+        # conversation.session_timeout)
+        self.sessions = get_session_registry("bot", self.config, record_type=BotSession,
+                                             on_evict=BotManager._on_session_evicted)
+        # In-flight turn cancellation, shared across reruns (see cancel_turn)
+        self.cancellations = get_cancellation_registry()
+
+        # External session store (session_store.backend); in-memory registry acts as its cache
+        self.store = None
+        if session_store_from_config is not None:
+            try:
+                self.store = session_store_from_config(_get_cfg(self.config, ["session_store"], {}), self.db)
+            except Exception as e:
+                log.warning("Session store disabled: %s", e)
+                self.store = None
+        # Stored sessions idle past the session timeout are purged every purge_interval seconds
+        self.store_max_age = float(_get_cfg(self.config, ["conversation", "session_timeout"], 3600))
+        self.store_purge_interval = float(_get_cfg(self.config, ["session_store", "purge_interval"], 600))
 
         # Crisis detector (optional)
         self.crisis = None
@@ -84,24 +278,83 @@ class BotManager:
             except Exception:
                 self.crisis = None
 
-        # Initialize provider client
-        self._init_client()
+        # Scan streamed replies for crisis keywords (safety.output_scanning)
+        self.scan_output = bool(_get_cfg(self.config, ["safety", "output_scanning", "enabled"], True))
+        self.abort_on_output_crisis = bool(_get_cfg(self.config, ["safety", "output_scanning", "abort_on_match"], False))
+
+        # Record/replay cassette (api.cassette.mode: off|record|replay)
+        self.cassette = cassette_from_config(_get_cfg(self.config, ["api", "cassette"], {}))
+
+        # Admission control shared by every BotManager in this process (api.scheduler)
+        self.scheduler = get_scheduler(_get_cfg(self.config, ["api", "scheduler"], {}))
+
+        # Hedged streaming requests (opt-in via api.hedging.enabled), shared process-wide
+        self.hedger = get_hedger(_get_cfg(self.config, ["api", "hedging"], {}))
+
+        # Per-bot-type max_tokens from observed tokens-per-word (api.token_calibration), shared process-wide
+        self.calibrator = get_calibrator(_get_cfg(self.config, ["api"], {}))
+        self.stream_usage = bool(_get_cfg(self.config, ["api", "token_calibration", "stream_usage"], True))
+
+        # Check provider keys (replay never touches the network); SDK clients are created on
+        # first use or by warm_up()
+        self.replay_only = bool(self.cassette and self.cassette.mode == "replay")
+        if not self.replay_only:
+            self.router.init_clients()
+        self.prewarm = bool(_get_cfg(self.config, ["startup", "prewarm_llm_clients"], True))
+        self.api_provider = self.router.primary.name
+        self.breaker = self.router.primary.breaker
+
+        # Gauges read at scrape time (the newest BotManager replaces older ones on rerun)
+        sessions = weakref.ref(self.sessions)
+        SESSIONS.set_function(lambda: len(sessions()) if sessions() is not None else None)
+        if self.scheduler is not None:
+            scheduler = self.scheduler
+            for state in ("in_flight", "queued"):
+                SCHEDULER.set_function(lambda state=state: scheduler.stats()[state], state=state)
 
     # ---------- Public API expected by app.py ----------
 
+    def warm_up(self):
+        """Create provider SDK clients in the background (startup.prewarm_llm_clients); call after the page is sent."""
+        if self.prewarm and not self.replay_only:
+            return self.router.warm_up()
+        return None
+
     def create_new_session(self) -> Dict[str, Any]:
         session_id = str(uuid.uuid4())
         participant_id = f"P{str(uuid.uuid4())[:8].upper()}"
         bot_type = random.choice(self.bot_types)
-        self.sessions[session_id] = {
-            "participant_id": participant_id,
-            "bot_type": bot_type,
-            "history": []  # [{"role":"user"/"assistant", "content": "..."}]
-        }
+        sess = BotSession(
+            participant_id=participant_id,
+            bot_type=bot_type,
+            history=[]  # [{"role":"user"/"assistant", "content": "..."}]
+        )
+        self._save_session(session_id, sess)
         return {"session_id": session_id, "participant_id": participant_id, "bot_type": bot_type}
 
+    def has_session(self, session_id: str) -> bool:
+        """True if the session is cached in memory or can be loaded from the store."""
+        return self._get_session(session_id) is not None
+
+    def set_bot_type(self, session_id: str, bot_type: str) -> None:
+        """Override a session's bot type (e.g. modality stickiness) and persist it."""
+        sess = self._get_session(session_id)
+        if not sess:
+            raise ValueError(f"Session not found: {session_id}")
+        sess["bot_type"] = bot_type
+        self._save_session(session_id, sess)
+
+    def restore_session(self, session_id: str, participant_id: str, bot_type: str,
+                        history: List[Dict[str, str]]) -> None:
+        """Recreate a session from caller-held state (fallback when no store has it)."""
+        self._save_session(session_id, BotSession(
+            participant_id=participant_id,
+            bot_type=bot_type,
+            history=list(history or []),
+        ))
+
     def get_bot_response(self, session_id: str, user_message: str, message_num: int) -> Dict[str, Any]:
-        sess = self.sessions.get(session_id)
+        sess = self._get_session(session_id)
         if not sess:
             raise ValueError(f"Session not found: {session_id}")
 
@@ -112,46 +365,43 @@ class BotManager:
             except Exception:
                 is_crisis, detected_keyword = False, None
             if is_crisis:
+                sess["last_call"] = None  # Scripted response; no model call
+                TURNS.inc(bot_type=sess["bot_type"], outcome="crisis")
                 return {
                     "bot_response": self._crisis_text(),
                     "crisis_detected": True,
                     "detected_keyword": detected_keyword,
                 }
 
-        bot_type = sess["bot_type"]
-        base_prompt = self.prompts.get(bot_type, "")
-        # Add a concise-length policy so the model ends naturally, plus an anchor to maintain style
-        length_policy = (
-            f"Please keep responses concise, around {self.max_words} words, and finish your thought with a complete sentence."
-        )
-        anchor = ""
-        if base_prompt:
-            anchor = (
-                f" Maintain the {bot_type} empathy style consistently throughout this conversation. Do not switch styles or tones."
-            )
-        # Add anti-repetition instruction
-        anti_repeat = (
-            " Review the full conversation history before responding. Do not repeat the same advice, suggestions, or phrasing you have already provided. "
-            "Build upon previous exchanges and offer new perspectives or information each time."
-        )
-        system_prompt = (base_prompt + "\n\n" + length_policy + anchor + anti_repeat).strip() if base_prompt else (length_policy + anti_repeat)
-
-        # Build messages (system + FULL history + current) - send ALL conversation history
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        # Send FULL history to maintain context across all 10 turns
-        messages.extend(sess["history"])
-        messages.append({"role": "user", "content": user_message})
+        messages = self._build_messages(sess, user_message)
 
         # Call the model
-        reply = self._call_model(messages)
+        call_meta = {}
+        started = time.perf_counter()
+        try:
+            reply = self._call_model(messages, participant_id=sess["participant_id"],
+                                     bot_type=sess["bot_type"], meta=call_meta)
+        except Exception as e:
+            # Retries are exhausted (or the circuit is open); leave history untouched
+            log.error("Model call failed: %s", e, extra={"session_id": session_id, "bot_type": sess["bot_type"]})
+            sess["last_call"] = dict(call_meta, failed=True)
+            self._save_session(session_id, sess)
+            self._observe_turn(sess["bot_type"], "sync", "failed", started, call_meta)
+            return {
+                "bot_response": ERROR_REPLY,
+                "crisis_detected": False,
+                "detected_keyword": None,
+            }
+        self._observe_turn(sess["bot_type"], "sync", "ok", started, call_meta)
+        self._calibrate(sess["bot_type"], call_meta, reply)
         # Enforce approximate word cap with sentence-aware truncation as a fallback
         reply = self._truncate_words_nicely(reply, self.max_words)
 
         # Update history
         sess["history"].append({"role": "user", "content": user_message})
         sess["history"].append({"role": "assistant", "content": reply})
+        sess["last_call"] = call_meta
+        self._save_session(session_id, sess)
 
         return {
             "bot_response": reply,
@@ -163,67 +413,79 @@ class BotManager:
 
     def check_crisis(self, user_message: str) -> tuple[bool, Optional[str], Optional[str]]:
         """Check a message for crisis keywords and return (is_crisis, keyword, crisis_text)."""
+        is_crisis, keywords, crisis_text = self.detect_crisis(user_message)
+        return is_crisis, (keywords[0] if keywords else None), crisis_text
+
+    def detect_crisis(self, user_message: str) -> tuple[bool, List[str], Optional[str]]:
+        """Like check_crisis(), but returns every matched keyword (configured order)."""
         if not self.crisis:
-            return False, None, None
+            return False, [], None
         try:
-            is_crisis, detected_keyword = self.crisis.check_message(user_message)
+            if hasattr(self.crisis, "find_all"):
+                keywords = self.crisis.matched_keywords(self.crisis.find_all(user_message))
+            else:
+                is_crisis, keyword = self.crisis.check_message(user_message)
+                keywords = [keyword] if is_crisis else []
         except Exception:
-            return False, None, None
-        if is_crisis:
-            return True, detected_keyword, self._crisis_text()
-        return False, None, None
+            return False, [], None
+        if keywords:
+            return True, keywords, self._crisis_text()
+        return False, [], None
 
     # ---------- Streaming responses ----------
 
-    def stream_bot_response(self, session_id: str, user_message: str):
+    def stream_bot_response(self, session_id: str, user_message: str, on_wait=None):
         """Yield assistant text chunks for a response, updating session history at the end.
 
-        This does NOT perform crisis detection; call check_crisis() before invoking streaming.
+        This does NOT check the user message; call check_crisis() before invoking streaming.
+        The reply itself is scanned incrementally for crisis keywords: matches are stored
+        in the call metadata (`crisis_keywords`) and, with safety.output_scanning.abort_on_match,
+        the stream stops before the matching chunk and the crisis response is appended.
+        `on_wait(position, waited_seconds)` is called while the turn is queued for an LLM slot.
         """
-        sess = self.sessions.get(session_id)
+        sess = self._get_session(session_id)
         if not sess:
             raise ValueError(f"Session not found: {session_id}")
 
-        bot_type = sess["bot_type"]
-        base_prompt = self.prompts.get(bot_type, "")
-        length_policy = (
-            f"Please keep responses concise, around {self.max_words} words, and finish your thought with a complete sentence."
-        )
-        anchor = ""
-        if base_prompt:
-            anchor = (
-                f" Maintain the {bot_type} empathy style consistently throughout this conversation. Do not switch styles or tones."
-            )
-        # Add anti-repetition instruction
-        anti_repeat = (
-            " Review the full conversation history before responding. Do not repeat the same advice, suggestions, or phrasing you have already provided. "
-            "Build upon previous exchanges and offer new perspectives or information each time."
-        )
-        system_prompt = (base_prompt + "\n\n" + length_policy + anchor + anti_repeat).strip() if base_prompt else (length_policy + anti_repeat)
-
-        # Build messages (system + FULL history + current) - send ALL conversation history
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        # Send FULL history to maintain context across all 10 turns
-        messages.extend(sess["history"])
-        messages.append({"role": "user", "content": user_message})
+        messages = self._build_messages(sess, user_message)
 
         full = []
         words_seen = 0
         exceeded = False
+        failed = False
+        stream = None
+        call_meta = {}
+        # Cancelled by end_session, cancel_turn, session expiry or a newer turn
+        cancel = self.cancellations.begin(session_id)
+        stop_reason = None
+        started = time.perf_counter()
+        first_at = None
+        # Automaton state carries across chunks: O(chunk) per token, matches may span chunks
+        scanner = self.crisis.scanner() if self.scan_output and hasattr(self.crisis, "scanner") else None
+        crisis_note = ""
+        # Only made current while pulling the next token, never across a yield
+        span = tracing.start_span("bot.stream", bot_type=sess["bot_type"])
         try:
-            stream = self._client.chat.completions.create(
-                model=self.model or "gpt-4",
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                stream=True,
-            )
-            for chunk in stream:
-                delta = getattr(getattr(chunk, "choices", [None])[0], "delta", None)
-                token = getattr(delta, "content", None) if delta else None
+            stream = self._open_stream(messages, participant_id=sess["participant_id"], on_wait=on_wait,
+                                       bot_type=sess["bot_type"], meta=call_meta, cancel=cancel)
+            while True:
+                with tracing.use_span(span):
+                    token = next(stream, None)
+                if token is None:
+                    if scanner is not None:
+                        self._note_output_crisis(scanner.finish(), call_meta, session_id)
+                    break
+                if cancel.cancelled:
+                    stop_reason = cancel.reason
+                    break
                 if token:
+                    first_at = first_at or time.perf_counter()
+                    if (scanner is not None and self._note_output_crisis(scanner.feed(token), call_meta, session_id)
+                            and self.abort_on_output_crisis):
+                        stop_reason = "crisis_output"
+                        crisis_note = "\n\n" + self._crisis_text()
+                        yield crisis_note
+                        break
                     full.append(token)
                     yield token
                     # Word-aware, sentence-friendly stop
@@ -231,26 +493,183 @@ class BotManager:
                     if not exceeded and words_seen >= self.max_words:
                         exceeded = True
                     if exceeded:
-                        txt = "".join(full)
                         # If we've crossed the cap and see sentence end, stop
                         if any(p in token for p in (".", "!", "?")):
+                            stop_reason = "word_cap"
                             break
                         # Hard stop if we go too far beyond (cap + 25 words)
                         if words_seen >= self.max_words + 25:
+                            stop_reason = "word_cap"
                             break
+        except GeneratorExit:
+            # Caller stopped reading (rerun, navigation, disconnect)
+            stop_reason = "abandoned"
+            raise
         except Exception as e:
-            # On error, yield a single error string
-            yield f"I’m sorry, I ran into an error: {e}"
+            if cancel.cancelled:
+                stop_reason = cancel.reason
+            else:
+                # Retries are exhausted (or the circuit is open); show a friendly message
+                log.error("Model call failed: %s", e, extra={"session_id": session_id, "bot_type": sess["bot_type"]})
+                failed = True
+                yield ("\n\n" if full else "") + ERROR_REPLY
+        finally:
+            # Always release the provider stream, however the turn ends
+            if stream is not None:
+                stream.close()
+            self.cancellations.finish(cancel)
+            if stop_reason:
+                self._record_early_stop(stop_reason, len(full), started, first_at)
+            cancelled = stop_reason and stop_reason not in COMPLETED_STOPS
+            outcome = "failed" if failed else "cancelled" if cancelled else "ok"
+            self._observe_turn(sess["bot_type"], "stream", outcome, started, call_meta, first_at)
+            span.set_attribute("outcome", outcome)
+            span.set_attribute("chunks", len(full))
+            span.set_attribute("stop_reason", stop_reason)
+            span.set_attribute("provider", call_meta.get('provider'))
+            span.end()
 
-        # Update history after streaming completes (best-effort)
+        # Update history once, after streaming completes (best-effort).
+        # A failed turn is left out so the participant can simply resend it,
+        # and a cancelled one because the conversation has moved on.
+        if failed or (stop_reason and stop_reason not in COMPLETED_STOPS):
+            sess["last_call"] = dict(call_meta, failed=True) if failed else dict(call_meta, cancelled=stop_reason)
+            # Stored too, so a session reloaded by another rerun or replica reports this turn
+            self._save_session(session_id, sess)
+            return
         try:
             final = "".join(full)
-            final = self._truncate_words_nicely(final, self.max_words)
+            if stop_reason != "crisis_output":
+                self._calibrate(sess["bot_type"], call_meta, final, chunks=len(full),
+                                finish_reason="word_cap" if stop_reason else None)
+            final = self._truncate_words_nicely(final, self.max_words) + crisis_note
             sess["history"].append({"role": "user", "content": user_message})
             sess["history"].append({"role": "assistant", "content": final})
+            sess["last_call"] = call_meta
+            self._save_session(session_id, sess)
         except Exception:
             pass
 
+    def _note_output_crisis(self, matches: list, call_meta: Dict[str, Any], session_id: str) -> bool:
+        """Record crisis keywords found in streamed output in `call_meta`; True if any."""
+        if not matches:
+            return False
+        keywords = call_meta.setdefault("crisis_keywords", [])
+        new = [m.keyword for m in matches if m.keyword not in keywords]
+        keywords.extend(dict.fromkeys(new))
+        action = "abort" if self.abort_on_output_crisis else "flag"
+        OUTPUT_CRISIS.inc(action=action)
+        log.warning("Crisis keyword in bot output: '%s'", "', '".join(m.keyword for m in matches),
+                    extra={"session_id": session_id, "keywords": keywords, "action": action})
+        return True
+
+    def cancel_turn(self, session_id: str, reason: str = "cancelled") -> bool:
+        """Stop the session's in-flight reply (e.g. the participant navigated away).
+
+        Returns:
+            True if a reply was streaming and has been signalled to stop
+        """
+        return self.cancellations.cancel(session_id, reason)
+
+    def cancellation_stats(self) -> Dict[str, Any]:
+        """Cancelled / early-stopped turns with estimated tokens and seconds saved."""
+        return self.cancellations.stats()
+
+    @staticmethod
+    def _observe_turn(bot_type: str, mode: str, outcome: str, started: float,
+                      call_meta: Dict[str, Any], first_at: Optional[float] = None):
+        """Turn duration, TTFT, outcome and token usage metrics."""
+        TURNS.inc(bot_type=bot_type, outcome=outcome)
+        TURN_SECONDS.observe(time.perf_counter() - started, bot_type=bot_type, mode=mode)
+        if first_at is not None:
+            TTFT_SECONDS.observe(first_at - started, bot_type=bot_type)
+        for kind in ("prompt", "completion", "cached"):
+            count = call_meta.get(f"{kind}_tokens")
+            if count:
+                TOKENS.inc(count, kind=kind)
+
+    def _record_early_stop(self, reason: str, chunks: int, started: float, first_at: Optional[float]):
+        """Estimate the generation skipped by stopping early (about one token per chunk)."""
+        tokens_saved = max(0, self.max_tokens - chunks)
+        per_token = (time.perf_counter() - first_at) / chunks if first_at and chunks > 1 else 0.0
+        self.cancellations.record_early_stop(reason, tokens_saved, tokens_saved * per_token)
+
+    # ---------- Session persistence ----------
+
+    def _get_session(self, session_id: str) -> Optional[BotSession]:
+        """Return the cached session, lazily loading it from the store on a miss."""
+        sess = self.sessions.get(session_id)
+        if sess is not None or not self.store:
+            return sess
+        try:
+            data = self.store.load(session_id)
+        except Exception as e:
+            log.warning("Session store load failed: %s", e, extra={"session_id": session_id})
+            return None
+        if not data:
+            return None
+        return self.sessions.put(session_id, BotSession.from_dict(data))
+
+    def _save_session(self, session_id: str, sess: BotSession) -> None:
+        """Cache the session and write it back to the store (once per turn)."""
+        self.sessions.put(session_id, sess)
+        if self.store:
+            try:
+                self.store.save(session_id, sess["participant_id"], sess["bot_type"], sess["history"],
+                                sess["last_call"])
+            except Exception as e:
+                log.warning("Session store save failed: %s", e, extra={"session_id": session_id})
+            try:
+                purged = self.store.purge_if_due(self.store_max_age, self.store_purge_interval)
+                if purged:
+                    log.info("Purged %d stale stored sessions", purged)
+            except Exception as e:
+                log.warning("Session store purge failed: %s", e)
+
+    # ---------- Prompt building ----------
+
+    def _on_prompts_changed(self, snapshot, changed):
+        self.prompts = dict(snapshot.prompts)
+        self._system_prompts = {}
+        log.info("Empathy prompts reloaded", extra={"config_version": snapshot.version})
+
+    def _build_messages(self, sess: Dict[str, Any], user_message: str) -> List[Dict[str, str]]:
+        """Build the request payload: system prompt + full history + current user message."""
+        system_prompt = self._system_prompt(sess["bot_type"])
+
+        # Build messages (system + FULL history + current) - send ALL conversation history
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        # Send FULL history to maintain context across all 10 turns
+        messages.extend(sess["history"])
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def _system_prompt(self, bot_type: str) -> str:
+        """System prompt for a bot type: base prompt + length, style and anti-repetition policies (cached)."""
+        cached = self._system_prompts.get(bot_type)
+        if cached is not None:
+            return cached
+        base_prompt = self.prompts.get(bot_type, "")
+        # Add a concise-length policy so the model ends naturally, plus an anchor to maintain style
+        length_policy = (
+            f"Please keep responses concise, around {self.max_words} words, and finish your thought with a complete sentence."
+        )
+        anchor = ""
+        if base_prompt:
+            anchor = (
+                f" Maintain the {bot_type} empathy style consistently throughout this conversation. Do not switch styles or tones."
+            )
+        # Add anti-repetition instruction
+        anti_repeat = (
+            " Review the full conversation history before responding. Do not repeat the same advice, suggestions, or phrasing you have already provided. "
+            "Build upon previous exchanges and offer new perspectives or information each time."
+        )
+        system_prompt = (base_prompt + "\n\n" + length_policy + anchor + anti_repeat).strip() if base_prompt else (length_policy + anti_repeat)
+        self._system_prompts[bot_type] = system_prompt
+        return system_prompt
+
     # ---------- Utility ----------
 
     @staticmethod
@@ -277,46 +696,338 @@ class BotManager:
             return text or ""
 
     def end_session(self, session_id: str, completed: bool = True):
-        # Nothing fancy; just drop in-memory state
-        if session_id in self.sessions:
-            del self.sessions[session_id]
+        # Stop any reply still streaming, then drop in-memory state and the stored copy
+        self.cancellations.cancel(session_id, "session_ended")
+        self.sessions.pop(session_id, None)
+        if self.store:
+            try:
+                self.store.delete(session_id)
+            except Exception:
+                pass
+
+    def get_last_call(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Metadata of the request that produced the session's latest reply.
+
+        Includes `provider`, `model` and `route` (one routing decision per attempt),
+        `max_tokens`, `finish_reason` and prompt / completion / cached token counts,
+        plus `hedged`, `winner`, `ttft` and `hedge_delay` when hedging is enabled.
+        Only the winning request's reply is ever kept.
+        """
+        sess = self._get_session(session_id)
+        return sess["last_call"] if sess else None
+
+    @staticmethod
+    def _on_session_evicted(session_id: str, sess, reason: str):
+        # An expired session cannot use its reply; stop generating it (the registry is
+        # shared across reruns, so this must not depend on the instance that created it)
+        if reason == "ttl":
+            get_cancellation_registry().cancel(session_id, "expired")
+
+    def _max_tokens_for(self, bot_type: Optional[str]) -> int:
+        """Completion cap for a turn: calibrated per bot type, else api.max_tokens."""
+        if self.calibrator is None:
+            return self.max_tokens
+        return self.calibrator.max_tokens_for(bot_type, self.max_tokens)
+
+    def _calibrate(self, bot_type: str, call_meta: Dict[str, Any], text: str, chunks: int = 0,
+                   finish_reason: Optional[str] = None):
+        """Feed a completed reply (before word-cap truncation) to the token calibrator."""
+        if self.calibrator is None or "max_tokens" not in call_meta:
+            return
+        if len(call_meta.get("route") or ()) > 1:
+            return  # Retried or resumed; token counts cover only the last attempt
+        self.calibrator.record(
+            bot_type,
+            tokens=call_meta.get("completion_tokens") or chunks,
+            words=len(text.split()),
+            finish_reason=finish_reason or call_meta.get("finish_reason"),
+            max_tokens=call_meta["max_tokens"],
+        )
+
+    def session_stats(self) -> Dict[str, int]:
+        """Session registry size and eviction counters."""
+        return self.sessions.stats()
 
     # ---------- Provider clients ----------
 
-    def _init_client(self):
-        # Initialize OpenAI client only
+    def _request_model(self, bot_type: Optional[str]) -> str:
+        """Model of the first provider on the bot type's route (the model the request is for)."""
+        route = self.router.route(bot_type)
+        return (route[0].model if route else self.model) or "gpt-4"
+
+    def _fingerprint(self, messages: List[Dict[str, str]], bot_type: Optional[str], max_tokens: int) -> str:
+        """Cassette key: the routed model and calibrated completion cap actually sent, not the api defaults."""
+        return request_fingerprint(self._request_model(bot_type), messages, self.temperature, max_tokens)
+
+    def _estimate_tokens(self, messages: List[Dict[str, str]], bot_type: Optional[str] = None) -> int:
+        """Rough prompt + completion token estimate (~4 chars per token) for admission.
+
+        The completion part is the bot type's calibrated cap, the one the request is sent with.
+        """
+        chars = sum(len(m.get("content") or "") for m in messages)
+        return chars // 4 + self._max_tokens_for(bot_type)
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        """Retry-After seconds from a provider error response, if any."""
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
         try:
-            from openai import OpenAI
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                # Fallback to Streamlit secrets when running on Streamlit Cloud
-                try:
-                    import streamlit as st  # type: ignore
-                    api_key = st.secrets.get("OPENAI_API_KEY") if hasattr(st, "secrets") else None
-                except Exception:
-                    api_key = None
-            if not api_key:
-                raise ValueError("OPENAI_API_KEY not set")
-            self._client = OpenAI(api_key=api_key)
-            self._provider = "openai"
-        except Exception as e:
-            raise RuntimeError(f"Failed to init OpenAI client: {e}")
+            value = headers.get("retry-after")
+            return float(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
 
-    def _call_model(self, messages: List[Dict[str, str]]) -> str:
+    def _create_completion(self, provider, messages: List[Dict[str, str]], stream: bool,
+                           max_tokens: Optional[int] = None):
+        """Call a provider, feeding the primary's rate-limit headers and 429s to the scheduler."""
+        kwargs = dict(
+            model=provider.model or "gpt-4",
+            messages=messages,
+            temperature=self.temperature,
+            max_tokens=max_tokens or self.max_tokens,
+            timeout=self.retry_policy.http_timeout(),
+        )
+        if stream:
+            kwargs["stream"] = True
+            if self.stream_usage:
+                # Final chunk carries token usage (used by token calibration)
+                kwargs["stream_options"] = {"include_usage": True}
+        completions = provider.client.chat.completions
+        raw_api = getattr(completions, "with_raw_response", None)
+        # Scheduler rate budgets describe the primary provider's account
+        observe = self.scheduler is not None and provider is self.router.primary
         try:
-            # OpenAI only - simplified
-            resp = self._client.chat.completions.create(
-                model=self.model or "gpt-4",
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-            )
-            return (resp.choices[0].message.content or "").strip()
+            if not observe or raw_api is None:
+                return completions.create(**kwargs)
+            raw = raw_api.create(**kwargs)
+            self.scheduler.observe_headers(getattr(raw, "headers", None))
+            return raw.parse()
+        except Exception as e:
+            if observe and getattr(e, "status_code", None) == 429:
+                self.scheduler.note_rate_limited(self._retry_after(e))
+            raise
 
+    def _on_retry(self, attempt: int, error: BaseException):
+        RETRIES.inc()
+        log.warning("Model call failed (retry %d/%d): %s", attempt, self.retry_policy.retries, error)
 
+    def _choose_provider(self, bot_type: Optional[str], tried: List[str], route: List[dict],
+                         meta: Optional[dict]):
+        """Pick the provider for the next attempt and log the routing decision."""
+        provider, decision = self.router.choose(bot_type, tried)
+        tried.append(provider.name)
+        route.append(decision)
+        if meta is not None:
+            meta.update(provider=provider.name, model=provider.model, route=route)
+        return provider, decision
 
+    def _call_model(self, messages: List[Dict[str, str]], participant_id: Optional[str] = None,
+                    bot_type: Optional[str] = None, meta: Optional[dict] = None) -> str:
+        """Return the model's reply; raises once retries are exhausted."""
+        max_tokens = self._max_tokens_for(bot_type)
+        if self.cassette and self.cassette.mode == "replay":
+            return self.cassette.replay_text(self._fingerprint(messages, bot_type, max_tokens)).strip()
+
+        tried, route = [], []
+        if meta is not None:
+            meta['max_tokens'] = max_tokens
+
+        def attempt():
+            provider, decision = self._choose_provider(bot_type, tried, route, meta)
+            ticket, resp = None, None
+            try:
+                if self.scheduler is not None:
+                    ticket = self.scheduler.acquire(participant_id, self._estimate_tokens(messages, bot_type))
+                with tracing.span("llm.attempt", provider=provider.name, model=provider.model):
+                    resp = self._create_completion(provider, messages, stream=False, max_tokens=max_tokens)
+            except Exception as e:
+                decision['error'] = f"{type(e).__name__}: {e}"[:200]
+                self.router.record_failure(provider, e)
+                raise
+            finally:
+                if ticket is not None:
+                    usage = getattr(resp, "usage", None)
+                    self.scheduler.release(ticket, getattr(usage, "total_tokens", None))
+            self.router.record_success(provider)
+            return resp
+
+        started = time.perf_counter()
+        with tracing.span("bot.call", bot_type=bot_type):
+            resp = call_with_retries(attempt, self.retry_policy, on_retry=self._on_retry)
+        text = (resp.choices[0].message.content or "").strip()
+        if meta is not None:
+            meta.update(self._usage_meta(getattr(resp, "usage", None)),
+                        finish_reason=getattr(resp.choices[0], "finish_reason", None))
+        if self.cassette:
+            self.cassette.record_text(self._fingerprint(messages, bot_type, max_tokens),
+                                      self._request_model(bot_type), text,
+                                      time.perf_counter() - started)
+        return text
+
+    @staticmethod
+    def _usage_meta(usage, chunks: int = 0) -> Dict[str, Optional[int]]:
+        """Token counts from a response's usage; without usage, one streamed chunk is roughly one token."""
+        details = getattr(usage, "prompt_tokens_details", None)
+        return {
+            'prompt_tokens': getattr(usage, "prompt_tokens", None),
+            'completion_tokens': getattr(usage, "completion_tokens", None) or chunks or None,
+            'cached_tokens': getattr(details, "cached_tokens", None),
+        }
+
+    def _provider_stream(self, provider, messages: List[Dict[str, str]], register=None,
+                         max_tokens: Optional[int] = None, meta: Optional[dict] = None):
+        """Yield raw text tokens from the provider's streaming API.
+
+        `register(stream)` receives the open response so another thread can abort it.
+        A completed stream stores `finish_reason` and token counts in `meta`.
+        """
+        span = tracing.start_span("llm.attempt", provider=provider.name, model=provider.model)
+        # Current only for the request, so connect / TLS / TTFB land on this span
+        with tracing.use_span(span):
+            try:
+                stream = self._create_completion(provider, messages, stream=True, max_tokens=max_tokens)
+            except BaseException:
+                span.end()
+                raise
+        if register:
+            register(stream)
+        finished = None
+        chunks, usage = 0, None
+        try:
+            for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                choice = (getattr(chunk, "choices", None) or [None])[0]
+                delta = getattr(choice, "delta", None)
+                token = getattr(delta, "content", None) if delta else None
+                if token:
+                    chunks += 1
+                    if chunks == 1:
+                        span.add_event("first_token")
+                    yield token
+                if getattr(choice, "finish_reason", None):
+                    finished = choice.finish_reason
+            if not finished:
+                # Connection dropped before the provider finished the reply
+                raise IncompleteStreamError("Stream ended before a finish reason was received")
+        except GeneratorExit:
+            span.set_attribute("abandoned", True)
+            raise
         except Exception as e:
-            return f"I’m sorry, I ran into an error: {e}"
+            span.record_error(e)
+            raise
+        finally:
+            # Release the HTTP connection even when the caller stops early
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+            span.set_attribute("chunks", chunks)
+            span.set_attribute("finish_reason", finished)
+            span.end()
+        if meta is not None:
+            meta.update(self._usage_meta(usage, chunks), finish_reason=finished)
+
+    def _admitted_stream(self, provider, messages: List[Dict[str, str]], participant_id: Optional[str],
+                         on_wait=None, timeout: Optional[float] = None, register=None, cancel=None,
+                         max_tokens: Optional[int] = None, meta: Optional[dict] = None,
+                         bot_type: Optional[str] = None):
+        """Wait for a scheduler slot now, then return the attempt's stream holding it until closed.
+
+        Admission happens before the stream is returned, so the attempt deadline and
+        TTFT (which start on the first read) do not include time spent in the queue.
+        """
+        ticket = self.scheduler.acquire(participant_id, self._estimate_tokens(messages, bot_type),
+                                        timeout=timeout, on_wait=on_wait, cancel=cancel)
+        return _SlotStream(self._provider_stream(provider, messages, register, max_tokens, meta),
+                           self.scheduler, ticket)
+
+    @staticmethod
+    def _continuation_messages(messages: List[Dict[str, str]], prefix: str) -> List[Dict[str, str]]:
+        """Messages for resuming a reply that was cut off after `prefix`."""
+        if not prefix:
+            return messages
+        return messages + [
+            {"role": "assistant", "content": prefix},
+            {"role": "system", "content": CONTINUE_INSTRUCTION},
+        ]
+
+    def _hedged_stream(self, provider, messages: List[Dict[str, str]], participant_id: Optional[str],
+                       on_wait=None, meta: Optional[dict] = None, cancel=None,
+                       max_tokens: Optional[int] = None, bot_type: Optional[str] = None):
+        """Race the primary request against a delayed hedge; stream the first to produce a token.
+
+        The primary waits for a scheduler slot as usual (before this returns, like
+        _admitted_stream). The hedge only runs if a slot is free right now, so
+        hedging never queues behind real turns.
+
+        Each attempt fills its own metadata dict; only the winner's usage and
+        finish_reason are copied into `meta`, so a losing stream that finishes
+        late cannot overwrite them.
+        """
+        ticket = None
+        if self.scheduler is not None:
+            ticket = self.scheduler.acquire(participant_id, self._estimate_tokens(messages, bot_type),
+                                            on_wait=on_wait, cancel=cancel)
+        race = meta if meta is not None else {}
+        attempt_meta = {'primary': {}, 'hedge': {}}
+
+        def primary(register):
+            return self._provider_stream(provider, messages, register, max_tokens, attempt_meta['primary'])
+
+        def hedge(register):
+            if self.scheduler is not None:
+                return self._admitted_stream(provider, messages, participant_id, timeout=0, register=register,
+                                             max_tokens=max_tokens, meta=attempt_meta['hedge'], bot_type=bot_type)
+            return self._provider_stream(provider, messages, register, max_tokens, attempt_meta['hedge'])
+
+        def winner_stream():
+            tokens = self.hedger.stream(primary, hedge, race)
+            try:
+                yield from tokens
+            finally:
+                tokens.close()
+            race.update(attempt_meta[race.get('winner', 'primary')])
+
+        if ticket is None:
+            return winner_stream()
+        return _SlotStream(winner_stream(), self.scheduler, ticket)
+
+    def _open_stream(self, messages: List[Dict[str, str]], participant_id: Optional[str] = None, on_wait=None,
+                     bot_type: Optional[str] = None, meta: Optional[dict] = None, cancel=None):
+        """Return a token generator, served from or recorded to the cassette when enabled.
+
+        Each attempt (first try, retry or resume) is routed separately, so a failing
+        provider hands the turn to the next one on the bot type's route.
+        """
+        max_tokens = self._max_tokens_for(bot_type)
+        if self.cassette and self.cassette.mode == "replay":
+            return self.cassette.replay_stream(self._fingerprint(messages, bot_type, max_tokens))
+
+        tried, route = [], []
+        if meta is not None:
+            meta['max_tokens'] = max_tokens
+
+        def start(prefix: str):
+            # A cancelled turn makes no further attempts (TurnCancelled is not retried)
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            provider, decision = self._choose_provider(bot_type, tried, route, meta)
+            attempt_messages = self._continuation_messages(messages, prefix)
+            if self.hedger is not None:
+                tokens = self._hedged_stream(provider, attempt_messages, participant_id, on_wait, meta, cancel,
+                                             max_tokens, bot_type)
+            elif self.scheduler is not None:
+                tokens = self._admitted_stream(provider, attempt_messages, participant_id, on_wait, cancel=cancel,
+                                               max_tokens=max_tokens, meta=meta, bot_type=bot_type)
+            else:
+                tokens = self._provider_stream(provider, attempt_messages, max_tokens=max_tokens, meta=meta)
+            return self.router.track_stream(provider, tokens, decision)
+
+        # Circuit breaking is per provider, inside the router
+        tokens = resilient_stream(start, self.retry_policy, on_retry=self._on_retry)
+        if self.cassette:
+            return self.cassette.record_stream(self._fingerprint(messages, bot_type, max_tokens),
+                                               self._request_model(bot_type), tokens)
+        return tokens
 
     # ---------- Crisis text helper ----------
 
@@ -327,8 +1038,11 @@ class BotManager:
                 return self.crisis.get_crisis_response()
             except Exception:
                 pass
-        # Fallback: read file directly
-        txt = _read_text([self.crisis_text_path] if self.crisis_text_path else [])
+        # Fallback: registry copy of crisis_response.txt, else read the file directly
+        if self.registry is not None:
+            txt = self.registry.snapshot().crisis_text
+        else:
+            txt = _read_text([self.crisis_text_path] if self.crisis_text_path else [])
         return txt or (
             "I'm concerned about your safety. If you are in immediate danger, please call your local emergency number. "
             "You can also reach out to a trusted person or a professional helpline available in your area."
@@ -0,0 +1,121 @@
+"""
+Turn Cancellation
+Cooperative cancellation of in-flight generations, one token per session turn.
+
+A streaming turn checks its token between chunks; once cancelled (End
+Conversation, navigation away, session expiry or a newer turn) it stops reading,
+closes the provider stream and makes no further retry attempts.
+
+The registry is process-wide because Streamlit reruns build a new BotManager
+while the previous run's stream may still be open.
+"""
+
+import threading
+from typing import Dict, Optional
+
+
+class TurnCancelled(Exception):
+    """Raised when a cancelled turn would start another model attempt."""
+
+
+class CancellationToken:
+    """Cancellation flag for one turn."""
+
+    __slots__ = ("session_id", "reason", "_event")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise TurnCancelled(f"Turn for session {self.session_id} cancelled ({self.reason})")
+
+
+class CancellationRegistry:
+    """Active turn tokens by session, plus counters for work saved by stopping early."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: Dict[str, CancellationToken] = {}
+        self._counters: Dict[str, float] = {
+            'cancelled': 0, 'early_stops': 0, 'tokens_saved_est': 0, 'seconds_saved_est': 0.0,
+        }
+        self._by_reason: Dict[str, int] = {}
+
+    def begin(self, session_id: str) -> CancellationToken:
+        """Start a turn; an older turn still streaming for the session is superseded."""
+        token = CancellationToken(session_id)
+        with self._lock:
+            previous = self._active.get(session_id)
+            self._active[session_id] = token
+        if previous is not None:
+            previous.cancel("superseded")
+        return token
+
+    def finish(self, token: CancellationToken):
+        """Forget a finished turn's token (no-op if a newer turn replaced it)."""
+        with self._lock:
+            if self._active.get(token.session_id) is token:
+                del self._active[token.session_id]
+
+    def cancel(self, session_id: str, reason: str = "cancelled") -> bool:
+        """
+        Cancel the session's in-flight turn, if any.
+
+        Returns:
+            True if a turn was streaming and has been signalled
+        """
+        with self._lock:
+            token = self._active.get(session_id)
+        if token is None or token.cancelled:
+            return False
+        token.cancel(reason)
+        return True
+
+    def is_active(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._active
+
+    def record_early_stop(self, reason: str, tokens_saved: int, seconds_saved: float):
+        """
+        Count a turn that stopped before the model finished.
+
+        Args:
+            reason: Cancellation reason, or "word_cap" for the reply length cap
+            tokens_saved: Estimated completion tokens not generated
+            seconds_saved: Estimated generation time not spent
+        """
+        with self._lock:
+            self._counters['early_stops'] += 1
+            if reason != "word_cap":
+                self._counters['cancelled'] += 1
+            self._counters['tokens_saved_est'] += max(0, int(tokens_saved))
+            self._counters['seconds_saved_est'] += max(0.0, float(seconds_saved))
+            self._by_reason[reason] = self._by_reason.get(reason, 0) + 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            out = dict(self._counters)
+            out['seconds_saved_est'] = round(out['seconds_saved_est'], 2)
+            out['in_flight'] = len(self._active)
+            out['by_reason'] = dict(self._by_reason)
+        return out
+
+
+_REGISTRY = CancellationRegistry()
+
+
+def get_cancellation_registry() -> CancellationRegistry:
+    """Return the process-wide cancellation registry."""
+    return _REGISTRY
@@ -0,0 +1,189 @@
+"""
+LLM Cassette
+Record/replay layer for model calls so BotManager can run offline and reproducibly.
+
+- record: pass calls through to the provider and append each interaction
+  (request fingerprint + streamed chunks with timings) to a JSONL file
+- replay: serve interactions from that file without any API calls,
+  optionally sleeping the original inter-chunk gaps
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+CASSETTE_MODES = ("off", "record", "replay")
+
+
+class CassetteMiss(KeyError):
+    """Raised in replay mode when no recording exists for a request."""
+
+
+def request_fingerprint(model: str, messages: List[Dict[str, str]],
+                        temperature: float, max_tokens: int) -> str:
+    """
+    Build a stable fingerprint for a model request.
+
+    Args:
+        model: Model name sent to the provider
+        messages: Chat messages (system/history/user)
+        temperature: Sampling temperature
+        max_tokens: Completion token cap
+
+    Returns:
+        Hex digest identifying the request
+    """
+    payload = {
+        "model": model,
+        "messages": [{"role": m.get("role"), "content": m.get("content")} for m in messages],
+        "temperature": round(float(temperature), 4),
+        "max_tokens": int(max_tokens),
+    }
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+class Cassette:
+    """
+    Stores and serves recorded model interactions.
+
+    Each line of the cassette file is one interaction:
+        {"fp": "<fingerprint>", "model": "...", "chunks": [[delay_ms, "text"], ...]}
+    The first delay is the time to first token; the rest are inter-chunk gaps.
+    """
+
+    def __init__(self, path: str, mode: str = "replay", preserve_timing: bool = False,
+                 speed: float = 1.0):
+        """
+        Initialize cassette.
+
+        Args:
+            path: JSONL file to record to / replay from
+            mode: "record" or "replay"
+            preserve_timing: In replay, sleep the recorded gaps between chunks
+            speed: Replay speed multiplier when preserving timing (2.0 = twice as fast)
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unsupported cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.preserve_timing = bool(preserve_timing)
+        self.speed = max(float(speed or 1.0), 0.001)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[List[list]]] = {}
+        self._cursor: Dict[str, int] = {}
+
+        if mode == "replay":
+            self._load()
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+    def _load(self):
+        """Read all recorded interactions into memory, grouped by fingerprint."""
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Cassette not found: {self.path}")
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self._entries.setdefault(entry["fp"], []).append(entry.get("chunks") or [])
+
+    # ---------- Record ----------
+
+    def _append(self, fp: str, model: str, chunks: List[list]):
+        line = json.dumps({"fp": fp, "model": model, "chunks": chunks},
+                          separators=(",", ":"), ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def record_stream(self, fp: str, model: str, tokens: Iterable[str]) -> Iterator[str]:
+        """
+        Pass tokens through while recording them with their timings.
+
+        The interaction is written when the stream finishes or is closed early,
+        so a capped stream replays exactly what the caller consumed. A stream
+        that raises is not recorded (replaying half a failed reply would hide
+        the failure).
+        """
+        chunks: List[list] = []
+        last = time.perf_counter()
+        keep = False
+        try:
+            for token in tokens:
+                now = time.perf_counter()
+                chunks.append([int(round((now - last) * 1000)), token])
+                last = now
+                yield token
+            keep = True
+        except GeneratorExit:
+            keep = True  # caller stopped early (word cap, crisis)
+            raise
+        finally:
+            close = getattr(tokens, "close", None)
+            if close:
+                try:
+                    close()
+                except Exception:
+                    pass
+            if keep:
+                self._append(fp, model, chunks)
+
+    def record_text(self, fp: str, model: str, text: str, elapsed: float):
+        """Record a non-streaming completion as a single chunk."""
+        self._append(fp, model, [[int(round(elapsed * 1000)), text]])
+
+    # ---------- Replay ----------
+
+    def _next_chunks(self, fp: str) -> List[list]:
+        with self._lock:
+            recordings = self._entries.get(fp)
+            if not recordings:
+                raise CassetteMiss(f"No recording for request {fp} in {self.path}")
+            # Repeated identical requests cycle through their recordings in order
+            idx = self._cursor.get(fp, 0)
+            self._cursor[fp] = idx + 1
+            return recordings[idx % len(recordings)]
+
+    def replay_stream(self, fp: str) -> Iterator[str]:
+        """Yield recorded chunks, sleeping the original gaps if configured."""
+        for delay_ms, token in self._next_chunks(fp):
+            if self.preserve_timing and delay_ms:
+                time.sleep(delay_ms / 1000.0 / self.speed)
+            yield token
+
+    def replay_text(self, fp: str) -> str:
+        """Return a recorded completion as a single string."""
+        return "".join(self.replay_stream(fp))
+
+
+def cassette_from_config(cfg: Optional[dict]) -> Optional[Cassette]:
+    """
+    Build a Cassette from the `api.cassette` config section.
+
+    Returns:
+        Cassette instance, or None when mode is "off" or missing
+    """
+    cfg = cfg or {}
+    mode = str(cfg.get("mode") or "off").lower()
+    if mode == "off":
+        return None
+    if mode not in CASSETTE_MODES:
+        raise ValueError(f"Unsupported cassette mode: {mode}")
+    return Cassette(
+        path=cfg.get("path") or "data/cassettes/llm_calls.jsonl",
+        mode=mode,
+        preserve_timing=bool(cfg.get("preserve_timing", False)),
+        speed=float(cfg.get("speed", 1.0) or 1.0),
+    )
@@ -6,6 +6,21 @@ Manages conversation flow, message limits, and conversation state.
 from typing import Dict, Optional, List
 from datetime import datetime
 
+from src.utils.session_registry import SessionRecord, SessionRegistry
+from src.utils.structured_logging import get_logger
+
+log = get_logger("conversation")
+
+
+class ConversationState(SessionRecord):
+    """Compact per-session conversation state (supports dict-style access)."""
+
+    __slots__ = (
+        'session_id', 'participant_id', 'bot_type', 'current_message_num',
+        'max_messages', 'started_at', 'is_active', 'is_complete', 'messages',
+        'ended_at', 'end_reason'
+    )
+
 
 class ConversationHandler:
     """
@@ -13,17 +28,20 @@ class ConversationHandler:
     Tracks conversation state and determines when conversations should end.
     """
     
-    def __init__(self, max_messages: int = 20):
+    def __init__(self, max_messages: int = 20, session_registry: Optional[SessionRegistry] = None):
         """
         Initialize conversation handler.
         
         Args:
             max_messages: Maximum number of messages allowed per conversation
+            session_registry: Optional bounded registry (defaults to 1-hour idle TTL)
         """
         self.max_messages = max_messages
-        self.conversations = {}  # session_id -> conversation state
+        # session_id -> conversation state (bounded; abandoned sessions expire)
+        self.conversations = (session_registry if session_registry is not None
+                              else SessionRegistry(record_type=ConversationState))
         
-        print(f"✓ Conversation handler initialized (max {max_messages} messages)")
+        log.info("Conversation handler initialized (max %d messages)", max_messages)
     
     
     def start_conversation(self, session_id: str, participant_id: str, 
@@ -39,21 +57,21 @@ class ConversationHandler:
         Returns:
             Conversation state dictionary
         """
-        conversation_state = {
-            'session_id': session_id,
-            'participant_id': participant_id,
-            'bot_type': bot_type,
-            'current_message_num': 0,
-            'max_messages': self.max_messages,
-            'started_at': datetime.utcnow(),
-            'is_active': True,
-            'is_complete': False,
-            'messages': []
-        }
+        conversation_state = ConversationState(
+            session_id=session_id,
+            participant_id=participant_id,
+            bot_type=bot_type,
+            current_message_num=0,
+            max_messages=self.max_messages,
+            started_at=datetime.utcnow(),
+            is_active=True,
+            is_complete=False,
+            messages=[]
+        )
         
         self.conversations[session_id] = conversation_state
         
-        print(f"✓ Started conversation for session {session_id}")
+        log.info("Started conversation for session %s", session_id, extra={"session_id": session_id})
         return conversation_state
     
     
@@ -69,11 +87,10 @@ class ConversationHandler:
         Returns:
             Updated conversation state
         """
-        if session_id not in self.conversations:
+        conversation = self.conversations.get(session_id)
+        if conversation is None:
             raise ValueError(f"Conversation not found for session: {session_id}")
         
-        conversation = self.conversations[session_id]
-        
         # Create message entry
         message = {
             'sender': sender,
@@ -93,6 +110,8 @@ class ConversationHandler:
             conversation['is_active'] = False
             conversation['is_complete'] = True
         
+        # Re-measure for the registry's memory budget
+        self.conversations.put(session_id, conversation)
         return conversation
     
     
@@ -200,8 +219,8 @@ class ConversationHandler:
             session_id: Session identifier
             reason: Reason for ending ("completed", "user_left", "error")
         """
-        if session_id in self.conversations:
-            conversation = self.conversations[session_id]
+        conversation = self.conversations.get(session_id)
+        if conversation is not None:
             conversation['is_active'] = False
             conversation['ended_at'] = datetime.utcnow()
             conversation['end_reason'] = reason
@@ -210,7 +229,8 @@ class ConversationHandler:
             if conversation['current_message_num'] >= conversation['max_messages']:
                 conversation['is_complete'] = True
             
-            print(f"✓ Conversation ended: {session_id} (reason: {reason})")
+            log.info("Conversation ended: %s (reason: %s)", session_id, reason,
+                     extra={"session_id": session_id, "reason": reason})
     
     
     def get_conversation_messages(self, session_id: str) -> List[Dict]:
@@ -261,9 +281,8 @@ class ConversationHandler:
         Args:
             session_id: Session identifier
         """
-        if session_id in self.conversations:
-            del self.conversations[session_id]
-            print(f"✓ Cleaned up conversation: {session_id}")
+        if self.conversations.pop(session_id, None) is not None:
+            log.info("Cleaned up conversation: %s", session_id, extra={"session_id": session_id})
     
     
     def get_active_conversations_count(self) -> int:
@@ -282,15 +301,17 @@ class ConversationHandler:
         Get statistics about all conversations.
         
         Returns:
-            Dictionary with conversation statistics
+            Dictionary with conversation statistics and registry eviction counters
         """
-        total = len(self.conversations)
-        active = sum(1 for conv in self.conversations.values() if conv['is_active'])
-        complete = sum(1 for conv in self.conversations.values() if conv['is_complete'])
+        conversations = self.conversations.values()
+        total = len(conversations)
+        active = sum(1 for conv in conversations if conv['is_active'])
+        complete = sum(1 for conv in conversations if conv['is_complete'])
         
         return {
             'total_conversations': total,
             'active_conversations': active,
             'completed_conversations': complete,
-            'incomplete_conversations': total - complete
+            'incomplete_conversations': total - complete,
+            'registry': self.conversations.stats()
         }
\ No newline at end of file
@@ -3,9 +3,20 @@ Crisis Detector
 Monitors messages for crisis keywords and triggers safety responses.
 """
 
-import re
+import time
 from typing import List, Tuple, Optional
-import yaml
+
+from src.chatbot.keyword_matcher import KeywordMatch, KeywordMatcher, MatchScanner
+from src.chatbot.text_normalizer import TextNormalizer
+from src.utils import metrics, tracing
+from src.utils.config_registry import ConfigRegistry, ConfigSnapshot, get_registry
+from src.utils.structured_logging import get_logger
+
+log = get_logger("crisis")
+crisis_log = get_logger("crisis_flags")
+
+CHECK_SECONDS = metrics.histogram("crisis_check_seconds", "CrisisDetector.check_message duration in seconds")
+DETECTIONS = metrics.counter("crisis_detections_total", "Messages matching a crisis keyword")
 
 
 class CrisisDetector:
@@ -21,63 +32,173 @@ class CrisisDetector:
         Args:
             config_path: Path to application configuration file
         """
+        # Shared, hot-reloaded config (None if unreadable: default keywords, no normalisation)
+        self.registry = self._load_registry(config_path)
+        snapshot = self.registry.snapshot() if self.registry else None
+        
         # Load crisis keywords from config
-        self.crisis_keywords = self._load_keywords(config_path)
+        self.crisis_keywords = self._load_keywords(snapshot)
         
-        # Compile regex patterns for faster matching
-        self.patterns = self._compile_patterns()
+        # Runtime edits (add_keyword/remove_keyword), re-applied when the config reloads
+        self._added: List[str] = []
+        self._removed: List[str] = []
         
-        print(f"✓ Crisis detector initialized with {len(self.crisis_keywords)} keywords")
+        # Canonicalise messages once (NFKC, look-alikes, leetspeak, ...) before matching
+        self.normalizer = self._load_normalizer(snapshot)
+        
+        # One automaton for all keywords: a single pass per message
+        self.matcher = self._build_matcher()
+        
+        if self.registry is not None:
+            self.registry.subscribe(self._on_config_change, parts=("safety",))
+        
+        log.info("Crisis detector initialized with %d keywords", len(self.crisis_keywords))
     
     
-    def _load_keywords(self, config_path: str) -> List[str]:
+    def _load_registry(self, config_path: str) -> Optional[ConfigRegistry]:
         """
-        Load crisis keywords from configuration file.
+        Get the process-wide config registry for the configuration file.
         
         Args:
             config_path: Path to config YAML file
             
         Returns:
-            List of crisis keywords
+            ConfigRegistry, or None if the file cannot be loaded
         """
         try:
-            with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
-            
-            keywords = config.get('safety', {}).get('crisis_keywords', [])
-            
-            # Add some default keywords if config is empty
-            if not keywords:
-                keywords = [
-                    'suicide', 'kill myself', 'end it all', 
-                    'want to die', 'no reason to live', 'better off dead'
-                ]
-            
-            return keywords
-            
+            return get_registry(config_path)
         except Exception as e:
-            print(f"⚠ Error loading crisis keywords from config: {e}")
+            log.warning("Error loading crisis keywords from config: %s", e)
+            return None
+    
+    
+    def _load_keywords(self, snapshot: Optional[ConfigSnapshot]) -> List[str]:
+        """
+        Load crisis keywords from a configuration snapshot.
+        
+        Args:
+            snapshot: Current config snapshot (None if the config is unreadable)
+            
+        Returns:
+            List of crisis keywords
+        """
+        if snapshot is None:
             # Return default keywords
             return ['suicide', 'kill myself', 'end it all', 'want to die']
+        
+        keywords = list((snapshot.config.get('safety') or {}).get('crisis_keywords') or [])
+        
+        # Add some default keywords if config is empty
+        if not keywords:
+            keywords = [
+                'suicide', 'kill myself', 'end it all', 
+                'want to die', 'no reason to live', 'better off dead'
+            ]
+        
+        return keywords
     
     
-    def _compile_patterns(self) -> List[re.Pattern]:
+    def _load_normalizer(self, snapshot: Optional[ConfigSnapshot]) -> Optional[TextNormalizer]:
         """
-        Compile regex patterns for crisis keyword detection.
-        Uses word boundaries to avoid false positives.
+        Load text normalisation settings (safety.normalization) from a configuration snapshot.
         
+        Args:
+            snapshot: Current config snapshot (None if the config is unreadable)
+            
         Returns:
-            List of compiled regex patterns
+            TextNormalizer, or None when disabled/unreadable (case-insensitive matching only)
         """
-        patterns = []
+        if snapshot is None:
+            return None
+        return TextNormalizer.from_config((snapshot.config.get('safety') or {}).get('normalization'))
+    
+    
+    def _build_matcher(self) -> KeywordMatcher:
+        """
+        Build the keyword matcher for crisis keyword detection.
+        Uses word boundaries to avoid false positives (same rules as `\\b<keyword>\\b`).
+        Keywords are indexed in canonical form, so variants need no extra entries.
         
-        for keyword in self.crisis_keywords:
-            # Create pattern with word boundaries (avoids matching partial words)
-            # Case-insensitive matching
-            pattern = re.compile(r'\b' + re.escape(keyword) + r'\b', re.IGNORECASE)
-            patterns.append(pattern)
+        Without runtime keyword edits the matcher is a registry artefact: built once
+        per process and shared by every detector until the safety section changes.
         
-        return patterns
+        Returns:
+            KeywordMatcher over all crisis keywords (case-insensitive)
+        """
+        if self.registry is not None and not (self._added or self._removed):
+            return self.registry.artifact(
+                "crisis_matcher", ("safety",),
+                lambda snapshot: KeywordMatcher(self._load_keywords(snapshot),
+                                                normalizer=self._load_normalizer(snapshot)))
+        return KeywordMatcher(self.crisis_keywords, normalizer=self.normalizer)
+    
+    
+    def _on_config_change(self, snapshot: ConfigSnapshot, changed):
+        """
+        Reload keywords and normalisation after the safety section changed.
+        
+        Args:
+            snapshot: New config snapshot
+            changed: Names of the changed parts
+        """
+        keywords = [k for k in self._load_keywords(snapshot) if k not in self._removed]
+        keywords.extend(k for k in self._added if k not in keywords)
+        self.crisis_keywords = keywords
+        self.normalizer = self._load_normalizer(snapshot)
+        self.matcher = self._build_matcher()
+        log.info("Crisis keywords reloaded: %d keywords", len(self.crisis_keywords),
+                 extra={"config_version": snapshot.version})
+    
+    
+    def find_all(self, message: str) -> List[KeywordMatch]:
+        """
+        Find every crisis keyword occurrence in a message (single pass).
+        
+        Args:
+            message: Message text to scan
+            
+        Returns:
+            KeywordMatch(keyword, start, end) for each occurrence, by position
+        """
+        started = time.perf_counter()
+        with tracing.span("crisis.check", chars=len(message or "")) as span:
+            try:
+                matches = self.matcher.find_all(message or "")
+                if matches:
+                    keywords = self.matched_keywords(matches)
+                    crisis_log.warning("CRISIS KEYWORD DETECTED: '%s'", "', '".join(keywords),
+                                       extra={"keyword": keywords[0], "keywords": keywords})
+                    DETECTIONS.inc()
+                    span.set_attribute("crisis", True)
+                    span.set_attribute("matches", len(matches))
+                return matches
+            finally:
+                CHECK_SECONDS.observe(time.perf_counter() - started)
+    
+    
+    def scanner(self) -> MatchScanner:
+        """
+        Incremental scanner for streamed text (e.g. bot replies), one per stream.
+        Each chunk costs time proportional to its length; matches spanning chunks are found.
+        
+        Returns:
+            MatchScanner whose feed()/finish() return KeywordMatch with stream offsets
+        """
+        return self.matcher.scanner()
+    
+    
+    def matched_keywords(self, matches: List[KeywordMatch]) -> List[str]:
+        """
+        Distinct keywords from a list of matches, in configured (priority) order.
+        
+        Args:
+            matches: Result of find_all()
+            
+        Returns:
+            Matched keywords, ordered as in the keyword list
+        """
+        found = {m.keyword for m in matches}
+        return [k for k in self.crisis_keywords if k in found]
     
     
     def check_message(self, message: str) -> Tuple[bool, Optional[str]]:
@@ -90,15 +211,13 @@ class CrisisDetector:
         Returns:
             Tuple of (is_crisis, detected_keyword)
             - is_crisis: True if crisis keyword detected
-            - detected_keyword: The keyword that was found (or None)
+            - detected_keyword: The first matched keyword in configured order (or None);
+              use find_all() for every match
         """
-        # Check each pattern
-        for pattern, keyword in zip(self.patterns, self.crisis_keywords):
-            if pattern.search(message):
-                print(f"⚠ CRISIS KEYWORD DETECTED: '{keyword}'")
-                return True, keyword
-        
-        return False, None
+        matches = self.find_all(message)
+        if not matches:
+            return False, None
+        return True, self.matched_keywords(matches)[0]
     
     
     def get_crisis_response(self) -> str:
@@ -109,14 +228,12 @@ class CrisisDetector:
         Returns:
             Crisis response text
         """
-        try:
-            # Try to load from crisis_response.txt file
-            with open('config/crisis_response.txt', 'r') as f:
-                response = f.read().strip()
+        # crisis_response.txt, loaded once and reloaded when it changes
+        response = self.registry.snapshot().crisis_text if self.registry else ""
+        if response:
             return response
-        except:
-            # Fallback crisis response if file not found
-            return """I'm concerned about what you're sharing and want you to know that help is available right now.
+        # Fallback crisis response if file not found
+        return """I'm concerned about what you're sharing and want you to know that help is available right now.
 
 If you're in immediate danger, please call 911.
 
@@ -160,9 +277,13 @@ I'm not a licensed therapist, but these trained professionals can provide immedi
         """
         if keyword not in self.crisis_keywords:
             self.crisis_keywords.append(keyword)
-            # Recompile patterns
-            self.patterns = self._compile_patterns()
-            print(f"✓ Added crisis keyword: '{keyword}'")
+            if keyword in self._removed:
+                self._removed.remove(keyword)
+            else:
+                self._added.append(keyword)
+            # Rebuild matcher
+            self.matcher = self._build_matcher()
+            log.info("Added crisis keyword: '%s'", keyword)
     
     
     def remove_keyword(self, keyword: str):
@@ -174,6 +295,10 @@ I'm not a licensed therapist, but these trained professionals can provide immedi
         """
         if keyword in self.crisis_keywords:
             self.crisis_keywords.remove(keyword)
-            # Recompile patterns
-            self.patterns = self._compile_patterns()
-            print(f"✓ Removed crisis keyword: '{keyword}'")
\ No newline at end of file
+            if keyword in self._added:
+                self._added.remove(keyword)
+            else:
+                self._removed.append(keyword)
+            # Rebuild matcher
+            self.matcher = self._build_matcher()
+            log.info("Removed crisis keyword: '%s'", keyword)
\ No newline at end of file
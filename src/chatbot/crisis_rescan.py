@@ -0,0 +1,198 @@
+"""
+Crisis Rescan
+Retroactive crisis keyword scan over every stored user message.
+
+Run after keywords are added (CrisisDetector.add_keyword or
+safety.crisis_keywords) so that historical messages are checked too:
+
+- User messages are read in keyset-ordered chunks (id > last id), never all at once
+- Chunks are matched in a process pool; each worker gets the detector's
+  KeywordMatcher once, at start-up
+- New flags are bulk-inserted, one per message and keyword; keywords already
+  flagged in the same turn (including live flags on the bot reply) are skipped,
+  so re-running is harmless
+- Flagged messages and their participants are updated with set-based UPDATEs
+- Progress is checkpointed after each committed chunk; a restarted job resumes
+  after the last committed message, unless the keywords or normalisation
+  settings changed (then everything is scanned again)
+
+Usage:
+    rescan = CrisisRescan(db_manager, CrisisDetector(), workers=4,
+                          checkpoint_path="data/checkpoints/crisis_rescan.json")
+    report = rescan.run()
+    report['messages_per_second']
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    from src.chatbot.keyword_matcher import KeywordMatcher
+    from src.utils.structured_logging import get_logger
+except Exception:
+    from keyword_matcher import KeywordMatcher
+    from structured_logging import get_logger
+
+log = get_logger("crisis.rescan")
+
+# (participant_id, message_id, keyword)
+Flag = Tuple[str, int, str]
+
+_WORKER_MATCHER: Optional[KeywordMatcher] = None
+
+
+def _init_worker(matcher: KeywordMatcher):
+    global _WORKER_MATCHER
+    _WORKER_MATCHER = matcher
+
+
+def _scan_in_worker(rows: List[Tuple[int, str, str]]) -> List[Flag]:
+    return scan_rows(_WORKER_MATCHER, rows)
+
+
+def scan_rows(matcher: KeywordMatcher, rows: List[Tuple[int, str, str]]) -> List[Flag]:
+    """Flags for one chunk of (message_id, participant_id, content) rows, keywords in configured order."""
+    order = {keyword: i for i, keyword in enumerate(matcher.keywords)}
+    flags: List[Flag] = []
+    for message_id, participant_id, content in rows:
+        found = {m.keyword for m in matcher.find_all(content or "")}
+        flags.extend((participant_id, message_id, keyword) for keyword in sorted(found, key=order.get))
+    return flags
+
+
+def matcher_fingerprint(matcher: KeywordMatcher) -> str:
+    """Identifies the keyword set and normalisation settings a checkpoint was made with."""
+    normalizer = matcher.normalizer
+    settings = None if normalizer is None else [
+        normalizer.confusables, normalizer.leetspeak, normalizer.collapse_whitespace, normalizer.stemming
+    ]
+    payload = json.dumps({"keywords": matcher.keywords, "normalizer": settings}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class CrisisRescan:
+    """Batch job: re-check stored user messages against the current crisis keywords."""
+
+    def __init__(self, db_manager, detector, chunk_size: int = 1000, workers: Optional[int] = None,
+                 checkpoint_path: Optional[str] = None):
+        """
+        Args:
+            db_manager: DatabaseManager to read messages from and write flags to
+            detector: CrisisDetector whose keywords and normalisation are used
+            chunk_size: Messages per keyset page (and per worker task)
+            workers: Worker processes (None = CPU count, 0 = scan in this process)
+            checkpoint_path: JSON file recording the last committed message (None = no checkpoint)
+        """
+        self.db = db_manager
+        self.matcher: KeywordMatcher = detector.matcher
+        self.chunk_size = max(1, int(chunk_size))
+        self.workers = (os.cpu_count() or 1) if workers is None else max(0, int(workers))
+        self.checkpoint_path = checkpoint_path
+        self.fingerprint = matcher_fingerprint(self.matcher)
+
+    # ---------- Checkpoint ----------
+
+    def load_checkpoint(self) -> int:
+        """Last committed message ID for the current keywords (0 = start from the beginning)."""
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return 0
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning("Rescan checkpoint unreadable (%s): %s; starting from the beginning", self.checkpoint_path, e)
+            return 0
+        if state.get("fingerprint") != self.fingerprint:
+            log.info("Crisis keywords changed since the last rescan; scanning every message again")
+            return 0
+        return int(state.get("last_message_id") or 0)
+
+    def _save_checkpoint(self, last_message_id: int, messages: int, flags: int):
+        if not self.checkpoint_path:
+            return
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        state = {
+            "fingerprint": self.fingerprint,
+            "last_message_id": last_message_id,
+            "messages": messages,
+            "flags_created": flags,
+            "updated_at": datetime.utcnow().isoformat(),
+        }
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    # ---------- Run ----------
+
+    def run(self, restart: bool = False,
+            progress: Optional[Callable[[Dict[str, object]], None]] = None) -> Dict[str, object]:
+        """
+        Scan every user message after the checkpoint and create missing flags.
+
+        Args:
+            restart: Ignore the checkpoint and scan from the first message
+            progress: Called with the running report after each committed chunk
+
+        Returns:
+            Report: messages, flags_created, chunks, seconds, messages_per_second,
+            resumed_from, last_message_id, workers
+        """
+        resumed_from = 0 if restart else self.load_checkpoint()
+        report: Dict[str, object] = {
+            'messages': 0, 'flags_created': 0, 'chunks': 0, 'seconds': 0.0, 'messages_per_second': 0.0,
+            'resumed_from': resumed_from, 'last_message_id': resumed_from, 'workers': self.workers,
+        }
+        started = time.perf_counter()
+
+        def commit(last_id: int, rows: int, flags: List[Flag]):
+            created = self.db.bulk_create_crisis_flags(flags) if flags else 0
+            report['messages'] += rows
+            report['flags_created'] += created
+            report['chunks'] += 1
+            report['last_message_id'] = last_id
+            report['seconds'] = time.perf_counter() - started
+            report['messages_per_second'] = report['messages'] / report['seconds'] if report['seconds'] else 0.0
+            self._save_checkpoint(last_id, report['messages'], report['flags_created'])
+            if progress is not None:
+                progress(dict(report))
+
+        after_id = resumed_from
+        if self.workers == 0:
+            while True:
+                rows = self.db.get_user_messages_after(after_id, self.chunk_size)
+                if not rows:
+                    break
+                after_id = rows[-1][0]
+                commit(after_id, len(rows), scan_rows(self.matcher, rows))
+        else:
+            # Read ahead while workers scan; commit in message order so the checkpoint never skips a chunk
+            window = self.workers * 2
+            pending = deque()
+            with ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.matcher,)) as pool:
+                exhausted = False
+                while pending or not exhausted:
+                    while not exhausted and len(pending) < window:
+                        rows = self.db.get_user_messages_after(after_id, self.chunk_size)
+                        if not rows:
+                            exhausted = True
+                            break
+                        after_id = rows[-1][0]
+                        pending.append((after_id, len(rows), pool.submit(_scan_in_worker, rows)))
+                    if pending:
+                        last_id, count, future = pending.popleft()
+                        commit(last_id, count, future.result())
+
+        report['seconds'] = time.perf_counter() - started
+        report['messages_per_second'] = report['messages'] / report['seconds'] if report['seconds'] else 0.0
+        log.info("Crisis rescan: %d messages, %d new flags, %.0f messages/s", report['messages'],
+                 report['flags_created'], report['messages_per_second'], extra=dict(report))
+        return report
@@ -7,6 +7,11 @@ import os
 from typing import Optional, Dict, List
 from datetime import datetime
 
+try:
+    from src.utils.config_registry import get_registry
+except Exception:
+    from config_registry import get_registry
+
 
 class EmpathyBot:
     """
@@ -45,25 +50,14 @@ class EmpathyBot:
         Returns:
             System prompt text
         """
-        # Map bot types to prompt files
-        prompt_files = {
-            'emotional': 'config/emotional_empathy_prompt.txt',
-            'cognitive': 'config/cognitive_empathy_prompt.txt',
-            'motivational': 'config/motivational_empathy_prompt.txt',
-            'neutral': None  # Neutral bot has no special prompt
-        }
-        
-        prompt_file = prompt_files.get(self.bot_type)
-        
         # Neutral bot uses no system prompt (default API behavior)
-        if prompt_file is None:
+        if self.bot_type == 'neutral':
             return ""
         
-        # Load prompt from file
+        # Prompt files are read once per process by the config registry
         try:
-            with open(prompt_file, 'r', encoding='utf-8') as f:
-                prompt = f.read().strip()
-            print(f"  ✓ Loaded prompt from {prompt_file}")
+            prompt = get_registry().snapshot().prompts.get(self.bot_type, "")
+            print(f"  ✓ Loaded {self.bot_type} prompt")
             return prompt
         except Exception as e:
             print(f"  ✗ Error loading prompt file: {e}")
@@ -119,8 +113,7 @@ class EmpathyBot:
         try:
             # If crisis mode, return crisis response immediately
             if crisis_mode:
-                with open('config/crisis_response.txt', 'r') as f:
-                    return f.read().strip()
+                return get_registry().snapshot().crisis_text
             
             # Add user message to history
             self.add_to_history('user', user_message)
@@ -0,0 +1,268 @@
+"""
+Hedged LLM Requests
+Cuts the time-to-first-token tail of streamed replies.
+
+If the first token has not arrived after a recent-TTFT percentile, a duplicate
+request is sent; whichever attempt produces a token first is streamed and the
+other is cancelled. Hedges are limited to a fraction of all requests and only
+use idle scheduler capacity, so an outage cannot double provider load.
+
+The TTFT window and the budget are process-wide (get_hedger): BotManager is
+rebuilt on every Streamlit rerun, and a per-instance budget would never allow
+a hedge or learn a percentile.
+"""
+
+import contextvars
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+
+class TTFTTracker:
+    """Sliding window of observed time-to-first-token values."""
+
+    def __init__(self, window: int = 200, percentile: float = 0.95, min_samples: int = 20,
+                 default_delay: float = 2.0, min_delay: float = 0.5, max_delay: float = 5.0):
+        """
+        Args:
+            window: Number of recent observations kept
+            percentile: Percentile of recent TTFT used as the hedge delay (0-1)
+            min_samples: Observations needed before the percentile is trusted
+            default_delay: Hedge delay used until min_samples is reached
+            min_delay: Lower bound on the hedge delay
+            max_delay: Upper bound on the hedge delay
+        """
+        self.percentile = min(1.0, max(0.0, float(percentile)))
+        self.min_samples = max(1, int(min_samples))
+        self.default_delay = float(default_delay)
+        self.min_delay = float(min_delay)
+        self.max_delay = float(max_delay)
+        self._samples = deque(maxlen=max(1, int(window)))
+        self._lock = threading.Lock()
+
+    def record(self, ttft: float):
+        with self._lock:
+            self._samples.append(float(ttft))
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for a first token before sending a hedge."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            delay = self.default_delay
+        else:
+            delay = samples[min(len(samples) - 1, int(self.percentile * len(samples)))]
+        return min(self.max_delay, max(self.min_delay, delay))
+
+
+class HedgeBudget:
+    """Caps hedges at `max_ratio` of primary requests."""
+
+    def __init__(self, max_ratio: float = 0.1):
+        self.max_ratio = max(0.0, float(max_ratio))
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+        self.denied = 0
+
+    def note_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def try_spend(self) -> bool:
+        """Reserve one hedge if the budget allows it."""
+        with self._lock:
+            if self.hedges + 1 <= self.max_ratio * self.requests:
+                self.hedges += 1
+                return True
+            self.denied += 1
+            return False
+
+
+class Hedger:
+    """
+    Races a primary streaming request against a delayed hedge.
+
+    Attempt factories take a `register(closeable)` callback for the open HTTP
+    response. The loser's response is closed and its tokens are discarded; a
+    worker blocked in a read exits at its next chunk or read timeout.
+    """
+
+    def __init__(self, tracker: Optional[TTFTTracker] = None, budget: Optional[HedgeBudget] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.tracker = tracker or TTFTTracker()
+        self.budget = budget or HedgeBudget()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_config(cls, cfg: Optional[dict]) -> Optional["Hedger"]:
+        """Build a Hedger from `api.hedging`; None unless enabled."""
+        cfg = cfg or {}
+        if not cfg.get("enabled", False):
+            return None
+        tracker = TTFTTracker(
+            window=int(cfg.get("window", 200)),
+            percentile=float(cfg.get("percentile", 0.95)),
+            min_samples=int(cfg.get("min_samples", 20)),
+            default_delay=float(cfg.get("default_delay", 2.0)),
+            min_delay=float(cfg.get("min_delay", 0.5)),
+            max_delay=float(cfg.get("max_delay", 5.0)),
+        )
+        return cls(tracker, HedgeBudget(float(cfg.get("max_extra_ratio", 0.1))))
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            hedged, wins = self.hedged, self.hedge_wins
+        return {
+            'requests': self.budget.requests,
+            'hedged': hedged,
+            'hedge_wins': wins,
+            'denied_by_budget': self.budget.denied,
+            'hedge_delay': round(self.tracker.hedge_delay(), 3),
+        }
+
+    @staticmethod
+    def _run(index: int, start, events: "queue.Queue", cancel: threading.Event, handles: list):
+        """Pump one attempt's tokens into the shared queue (worker thread)."""
+        tokens = None
+        try:
+            tokens = start(handles.append)
+            for token in tokens:
+                if cancel.is_set():
+                    return
+                events.put((index, "token", token))
+            events.put((index, "done", None))
+        except Exception as e:
+            if not cancel.is_set():
+                events.put((index, "error", e))
+        finally:
+            close = getattr(tokens, "close", None)
+            if close:
+                try:
+                    close()
+                except Exception:
+                    pass
+
+    def stream(self, primary, hedge, meta: Optional[dict] = None) -> Iterator[str]:
+        """
+        Yield tokens from whichever attempt produces a first token first.
+
+        Args:
+            primary: Factory(register) -> token iterator for the first request
+            hedge: Factory(register) -> token iterator for the duplicate request
+            meta: Optional dict filled with hedged / winner / ttft / hedge_delay
+
+        Raises:
+            The primary's error if every launched attempt fails before its first token
+        """
+        meta = meta if meta is not None else {}
+        events: "queue.Queue" = queue.Queue()
+        cancels = [threading.Event(), threading.Event()]
+        handles = [[], []]
+        errors: Dict[int, BaseException] = {}
+        launched = 1
+        delay = self.tracker.hedge_delay()
+        self.budget.note_request()
+        started = self._clock()
+        meta.update({'hedged': False, 'winner': 'primary', 'ttft': None, 'hedge_delay': round(delay, 3)})
+
+        def launch(index, factory):
+            # Copy the caller's context so the attempt's trace span parents correctly
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run,
+                             args=(self._run, index, factory, events, cancels[index], handles[index]),
+                             daemon=True).start()
+
+        launch(0, primary)
+        winner, first = None, None
+        hedge_pending = True
+        try:
+            while winner is None:
+                timeout = max(0.0, started + delay - self._clock()) if hedge_pending else None
+                try:
+                    index, kind, payload = events.get(timeout=timeout)
+                except queue.Empty:
+                    hedge_pending = False
+                    if self.budget.try_spend():
+                        launched += 1
+                        meta['hedged'] = True
+                        with self._lock:
+                            self.hedged += 1
+                        launch(1, hedge)
+                    continue
+                if kind == "error":
+                    errors[index] = payload
+                    if len(errors) == launched:
+                        # Nothing left running (a failed primary is not hedged; retries handle it)
+                        raise errors.get(0) or payload
+                    continue
+                winner, first = index, payload
+
+            ttft = self._clock() - started
+            self.tracker.record(ttft)
+            meta['ttft'] = round(ttft, 3)
+            meta['winner'] = 'hedge' if winner == 1 else 'primary'
+            if winner == 1:
+                with self._lock:
+                    self.hedge_wins += 1
+            self._cancel(1 - winner, cancels, handles)
+
+            if first is not None:
+                yield first
+                while True:
+                    index, kind, payload = events.get()
+                    if index != winner:
+                        continue
+                    if kind == "token":
+                        yield payload
+                    elif kind == "error":
+                        raise payload
+                    else:
+                        break
+        finally:
+            for index in range(2):
+                self._cancel(index, cancels, handles)
+
+    @staticmethod
+    def _cancel(index: int, cancels, handles):
+        """Stop an attempt and abort its open HTTP response, if registered."""
+        if cancels[index].is_set():
+            return
+        cancels[index].set()
+        for handle in handles[index]:
+            try:
+                handle.close()
+            except Exception:
+                pass
+
+
+# ---- Process-wide instances ----------------------------------------------------
+
+_HEDGERS: Dict[Tuple, Hedger] = {}
+_HEDGERS_LOCK = threading.Lock()
+
+
+def get_hedger(cfg: Optional[dict] = None) -> Optional[Hedger]:
+    """
+    Return the process-wide Hedger for an `api.hedging` section, creating it on first use.
+
+    Instances are keyed by the section's settings, so every BotManager built from
+    the same config shares one TTFT window and one hedge budget.
+
+    Returns:
+        Hedger, or None unless the section sets enabled: true
+    """
+    cfg = cfg or {}
+    if not cfg.get("enabled", False):
+        return None
+    key = tuple(sorted((str(k), repr(v)) for k, v in cfg.items()))
+    with _HEDGERS_LOCK:
+        hedger = _HEDGERS.get(key)
+        if hedger is None:
+            hedger = _HEDGERS[key] = Hedger.from_config(cfg)
+        return hedger
@@ -0,0 +1,259 @@
+"""
+Keyword Matcher
+Single-pass multi-keyword matching (Aho-Corasick) with word boundaries.
+
+One automaton holds every keyword, so a message is scanned once whatever the
+size of the keyword list (the old per-keyword regex loop grew linearly), and
+every occurrence is reported with its offsets instead of only the first
+keyword.
+
+- Matching is case-insensitive (per-character lower-casing, so offsets into
+  the original text are preserved)
+- Word boundaries follow the old `\\b<keyword>\\b` patterns: a keyword edge
+  that is a word character must not touch another word character
+- Overlapping and repeated occurrences are all reported
+- A MatchScanner carries the automaton state across chunks, so streamed text
+  can be scanned incrementally and matches spanning chunk boundaries are found
+- With a TextNormalizer, keywords are indexed in canonical form and each
+  message is normalised once before the scan; offsets are mapped back to the
+  original text
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+try:
+    from src.chatbot.text_normalizer import TextNormalizer
+except Exception:
+    from text_normalizer import TextNormalizer
+
+
+class KeywordMatch(NamedTuple):
+    """One keyword occurrence; `start`/`end` are offsets into the scanned text (end exclusive)."""
+    keyword: str
+    start: int
+    end: int
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+def _fold(ch: str) -> str:
+    """Lower-case one character, keeping it one character long (offsets stay aligned)."""
+    lowered = ch.lower()
+    return lowered if len(lowered) == 1 else ch
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over the (lower-cased) keywords."""
+
+    def __init__(self, keywords: Iterable[str], normalizer: Optional[TextNormalizer] = None):
+        """
+        Args:
+            keywords: Keywords or phrases; blanks and duplicates are ignored, order is kept
+            normalizer: Canonicalise keywords and messages before matching (None = case folding only)
+        """
+        self.normalizer = normalizer
+        self.keywords: List[str] = list(dict.fromkeys(k for k in keywords if k and k.strip()))
+        if normalizer is not None:
+            # Keywords that vanish under normalisation (e.g. only punctuation) cannot match
+            self.keywords = [k for k in self.keywords if normalizer.canonical(k).strip()]
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        # Per keyword: folded length and whether each edge needs a word boundary
+        self._length: List[int] = []
+        self._bound_left: List[bool] = []
+        self._bound_right: List[bool] = []
+        for index, keyword in enumerate(self.keywords):
+            if normalizer is not None:
+                keyword = normalizer.canonical(keyword).strip()
+            folded = "".join(_fold(c) for c in keyword)
+            self._length.append(len(folded))
+            self._bound_left.append(_is_word(folded[0]))
+            self._bound_right.append(_is_word(folded[-1]))
+            self._insert(folded, index)
+        self._link()
+        self.max_length = max(self._length, default=0)
+
+    def _insert(self, folded: str, index: int):
+        node = 0
+        for c in folded:
+            nxt = self._goto[node].get(c)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][c] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        self._out[node] += (index,)
+
+    def _link(self):
+        """Breadth-first failure links; each node's outputs include its suffixes' outputs."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for c, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and c not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(c, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] += self._out[self._fail[child]]
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def scanner(self) -> "MatchScanner":
+        """New incremental scanner (one per stream)."""
+        return MatchScanner(self)
+
+    def find_all(self, text: str) -> List[KeywordMatch]:
+        """Every keyword occurrence in `text`, ordered by end offset (offsets into `text`)."""
+        if not text or not self.keywords:
+            return []
+        scanner = MatchScanner(self)
+        if self.normalizer is None:
+            return scanner.feed(text) + scanner.finish()
+        # Whole text at once: one normalisation pass, no buffering
+        norm = self.normalizer.normalize(text)
+        matches = scanner._scan(norm.text) + scanner._take_pending()
+        return [KeywordMatch(m.keyword, *norm.original_span(m.start, m.end)) for m in matches]
+
+    def search(self, text: str) -> Optional[KeywordMatch]:
+        """First occurrence (by end offset), or None."""
+        matches = self.find_all(text)
+        return matches[0] if matches else None
+
+
+# Separators after which a streamed chunk can be normalised without the text that follows
+_SEPARATORS = frozenset(" \t\r\n-")
+# Longest run without a separator held back before normalising it anyway
+MAX_HELD_CHARS = 256
+
+
+class MatchScanner:
+    """
+    Incremental scan over text that arrives in chunks (e.g. streamed tokens).
+
+    The automaton state carries across chunks, so a keyword split over several
+    chunks is still found, and each chunk costs time proportional to its length.
+    A match ending on a word character is only confirmed when the next
+    character (or the end of the text) shows it is not inside a longer word,
+    so it may be reported by a later `feed()` call or by `finish()`.
+
+    With a normalizer, the trailing partial word is held back until a
+    separator arrives (leetspeak and stemming need the whole word). Offsets
+    are always into the full original stream.
+    """
+
+    __slots__ = ("matcher", "node", "position", "_wordness", "_pending",
+                 "_held", "_consumed", "_starts", "_ends", "_base", "_last_space")
+
+    def __init__(self, matcher: KeywordMatcher):
+        self.matcher = matcher
+        self.node = 0
+        self.position = 0
+        # Word-ness of the most recent characters (enough to check a left boundary)
+        self._wordness = deque(maxlen=matcher.max_length + 1)
+        self._pending: List[KeywordMatch] = []
+        # Normalised streams: text not yet normalised, original chars before it and
+        # original spans of recent canonical characters (index - _base)
+        self._held = ""
+        self._consumed = 0
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        self._base = 0
+        self._last_space = False
+
+    def feed(self, chunk: str) -> List[KeywordMatch]:
+        """Scan the next chunk; returns matches confirmed so far."""
+        if self.matcher.normalizer is None:
+            return self._scan(chunk)
+        text = self._held + chunk
+        cut = len(text)
+        # Normalise up to the start of the last word (after the last separator run)
+        while cut > 0 and text[cut - 1] not in _SEPARATORS:
+            cut -= 1
+        if cut == 0:
+            if len(text) < MAX_HELD_CHARS:
+                self._held = text
+                return []
+            cut = len(text)
+        self._held = text[cut:]
+        return self._scan_normalized(text[:cut])
+
+    def finish(self) -> List[KeywordMatch]:
+        """End of text: scan anything held back and confirm matches awaiting a right boundary."""
+        if self.matcher.normalizer is None:
+            return self._take_pending()
+        found = self._scan_normalized(self._held) if self._held else []
+        self._held = ""
+        return found + [self._original(m) for m in self._take_pending()]
+
+    def _take_pending(self) -> List[KeywordMatch]:
+        found, self._pending = self._pending, []
+        return found
+
+    def _scan_normalized(self, segment: str) -> List[KeywordMatch]:
+        norm = self.matcher.normalizer.normalize(segment)
+        text, starts, ends = norm.text, norm.starts, norm.ends
+        offset = self._consumed
+        self._consumed += len(segment)
+        if text[:1] == " " and self._last_space:
+            # Whitespace run split across segments: still one canonical space
+            self._ends[-1] = ends[0] + offset
+            text, starts, ends = text[1:], starts[1:], ends[1:]
+        # Keep spans only as far back as a match (or a pending one) can start
+        keep = self.matcher.max_length + 1
+        if len(self._starts) > keep:
+            drop = len(self._starts) - keep
+            del self._starts[:drop]
+            del self._ends[:drop]
+            self._base += drop
+        self._starts.extend(s + offset for s in starts)
+        self._ends.extend(e + offset for e in ends)
+        if text:
+            self._last_space = text[-1] == " "
+        return [self._original(m) for m in self._scan(text)]
+
+    def _original(self, match: KeywordMatch) -> KeywordMatch:
+        return KeywordMatch(match.keyword, self._starts[match.start - self._base],
+                            self._ends[match.end - 1 - self._base])
+
+    def _scan(self, text: str) -> List[KeywordMatch]:
+        """Run the automaton over (canonical) text; offsets are canonical stream positions."""
+        m = self.matcher
+        goto, fail, out = m._goto, m._fail, m._out
+        keywords, length, bound_left, bound_right = m.keywords, m._length, m._bound_left, m._bound_right
+        wordness = self._wordness
+        node, position, pending = self.node, self.position, self._pending
+        found: List[KeywordMatch] = []
+        for ch in text:
+            is_word = _is_word(ch)
+            if pending:
+                # Pending matches ended on a word character; this character settles them
+                if not is_word:
+                    found.extend(pending)
+                pending = []
+            wordness.append(is_word)
+            c = _fold(ch)
+            while node and c not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(c, 0)
+            if out[node]:
+                for index in out[node]:
+                    size = length[index]
+                    if bound_left[index] and len(wordness) > size and wordness[-size - 1]:
+                        continue
+                    match = KeywordMatch(keywords[index], position - size + 1, position + 1)
+                    if bound_right[index]:
+                        pending.append(match)
+                    else:
+                        found.append(match)
+            position += 1
+        self.node, self.position, self._pending = node, position, pending
+        return found
@@ -0,0 +1,387 @@
+"""
+LLM Scheduler
+Process-wide admission control for outbound model requests.
+
+- Caps concurrent requests (api.scheduler.max_concurrency)
+- Token buckets for requests/min and tokens/min, corrected from the provider's
+  x-ratelimit-* response headers and paused on 429 Retry-After
+- Fair queueing: each participant's turns are FIFO, participants are served
+  round-robin so one busy session cannot starve the others
+- Queue depth and wait times are exposed so the UI can show "waiting for a slot"
+"""
+
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Mapping, Optional
+
+
+class SchedulerTimeout(TimeoutError):
+    """Raised when a request waited longer than max_queue_wait for a slot."""
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a rate-limit reset duration such as "1s", "6m0s", "250ms" or "12".
+
+    Returns:
+        Seconds as float, or None if unparseable
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total, matched = 0.0, False
+    for amount, unit in _DURATION_PART.findall(value):
+        matched = True
+        amount = float(amount)
+        total += {"ms": amount / 1000.0, "s": amount, "m": amount * 60, "h": amount * 3600}[unit]
+    return total if matched else None
+
+
+class _TokenBucket:
+    """Continuous-refill bucket sized in units per minute."""
+
+    def __init__(self, per_minute: float, now: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = now
+
+    def refill(self, now: float):
+        elapsed = max(0.0, now - self.updated)
+        self.level = min(self.capacity, self.level + elapsed * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_for(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 if available now)."""
+        self.refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60.0 / self.capacity
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def sync(self, limit: Optional[float], remaining: Optional[float], now: float):
+        """Adopt the provider's view of the limit and remaining budget."""
+        self.refill(now)
+        if limit and limit > 0:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.level = min(self.level, float(remaining), self.capacity)
+
+
+class SchedulerTicket:
+    """One queued or admitted model request."""
+
+    __slots__ = ("key", "est_tokens", "enqueued_at", "admitted_at")
+
+    def __init__(self, key: str, est_tokens: int, enqueued_at: float):
+        self.key = key
+        self.est_tokens = est_tokens
+        self.enqueued_at = enqueued_at
+        self.admitted_at: Optional[float] = None
+
+    @property
+    def wait_seconds(self) -> float:
+        if self.admitted_at is None:
+            return 0.0
+        return self.admitted_at - self.enqueued_at
+
+
+class LLMScheduler:
+    """
+    Fair, rate-aware gate in front of the provider API.
+
+    Usage:
+        with scheduler.slot(participant_id, est_tokens=600) as ticket:
+            ... call the API ...
+    """
+
+    def __init__(self, max_concurrency: int = 16, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, max_queue_wait: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize scheduler.
+
+        Args:
+            max_concurrency: Maximum in-flight model requests in this process
+            requests_per_minute: Request budget (None disables the bucket)
+            tokens_per_minute: Token budget, prompt + completion (None disables)
+            max_queue_wait: Seconds a turn may wait before SchedulerTimeout
+            clock: Monotonic time source
+        """
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue_wait = float(max_queue_wait)
+        self._clock = clock
+        now = clock()
+        self._requests = _TokenBucket(requests_per_minute, now) if requests_per_minute else None
+        self._tokens = _TokenBucket(tokens_per_minute, now) if tokens_per_minute else None
+        self._cond = threading.Condition()
+        self._queues: Dict[str, Deque[SchedulerTicket]] = {}
+        self._ring: Deque[str] = deque()  # participants with pending turns, service order
+        self._in_flight = 0
+        self._paused_until = 0.0
+        # Counters
+        self._admitted = 0
+        self._timeouts = 0
+        self._rate_limited = 0
+        self._waits: Deque[float] = deque(maxlen=1000)
+
+    # ---------- Queue internals (caller holds the condition lock) ----------
+
+    def _enqueue(self, ticket: SchedulerTicket):
+        queue = self._queues.get(ticket.key)
+        if queue is None:
+            queue = self._queues[ticket.key] = deque()
+            self._ring.append(ticket.key)
+        queue.append(ticket)
+
+    def _dequeue(self, ticket: SchedulerTicket):
+        queue = self._queues.get(ticket.key)
+        if not queue:
+            return
+        was_head = self._ring and self._ring[0] == ticket.key and queue[0] is ticket
+        try:
+            queue.remove(ticket)
+        except ValueError:
+            return
+        if not queue:
+            del self._queues[ticket.key]
+            self._ring.remove(ticket.key)
+        elif was_head:
+            # Participant keeps its FIFO order but goes to the back of the round-robin
+            self._ring.rotate(-1)
+
+    def _is_head(self, ticket: SchedulerTicket) -> bool:
+        return bool(self._ring) and self._ring[0] == ticket.key and self._queues[ticket.key][0] is ticket
+
+    def _position(self, ticket: SchedulerTicket) -> int:
+        """Approximate number of turns ahead of this one."""
+        ahead = 0
+        for key in self._ring:
+            queue = self._queues[key]
+            if key == ticket.key:
+                return ahead + list(queue).index(ticket)
+            ahead += 1
+        return ahead
+
+    def _admission_delay(self, ticket: SchedulerTicket, now: float) -> Optional[float]:
+        """0 if the ticket may go now, seconds to wait for budget, or None if blocked on a slot."""
+        if self._in_flight >= self.max_concurrency:
+            return None
+        delay = max(0.0, self._paused_until - now)
+        if self._requests:
+            delay = max(delay, self._requests.wait_for(1, now))
+        if self._tokens and ticket.est_tokens:
+            delay = max(delay, self._tokens.wait_for(ticket.est_tokens, now))
+        return delay
+
+    # ---------- Public API ----------
+
+    def acquire(self, key: str, est_tokens: int = 0, timeout: Optional[float] = None,
+                on_wait: Optional[Callable[[int, float], None]] = None, cancel=None) -> SchedulerTicket:
+        """
+        Block until this turn may call the provider.
+
+        Args:
+            key: Fairness key (participant or session id)
+            est_tokens: Estimated prompt + completion tokens
+            timeout: Max seconds to wait (defaults to max_queue_wait)
+            on_wait: Optional callback(position, waited_seconds) called about twice a
+                     second while queued (outside the scheduler lock)
+            cancel: Optional cancellation token; a cancelled turn leaves the queue
+
+        Returns:
+            Admitted ticket; pass it to release()
+        """
+        timeout = self.max_queue_wait if timeout is None else float(timeout)
+        ticket = SchedulerTicket(key or "anonymous", int(est_tokens or 0), self._clock())
+        deadline = ticket.enqueued_at + timeout
+        last_notice = None
+        self._cond.acquire()
+        try:
+            self._enqueue(ticket)
+            while True:
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                now = self._clock()
+                delay = self._admission_delay(ticket, now) if self._is_head(ticket) else None
+                if delay == 0.0:
+                    break
+                if now >= deadline:
+                    self._timeouts += 1
+                    raise SchedulerTimeout(f"No LLM slot after {timeout:g}s ({self._queue_depth()} queued)")
+                if on_wait and (last_notice is None or now - last_notice >= 0.5):
+                    last_notice = now
+                    position, waited = self._position(ticket), now - ticket.enqueued_at
+                    self._cond.release()
+                    try:
+                        on_wait(position, waited)
+                    except Exception:
+                        pass
+                    finally:
+                        self._cond.acquire()
+                    continue
+                self._cond.wait(min(0.5, deadline - now, delay if delay is not None else 0.5))
+
+            # Admit
+            self._dequeue(ticket)
+            ticket.admitted_at = self._clock()
+            self._in_flight += 1
+            self._admitted += 1
+            self._waits.append(ticket.wait_seconds)
+            if self._requests:
+                self._requests.take(1)
+            if self._tokens and ticket.est_tokens:
+                self._tokens.take(ticket.est_tokens)
+            return ticket
+        except BaseException:
+            self._dequeue(ticket)
+            raise
+        finally:
+            # Another waiter may now be at the head of the queue
+            self._cond.notify_all()
+            self._cond.release()
+
+    def release(self, ticket: SchedulerTicket, used_tokens: Optional[int] = None):
+        """
+        Return the slot of an admitted ticket.
+
+        Args:
+            ticket: Ticket from acquire()
+            used_tokens: Actual tokens used, to correct the estimate (optional)
+        """
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            if self._tokens and used_tokens is not None:
+                # Refund (or charge) the difference between estimate and actual usage
+                self._tokens.level = min(self._tokens.capacity,
+                                         self._tokens.level + ticket.est_tokens - int(used_tokens))
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, key: str, est_tokens: int = 0, on_wait: Optional[Callable[[int, float], None]] = None):
+        """Context manager around acquire()/release()."""
+        ticket = self.acquire(key, est_tokens, on_wait=on_wait)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def observe_headers(self, headers: Optional[Mapping[str, str]]):
+        """
+        Learn limits from provider rate-limit headers.
+
+        Reads x-ratelimit-{limit,remaining,reset}-{requests,tokens}.
+        """
+        if not headers:
+            return
+
+        def _num(name):
+            try:
+                value = headers.get(name)
+                return float(value) if value is not None else None
+            except (TypeError, ValueError):
+                return None
+
+        with self._cond:
+            now = self._clock()
+            for kind, bucket_attr in (("requests", "_requests"), ("tokens", "_tokens")):
+                limit = _num(f"x-ratelimit-limit-{kind}")
+                remaining = _num(f"x-ratelimit-remaining-{kind}")
+                if limit is None and remaining is None:
+                    continue
+                bucket = getattr(self, bucket_attr)
+                if bucket is None and limit:
+                    bucket = _TokenBucket(limit, now)
+                    setattr(self, bucket_attr, bucket)
+                if bucket is not None:
+                    bucket.sync(limit, remaining, now)
+                if remaining is not None and remaining <= 0:
+                    reset = parse_reset(headers.get(f"x-ratelimit-reset-{kind}"))
+                    if reset:
+                        self._paused_until = max(self._paused_until, now + reset)
+            self._cond.notify_all()
+
+    def note_rate_limited(self, retry_after: Optional[float] = None):
+        """Pause admissions after a 429 (Retry-After seconds, default 1s)."""
+        with self._cond:
+            self._rate_limited += 1
+            pause = retry_after if retry_after and retry_after > 0 else 1.0
+            self._paused_until = max(self._paused_until, self._clock() + pause)
+
+    def _queue_depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def queue_depth(self) -> int:
+        """Number of turns waiting for a slot."""
+        with self._cond:
+            return self._queue_depth()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get scheduler state and wait-time statistics.
+
+        Returns:
+            Dictionary with in_flight, queued, admitted, timeouts, rate_limited,
+            paused_for, and wait p50/p95/max in seconds
+        """
+        with self._cond:
+            waits = sorted(self._waits)
+            now = self._clock()
+
+            def _pct(p):
+                if not waits:
+                    return 0.0
+                return waits[min(len(waits) - 1, int(round(p * (len(waits) - 1))))]
+
+            return {
+                'in_flight': self._in_flight,
+                'queued': self._queue_depth(),
+                'max_concurrency': self.max_concurrency,
+                'admitted': self._admitted,
+                'timeouts': self._timeouts,
+                'rate_limited': self._rate_limited,
+                'paused_for': round(max(0.0, self._paused_until - now), 3),
+                'wait_p50': round(_pct(0.50), 4),
+                'wait_p95': round(_pct(0.95), 4),
+                'wait_max': round(waits[-1], 4) if waits else 0.0,
+            }
+
+
+# ---- Process-wide instance -----------------------------------------------------
+
+_SCHEDULER: Optional[LLMScheduler] = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def get_scheduler(cfg: Optional[dict] = None) -> Optional[LLMScheduler]:
+    """
+    Return the process-wide scheduler, creating it from `api.scheduler` on first use.
+
+    Returns:
+        LLMScheduler, or None when the section sets enabled: false
+    """
+    global _SCHEDULER
+    cfg = cfg or {}
+    if not cfg.get("enabled", True):
+        return None
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = LLMScheduler(
+                max_concurrency=int(cfg.get("max_concurrency", 16)),
+                requests_per_minute=cfg.get("requests_per_minute"),
+                tokens_per_minute=cfg.get("tokens_per_minute"),
+                max_queue_wait=float(cfg.get("max_queue_wait", 60)),
+            )
+        return _SCHEDULER
@@ -0,0 +1,386 @@
+"""
+Load Generator
+Headless virtual participants driving the same turn path as src/app.py.
+
+Each virtual participant goes through what a real one does, minus Streamlit:
+consent (BotManager.create_new_session + create_participant), then per turn
+the pipelined crisis check -> streamed reply -> background message writes
+(TurnPipeline), then completion (mark_participant_completed + end_session).
+All participants share one database manager, bot manager and pipeline, as the
+sessions of one app replica share the process-wide scheduler, write lanes and
+connection pool.
+
+Messages are seeker posts sampled from docs/emotional-reactions-reddit-kb2.csv
+and the human turns of the counselling parquet file; a small share can be
+replaced by crisis phrasing so the crisis reply and flag writes are exercised.
+
+The report covers throughput, p50/p95/p99 latencies (first token, reply,
+turn including writes), database time and error rates; render_html() turns it
+into a standalone page.
+
+Usage:
+    generator = LoadGenerator(config, db_manager, participants=200, concurrency=50, turns=10)
+    report = generator.run()
+    report['latency_ms']['turn_with_writes']['p95']
+"""
+
+import csv
+import html
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+try:
+    from src.chatbot.bot_manager import BotManager
+    from src.chatbot.turn_pipeline import StageTimings, TurnPipeline
+    from src.database.query_stats import STATEMENT_SECONDS
+    from src.utils.structured_logging import get_logger
+except Exception:
+    from bot_manager import BotManager
+    from turn_pipeline import StageTimings, TurnPipeline
+    from query_stats import STATEMENT_SECONDS
+    from structured_logging import get_logger
+
+log = get_logger("loadtest")
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+SEEKER_POSTS_CSV = os.path.join(PROJECT_ROOT, "docs", "emotional-reactions-reddit-kb2.csv")
+COUNSELLING_PARQUET = os.path.join(PROJECT_ROOT, "docs", "train-00000-of-00001-01391a60ef5c00d9.parquet")
+
+# Mixed into sampled posts at crisis_rate (matches safety.crisis_keywords)
+CRISIS_MESSAGES = (
+    "Honestly I just want to die.",
+    "Some days I think everyone would be better off dead without me.",
+    "I keep thinking about suicide.",
+)
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, Optional[float]]:
+    """p50 / p95 / p99 / max / mean of `values` (None when empty)."""
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None, 'mean': None, 'count': 0}
+    ordered = sorted(values)
+    out = {f"p{int(q * 100)}": round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+           for q in PERCENTILES}
+    out['max'] = round(ordered[-1], 1)
+    out['mean'] = round(sum(ordered) / len(ordered), 1)
+    out['count'] = len(ordered)
+    return out
+
+
+class PromptSampler:
+    """Participant messages sampled (with a fixed seed) from the bundled seeker-post corpora."""
+
+    def __init__(self, csv_path: Optional[str] = SEEKER_POSTS_CSV, parquet_path: Optional[str] = COUNSELLING_PARQUET,
+                 crisis_rate: float = 0.0, seed: int = 0, max_chars: int = 600):
+        """
+        Args:
+            csv_path: CSV with a seeker_post column (None to skip)
+            parquet_path: Parquet with "<HUMAN>: ... <ASSISTANT>: ..." text rows (None to skip;
+                skipped with a warning if pandas cannot read parquet)
+            crisis_rate: Share of messages replaced by crisis phrasing
+            seed: Random seed; the same seed yields the same messages
+            max_chars: Longer posts are cut to this many characters (chat input size)
+        """
+        self.crisis_rate = float(crisis_rate)
+        self.max_chars = int(max_chars)
+        self.posts: List[str] = []
+        if csv_path:
+            self.posts.extend(self._load_csv(csv_path))
+        if parquet_path:
+            self.posts.extend(self._load_parquet(parquet_path))
+        if not self.posts:
+            raise ValueError("No seeker posts found to sample from")
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _load_csv(self, path: str) -> List[str]:
+        with open(path, newline="", encoding="utf-8") as f:
+            return [row["seeker_post"].strip() for row in csv.DictReader(f) if (row.get("seeker_post") or "").strip()]
+
+    def _load_parquet(self, path: str) -> List[str]:
+        try:
+            import pandas as pd
+            frame = pd.read_parquet(path)
+        except Exception as e:
+            log.warning("Skipping %s: %s", path, e)
+            return []
+        posts = []
+        for text in frame["text"].dropna():
+            human = str(text).split("<ASSISTANT>:", 1)[0].replace("<HUMAN>:", "").strip()
+            if human:
+                posts.append(human)
+        return posts
+
+    def messages(self, count: int) -> List[str]:
+        """`count` messages for one participant."""
+        with self._lock:
+            out = []
+            for _ in range(count):
+                if self.crisis_rate and self._rng.random() < self.crisis_rate:
+                    out.append(self._rng.choice(CRISIS_MESSAGES))
+                else:
+                    out.append(self._rng.choice(self.posts)[:self.max_chars])
+            return out
+
+
+class VirtualParticipant:
+    """One participant's visit: consent, `turns` messages with think time, completion."""
+
+    def __init__(self, db_manager, bot_manager, pipeline: TurnPipeline, messages: List[str],
+                 think_time: Callable[[], float] = lambda: 0.0, write_timeout: float = 60.0,
+                 prolific_id: Optional[str] = None, delays: Optional[Sequence[float]] = None,
+                 complete: bool = True):
+        """
+        Args:
+            db_manager: DatabaseManager the visit writes to
+            bot_manager: BotManager (sessions, crisis check, streaming)
+            pipeline: TurnPipeline running each turn
+            messages: Messages to send, in order
+            think_time: Seconds to wait after each reply (ignored when `delays` is given)
+            write_timeout: Seconds to wait for a turn's background writes
+            prolific_id: Optional external ID stored on the participant
+            delays: Seconds to wait before each message (index 0: after consent), e.g. from a trace
+            complete: Finish the conversation after the last message; False leaves like an early exit
+        """
+        self.db = db_manager
+        self.bot_manager = bot_manager
+        self.pipeline = pipeline
+        self.messages = messages
+        self.think_time = think_time
+        self.delays = delays
+        self.complete = complete
+        self.write_timeout = write_timeout
+        self.prolific_id = prolific_id
+        self.participant_id: Optional[str] = None
+        self.turns: List[Dict[str, Any]] = []
+        self.error: Optional[str] = None
+        self.completed = False
+
+    def run(self) -> "VirtualParticipant":
+        try:
+            # STAGE 1: consent -> session and participant row
+            session = self.bot_manager.create_new_session()
+            self.participant_id = session['participant_id']
+            self.db.create_participant(self.participant_id, session['bot_type'], prolific_id=self.prolific_id)
+
+            # STAGE 3: conversation
+            for message_num, text in enumerate(self.messages, 1):
+                if self.delays is not None:
+                    pause = self.delays[message_num - 1] if message_num <= len(self.delays) else 0.0
+                else:
+                    pause = self.think_time() if message_num > 1 else 0.0
+                if pause > 0:
+                    time.sleep(pause)
+                self.turns.append(self._turn(session['session_id'], message_num, text))
+
+            # STAGE 2: completion (an early exit just stops sending; the session expires)
+            if self.complete:
+                self.db.mark_participant_completed(self.participant_id)
+                self.bot_manager.end_session(session['session_id'], completed=True)
+            self.completed = True
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            log.warning("Virtual participant %s failed: %s", self.participant_id, self.error)
+        return self
+
+    def _turn(self, session_id: str, message_num: int, text: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        record: Dict[str, Any] = {'message_num': message_num, 'error': None}
+        turn = self.pipeline.begin(session_id, self.participant_id, message_num, text)
+        try:
+            "".join(turn.stream())
+            record['reply_ms'] = (time.perf_counter() - started) * 1000.0
+            turn.wait(self.write_timeout)
+        except Exception as e:
+            # The app shows an error and lets the participant resend; the visit continues
+            record['error'] = type(e).__name__
+        record['turn_ms'] = (time.perf_counter() - started) * 1000.0
+        record['crisis'] = turn.crisis_detected
+        # Retries exhausted: the participant saw BotManager's error reply
+        record['failed'] = bool((turn.call_meta or {}).get('failed'))
+        record['write_errors'] = len(turn.errors)
+        record['timings'] = dict(turn.timings)
+        return record
+
+
+class LoadGenerator:
+    """Runs virtual participants concurrently against one app stack and summarises the run."""
+
+    def __init__(self, config: dict, db_manager, participants: int = 50, concurrency: int = 10,
+                 turns: Optional[int] = None, think_time: float = 0.0, ramp_up: float = 0.0,
+                 sampler: Optional[PromptSampler] = None, seed: int = 0):
+        """
+        Args:
+            config: App configuration (as loaded by app.load_config; api.base_url set to the stub)
+            db_manager: DatabaseManager (SQLite file or Postgres) the run writes to
+            participants: Virtual participants in total
+            concurrency: Participants in conversation at the same time
+            turns: Messages per participant (default conversation.max_messages)
+            think_time: Mean seconds between a reply and the next message (exponential)
+            ramp_up: Seconds over which participant starts are spread
+            sampler: Message source (default PromptSampler(seed=seed))
+            seed: Random seed for think times and the default sampler
+        """
+        self.config = config
+        self.db = db_manager
+        self.participants = max(1, int(participants))
+        self.concurrency = max(1, int(concurrency))
+        self.turns = int(turns or ((config.get("conversation") or {}).get("max_messages") or 10))
+        self.think_time = float(think_time)
+        self.ramp_up = float(ramp_up)
+        self.sampler = sampler or PromptSampler(seed=seed)
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+        # Same components as app.initialize_app, shared by every virtual participant
+        self.bot_manager = BotManager(self.db, config)
+        self.pipeline = TurnPipeline.from_config(config, self.db, self.bot_manager)
+        self.pipeline.timings = StageTimings(window=self.participants * self.turns)
+
+    def _think(self) -> float:
+        if self.think_time <= 0:
+            return 0.0
+        with self._rng_lock:
+            return self._rng.expovariate(1.0 / self.think_time)
+
+    def _participant(self, index: int, started: float) -> VirtualParticipant:
+        if self.ramp_up > 0:
+            delay = started + self.ramp_up * index / self.participants - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        visitor = VirtualParticipant(self.db, self.bot_manager, self.pipeline, self.sampler.messages(self.turns),
+                                     think_time=self._think)
+        return visitor.run()
+
+    def run(self) -> Dict[str, Any]:
+        """Run every participant to completion and return the report."""
+        db_before = STATEMENT_SECONDS.snapshot()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="virtual-participant") as pool:
+            visitors = list(pool.map(lambda i: self._participant(i, started), range(self.participants)))
+        self.pipeline.lanes.drain(timeout=60)
+        seconds = time.perf_counter() - started
+        db_after = STATEMENT_SECONDS.snapshot()
+        report = self.summarise(visitors, seconds, db_before, db_after)
+        log.info("Load run: %d participants, %d turns in %.1fs (%.2f turns/s), p95 turn %.0f ms",
+                 report['participants'], report['turns'], seconds, report['throughput']['turns_per_second'],
+                 report['latency_ms']['turn_with_writes']['p95'] or 0, extra={"loadtest": report['throughput']})
+        return report
+
+    def summarise(self, visitors: List[VirtualParticipant], seconds: float, db_before=None,
+                  db_after=None) -> Dict[str, Any]:
+        turns = [t for v in visitors for t in v.turns]
+        timings = [t['timings'] for t in turns]
+
+        def stage(name: str) -> Dict[str, Optional[float]]:
+            return percentiles([t[name] for t in timings if t.get(name) is not None])
+
+        statements = (db_after.count if db_after else 0) - (db_before.count if db_before else 0)
+        statement_s = (db_after.sum if db_after else 0.0) - (db_before.sum if db_before else 0.0)
+        failed = sum(1 for t in turns if t['failed'])
+        turn_errors = sum(1 for t in turns if t['error'])
+        write_errors = sum(t['write_errors'] for t in turns)
+        by_type: Dict[str, int] = {}
+        for t in turns:
+            if t['error']:
+                by_type[t['error']] = by_type.get(t['error'], 0) + 1
+        for v in visitors:
+            if v.error:
+                key = v.error.split(":", 1)[0]
+                by_type[key] = by_type.get(key, 0) + 1
+        return {
+            'settings': {
+                'participants': self.participants, 'concurrency': self.concurrency, 'turns': self.turns,
+                'think_time': self.think_time, 'ramp_up': self.ramp_up, 'crisis_rate': self.sampler.crisis_rate,
+                'database': self.db.engine.url.render_as_string(hide_password=True),
+            },
+            'participants': len(visitors),
+            'completed': sum(1 for v in visitors if v.completed),
+            'turns': len(turns),
+            'crisis_turns': sum(1 for t in turns if t['crisis']),
+            'seconds': round(seconds, 3),
+            'throughput': {
+                'turns_per_second': round(len(turns) / seconds, 2) if seconds else 0.0,
+                'participants_per_minute': round(60.0 * len(visitors) / seconds, 1) if seconds else 0.0,
+            },
+            'latency_ms': {
+                'first_token': stage('first_token'),
+                'reply': percentiles([t['reply_ms'] for t in turns if 'reply_ms' in t]),
+                'turn_with_writes': percentiles([t['turn_ms'] for t in turns]),
+                'crisis_check': stage('crisis_check'),
+            },
+            'db': {
+                'statements': statements,
+                'statement_seconds': round(statement_s, 3),
+                'statements_per_turn': round(statements / len(turns), 1) if turns else 0.0,
+                'user_write_ms': stage('user_write'),
+                'bot_write_ms': stage('bot_write'),
+                'write_queue_ms': percentiles([t[k] for t in timings for k in ('user_write_wait', 'bot_write_wait')
+                                               if t.get(k) is not None]),
+            },
+            'errors': {
+                'model_failures': failed,
+                'turn_errors': turn_errors,
+                'write_errors': write_errors,
+                'participants_failed': sum(1 for v in visitors if v.error),
+                'error_rate': round((failed + turn_errors) / len(turns), 4) if turns else 0.0,
+                'by_type': by_type,
+            },
+            # Process-wide admission control and connection pool state at the end of the run
+            'scheduler': self.bot_manager.scheduler.stats() if self.bot_manager.scheduler is not None else None,
+            'pool': self.db.engine.pool.status(),
+        }
+
+
+def render_html(report: Dict[str, Any], title: str = "Chat turn load test") -> str:
+    """Standalone HTML page (no external assets) for a LoadGenerator report."""
+
+    def cell(value) -> str:
+        return "–" if value is None else html.escape(str(value))
+
+    def table(rows: Dict[str, Dict[str, Any]], heading: str) -> str:
+        columns = ("p50", "p95", "p99", "max", "mean", "count")
+        head = "".join(f"<th>{c}</th>" for c in columns)
+        body = "".join(
+            f"<tr><td>{html.escape(name)}</td>" + "".join(f"<td>{cell(stats.get(c))}</td>" for c in columns) + "</tr>"
+            for name, stats in rows.items()
+        )
+        return f"<h2>{html.escape(heading)}</h2><table><tr><th></th>{head}</tr>{body}</table>"
+
+    def pairs(values: Dict[str, Any], heading: str) -> str:
+        body = "".join(f"<tr><td>{html.escape(str(k))}</td><td>{cell(v)}</td></tr>" for k, v in values.items()
+                       if not isinstance(v, dict))
+        return f"<h2>{html.escape(heading)}</h2><table>{body}</table>"
+
+    db = report['db']
+    summary = {
+        'participants (completed)': f"{report['participants']} ({report['completed']})",
+        'turns': report['turns'], 'crisis turns': report['crisis_turns'], 'seconds': report['seconds'],
+        **report['throughput'],
+    }
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{html.escape(title)}</title>
+<style>
+body {{ font-family: -apple-system, Segoe UI, sans-serif; margin: 2em; color: #222; }}
+table {{ border-collapse: collapse; margin-bottom: 1.5em; }}
+td, th {{ border: 1px solid #ccc; padding: 4px 10px; text-align: right; }}
+td:first-child {{ text-align: left; }}
+</style></head><body>
+<h1>{html.escape(title)}</h1>
+{pairs(report['settings'], "Settings")}
+{pairs(summary, "Throughput")}
+{table(report['latency_ms'], "Latency (ms)")}
+{table({k: v for k, v in db.items() if isinstance(v, dict)}, "Database (ms)")}
+{pairs(db, "Database statements")}
+{pairs(report['errors'], "Errors")}
+{pairs(report['errors']['by_type'], "Errors by type") if report['errors']['by_type'] else ""}
+{pairs(report['scheduler'], "LLM scheduler") if report.get('scheduler') else ""}
+<p>Connection pool: {cell(report.get('pool'))}</p>
+</body></html>
+"""
@@ -0,0 +1,389 @@
+"""
+LLM Providers
+Provider clients and latency-aware routing between them.
+
+- Provider: one OpenAI-compatible chat endpoint with its own model, API key and
+  circuit breaker. OpenAI, Gemini (`/v1beta/openai/`) and Anthropic (`/v1/`) all
+  expose one, as does scripts/llm_stub.py
+- ProviderHealth: rolling error rate and time-to-first-token per provider,
+  shared process-wide (get_health) like the circuit breakers, so the history
+  outlives the router that BotManager rebuilds on every rerun
+- ProviderRouter: ordered provider list per bot type; providers that are failing
+  or breach the TTFT SLO are tried last, and failover stays within one modality
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from statistics import median
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    from src.chatbot.llm_scheduler import SchedulerTimeout
+    from src.chatbot.resilience import CircuitOpenError, get_breaker, is_retryable
+except Exception:
+    from llm_scheduler import SchedulerTimeout
+    from resilience import CircuitOpenError, get_breaker, is_retryable
+
+try:
+    from src.utils import tracing
+    from src.utils.structured_logging import get_logger
+except Exception:
+    import tracing
+    from structured_logging import get_logger
+
+log = get_logger("providers")
+
+
+class Provider:
+    """One OpenAI-compatible chat completions endpoint."""
+
+    def __init__(self, name: str, model: str, base_url: Optional[str] = None,
+                 api_key_env: str = "OPENAI_API_KEY", modality: str = "chat",
+                 breaker_cfg: Optional[dict] = None):
+        """
+        Args:
+            name: Provider name used in routes, logs and the circuit breaker
+            model: Model name sent with each request
+            base_url: API base URL (None uses the OpenAI default)
+            api_key_env: Environment variable (or Streamlit secret) holding the key
+            modality: Failover only moves between providers of the same modality
+            breaker_cfg: circuit_breaker settings (failure_threshold, reset_timeout)
+        """
+        self.name = name
+        self.model = model
+        self.base_url = base_url or None
+        self.api_key_env = api_key_env
+        self.modality = modality
+        self.breaker = get_breaker(name, breaker_cfg)
+        self._api_key: Optional[str] = None
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def init_client(self):
+        """
+        Resolve the API key; raises RuntimeError if it is missing.
+
+        The SDK client is created on first use (see `client`) or by warm_up(), so
+        startup does not pay for importing the SDK (about a second on a cold start).
+        """
+        api_key = os.getenv(self.api_key_env)
+        if not api_key:
+            # Fallback to Streamlit secrets when running on Streamlit Cloud
+            try:
+                import streamlit as st  # type: ignore
+                api_key = st.secrets.get(self.api_key_env) if hasattr(st, "secrets") else None
+            except Exception:
+                api_key = None
+        if not api_key:
+            raise RuntimeError(f"Failed to init {self.name} client: {self.api_key_env} not set")
+        self._api_key = api_key
+
+    @property
+    def client(self):
+        """SDK client, created once on first access (raises RuntimeError if it cannot be)."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+
+    @client.setter
+    def client(self, value):
+        self._client = value
+
+    @property
+    def ready(self) -> bool:
+        """True once the SDK client exists."""
+        return self._client is not None
+
+    def _create_client(self):
+        if self._api_key is None:
+            self.init_client()
+        try:
+            from openai import OpenAI
+            # Connect / TLS / time-to-first-byte events for the current trace span
+            try:
+                from openai import DefaultHttpxClient
+                http_client = DefaultHttpxClient(event_hooks=tracing.httpx_event_hooks())
+            except ImportError:
+                http_client = None
+            # The SDK's own retries are disabled; RetryPolicy owns retry behaviour
+            return OpenAI(api_key=self._api_key, base_url=self.base_url, max_retries=0,
+                          http_client=http_client)
+        except Exception as e:
+            raise RuntimeError(f"Failed to init {self.name} client: {e}")
+
+    def __repr__(self):
+        return f"<Provider({self.name}, model={self.model})>"
+
+
+class ProviderHealth:
+    """Rolling window of call outcomes for one provider."""
+
+    def __init__(self, window: int = 50):
+        self._outcomes = deque(maxlen=max(1, int(window)))  # True/False per attempt
+        self._ttfts = deque(maxlen=max(1, int(window)))  # Seconds, successful streams only
+        self._lock = threading.Lock()
+
+    def record(self, ok: bool, ttft: Optional[float] = None):
+        with self._lock:
+            self._outcomes.append(bool(ok))
+            if ok and ttft is not None:
+                self._ttfts.append(float(ttft))
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        with self._lock:
+            outcomes, ttfts = list(self._outcomes), list(self._ttfts)
+        return {
+            'samples': len(outcomes),
+            'error_rate': (outcomes.count(False) / len(outcomes)) if outcomes else 0.0,
+            'ttft_p50': median(ttfts) if ttfts else None,
+        }
+
+
+_HEALTH: Dict[str, ProviderHealth] = {}
+_HEALTH_LOCK = threading.Lock()
+
+
+def get_health(name: str, window: int = 50) -> ProviderHealth:
+    """Return the process-wide health window for a provider, creating it on first use."""
+    with _HEALTH_LOCK:
+        health = _HEALTH.get(name)
+        if health is None:
+            health = _HEALTH[name] = ProviderHealth(window)
+        return health
+
+
+class ProviderRouter:
+    """
+    Chooses a provider per attempt.
+
+    Routes map bot type to an ordered list of provider names (`default` is used
+    for unlisted bot types). Within a turn, providers not yet tried come first,
+    so retries fail over instead of hammering the same endpoint.
+    """
+
+    def __init__(self, providers: List[Provider], routes: Dict[str, List[str]],
+                 slo_ttft: Optional[float] = None, max_error_rate: float = 0.5,
+                 window: int = 50, min_samples: int = 5):
+        """
+        Args:
+            providers: Available providers
+            routes: bot_type -> ordered provider names; must include "default"
+            slo_ttft: Median TTFT (seconds) above which a provider is deprioritized
+            max_error_rate: Rolling error rate above which a provider is deprioritized
+            window: Attempts kept per provider for health scoring
+            min_samples: Attempts needed before health affects routing
+        """
+        self.providers: Dict[str, Provider] = {p.name: p for p in providers}
+        self.routes = {k: [n for n in v if n in self.providers] for k, v in routes.items()}
+        if not self.routes.get("default"):
+            self.routes["default"] = [p.name for p in providers]
+        self.slo_ttft = float(slo_ttft) if slo_ttft else None
+        self.max_error_rate = float(max_error_rate)
+        self.min_samples = max(1, int(min_samples))
+        self.health: Dict[str, ProviderHealth] = {p.name: get_health(p.name, window) for p in providers}
+
+    @classmethod
+    def from_config(cls, api_cfg: Optional[dict]) -> "ProviderRouter":
+        """
+        Build a router from the `api` config section.
+
+        Without `api.providers`, a single "openai" provider is built from
+        api.model / api.base_url, matching the original single-provider setup.
+        """
+        api_cfg = api_cfg or {}
+        breaker_cfg = api_cfg.get("circuit_breaker") or {}
+        providers_cfg = api_cfg.get("providers") or {
+            "openai": {"model": api_cfg.get("model", "gpt-4"), "base_url": api_cfg.get("base_url")}
+        }
+        providers = [
+            Provider(
+                name,
+                model=pcfg.get("model") or api_cfg.get("model", "gpt-4"),
+                base_url=pcfg.get("base_url"),
+                api_key_env=pcfg.get("api_key_env", "OPENAI_API_KEY"),
+                modality=pcfg.get("modality", "chat"),
+                breaker_cfg=pcfg.get("circuit_breaker") or breaker_cfg,
+            )
+            for name, pcfg in providers_cfg.items()
+        ]
+        routing = api_cfg.get("routing") or {}
+        return cls(
+            providers,
+            routes=dict(routing.get("routes") or {}),
+            slo_ttft=routing.get("slo_ttft"),
+            max_error_rate=float(routing.get("max_error_rate", 0.5)),
+            window=int(routing.get("health_window", 50)),
+            min_samples=int(routing.get("min_samples", 5)),
+        )
+
+    def init_clients(self) -> List[str]:
+        """
+        Check provider keys; providers that cannot be initialised are dropped.
+        SDK clients are created on first use, or in the background by warm_up().
+
+        Returns:
+            Names of the usable providers (raises RuntimeError if none)
+        """
+        errors = []
+        for name, provider in list(self.providers.items()):
+            try:
+                provider.init_client()
+            except Exception as e:
+                errors.append(str(e))
+                del self.providers[name]
+                log.warning("Provider '%s' unavailable: %s", name, e, extra={"provider": name})
+        if not self.providers:
+            raise RuntimeError("; ".join(errors) or "No LLM providers configured")
+        self.routes = {k: [n for n in v if n in self.providers] for k, v in self.routes.items()}
+        if not self.routes.get("default"):
+            self.routes["default"] = list(self.providers)
+        return list(self.providers)
+
+    def warm_up(self) -> Optional[threading.Thread]:
+        """
+        Create the SDK clients on a background thread, so neither startup nor the
+        first reply waits for the SDK import.
+
+        Returns:
+            The started thread, or None if every client already exists
+        """
+        pending = [p for p in self.providers.values() if not p.ready]
+        if not pending:
+            return None
+
+        def create():
+            for provider in pending:
+                try:
+                    provider.client
+                except Exception as e:
+                    # The first request retries and reports it through the usual path
+                    log.warning("Provider '%s' client warm-up failed: %s", provider.name, e,
+                                extra={"provider": provider.name})
+
+        thread = threading.Thread(target=create, name="llm-client-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def primary(self) -> Provider:
+        return self.providers[self.routes["default"][0]]
+
+    def route(self, bot_type: Optional[str]) -> List[Provider]:
+        """Configured providers for a bot type, limited to the first one's modality."""
+        names = self.routes.get(bot_type or "") or self.routes["default"]
+        providers = [self.providers[n] for n in names]
+        if not providers:
+            return []
+        modality = providers[0].modality
+        return [p for p in providers if p.modality == modality]
+
+    def unhealthy_reason(self, provider: Provider) -> Optional[str]:
+        """Why a provider is deprioritized, or None if it is healthy."""
+        snap = self.health[provider.name].snapshot()
+        if snap['samples'] < self.min_samples:
+            return None
+        if snap['error_rate'] > self.max_error_rate:
+            return f"error rate {snap['error_rate']:.0%}"
+        if self.slo_ttft and snap['ttft_p50'] is not None and snap['ttft_p50'] > self.slo_ttft:
+            return f"ttft p50 {snap['ttft_p50']:.2f}s > SLO {self.slo_ttft:g}s"
+        return None
+
+    def choose(self, bot_type: Optional[str], tried: List[str]) -> Tuple[Provider, Dict[str, object]]:
+        """
+        Pick the provider for the next attempt of a turn.
+
+        Args:
+            bot_type: Session bot type (selects the route)
+            tried: Provider names already attempted this turn
+
+        Returns:
+            (provider, decision) where decision records the provider, model and reason
+
+        Raises:
+            CircuitOpenError: Every provider on the route is failing fast
+        """
+        route = self.route(bot_type)
+        degraded = {p.name: self.unhealthy_reason(p) for p in route}
+        # Untried before tried (failover), healthy before degraded; otherwise route order
+        ordered = sorted(route, key=lambda p: (p.name in tried, degraded[p.name] is not None))
+        skipped = []
+        for provider in ordered:
+            try:
+                provider.breaker.allow()
+            except CircuitOpenError:
+                skipped.append(f"{provider.name}: circuit open")
+                continue
+            if provider.name in tried:
+                reason = "retry"
+            elif tried:
+                reason = "failover"
+            else:
+                reason = "primary" if provider is route[0] else "rerouted"
+            skipped += [f"{p.name}: {degraded[p.name]}" for p in route[:route.index(provider)]
+                        if degraded[p.name] and p.name not in tried]
+            decision = {'provider': provider.name, 'model': provider.model, 'reason': reason}
+            if skipped:
+                decision['skipped'] = skipped
+            return provider, decision
+        raise CircuitOpenError(f"All providers for '{bot_type or 'default'}' are failing fast ({', '.join(skipped)})")
+
+    # ---------- Outcome tracking ----------
+
+    def record_success(self, provider: Provider, ttft: Optional[float] = None):
+        self.health[provider.name].record(True, ttft)
+        provider.breaker.record_success()
+
+    def record_failure(self, provider: Provider, error: BaseException):
+        # Client errors (400, auth) and local queue timeouts are not the provider's fault
+        if is_retryable(error) and not isinstance(error, SchedulerTimeout):
+            self.health[provider.name].record(False)
+            provider.breaker.record_failure()
+        else:
+            provider.breaker.release_probe()
+
+    def track_stream(self, provider: Provider, tokens: Iterator[str], decision: Dict[str, object],
+                     clock=time.monotonic) -> Iterator[str]:
+        """Pass tokens through, recording TTFT and the outcome for this provider.
+
+        `tokens` must already hold its scheduler slot (see BotManager._admitted_stream):
+        the clock starts on the first read, so TTFT measures the provider, not the
+        time the turn spent queued for admission.
+        """
+        started = clock()
+        ttft = None
+        try:
+            for token in tokens:
+                if ttft is None:
+                    ttft = clock() - started
+                    decision['ttft'] = round(ttft, 3)
+                yield token
+        except GeneratorExit:
+            # Caller stopped early; only a delivered token counts as success
+            if ttft is not None:
+                self.record_success(provider, ttft)
+            else:
+                provider.breaker.release_probe()
+            raise
+        except Exception as e:
+            decision['error'] = f"{type(e).__name__}: {e}"[:200]
+            self.record_failure(provider, e)
+            raise
+        finally:
+            close = getattr(tokens, "close", None)
+            if close:
+                close()
+        self.record_success(provider, ttft)
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        """Health, circuit state and routing status per provider."""
+        out = {}
+        for name, provider in self.providers.items():
+            snap = self.health[name].snapshot()
+            snap['circuit'] = provider.breaker.state
+            snap['deprioritized'] = self.unhealthy_reason(provider)
+            out[name] = snap
+        return out
@@ -0,0 +1,300 @@
+"""
+Resilient LLM Calls
+Retry, deadline and circuit-breaker policy for BotManager's model calls.
+
+- Per-attempt deadlines: connect, time-to-first-token / stall (HTTP read timeout)
+  and total (api.timeout)
+- Jittered exponential backoff on retryable errors, up to api.retry_attempts retries
+- Circuit breaker per provider: after repeated failures calls fail fast until a
+  cool-down probe succeeds
+- Mid-stream failures resume from the text already delivered instead of restarting
+"""
+
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the provider while its circuit is open."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """An attempt ran past its total deadline."""
+
+
+class IncompleteStreamError(ConnectionError):
+    """The provider closed a stream before sending a finish reason."""
+
+
+# Error class names (anywhere in the MRO) that indicate a transient transport problem.
+# Matched by name so both the OpenAI SDK and raw HTTP client errors are covered.
+_TRANSIENT_ERROR_NAMES = {
+    "APIConnectionError", "APITimeoutError", "TransportError", "TimeoutException",
+    "NetworkError", "ProtocolError", "RemoteProtocolError", "ReadError", "ConnectError",
+}
+_RETRYABLE_STATUS = {408, 409, 425, 429}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """True for timeouts, connection drops, 408/409/425/429 and 5xx responses."""
+    if isinstance(error, CircuitOpenError):
+        return False
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return int(status) in _RETRYABLE_STATUS or int(status) >= 500
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in _TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0,
+                  rng: Optional[random.Random] = None) -> float:
+    """
+    Full-jitter exponential backoff.
+
+    Args:
+        attempt: Retry number (1 for the first retry)
+        base: Base delay in seconds
+        cap: Maximum delay in seconds
+
+    Returns:
+        Seconds to sleep, uniform in [0, min(cap, base * 2**(attempt-1))]
+    """
+    upper = min(cap, base * (2 ** max(0, attempt - 1)))
+    return (rng or random).uniform(0, upper)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed -> open after `failure_threshold` failures; open -> half-open after
+    `reset_timeout` seconds; one successful probe closes it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may proceed."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+            raise CircuitOpenError(f"Provider '{self.name}' circuit open; failing fast")
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """Give back a half-open probe that ended without a verdict."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probe_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probe_in_flight:
+                    self.trips += 1
+                self._opened_at = self._clock()
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                'state': self._state(),
+                'consecutive_failures': self._failures,
+                'trips': self.trips,
+                'rejected': self.rejected,
+            }
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(name: str, cfg: Optional[dict] = None) -> CircuitBreaker:
+    """Return the process-wide breaker for a provider, creating it on first use."""
+    cfg = cfg or {}
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(name)
+        if breaker is None:
+            breaker = _BREAKERS[name] = CircuitBreaker(
+                name,
+                failure_threshold=int(cfg.get("failure_threshold", 5)),
+                reset_timeout=float(cfg.get("reset_timeout", 30)),
+            )
+        return breaker
+
+
+class RetryPolicy:
+    """Retry and deadline settings, read from the `api` config section."""
+
+    def __init__(self, retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 total_timeout: float = 30.0, connect_timeout: float = 5.0,
+                 ttft_timeout: float = 10.0, sleep: Callable[[float], None] = time.sleep):
+        self.retries = max(0, int(retries))
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self.total_timeout = float(total_timeout)
+        self.connect_timeout = float(connect_timeout)
+        self.ttft_timeout = float(ttft_timeout)
+        self.sleep = sleep
+
+    @classmethod
+    def from_config(cls, api_cfg: Optional[dict]) -> "RetryPolicy":
+        api_cfg = api_cfg or {}
+        return cls(
+            retries=int(api_cfg.get("retry_attempts", 3)),
+            backoff_base=float(api_cfg.get("retry_backoff_base", 0.5)),
+            backoff_max=float(api_cfg.get("retry_backoff_max", 8.0)),
+            total_timeout=float(api_cfg.get("timeout", 30)),
+            connect_timeout=float(api_cfg.get("connect_timeout", 5)),
+            ttft_timeout=float(api_cfg.get("ttft_timeout", 10)),
+        )
+
+    def http_timeout(self):
+        """
+        Per-attempt HTTP timeout for the provider SDK.
+
+        The read timeout bounds both time to first token and stalls between chunks.
+        """
+        try:
+            from openai import Timeout
+        except Exception:
+            return self.total_timeout
+        return Timeout(self.total_timeout, connect=self.connect_timeout,
+                       read=min(self.ttft_timeout, self.total_timeout))
+
+    def backoff(self, attempt: int) -> float:
+        return backoff_delay(attempt, self.backoff_base, self.backoff_max)
+
+
+def call_with_retries(call: Callable[[], object], policy: RetryPolicy,
+                      breaker: Optional[CircuitBreaker] = None,
+                      on_retry: Optional[Callable[[int, BaseException], None]] = None):
+    """
+    Run a non-streaming call with retries, backoff and circuit breaking.
+
+    Returns:
+        The call's result; re-raises the last error when retries are exhausted
+    """
+    attempt = 0
+    while True:
+        if breaker:
+            breaker.allow()
+        try:
+            result = call()
+        except Exception as e:
+            retryable = is_retryable(e)
+            if breaker and retryable:
+                breaker.record_failure()
+            attempt += 1
+            if not retryable or attempt > policy.retries:
+                raise
+            if on_retry:
+                on_retry(attempt, e)
+            policy.sleep(policy.backoff(attempt))
+            continue
+        if breaker:
+            breaker.record_success()
+        return result
+
+
+def resilient_stream(start: Callable[[str], Iterator[str]], policy: RetryPolicy,
+                     breaker: Optional[CircuitBreaker] = None,
+                     on_retry: Optional[Callable[[int, BaseException], None]] = None,
+                     clock: Callable[[], float] = time.monotonic) -> Iterator[str]:
+    """
+    Yield tokens from `start(prefix)`, retrying failed attempts.
+
+    `prefix` is the text already delivered to the caller ("" for a fresh attempt).
+    After a mid-stream failure the next attempt receives that text and must
+    continue from it, so nothing is delivered twice.
+
+    The total deadline starts when `start()` returns: any wait for admission
+    (LLMScheduler) must happen inside `start()` and is not charged to the attempt.
+
+    Args:
+        start: Opens one attempt and returns a token iterator
+        policy: Retry/deadline settings
+        breaker: Optional circuit breaker for the provider
+        on_retry: Optional callback(attempt, error) before each retry
+    """
+    delivered = []
+    attempt = 0
+    while True:
+        if breaker:
+            breaker.allow()
+        stream = None
+        received = False
+        try:
+            stream = start("".join(delivered))
+            started = clock()
+            for token in stream:
+                if clock() - started > policy.total_timeout:
+                    raise DeadlineExceeded(f"Attempt exceeded {policy.total_timeout:g}s total deadline")
+                received = True
+                delivered.append(token)
+                yield token
+        except GeneratorExit:
+            # Caller stopped early (word cap, cancellation); not a provider failure
+            if breaker:
+                if received:
+                    breaker.record_success()
+                else:
+                    breaker.release_probe()
+            raise
+        except Exception as e:
+            retryable = is_retryable(e)
+            if breaker and retryable:
+                breaker.record_failure()
+            attempt += 1
+            if not retryable or attempt > policy.retries:
+                raise
+            if on_retry:
+                on_retry(attempt, e)
+            policy.sleep(policy.backoff(attempt))
+            continue
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                try:
+                    close()
+                except Exception:
+                    pass
+        if breaker:
+            breaker.record_success()
+        return
@@ -0,0 +1,196 @@
+"""
+Text Normalizer
+Maps a message once into a canonical form for keyword matching, keeping
+original offsets.
+
+Steps (each can be switched off):
+- Unicode NFKC, zero-width/format characters dropped, accents stripped
+- Confusable folding: curly quotes and dashes, Cyrillic/Greek look-alikes
+- Case folding
+- Leetspeak folding inside words ("k1ll", "$uicide"; "988" is left alone)
+- Whitespace and hyphen runs collapsed to one space ("want-to-die")
+- Optional light stemming ("suicidal", "suicides" -> "suicid")
+
+Keywords go through the same normalizer, so one canonical keyword covers its
+variants and the per-message cost does not grow with variant coverage.
+
+Usage:
+    normalizer = TextNormalizer(stemming=True)
+    norm = normalizer.normalize("I want  to   d1e")
+    norm.text                    # "i want to die"
+    norm.original_span(10, 13)   # (13, 16) -> "d1e" in the original
+"""
+
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+
+# Look-alikes NFKC leaves in place (Cyrillic/Greek letters, typographic punctuation)
+CONFUSABLES = {
+    "‘": "'", "’": "'", "‚": "'", "‛": "'", "′": "'", "´": "'", "`": "'",
+    "“": '"', "”": '"', "„": '"', "″": '"',
+    "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-", "―": "-", "−": "-",
+    "а": "a", "е": "e", "о": "o", "р": "p", "с": "c", "у": "y",
+    "х": "x", "і": "i", "ј": "j", "ѕ": "s", "һ": "h", "ԁ": "d",
+    "α": "a", "ο": "o", "ι": "i", "κ": "k", "ν": "v", "ρ": "p",
+    "τ": "t", "υ": "u", "ı": "i",
+}
+
+# Leetspeak substitutions, applied only inside words that contain a letter
+LEET = {
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b",
+    "@": "a", "$": "s", "!": "i", "|": "l", "+": "t",
+}
+
+# Light suffix stripping; the first suffix leaving STEM_MIN_LENGTH characters wins
+STEM_SUFFIXES = ("ingly", "edly", "ally", "ing", "ed", "al", "es", "s", "e")
+STEM_MIN_LENGTH = 4
+
+
+class NormalizedText:
+    """Canonical text plus, per canonical character, its [start, end) span in the original."""
+
+    __slots__ = ("text", "starts", "ends")
+
+    def __init__(self, text: str, starts: List[int], ends: List[int]):
+        self.text = text
+        self.starts = starts
+        self.ends = ends
+
+    def original_span(self, start: int, end: int) -> Tuple[int, int]:
+        """Original [start, end) covering canonical characters [start, end)."""
+        return self.starts[start], self.ends[end - 1]
+
+
+class TextNormalizer:
+    """Canonicalises messages and keywords for matching."""
+
+    def __init__(self, confusables: bool = True, leetspeak: bool = True,
+                 collapse_whitespace: bool = True, stemming: bool = False):
+        """
+        Args:
+            confusables: NFKC, drop zero-width characters, strip accents, fold look-alikes
+            leetspeak: Fold digits/symbols inside words ("k1ll" -> "kill")
+            collapse_whitespace: Any run of whitespace/hyphens becomes one space
+            stemming: Strip common suffixes so inflections match
+        """
+        self.confusables = confusables
+        self.leetspeak = leetspeak
+        self.collapse_whitespace = collapse_whitespace
+        self.stemming = stemming
+        self._cache: Dict[str, str] = {}
+
+    @classmethod
+    def from_config(cls, cfg: Optional[dict]) -> Optional["TextNormalizer"]:
+        """Build from `safety.normalization`; None when disabled (plain case-insensitive matching)."""
+        cfg = cfg or {}
+        if not cfg.get("enabled", False):
+            return None
+        return cls(
+            confusables=bool(cfg.get("confusables", True)),
+            leetspeak=bool(cfg.get("leetspeak", True)),
+            collapse_whitespace=bool(cfg.get("collapse_whitespace", True)),
+            stemming=bool(cfg.get("stemming", False)),
+        )
+
+    def _fold(self, ch: str) -> str:
+        """Canonical form of one character (may be empty or several characters); cached."""
+        folded = self._cache.get(ch)
+        if folded is not None:
+            return folded
+        if self.confusables:
+            parts = []
+            for c in unicodedata.normalize("NFKC", ch):
+                if unicodedata.category(c) == "Cf":
+                    continue  # zero-width joiners, soft hyphens, BOM, ...
+                c = CONFUSABLES.get(c, c)
+                parts.extend(d for d in unicodedata.normalize("NFD", c) if not unicodedata.combining(d))
+            folded = "".join(CONFUSABLES.get(c, c) for c in "".join(parts).casefold())
+        else:
+            folded = ch.casefold()
+        self._cache[ch] = folded
+        return folded
+
+    def normalize(self, text: str) -> NormalizedText:
+        """Map `text` to its canonical form."""
+        chars: List[str] = []
+        starts: List[int] = []
+        ends: List[int] = []
+        collapse = self.collapse_whitespace
+        for i, ch in enumerate(text):
+            for c in self._fold(ch):
+                if collapse and (c.isspace() or c == "-"):
+                    if chars and chars[-1] == " ":
+                        ends[-1] = i + 1
+                        continue
+                    c = " "
+                chars.append(c)
+                starts.append(i)
+                ends.append(i + 1)
+        if self.leetspeak:
+            self._fold_leetspeak(chars)
+        if self.stemming:
+            chars, starts, ends = self._stem(chars, starts, ends)
+        return NormalizedText("".join(chars), starts, ends)
+
+    def canonical(self, text: str) -> str:
+        """Canonical text only (used for keywords)."""
+        return self.normalize(text).text
+
+    @staticmethod
+    def _fold_leetspeak(chars: List[str]):
+        """
+        Replace leet characters in place within words that contain a letter.
+        Digits are always folded there; symbols only when a letter or digit
+        follows and they start the word or follow one ("$uicide", "k!ll", not "hi!!").
+        """
+        n = len(chars)
+        i = 0
+        while i < n:
+            if not (chars[i].isalnum() or chars[i] in LEET):
+                i += 1
+                continue
+            j = i
+            while j < n and (chars[j].isalnum() or chars[j] in LEET):
+                j += 1
+            if any(c.isalpha() for c in chars[i:j]):
+                for k in range(i, j):
+                    c = chars[k]
+                    if c not in LEET:
+                        continue
+                    if c.isdigit():
+                        chars[k] = LEET[c]
+                    elif (k + 1 < j and chars[k + 1].isalnum()) and (k == i or chars[k - 1].isalnum()):
+                        chars[k] = LEET[c]
+            i = j
+
+    @staticmethod
+    def _stem(chars: List[str], starts: List[int], ends: List[int]):
+        """Strip suffixes per word; a stem's last character keeps the whole word's end offset."""
+        out_chars: List[str] = []
+        out_starts: List[int] = []
+        out_ends: List[int] = []
+        n = len(chars)
+        i = 0
+        while i < n:
+            if not chars[i].isalpha():
+                out_chars.append(chars[i])
+                out_starts.append(starts[i])
+                out_ends.append(ends[i])
+                i += 1
+                continue
+            j = i
+            while j < n and chars[j].isalpha():
+                j += 1
+            word = "".join(chars[i:j])
+            keep = len(word)
+            for suffix in STEM_SUFFIXES:
+                if word.endswith(suffix) and len(word) - len(suffix) >= STEM_MIN_LENGTH:
+                    keep = len(word) - len(suffix)
+                    break
+            out_chars.extend(chars[i:i + keep])
+            out_starts.extend(starts[i:i + keep])
+            out_ends.extend(ends[i:i + keep])
+            out_ends[-1] = ends[j - 1]
+            i = j
+        return out_chars, out_starts, out_ends
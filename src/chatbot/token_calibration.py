@@ -0,0 +1,256 @@
+"""
+Token Calibration
+Derives max_tokens per bot type from observed tokens-per-word.
+
+api.max_tokens is a fixed cap while api.max_words is enforced afterwards by
+sentence-aware truncation. A cap that is too low cuts replies mid-sentence
+(finish_reason "length"); one that is too high pays for text past the word
+cap that is then thrown away. The calibrator keeps recent completed turns per
+bot type and sizes the cap so that max_words words fit for the chosen
+percentile of tokens-per-word:
+
+    max_tokens = ceil(p(tokens_per_word) * max_words * headroom)
+
+Samples are persisted to a small JSON file so calibration survives restarts
+and can be inspected offline (scripts/token_calibration_report.py). One
+calibrator per file is shared by the whole process (get_calibrator), so every
+session's turns count towards min_samples and a single writer owns the file.
+"""
+
+import atexit
+import json
+import math
+import os
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+try:
+    from src.utils.structured_logging import get_logger
+except Exception:
+    from structured_logging import get_logger
+
+log = get_logger("calibration")
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class TokenCalibrator:
+    """Rolling tokens-per-word samples per bot type, persisted as JSON."""
+
+    def __init__(self, path: Optional[str] = None, max_words: int = 150, percentile: float = 0.9,
+                 headroom: float = 1.2, min_samples: int = 30, window: int = 500,
+                 floor: int = 16, ceiling: int = 1024, save_every: int = 10):
+        """
+        Args:
+            path: JSON file holding the samples (None keeps them in memory only)
+            max_words: Word cap the derived max_tokens must fit
+            percentile: Tokens-per-word percentile used for the cap (0-1)
+            headroom: Multiplier leaving room to finish the last sentence
+            min_samples: Samples a bot type needs before its cap is derived
+            window: Samples kept per bot type
+            floor: Lowest derived max_tokens
+            ceiling: Highest derived max_tokens
+            save_every: Persist after this many new samples
+        """
+        self.path = path
+        self.max_words = max(1, int(max_words))
+        self.percentile = min(max(float(percentile), 0.0), 1.0)
+        self.headroom = max(1.0, float(headroom))
+        self.min_samples = max(1, int(min_samples))
+        self.window = max(1, int(window))
+        self.floor = max(1, int(floor))
+        self.ceiling = max(self.floor, int(ceiling))
+        self.save_every = max(1, int(save_every))
+        self._samples: Dict[str, deque] = {}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    @classmethod
+    def from_config(cls, api_cfg: Optional[dict]) -> Optional["TokenCalibrator"]:
+        """Build from api.token_calibration; returns None unless enabled."""
+        api_cfg = api_cfg or {}
+        cfg = api_cfg.get("token_calibration") or {}
+        if not cfg.get("enabled", False):
+            return None
+        return cls(
+            path=cfg.get("path") or None,
+            max_words=int(api_cfg.get("max_words", 150)),
+            percentile=float(cfg.get("percentile", 0.9)),
+            headroom=float(cfg.get("headroom", 1.2)),
+            min_samples=int(cfg.get("min_samples", 30)),
+            window=int(cfg.get("window", 500)),
+            floor=int(cfg.get("min_tokens", 16)),
+            ceiling=int(cfg.get("max_tokens", 1024)),
+        )
+
+    # ---------- Persistence ----------
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning("Token calibration file unreadable (%s): %s", self.path, e)
+            return
+        for bot_type, samples in (data.get("samples") or {}).items():
+            self._samples[bot_type] = deque((s for s in samples if s.get("words")), maxlen=self.window)
+
+    def save(self):
+        """Write samples atomically (temp file + rename)."""
+        if not self.path:
+            return
+        with self._lock:
+            data = {"max_words": self.max_words,
+                    "samples": {k: list(v) for k, v in self._samples.items()}}
+            self._unsaved = 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+    def flush(self):
+        """Save if any samples were recorded since the last save."""
+        with self._lock:
+            pending = self._unsaved
+        if pending:
+            try:
+                self.save()
+            except OSError as e:
+                log.warning("Could not save token calibration: %s", e)
+
+    # ---------- Samples ----------
+
+    def record(self, bot_type: str, tokens: int, words: int, finish_reason: Optional[str],
+               max_tokens: int):
+        """
+        Add one completed reply.
+
+        Args:
+            bot_type: Session bot type
+            tokens: Completion tokens generated (usage, or streamed chunks)
+            words: Words in the reply before word-cap truncation
+            finish_reason: Provider finish reason ("length" = cut by max_tokens),
+                           or "word_cap" when streaming stopped at the word cap
+            max_tokens: Cap the request was sent with
+        """
+        if not tokens or not words:
+            return
+        sample = {"tokens": int(tokens), "words": int(words),
+                  "finish": finish_reason or "stop", "cap": int(max_tokens)}
+        with self._lock:
+            self._samples.setdefault(bot_type, deque(maxlen=self.window)).append(sample)
+            self._unsaved += 1
+            due = self._unsaved >= self.save_every
+        if due:
+            try:
+                self.save()
+            except OSError as e:
+                log.warning("Could not save token calibration: %s", e)
+
+    def samples(self, bot_type: str) -> List[dict]:
+        with self._lock:
+            return list(self._samples.get(bot_type) or [])
+
+    # ---------- Derived caps ----------
+
+    def _derive(self, samples: List[dict]) -> int:
+        tpw = _percentile([s["tokens"] / s["words"] for s in samples], self.percentile)
+        cap = math.ceil(tpw * self.max_words * self.headroom)
+        return min(self.ceiling, max(self.floor, cap))
+
+    def max_tokens_for(self, bot_type: Optional[str], default: int) -> int:
+        """Calibrated max_tokens for a bot type, or `default` until enough samples exist."""
+        samples = self.samples(bot_type or "")
+        if len(samples) < self.min_samples:
+            return int(default)
+        return self._derive(samples)
+
+    def _needed(self, sample: dict) -> float:
+        """Tokens the reply needed to reach its natural end or the word cap."""
+        tpw = sample["tokens"] / sample["words"]
+        if sample["finish"] in ("length", "word_cap") or sample["words"] > self.max_words:
+            return tpw * self.max_words
+        return float(sample["tokens"])
+
+    def _spend(self, sample: dict) -> float:
+        """Tokens the model would generate without any cap (estimated when it was cut)."""
+        return max(float(sample["tokens"]), self._needed(sample))
+
+    def report(self, default: int) -> Dict[str, dict]:
+        """
+        Per-bot-type comparison of the configured cap and the derived one.
+
+        "before" figures are observed; "after" figures are estimated from each
+        sample's tokens-per-word.
+
+        Args:
+            default: Configured api.max_tokens
+        """
+        with self._lock:
+            by_type = {k: list(v) for k, v in self._samples.items()}
+        out = {}
+        for bot_type, samples in sorted(by_type.items()):
+            if not samples:
+                continue
+            n = len(samples)
+            tpw = [s["tokens"] / s["words"] for s in samples]
+            # What the cap would be now, even for bot types still below min_samples
+            after = self._derive(samples)
+            out[bot_type] = {
+                'samples': n,
+                'tokens_per_word_p50': round(_percentile(tpw, 0.5), 3),
+                'tokens_per_word_p95': round(_percentile(tpw, 0.95), 3),
+                'over_word_cap_rate': round(sum(1 for s in samples if s["words"] > self.max_words) / n, 3),
+                'max_tokens_before': int(default),
+                'max_tokens_after': after,
+                'truncation_rate_before': round(sum(1 for s in samples if s["finish"] == "length") / n, 3),
+                'truncation_rate_after': round(sum(1 for s in samples if self._needed(s) > after) / n, 3),
+                'avg_tokens_before': round(sum(s["tokens"] for s in samples) / n, 1),
+                'avg_tokens_after': round(sum(min(self._spend(s), after) for s in samples) / n, 1),
+            }
+        return out
+
+
+# ---- Process-wide instances ----------------------------------------------------
+
+_CALIBRATORS: Dict[Optional[str], TokenCalibrator] = {}
+_CALIBRATORS_LOCK = threading.Lock()
+
+
+def get_calibrator(api_cfg: Optional[dict] = None) -> Optional[TokenCalibrator]:
+    """
+    Return the process-wide calibrator for `api.token_calibration.path`, creating it on first use.
+
+    BotManager is built per session, so a calibrator per instance would never
+    reach min_samples or save_every, and instances would overwrite each other's file.
+
+    Returns:
+        TokenCalibrator, or None unless the section sets enabled: true
+    """
+    cfg = (api_cfg or {}).get("token_calibration") or {}
+    if not cfg.get("enabled", False):
+        return None
+    path = cfg.get("path") or None
+    with _CALIBRATORS_LOCK:
+        calibrator = _CALIBRATORS.get(path)
+        if calibrator is None:
+            calibrator = _CALIBRATORS[path] = TokenCalibrator.from_config(api_cfg)
+        return calibrator
+
+
+@atexit.register
+def flush_calibrators():
+    """Save samples recorded since each calibrator's last periodic save."""
+    with _CALIBRATORS_LOCK:
+        calibrators = list(_CALIBRATORS.values())
+    for calibrator in calibrators:
+        calibrator.flush()
@@ -0,0 +1,201 @@
+"""
+Traffic Replay
+Record real participant timing from the study database and re-drive it,
+accelerated, against the turn path.
+
+Synthetic load (load_generator.py) has steady arrivals and fixed think times;
+real waves have Prolific bursts, long pauses and people leaving early. A trace
+keeps exactly that and nothing else:
+
+- arrival: seconds from the first participant in the window
+- delays: seconds before each user message (first: after consent; later:
+  after the previous bot reply was saved), i.e. think time
+- lengths: characters per user message (the text itself is never read)
+- crisis: positions of user messages that contained crisis keywords
+- completed: False for early exits (the replayed visitor stops sending)
+
+Participant IDs, Prolific IDs, message text and absolute timestamps are not
+recorded. Traces are JSON Lines: a header line, then one line per participant.
+
+Replay runs each trace participant as a VirtualParticipant with sampled seeker
+posts (cut to the recorded length, crisis phrasing at the recorded positions),
+compressing every arrival and delay by `speed`; the report is the load
+generator's report plus how late participants started (start_lag).
+
+Usage:
+    trace = record_trace(db_manager, since=datetime(2025, 3, 1), until=datetime(2025, 4, 1))
+    save_trace(trace, "data/traces/march.jsonl")
+
+    replayer = TraceReplayer(config, test_db, load_trace("data/traces/march.jsonl"), speed=20)
+    report = replayer.run()
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+try:
+    from src.chatbot.load_generator import CRISIS_MESSAGES, LoadGenerator, PromptSampler, VirtualParticipant, percentiles
+    from src.utils.structured_logging import get_logger
+except Exception:
+    from load_generator import CRISIS_MESSAGES, LoadGenerator, PromptSampler, VirtualParticipant, percentiles
+    from structured_logging import get_logger
+
+log = get_logger("loadtest.replay")
+
+TRACE_FORMAT = "empathic-traffic-trace"
+TRACE_VERSION = 1
+
+
+def _seconds(later: Optional[datetime], earlier: Optional[datetime]) -> float:
+    if later is None or earlier is None:
+        return 0.0
+    return max(0.0, round((later - earlier).total_seconds(), 3))
+
+
+def record_trace(db_manager, since: Optional[datetime] = None, until: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Build an anonymised trace from participants (and their messages) who started in a window.
+
+    Args:
+        db_manager: DatabaseManager to read from
+        since: Earliest participant start time (inclusive)
+        until: Latest participant start time (exclusive)
+
+    Returns:
+        {"header": {...}, "participants": [...]} ordered by arrival
+    """
+    participants, messages = db_manager.get_participant_timelines(since, until)
+    by_participant: Dict[str, List[tuple]] = {}
+    for row in messages:
+        by_participant.setdefault(row[0], []).append(row)
+
+    origin = participants[0][2] if participants else None
+    entries = []
+    for participant_id, bot_type, start_time, end_time, completed in participants:
+        rows = by_participant.get(participant_id, [])
+        bot_saved = {num: ts for _, num, sender, ts, _, _ in rows if sender == 'bot'}
+        users = [r for r in rows if r[2] == 'user']
+        delays, lengths, crisis = [], [], []
+        previous = start_time
+        for i, (_, num, _, ts, length, flagged) in enumerate(users):
+            delays.append(_seconds(ts, previous))
+            lengths.append(int(length or 0))
+            if flagged:
+                crisis.append(i)
+            # Think time runs from the reply the participant read (or their own message if none was saved)
+            reply = bot_saved.get(num)
+            previous = reply if reply is not None and ts is not None and reply >= ts else ts
+        entries.append({
+            'arrival': _seconds(start_time, origin),
+            'bot_type': bot_type,
+            'delays': delays,
+            'lengths': lengths,
+            'crisis': crisis,
+            'completed': bool(completed),
+        })
+
+    last = max((e['arrival'] + sum(e['delays']) for e in entries), default=0.0)
+    header = {
+        'format': TRACE_FORMAT,
+        'version': TRACE_VERSION,
+        'participants': len(entries),
+        'messages': sum(len(e['delays']) for e in entries),
+        'early_exits': sum(1 for e in entries if not e['completed']),
+        'duration': round(last, 3),
+    }
+    return {'header': header, 'participants': entries}
+
+
+def save_trace(trace: Dict[str, Any], path: str):
+    """Write a trace as JSON Lines (header first)."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(trace['header']) + "\n")
+        for entry in trace['participants']:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+
+def load_trace(path: str) -> Dict[str, Any]:
+    """
+    Read a trace written by save_trace().
+
+    Raises:
+        ValueError: If the file is not a trace or has an unsupported version
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line for line in f if line.strip()]
+    header = json.loads(lines[0]) if lines else {}
+    if header.get('format') != TRACE_FORMAT:
+        raise ValueError(f"{path} is not a traffic trace")
+    if header.get('version') != TRACE_VERSION:
+        raise ValueError(f"Unsupported trace version {header.get('version')} in {path}")
+    participants = sorted((json.loads(line) for line in lines[1:]), key=lambda e: e['arrival'])
+    return {'header': header, 'participants': participants}
+
+
+class TraceReplayer(LoadGenerator):
+    """Re-drives a recorded trace against the turn path, `speed` times faster than recorded."""
+
+    def __init__(self, config: dict, db_manager, trace: Dict[str, Any], speed: float = 1.0,
+                 max_threads: int = 256, sampler: Optional[PromptSampler] = None, seed: int = 0):
+        """
+        Args:
+            config: App configuration (api.base_url pointing at a stub)
+            db_manager: DatabaseManager the replay writes to (not the production database)
+            trace: Result of record_trace() / load_trace()
+            speed: Time compression (1 = as recorded, 50 = fifty times faster)
+            max_threads: Visitors in flight at once; beyond this, arrivals start late (see start_lag)
+            sampler: Message source (default PromptSampler(seed=seed), no random crisis messages)
+            seed: Random seed for the default sampler
+        """
+        if not trace.get('participants'):
+            raise ValueError("Trace has no participants to replay")
+        self.trace = trace
+        self.entries: List[Dict[str, Any]] = trace['participants']
+        self.speed = max(0.01, float(speed))
+        self.start_lags: List[float] = []
+        turns = max((len(e['delays']) for e in self.entries), default=1)
+        super().__init__(config, db_manager, participants=len(self.entries), concurrency=max_threads,
+                         turns=max(1, turns), sampler=sampler or PromptSampler(seed=seed), seed=seed)
+
+    def _messages(self, entry: Dict[str, Any]) -> List[str]:
+        messages = self.sampler.messages(len(entry['delays']))
+        crisis = set(entry.get('crisis') or ())
+        out = []
+        for i, (text, length) in enumerate(zip(messages, entry.get('lengths') or [0] * len(messages))):
+            if i in crisis:
+                out.append(CRISIS_MESSAGES[i % len(CRISIS_MESSAGES)])
+            else:
+                out.append(text[:length] if length else text)
+        return out
+
+    def _participant(self, index: int, started: float) -> VirtualParticipant:
+        entry = self.entries[index]
+        due = started + entry['arrival'] / self.speed
+        wait = due - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        self.start_lags.append(max(0.0, time.perf_counter() - due) * 1000.0)
+        visitor = VirtualParticipant(self.db, self.bot_manager, self.pipeline, self._messages(entry),
+                                     delays=[d / self.speed for d in entry['delays']],
+                                     complete=entry.get('completed', True))
+        return visitor.run()
+
+    def summarise(self, visitors: List[VirtualParticipant], seconds: float, db_before=None,
+                  db_after=None) -> Dict[str, Any]:
+        report = super().summarise(visitors, seconds, db_before, db_after)
+        header = self.trace.get('header') or {}
+        report['settings'].update({
+            'speed': self.speed,
+            'trace_duration': header.get('duration'),
+            'replay_duration_target': round((header.get('duration') or 0.0) / self.speed, 3),
+            'early_exits': header.get('early_exits'),
+        })
+        # A replay that cannot keep the recorded schedule understates the peak
+        report['latency_ms']['start_lag'] = percentiles(self.start_lags)
+        return report
@@ -0,0 +1,370 @@
+"""
+Turn Pipeline
+Runs one participant turn with database writes taken off the critical path.
+
+Sequential flow:  save user msg -> crisis check -> stream reply -> save bot msg
+Pipelined flow:   crisis check -> stream reply           (participant waits)
+                         \\-> save user msg -> save bot msg (background lane)
+
+- The user-message write starts right after the local crisis check and runs
+  while the reply streams
+- The bot-message write is queued once the reply is complete, behind the user
+  message, so the UI never waits for it
+- Writes for one participant go through a single FIFO lane, so message order
+  (and message_num) is exactly as in the sequential flow; different participants
+  use different lanes and write in parallel
+- Per-stage timings are kept for every turn so the saving is measurable, and
+  each turn's latency and token usage is written to the turn_metrics table
+  once both messages are saved
+- Each turn is one `chat.turn` trace span, ended once both messages are saved;
+  lane writes run under it, so both message rows carry the turn's trace id
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import closing
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    from src.utils import tracing
+    from src.utils.structured_logging import get_logger
+except Exception:
+    import tracing
+    from structured_logging import get_logger
+
+log = get_logger("turn_pipeline")
+
+
+class WriteLanes:
+    """Striped single-threaded writers; jobs with the same key run in submission order."""
+
+    def __init__(self, lanes: int = 4):
+        self.lane_count = max(1, int(lanes))
+        self._queues: List["queue.Queue"] = [queue.Queue() for _ in range(self.lane_count)]
+        for i, q in enumerate(self._queues):
+            threading.Thread(target=self._work, args=(q,), name=f"turn-writer-{i}", daemon=True).start()
+
+    @staticmethod
+    def _work(q: "queue.Queue"):
+        while True:
+            future, fn = q.get()
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn())
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                q.task_done()
+
+    def submit(self, key: str, fn: Callable[[], object]) -> Future:
+        """Queue `fn` on the lane for `key`; returns a Future for its result."""
+        future: Future = Future()
+        self._queues[hash(key) % self.lane_count].put((future, fn))
+        return future
+
+    def pending(self) -> int:
+        return sum(q.unfinished_tasks for q in self._queues)
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued write has run; returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+
+class StageTimings:
+    """Rolling per-stage timings (milliseconds) across recent turns."""
+
+    def __init__(self, window: int = 500):
+        self._turns = deque(maxlen=max(1, int(window)))
+        self._lock = threading.Lock()
+
+    def record(self, timings: Dict[str, float]):
+        with self._lock:
+            self._turns.append(dict(timings))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """p50 / p95 / count per stage."""
+        with self._lock:
+            turns = list(self._turns)
+        stages: Dict[str, List[float]] = {}
+        for t in turns:
+            for stage, ms in t.items():
+                stages.setdefault(stage, []).append(ms)
+        out = {}
+        for stage, values in stages.items():
+            values.sort()
+            out[stage] = {
+                'p50': round(values[len(values) // 2], 1),
+                'p95': round(values[min(len(values) - 1, int(0.95 * len(values)))], 1),
+                'count': len(values),
+            }
+        return out
+
+
+_LANES: Optional[WriteLanes] = None
+_LANES_LOCK = threading.Lock()
+TURN_TIMINGS = StageTimings()
+
+
+def get_write_lanes(lanes: int = 4) -> WriteLanes:
+    """Return the process-wide write lanes (Streamlit reruns rebuild the pipeline, not the lanes)."""
+    global _LANES
+    with _LANES_LOCK:
+        if _LANES is None:
+            _LANES = WriteLanes(lanes)
+        return _LANES
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000.0, 1)
+
+
+class Turn:
+    """One participant turn: crisis result, streamed reply, pending writes and timings."""
+
+    def __init__(self, pipeline: "TurnPipeline", session_id: str, participant_id: str,
+                 message_num: int, user_message: str):
+        self.pipeline = pipeline
+        self.session_id = session_id
+        self.participant_id = participant_id
+        self.message_num = message_num
+        self.user_message = user_message
+        self.crisis_detected = False
+        self.detected_keyword: Optional[str] = None
+        self.detected_keywords: List[str] = []
+        self._crisis_text: Optional[str] = None
+        self.response = ""
+        self.call_meta: Optional[Dict[str, Any]] = None
+        self.started_at = datetime.utcnow()
+        self.timings: Dict[str, float] = {}
+        self.errors: List[BaseException] = []
+        self._started = time.perf_counter()
+        self._user_write: Optional[Future] = None
+        self._bot_write: Optional[Future] = None
+        self._lock = threading.Lock()
+        self._recorded = False
+        self.span = tracing.start_span("chat.turn", participant_id=participant_id, message_num=message_num)
+
+    @property
+    def trace_id(self) -> Optional[str]:
+        return self.span.trace_id
+
+    def _write(self, stage: str, fn: Callable[[], object]):
+        """Queue a DB write on this participant's lane, timing queue wait + execution."""
+        queued = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            try:
+                # Lane threads do not inherit the caller's context
+                with tracing.use_span(self.span):
+                    return fn()
+            finally:
+                self.timings[f"{stage}_wait"] = _ms(started - queued)
+                self.timings[stage] = _ms(time.perf_counter() - started)
+
+        future = self.pipeline.lanes.submit(self.participant_id, job)
+        # Publish before adding the callback, which may run immediately
+        setattr(self, f"_{stage}", future)
+        future.add_done_callback(self._on_write_done)
+
+    def _on_write_done(self, future: Future):
+        error = future.exception()
+        if error is not None:
+            self.errors.append(error)
+            log.error("Background write failed for %s #%s: %s", self.participant_id, self.message_num, error,
+                      extra={"participant_id": self.participant_id, "message_num": self.message_num})
+        with self._lock:
+            if self._recorded or not self.persisted:
+                return
+            self._recorded = True
+        self.timings['total_with_writes'] = _ms(time.perf_counter() - self._started)
+        self.pipeline.timings.record(self.timings)
+        self._end_span()
+        if self.pipeline.record_metrics:
+            self.pipeline.lanes.submit(self.participant_id, self._save_metrics)
+
+    def metrics(self) -> Dict[str, Any]:
+        """turn_metrics columns for this turn (timings in ms from the turn start)."""
+        meta = self.call_meta or {}
+        saved = self._bot_write.result() if self._bot_write is not None and not self._bot_write.exception() else None
+        return {
+            'message_id': getattr(saved, 'id', None),
+            'provider': meta.get('provider'),
+            'model': meta.get('model'),
+            'retries': max(0, len(meta.get('route') or ()) - 1),
+            'finish_reason': meta.get('finish_reason'),
+            'crisis': self.crisis_detected,
+            'request_start': self.started_at,
+            'ttft_ms': self.timings.get('first_token'),
+            'stream_ms': self.timings.get('reply_complete', self.timings.get('first_token')),
+            'total_ms': self.timings.get('total_with_writes'),
+            'user_write_ms': self.timings.get('user_write'),
+            'bot_write_ms': self.timings.get('bot_write'),
+            'prompt_tokens': meta.get('prompt_tokens'),
+            'completion_tokens': meta.get('completion_tokens'),
+            'cached_tokens': meta.get('cached_tokens'),
+        }
+
+    def _save_metrics(self):
+        with tracing.use_span(self.span):
+            return self.pipeline.db.save_turn_metrics(self.participant_id, self.message_num, self.metrics())
+
+    def _end_span(self):
+        self.span.set_attribute("crisis", self.crisis_detected)
+        self.span.set_attribute("provider", (self.call_meta or {}).get('provider'))
+        for stage, ms in self.timings.items():
+            self.span.set_attribute(f"timing.{stage}_ms", ms)
+        if self.errors:
+            self.span.record_error(self.errors[0])
+        self.span.end()
+
+    def stream(self, on_wait=None) -> Iterator[str]:
+        """
+        Yield the reply (crisis text or streamed model output).
+
+        The bot-message write is queued when the reply completes; it is not
+        queued if the caller stops consuming early or the turn is cancelled.
+
+        Args:
+            on_wait: Passed to BotManager.stream_bot_response (queue position callback)
+        """
+        bot = self.pipeline.bot_manager
+        if self.crisis_detected:
+            self.response = self._crisis_text or ""
+            self.timings['first_token'] = _ms(time.perf_counter() - self._started)
+            self._write("bot_write", self._save_crisis_reply)
+            yield self.response
+            return
+
+        chunks = []
+        complete = False
+        try:
+            # Closing this generator closes the model stream too (see BotManager.cancel_turn)
+            with closing(bot.stream_bot_response(self.session_id, self.user_message, on_wait=on_wait)) as reply:
+                while True:
+                    # The turn span is current while the next chunk is produced, not across yields
+                    with tracing.use_span(self.span):
+                        chunk = next(reply, None)
+                    if chunk is None:
+                        break
+                    if not chunks:
+                        self.timings['first_token'] = _ms(time.perf_counter() - self._started)
+                    chunks.append(chunk)
+                    yield chunk
+            complete = True
+        finally:
+            if not complete:
+                # Caller stopped reading; no bot write will end the span
+                self.span.set_attribute("abandoned", True)
+                self._end_span()
+        # Replayed (cassette) or reloaded sessions may carry no call metadata; only an
+        # explicit cancelled flag means the reply must not be saved
+        call_meta = bot.get_last_call(self.session_id) or {}
+        if call_meta.get("cancelled"):
+            # Cancelled mid-reply (End Conversation, expiry or a newer turn); nothing to save
+            self.span.set_attribute("cancelled", True)
+            self._end_span()
+            return
+        self.response = "".join(chunks)
+        self.call_meta = call_meta
+        self.timings['reply_complete'] = _ms(time.perf_counter() - self._started)
+        self._write("bot_write", lambda: self.pipeline.db.save_message(
+            self.participant_id, self.message_num, 'bot', self.response,
+            contains_crisis_keyword=bool(call_meta.get("crisis_keywords")), call_meta=call_meta
+        ))
+
+    def _save_crisis_reply(self):
+        db = self.pipeline.db
+        saved = db.save_message(self.participant_id, self.message_num, 'bot', self.response,
+                                contains_crisis_keyword=True)
+        msg_id = getattr(saved, 'id', None)
+        if msg_id:
+            # One flag per matched keyword so reviewers see everything that triggered
+            for keyword in self.detected_keywords or [self.detected_keyword or 'crisis']:
+                db.create_crisis_flag(
+                    participant_id=self.participant_id,
+                    message_id=msg_id,
+                    keyword_detected=str(keyword)
+                )
+        return saved
+
+    @property
+    def persisted(self) -> bool:
+        """True once both messages have been written (successfully or not)."""
+        return all(f is not None and f.done() for f in (self._user_write, self._bot_write))
+
+    def wait(self, timeout: Optional[float] = None) -> "Turn":
+        """Block until this turn's writes finish; re-raises the first write error."""
+        for future in (self._user_write, self._bot_write):
+            if future is not None:
+                future.result(timeout)
+        return self
+
+
+class TurnPipeline:
+    """
+    Starts a turn as soon as the local crisis check clears.
+
+    Usage:
+        turn = pipeline.begin(session_id, participant_id, message_num, text)
+        for chunk in turn.stream():
+            render(chunk)
+        # Writes finish in the background; turn.wait() blocks on them if needed
+    """
+
+    def __init__(self, db_manager, bot_manager, lanes: Optional[WriteLanes] = None,
+                 timings: Optional[StageTimings] = None, record_metrics: bool = True):
+        """
+        Args:
+            db_manager: DatabaseManager used for message writes
+            bot_manager: BotManager used for the crisis check and streaming
+            lanes: Writer lanes (defaults to the process-wide lanes)
+            timings: Timing sink (defaults to the process-wide TURN_TIMINGS)
+            record_metrics: Write each turn's latency and token usage to turn_metrics
+        """
+        self.db = db_manager
+        self.bot_manager = bot_manager
+        self.lanes = lanes or get_write_lanes()
+        self.timings = timings or TURN_TIMINGS
+        self.record_metrics = bool(record_metrics)
+
+    @classmethod
+    def from_config(cls, config: Optional[dict], db_manager, bot_manager) -> "TurnPipeline":
+        """Build a pipeline using conversation.turn_pipeline (write_lanes, record_metrics)."""
+        cfg = ((config or {}).get("conversation") or {}).get("turn_pipeline") or {}
+        return cls(db_manager, bot_manager, lanes=get_write_lanes(int(cfg.get("write_lanes", 4))),
+                   record_metrics=cfg.get("record_metrics", True))
+
+    def begin(self, session_id: str, participant_id: str, message_num: int, user_message: str) -> Turn:
+        """
+        Run the crisis check and queue the user-message write.
+
+        Returns:
+            Turn whose stream() yields the reply
+        """
+        turn = Turn(self, session_id, participant_id, message_num, user_message)
+        started = time.perf_counter()
+        with tracing.use_span(turn.span):
+            is_crisis, keywords, crisis_text = self.bot_manager.detect_crisis(user_message)
+        turn.timings['crisis_check'] = _ms(time.perf_counter() - started)
+        turn.crisis_detected, turn._crisis_text = bool(is_crisis), crisis_text
+        turn.detected_keywords = list(keywords)
+        turn.detected_keyword = keywords[0] if keywords else None
+        turn._write("user_write", lambda: self.db.save_message(
+            participant_id, message_num, 'user', user_message
+        ))
+        return turn
+
+    def stats(self) -> Dict[str, object]:
+        """Stage timings (p50/p95 ms) and writes still queued."""
+        return {'stages': self.timings.summary(), 'pending_writes': self.lanes.pending()}
@@ -4,14 +4,25 @@ Handles exporting conversation data from database to CSV files for research anal
 """
 
 import csv
-import pandas as pd
 from datetime import datetime
 from src.utils.timezone import fmt_az, now_az
 from typing import List, Dict
 import os
 
 from src.database.db_manager import DatabaseManager
-from src.database.models import Participant, Message, CrisisFlag
+from src.database.models import Participant, Message, CrisisFlag, TurnMetric
+from src.utils import metrics
+
+# Export run durations and failures, labelled by export function
+EXPORT_SECONDS = metrics.histogram("export_run_seconds", "CSV export duration in seconds", ["export"])
+EXPORT_ERRORS = metrics.counter("export_errors_total", "CSV exports that raised", ["export"])
+_timed = metrics.instrumented(EXPORT_SECONDS, EXPORT_ERRORS, label="export")
+
+
+def _write_csv(rows: List[Dict], filepath: str):
+    """Write export rows to CSV. pandas is imported here, not at module load, to keep app startup light."""
+    import pandas as pd
+    pd.DataFrame(rows).to_csv(filepath, index=False, encoding='utf-8')
 
 
 class CSVExporter:
@@ -20,6 +31,12 @@ class CSVExporter:
     Creates analysis-ready CSV files from conversation data.
     """
     
+    # turn_metrics columns added to bot messages in the conversation export
+    TURN_METRIC_COLUMNS = [
+        'model', 'provider', 'retries', 'finish_reason', 'ttft_ms', 'stream_ms', 'total_ms',
+        'user_write_ms', 'bot_write_ms', 'prompt_tokens', 'completion_tokens', 'cached_tokens'
+    ]
+    
     def __init__(self, db_manager: DatabaseManager):
         """
         Initialize CSV exporter with database manager.
@@ -38,10 +55,12 @@ class CSVExporter:
     # MAIN EXPORT FUNCTIONS
      
     
+    @_timed
     def export_all_conversations(self, filename: str = None) -> str:
         """
         Export all conversations to a single CSV file.
         Each row is one message with participant and bot information.
+        Bot messages also carry the turn's latency and token usage (turn_metrics).
         
         Args:
             filename: Optional custom filename. If None, generates timestamped name.
@@ -71,11 +90,15 @@ class CSVExporter:
         try:
             parts = session.query(Participant).all()
             part_map = {p.id: p for p in parts}
+            metrics_map = {
+                m.message_id: m for m in session.query(TurnMetric).filter(TurnMetric.message_id.isnot(None)).all()
+            }
         finally:
             session.close()
 
         for msg in messages:
             participant = part_map.get(msg.participant_id)
+            metric = metrics_map.get(msg.id)
             
             row = {
                 'participant_id': msg.participant_id,
@@ -87,12 +110,15 @@ class CSVExporter:
                 'contains_crisis_keyword': msg.contains_crisis_keyword,
                 'conversation_completed': participant.completed if participant else False
             }
+            # Turn metrics (bot messages only; blank otherwise)
+            for column in self.TURN_METRIC_COLUMNS:
+                value = getattr(metric, column, None) if metric else None
+                row[column] = value if value is not None else ''
             rows.append(row)
         
         # Write to CSV
         if rows:
-            df = pd.DataFrame(rows)
-            df.to_csv(filepath, index=False, encoding='utf-8')
+            _write_csv(rows, filepath)
             print(f"✓ Exported {len(rows)} messages to: {filepath}")
         else:
             print("⚠ No messages to export")
@@ -100,6 +126,7 @@ class CSVExporter:
         return filepath
     
     
+    @_timed
     def export_participant_summary(self, filename: str = None) -> str:
         """
         Export summary information about each participant.
@@ -148,8 +175,7 @@ class CSVExporter:
         
         # Write to CSV
         if rows:
-            df = pd.DataFrame(rows)
-            df.to_csv(filepath, index=False, encoding='utf-8')
+            _write_csv(rows, filepath)
             print(f"✓ Exported {len(rows)} participant summaries to: {filepath}")
         else:
             print("⚠ No participants to export")
@@ -157,6 +183,7 @@ class CSVExporter:
         return filepath
     
     
+    @_timed
     def export_crisis_flags(self, filename: str = None) -> str:
         """
         Export all crisis flag events for review.
@@ -174,21 +201,23 @@ class CSVExporter:
         
         filepath = os.path.join(self.export_dir, filename)
         
-        # Get all crisis flags
+        # Get all crisis flags with their message text in one query
         session = self.db_manager.get_session()
         try:
-            crisis_flags = session.query(CrisisFlag).all()
+            crisis_flags = (
+                session.query(CrisisFlag, Message.content)
+                .outerjoin(Message, Message.id == CrisisFlag.message_id)
+                .order_by(CrisisFlag.id)
+                .all()
+            )
             
             # Prepare data
             rows = []
-            for flag in crisis_flags:
-                # Get the message content
-                message = session.query(Message).filter_by(id=flag.message_id).first()
-                
+            for flag, content in crisis_flags:
                 row = {
                     'participant_id': flag.participant_id,
                     'message_id': flag.message_id,
-                    'message_text': message.content if message else 'N/A',
+                    'message_text': content if content is not None else 'N/A',
                     'keyword_detected': flag.keyword_detected,
                     'timestamp_az': fmt_az(flag.timestamp, "%Y-%m-%d %H:%M:%S"),
                     'reviewed': flag.reviewed,
@@ -198,8 +227,7 @@ class CSVExporter:
             
             # Write to CSV
             if rows:
-                df = pd.DataFrame(rows)
-                df.to_csv(filepath, index=False, encoding='utf-8')
+                _write_csv(rows, filepath)
                 print(f"✓ Exported {len(rows)} crisis flags to: {filepath}")
             else:
                 print("⚠ No crisis flags to export")
@@ -210,6 +238,7 @@ class CSVExporter:
         return filepath
     
     
+    @_timed
     def export_bot_comparison(self, filename: str = None) -> str:
         """
         Export data structured for comparing bot types.
@@ -228,44 +257,36 @@ class CSVExporter:
         
         filepath = os.path.join(self.export_dir, filename)
         
-        # Get statistics by bot type
+        # Get statistics by bot type (one aggregate query)
         bot_types = ['emotional', 'cognitive', 'motivational', 'neutral']
+        summary = self.db_manager.get_bot_type_summary()
         rows = []
         
         for bot_type in bot_types:
-            session = self.db_manager.get_session()
-            try:
-                # Get participants for this bot type
-                participants = session.query(Participant).filter_by(bot_type=bot_type).all()
-                
-                if not participants:
-                    continue
-                
-                # Calculate statistics
-                total_participants = len(participants)
-                completed = sum(1 for p in participants if p.completed)
-                total_messages = sum(p.total_messages for p in participants)
-                avg_messages = total_messages / total_participants if total_participants > 0 else 0
-                crisis_flagged = sum(1 for p in participants if p.crisis_flagged)
-                
-                row = {
-                    'bot_type': bot_type,
-                    'total_participants': total_participants,
-                    'completed_conversations': completed,
-                    'completion_rate': round(completed / total_participants * 100, 2) if total_participants > 0 else 0,
-                    'total_messages': total_messages,
-                    'avg_messages_per_participant': round(avg_messages, 2),
-                    'crisis_flags': crisis_flagged
-                }
-                rows.append(row)
-                
-            finally:
-                session.close()
+            stats = summary.get(bot_type)
+            if not stats or not stats['participants']:
+                continue
+            
+            # Calculate statistics
+            total_participants = stats['participants']
+            completed = stats['completed']
+            total_messages = stats['total_messages']
+            avg_messages = total_messages / total_participants if total_participants > 0 else 0
+            
+            row = {
+                'bot_type': bot_type,
+                'total_participants': total_participants,
+                'completed_conversations': completed,
+                'completion_rate': round(completed / total_participants * 100, 2) if total_participants > 0 else 0,
+                'total_messages': total_messages,
+                'avg_messages_per_participant': round(avg_messages, 2),
+                'crisis_flags': stats['crisis_flagged']
+            }
+            rows.append(row)
         
         # Write to CSV
         if rows:
-            df = pd.DataFrame(rows)
-            df.to_csv(filepath, index=False, encoding='utf-8')
+            _write_csv(rows, filepath)
             print(f"✓ Exported bot comparison data to: {filepath}")
         else:
             print("⚠ No data to export")
@@ -277,6 +298,7 @@ class CSVExporter:
     # CONVENIENCE FUNCTION
      
     
+    @_timed
     def export_all(self) -> Dict[str, str]:
         """
         Export all data types at once.
@@ -3,7 +3,7 @@ Database Models
 Defines the structure of our SQLite database tables for storing conversation data.
 """
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, Float, String, Text, DateTime, Boolean, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -81,6 +81,12 @@ class Message(Base):
     # Crisis detection
     contains_crisis_keyword = Column(Boolean, default=False)  # Does this message contain crisis keywords?
     
+    # Model call metadata for bot messages (JSON): provider, model, routing decisions, hedging
+    call_meta = Column(Text, nullable=True)
+    
+    # Trace of the turn that produced the message (W3C trace id, see src/utils/tracing.py)
+    trace_id = Column(String(32), nullable=True)
+    
     # Relationship: Many messages belong to one participant
     participant = relationship("Participant", back_populates="messages")
     
@@ -90,6 +96,49 @@ class Message(Base):
 
 
  
+# TURN METRICS TABLE
+# Latency and token usage for each bot turn
+ 
+class TurnMetric(Base):
+    """
+    Records how long one bot turn took and how many tokens it used.
+    Lets researchers compare latency and cost across bot types.
+    """
+    __tablename__ = 'turn_metrics'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    
+    # Which turn (the bot message it produced, when saved)
+    participant_id = Column(String, ForeignKey('participants.id'), nullable=False)
+    message_id = Column(Integer, ForeignKey('messages.id'), nullable=True)
+    message_num = Column(Integer, nullable=False)
+    bot_type = Column(String, nullable=True)
+    
+    # Model call
+    provider = Column(String, nullable=True)
+    model = Column(String, nullable=True)
+    retries = Column(Integer, default=0)  # Attempts after the first (retries, failovers, resumes)
+    finish_reason = Column(String, nullable=True)  # "stop", "length", ...
+    crisis = Column(Boolean, default=False)  # Scripted crisis reply (no model call)
+    
+    # Timings in milliseconds, measured from request_start
+    request_start = Column(DateTime, nullable=False)  # When the turn started (UTC)
+    ttft_ms = Column(Float, nullable=True)  # First reply token shown
+    stream_ms = Column(Float, nullable=True)  # Reply complete
+    total_ms = Column(Float, nullable=True)  # Reply complete and both messages written
+    user_write_ms = Column(Float, nullable=True)  # Database write durations
+    bot_write_ms = Column(Float, nullable=True)
+    
+    # Token usage reported by the provider
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    cached_tokens = Column(Integer, nullable=True)
+    
+    def __repr__(self):
+        return f"<TurnMetric(participant='{self.participant_id}', num={self.message_num}, ttft_ms={self.ttft_ms})>"
+
+
+ 
 # CRISIS FLAGS TABLE
 # Stores detailed information about crisis detections
  
@@ -109,7 +158,7 @@ class CrisisFlag(Base):
     
     # What triggered the flag
     keyword_detected = Column(String, nullable=False)  # Which crisis keyword was found
-    flag_type = Column(String, default="automatic")  # "automatic" or "manual" if researcher adds
+    flag_type = Column(String, default="automatic")  # "automatic", "rescan" (retroactive batch scan) or "manual" if researcher adds
     
     # When and status
     timestamp = Column(DateTime, default=datetime.utcnow)
@@ -121,6 +170,28 @@ class CrisisFlag(Base):
 
 
  
+# CHAT SESSIONS TABLE
+# Live chat state shared between app processes (see session_store.py)
+ 
+class ChatSession(Base):
+    """
+    Stores the bot type and compacted history of an in-progress chat.
+    Lets any app replica resume a session without rebuilding it from UI state.
+    """
+    __tablename__ = 'chat_sessions'
+    
+    session_id = Column(String, primary_key=True)  # BotManager session UUID
+    participant_id = Column(String, nullable=True)
+    bot_type = Column(String, nullable=False)
+    history = Column(Text, nullable=False, default="[]")  # Compact JSON: [["u", "..."], ["a", "..."]]
+    last_call = Column(Text, nullable=True)  # JSON metadata of the latest model call (BotManager.get_last_call)
+    updated_at = Column(DateTime, default=datetime.utcnow)  # Last write (used for cleanup)
+    
+    def __repr__(self):
+        return f"<ChatSession(id='{self.session_id}', bot_type='{self.bot_type}')>"
+
+
+ 
 # EXPORT METADATA TABLE (Optional)
 # Tracks when data was exported for research analysis
  
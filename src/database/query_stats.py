@@ -0,0 +1,161 @@
+"""
+Query Stats
+Statement counting, timing and slow-query logging on a SQLAlchemy engine.
+
+- Every statement is timed (db_statement_seconds) and counted
+- Statements slower than the engine's threshold are logged at WARNING on
+  `empathic.db.slow` with their (truncated) parameters
+- `count_queries()` collects the statements run by the current thread/context
+  inside a block; `query_budget()` fails when a block runs more than allowed,
+  so an N+1 pattern (one query per row) shows up as soon as it is introduced
+
+Usage:
+    with query_budget(3, "crisis flags page"):
+        dashboard.display_crisis_flags()
+"""
+
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from src.utils import metrics
+from src.utils.structured_logging import get_logger
+
+log = get_logger("db.slow")
+
+STATEMENT_SECONDS = metrics.histogram("db_statement_seconds", "SQL statement execution time in seconds")
+SLOW_STATEMENTS = metrics.counter("db_slow_statements_total", "SQL statements slower than slow_query_ms")
+
+# Characters of each bound parameter kept in slow-query logs (message text is truncated)
+MAX_PARAM_CHARS = 80
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A block ran more SQL statements than its budget."""
+
+
+class QueryLog:
+    """Statements run inside a `count_queries()` block: (sql, parameters, duration_ms)."""
+
+    def __init__(self):
+        self.statements: List[Tuple[str, object, float]] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+    def describe(self, limit: int = 20) -> str:
+        lines = [f"{ms:8.2f} ms  {' '.join(sql.split())[:160]}" for sql, _, ms in self.statements[:limit]]
+        if len(self.statements) > limit:
+            lines.append(f"... {len(self.statements) - limit} more")
+        return "\n".join(lines)
+
+
+_ACTIVE: ContextVar = ContextVar("query_logs", default=())
+_ENGINES: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _short_params(parameters) -> object:
+    if isinstance(parameters, dict):
+        return {k: _short(v) for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            # executemany: first row only
+            return [_short_params(parameters[0]), f"... {len(parameters)} rows"]
+        return [_short(v) for v in parameters]
+    return _short(parameters)
+
+
+def _short(value) -> object:
+    if isinstance(value, str) and len(value) > MAX_PARAM_CHARS:
+        return value[:MAX_PARAM_CHARS] + "…"
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)[:MAX_PARAM_CHARS]
+
+
+def instrument_engine(engine, slow_query_ms: Optional[float] = None):
+    """
+    Attach timing/counting listeners to `engine` (once; later calls update the threshold).
+
+    Args:
+        engine: SQLAlchemy Engine
+        slow_query_ms: Log statements at or above this duration (None or 0 disables)
+    """
+    settings = _ENGINES.get(engine)
+    if settings is not None:
+        if slow_query_ms is not None:
+            settings['slow_ms'] = slow_query_ms
+        return
+    settings = _ENGINES[engine] = {'slow_ms': slow_query_ms}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("_query_started")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        STATEMENT_SECONDS.observe(elapsed)
+        ms = elapsed * 1000.0
+        for query_log in _ACTIVE.get():
+            query_log.statements.append((statement, parameters, ms))
+        slow_ms = settings['slow_ms']
+        if slow_ms and ms >= slow_ms:
+            SLOW_STATEMENTS.inc()
+            log.warning("Slow query (%.1f ms): %s", ms, " ".join(statement.split())[:500],
+                        extra={"duration_ms": round(ms, 2), "statement": statement[:2000],
+                               "params": repr(_short_params(parameters)), "executemany": executemany})
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        conn = context.connection
+        started = conn.info.get("_query_started") if conn is not None else None
+        if started:
+            started.pop()
+
+
+@contextmanager
+def count_queries(engine=None) -> Iterator[QueryLog]:
+    """
+    Collect the statements run by this thread/context inside the block.
+
+    Args:
+        engine: Engine (or DatabaseManager) to instrument if it is not already
+    """
+    if engine is not None:
+        instrument_engine(getattr(engine, "engine", engine))
+    query_log = QueryLog()
+    token = _ACTIVE.set(_ACTIVE.get() + (query_log,))
+    try:
+        yield query_log
+    finally:
+        _ACTIVE.reset(token)
+
+
+@contextmanager
+def query_budget(max_queries: int, label: str = "block", engine=None) -> Iterator[QueryLog]:
+    """
+    Fail with QueryBudgetExceeded if the block runs more than `max_queries` statements.
+
+    Args:
+        max_queries: Statements allowed
+        label: Name used in the failure message
+        engine: Engine (or DatabaseManager) to instrument if it is not already
+    """
+    with count_queries(engine) as query_log:
+        yield query_log
+    if query_log.count > max_queries:
+        raise QueryBudgetExceeded(
+            f"{label} ran {query_log.count} queries (budget {max_queries}):\n{query_log.describe()}"
+        )
@@ -0,0 +1,276 @@
+"""
+Session Store
+Persists live chat sessions (bot_type, compacted history and the latest call
+metadata) outside the process.
+
+BotManager keeps a bounded in-memory cache of sessions; a SessionStore sits behind
+it so sessions survive Streamlit reruns and can be served by any replica:
+- InMemorySessionStore: process-wide dict (single replica, survives reruns)
+- SQLiteSessionStore / PostgresSessionStore: `chat_sessions` table in the study DB
+
+Sessions idle for longer than conversation.session_timeout are purged on a
+schedule (purge_if_due, run by BotManager after session writes), so abandoned
+sessions do not accumulate in the table.
+"""
+
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import delete, inspect, select, text
+
+from src.database.models import ChatSession
+
+
+# Compact role codes used in stored history
+_ROLE_CODES = {"user": "u", "assistant": "a", "system": "s"}
+_CODE_ROLES = {v: k for k, v in _ROLE_CODES.items()}
+
+
+def compact_history(history: List[Dict[str, str]]) -> str:
+    """Serialize chat history as compact JSON: [["u", "..."], ["a", "..."]]."""
+    rows = [[_ROLE_CODES.get(m.get("role"), m.get("role")), m.get("content") or ""] for m in history or []]
+    return json.dumps(rows, separators=(",", ":"), ensure_ascii=False)
+
+
+def _dump_call(last_call: Optional[Dict[str, Any]]) -> Optional[str]:
+    if last_call is None:
+        return None
+    return json.dumps(last_call, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _load_call(data: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not data:
+        return None
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+def expand_history(data: Optional[str]) -> List[Dict[str, str]]:
+    """Inverse of compact_history()."""
+    if not data:
+        return []
+    try:
+        rows = json.loads(data)
+    except ValueError:
+        return []
+    return [{"role": _CODE_ROLES.get(code, code), "content": content} for code, content in rows]
+
+
+# Next scheduled purge per store location (process-wide; stores are rebuilt on every rerun)
+_NEXT_PURGE: Dict[str, float] = {}
+_PURGE_LOCK = threading.Lock()
+
+
+class SessionStore:
+    """
+    Interface for external session persistence.
+
+    Sessions are plain dicts: {"participant_id", "bot_type", "history", "last_call"}.
+    """
+
+    # Storage the instance writes to; instances with the same location share one purge schedule
+    location = "store"
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored session or None."""
+        raise NotImplementedError
+
+    def save(self, session_id: str, participant_id: Optional[str], bot_type: str,
+             history: List[Dict[str, str]], last_call: Optional[Dict[str, Any]] = None) -> None:
+        """Insert or replace a session."""
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        """Remove a session (no error if missing)."""
+        raise NotImplementedError
+
+    def purge_older_than(self, seconds: float) -> int:
+        """Delete sessions not written for `seconds`; returns number removed."""
+        return 0
+
+    def purge_if_due(self, seconds: float, interval: float, clock: Callable[[], float] = time.monotonic) -> int:
+        """
+        Run purge_older_than(seconds) if `interval` has passed since this location was last purged.
+
+        The first call in a process purges right away (sessions left by a previous run).
+
+        Returns:
+            Number of sessions removed (0 when no purge was due)
+        """
+        now = clock()
+        with _PURGE_LOCK:
+            due = _NEXT_PURGE.get(self.location)
+            if due is not None and now < due:
+                return 0
+            _NEXT_PURGE[self.location] = now + interval
+        return self.purge_older_than(seconds)
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-wide store; survives Streamlit reruns but not restarts or other replicas."""
+
+    _shared: Dict[str, Dict[str, Any]] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, shared: bool = True):
+        """
+        Args:
+            shared: Use the process-wide dict (True) or a private one (tests)
+        """
+        if shared:
+            self._data, self._lock = InMemorySessionStore._shared, InMemorySessionStore._shared_lock
+            self.location = "memory"
+        else:
+            self._data, self._lock = {}, threading.Lock()
+            self.location = f"memory:{id(self)}"
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._data.get(session_id)
+        if row is None:
+            return None
+        return {
+            "participant_id": row["participant_id"],
+            "bot_type": row["bot_type"],
+            "history": expand_history(row["history"]),
+            "last_call": _load_call(row.get("last_call")),
+        }
+
+    def save(self, session_id: str, participant_id: Optional[str], bot_type: str,
+             history: List[Dict[str, str]], last_call: Optional[Dict[str, Any]] = None) -> None:
+        row = {
+            "participant_id": participant_id,
+            "bot_type": bot_type,
+            "history": compact_history(history),
+            "last_call": _dump_call(last_call),
+            "updated_at": datetime.utcnow(),
+        }
+        with self._lock:
+            self._data[session_id] = row
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._data.pop(session_id, None)
+
+    def purge_older_than(self, seconds: float) -> int:
+        cutoff = datetime.utcnow() - timedelta(seconds=seconds)
+        with self._lock:
+            stale = [k for k, v in self._data.items() if v["updated_at"] < cutoff]
+            for k in stale:
+                del self._data[k]
+        return len(stale)
+
+
+class SQLSessionStore(SessionStore):
+    """Stores sessions in the `chat_sessions` table using a dialect-specific upsert."""
+
+    def __init__(self, engine):
+        """
+        Args:
+            engine: SQLAlchemy engine of the study database
+        """
+        self.engine = engine
+        self.location = str(engine.url)
+        ChatSession.__table__.create(engine, checkfirst=True)
+        # Tables created before last_call was stored (nullable, additive)
+        if 'last_call' not in {c['name'] for c in inspect(engine).get_columns('chat_sessions')}:
+            with engine.begin() as conn:
+                conn.execute(text('ALTER TABLE chat_sessions ADD COLUMN last_call TEXT'))
+
+    def _insert(self):
+        raise NotImplementedError
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        table = ChatSession.__table__
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(table.c.participant_id, table.c.bot_type, table.c.history, table.c.last_call)
+                .where(table.c.session_id == session_id)
+            ).first()
+        if row is None:
+            return None
+        return {"participant_id": row[0], "bot_type": row[1], "history": expand_history(row[2]),
+                "last_call": _load_call(row[3])}
+
+    def save(self, session_id: str, participant_id: Optional[str], bot_type: str,
+             history: List[Dict[str, str]], last_call: Optional[Dict[str, Any]] = None) -> None:
+        values = {
+            "session_id": session_id,
+            "participant_id": participant_id,
+            "bot_type": bot_type,
+            "history": compact_history(history),
+            "last_call": _dump_call(last_call),
+            "updated_at": datetime.utcnow(),
+        }
+        stmt = self._insert()(ChatSession.__table__).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["session_id"],
+            set_={k: stmt.excluded[k] for k in ("participant_id", "bot_type", "history", "last_call", "updated_at")},
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+
+    def delete(self, session_id: str) -> None:
+        table = ChatSession.__table__
+        with self.engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.session_id == session_id))
+
+    def purge_older_than(self, seconds: float) -> int:
+        table = ChatSession.__table__
+        cutoff = datetime.utcnow() - timedelta(seconds=seconds)
+        with self.engine.begin() as conn:
+            result = conn.execute(delete(table).where(table.c.updated_at < cutoff))
+        return result.rowcount or 0
+
+
+class SQLiteSessionStore(SQLSessionStore):
+    """SQLite backend (INSERT ... ON CONFLICT DO UPDATE, SQLite >= 3.24)."""
+
+    def _insert(self):
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+
+
+class PostgresSessionStore(SQLSessionStore):
+    """PostgreSQL backend (INSERT ... ON CONFLICT DO UPDATE)."""
+
+    def _insert(self):
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+
+
+def session_store_from_config(cfg: Optional[dict], db_manager=None) -> Optional[SessionStore]:
+    """
+    Build a SessionStore from the `session_store` config section.
+
+    Backends:
+        "none": no external store (sessions live only in BotManager memory)
+        "memory": process-wide in-memory store
+        "database": table in the study DB; SQLite or Postgres chosen from the engine
+        "sqlite" / "postgres": force a specific SQL backend
+
+    Returns:
+        SessionStore instance, or None for "none"
+    """
+    cfg = cfg or {}
+    backend = str(cfg.get("backend") or "none").lower()
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return InMemorySessionStore()
+
+    engine = getattr(db_manager, "engine", None)
+    if engine is None:
+        raise ValueError(f"Session store backend '{backend}' requires a database manager")
+    if backend == "database":
+        backend = "postgres" if engine.dialect.name == "postgresql" else engine.dialect.name
+    if backend == "sqlite":
+        return SQLiteSessionStore(engine)
+    if backend in ("postgres", "postgresql"):
+        return PostgresSessionStore(engine)
+    raise ValueError(f"Unsupported session store backend: {backend}")
@@ -0,0 +1,384 @@
+"""
+Synthetic Study Data
+Generates a realistic, reproducible study database for scale testing
+(exports, dashboard pages, statistics, assignment) without real participants.
+
+The rows follow what the app writes for a real participant:
+
+- participants: bot types assigned in balanced blocks, arrivals in Prolific
+  waves over the study window, Prolific IDs, completion (early exits stop
+  after a few turns and keep end_time empty), feedback for most completers
+- messages: one user and one bot message per turn, sharing message_num;
+  think times and reply latencies from log-normal distributions; user text
+  sampled from the seeker posts / counselling questions in docs/, bot text
+  from the responses; call metadata and a trace ID on bot messages
+- crisis turns: crisis phrasing from the participant, the configured crisis
+  response as the flagged bot message, one crisis flag on that message and
+  a crisis turn metric (participants often leave afterwards)
+- turn_metrics: one row per bot message (latency and token usage)
+
+Rows are written with explicit IDs in bulk: executemany on SQLite (with
+journaling relaxed for the load) and COPY on PostgreSQL. The same seed gives
+the same database. Indexes are created after the load by opening the
+database with DatabaseManager.
+
+Usage:
+    study = SyntheticStudy.from_config(config, participants=100_000, seed=7)
+    counts = study.write(engine)
+"""
+
+import csv
+import io
+import json
+import math
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from src.database.models import Base, CrisisFlag, Message, Participant, TurnMetric
+from src.utils.structured_logging import get_logger
+
+log = get_logger("db.synthetic")
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+SEEKER_POSTS_CSV = os.path.join(PROJECT_ROOT, "docs", "emotional-reactions-reddit-kb2.csv")
+COUNSELLING_PARQUET = os.path.join(PROJECT_ROOT, "docs", "train-00000-of-00001-01391a60ef5c00d9.parquet")
+CRISIS_RESPONSE = os.path.join(PROJECT_ROOT, "config", "crisis_response.txt")
+
+BOT_TYPES = ("cognitive", "emotional", "motivational", "control")
+# (participant message, keyword the detector reports); keywords match safety.crisis_keywords
+CRISIS_MESSAGES = (
+    ("Honestly I just want to die.", "want to die"),
+    ("Some days I think everyone would be better off dead without me.", "better off dead"),
+    ("I keep thinking about suicide.", "suicide"),
+    ("I don't see any reason to keep going, I want to end it all.", "end it all"),
+)
+FEEDBACK_TEXTS = (
+    "It felt supportive.", "The replies were a bit long.", "It understood what I meant.",
+    "Helpful, but it repeated itself.", "I liked the suggestions.", "Felt a little generic.",
+)
+FEEDBACK_RATINGS = (1, 2, 3, 4, 5)
+FEEDBACK_WEIGHTS = (0.05, 0.1, 0.25, 0.35, 0.25)
+
+# Insert order (parents first) and the columns written for each table
+TABLES = (
+    (Participant.__table__, ('id', 'bot_type', 'start_time', 'end_time', 'total_messages', 'completed',
+                             'crisis_flagged', 'prolific_id', 'feedback_text', 'feedback_rating',
+                             'feedback_time')),
+    (Message.__table__, ('id', 'participant_id', 'message_num', 'sender', 'content', 'timestamp',
+                         'contains_crisis_keyword', 'call_meta', 'trace_id')),
+    (TurnMetric.__table__, ('id', 'participant_id', 'message_id', 'message_num', 'bot_type', 'provider',
+                            'model', 'retries', 'finish_reason', 'crisis', 'request_start', 'ttft_ms',
+                            'stream_ms', 'total_ms', 'user_write_ms', 'bot_write_ms', 'prompt_tokens',
+                            'completion_tokens', 'cached_tokens')),
+    (CrisisFlag.__table__, ('id', 'participant_id', 'message_id', 'keyword_detected', 'flag_type',
+                            'timestamp', 'reviewed', 'notes')),
+)
+
+Batch = Dict[str, List[tuple]]
+
+
+def load_corpus(csv_path: Optional[str] = SEEKER_POSTS_CSV, parquet_path: Optional[str] = COUNSELLING_PARQUET,
+                max_chars: int = 1200) -> Tuple[List[str], List[str]]:
+    """
+    Participant-side and supporter-side texts from the bundled corpora, in file order.
+
+    Args:
+        csv_path: CSV with seeker_post / response_post columns (None to skip)
+        parquet_path: Parquet with "<HUMAN>: ... <ASSISTANT>: ..." rows (None to skip;
+            skipped with a warning if pandas cannot read parquet)
+        max_chars: Longer texts are cut to this many characters
+
+    Returns:
+        (user_texts, bot_texts)
+    """
+    users, bots = [], []
+    if csv_path:
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                seeker = (row.get("seeker_post") or "").strip()
+                response = (row.get("response_post") or "").strip()
+                if seeker:
+                    users.append(seeker[:max_chars])
+                if response:
+                    bots.append(response[:max_chars])
+    if parquet_path:
+        try:
+            import pandas as pd
+            frame = pd.read_parquet(parquet_path)
+        except Exception as e:
+            log.warning("Skipping %s: %s", parquet_path, e)
+            frame = None
+        if frame is not None:
+            for text in frame["text"].dropna():
+                human, _, assistant = str(text).partition("<ASSISTANT>:")
+                human = human.replace("<HUMAN>:", "").strip()
+                if human:
+                    users.append(human[:max_chars])
+                if assistant.strip():
+                    bots.append(assistant.strip()[:max_chars])
+    if not users or not bots:
+        raise ValueError("No corpus texts found to sample from")
+    return users, bots
+
+
+class SyntheticStudy:
+    """Seeded generator of study rows (participants, messages, turn metrics, crisis flags)."""
+
+    def __init__(self, participants: Optional[int] = None, messages: Optional[int] = None, seed: int = 0,
+                 start: datetime = datetime(2025, 3, 3, 15, 0, 0), days: int = 14, waves_per_day: int = 2,
+                 max_turns: int = 10, completion_rate: float = 0.8, crisis_rate: float = 0.004,
+                 feedback_rate: float = 0.6, bot_types: Sequence[str] = BOT_TYPES, model: str = "gpt-4o",
+                 corpus: Optional[Tuple[List[str], List[str]]] = None, crisis_text: Optional[str] = None):
+        """
+        Args:
+            participants: Number of participants (at least one of participants / messages)
+            messages: Stop at exactly this many message rows (the last conversation is cut short)
+            seed: Random seed; the same seed and settings give the same rows
+            start: Start of the study window (UTC)
+            days: Length of the study window
+            waves_per_day: Prolific batches per day; arrivals cluster after each wave opens
+            max_turns: Turns in a completed conversation (conversation.max_messages)
+            completion_rate: Share of participants who finish all turns
+            crisis_rate: Chance that a user message contains crisis phrasing
+            feedback_rate: Share of completers who leave feedback
+            bot_types: Conditions, assigned in shuffled balanced blocks
+            model: Model name recorded on bot turns
+            corpus: (user_texts, bot_texts); default load_corpus()
+            crisis_text: Bot reply in crisis turns; default config/crisis_response.txt
+        """
+        if not participants and not messages:
+            raise ValueError("Give a number of participants or messages to generate")
+        self.participants = int(participants) if participants else None
+        self.messages = int(messages) if messages else None
+        self.seed = seed
+        self.start = start
+        self.days = max(1, int(days))
+        self.waves_per_day = max(1, int(waves_per_day))
+        self.max_turns = max(1, int(max_turns))
+        self.completion_rate = float(completion_rate)
+        self.crisis_rate = float(crisis_rate)
+        self.feedback_rate = float(feedback_rate)
+        self.bot_types = tuple(bot_types)
+        self.model = model
+        self.user_texts, self.bot_texts = corpus or load_corpus()
+        if crisis_text is None:
+            try:
+                with open(CRISIS_RESPONSE, "r", encoding="utf-8") as f:
+                    crisis_text = f.read().strip()
+            except OSError:
+                crisis_text = ""
+        self.crisis_text = crisis_text or "If you're in immediate danger, please call 911 or call or text 988."
+
+    @classmethod
+    def from_config(cls, cfg: dict, **kwargs) -> "SyntheticStudy":
+        """Turn count and model from the app config (conversation.max_messages, api.model)."""
+        cfg = cfg or {}
+        kwargs.setdefault("max_turns", (cfg.get("conversation") or {}).get("max_messages", 10))
+        kwargs.setdefault("model", (cfg.get("api") or {}).get("model", "gpt-4o"))
+        return cls(**kwargs)
+
+    # ---------- Row generation ----------
+
+    def _arrivals(self, rng: random.Random, count: int) -> List[float]:
+        """Sorted arrival offsets (seconds from start): waves at random daytime hours, exponential spread."""
+        waves = []
+        for day in range(self.days):
+            for _ in range(self.waves_per_day):
+                waves.append(day * 86400 + rng.uniform(14, 26) * 3600)
+        # Most participants join within the first half hour of a wave
+        return sorted(rng.choice(waves) + min(rng.expovariate(1 / 900.0), 6 * 3600) for _ in range(count))
+
+    def batches(self, batch_messages: int = 50_000) -> Iterator[Batch]:
+        """
+        Yield rows table by table in batches of roughly `batch_messages` messages.
+
+        Rows are tuples in the column order of TABLES, keyed by table name.
+        """
+        rng = random.Random(self.seed)
+        if self.participants:
+            count = self.participants
+        else:
+            # Enough participants for the message budget, with margin (late extras are appended below)
+            per_participant = 2 * (self.completion_rate * self.max_turns + (1 - self.completion_rate) * 2.5)
+            count = int(self.messages / max(1.0, per_participant) * 1.2) + 1
+        arrivals = self._arrivals(rng, count)
+        users, bots = self.user_texts, self.bot_texts
+        n_users, n_bots = len(users), len(bots)
+        origin = self.start
+        budget = self.messages if self.messages else math.inf
+        model = self.model
+        # call_meta as save_message writes it (compact JSON), formatted without json.dumps per row
+        meta_template = (json.dumps({"provider": "openai", "model": model, "max_tokens": 160, "finish_reason": "stop"},
+                                    separators=(",", ":"))[:-1].replace("%", "%%")
+                         + ',"prompt_tokens":%d,"completion_tokens":%d,"cached_tokens":%d}')
+        block: List[str] = []
+        message_id = metric_id = flag_id = 0
+        batch: Batch = {table.name: [] for table, _ in TABLES}
+
+        def ts(seconds: float) -> str:
+            return (origin + timedelta(seconds=seconds)).isoformat(" ", "microseconds")
+
+        index = 0
+        arrival = arrivals[0]
+        while message_id < budget and (index < count or self.participants is None):
+            # Past the planned arrivals (message budget only): keep participants trickling in
+            arrival = arrivals[index] if index < count else arrival + rng.expovariate(1 / 30.0)
+            if not block:
+                block = list(self.bot_types)
+                rng.shuffle(block)
+            bot_type = block.pop()
+            pid = f"P{index + 1:08d}"
+            completed = rng.random() < self.completion_rate
+            # Early exits: a few leave right after consent, most after one to three turns
+            turns = self.max_turns if completed else min(self.max_turns - 1, int(rng.expovariate(1 / 2.5)))
+            clock = arrival + rng.uniform(20, 90)  # consent and instructions
+            crisis_flagged = False
+            taken = 0
+            prompt_tokens = 900
+            for num in range(1, turns + 1):
+                if message_id + 2 > budget:
+                    completed = False
+                    if message_id < budget:
+                        # One message left: the participant's last message got no reply
+                        message_id += 1
+                        clock += rng.lognormvariate(3.2, 0.6)
+                        batch['messages'].append((message_id, pid, num, 'user', users[int(rng.random() * n_users)],
+                                                  ts(clock), False, None, None))
+                        taken += 1
+                    break
+                clock += rng.lognormvariate(3.2, 0.6)  # think and type, median ~25 s
+                trace_id = f"{rng.getrandbits(128):032x}"
+                user_at = clock
+                crisis = rng.random() < self.crisis_rate
+                if crisis:
+                    text, keyword = CRISIS_MESSAGES[rng.randrange(len(CRISIS_MESSAGES))]
+                else:
+                    text = users[int(rng.random() * n_users)]
+                message_id += 1
+                batch['messages'].append((message_id, pid, num, 'user', text, ts(user_at), False, None, trace_id))
+                metric_id += 1
+                if crisis:
+                    # Scripted reply, no model call
+                    clock += rng.uniform(0.02, 0.2)
+                    message_id += 1
+                    batch['messages'].append((message_id, pid, num, 'bot', self.crisis_text, ts(clock), True,
+                                              None, trace_id))
+                    flag_id += 1
+                    batch['crisis_flags'].append((flag_id, pid, message_id, keyword, "automatic", ts(clock),
+                                                  rng.random() < 0.7, None))
+                    total_ms = (clock - user_at) * 1000.0
+                    batch['turn_metrics'].append((metric_id, pid, message_id, num, bot_type, None, None, 0, None,
+                                                  True, ts(user_at), None, None, round(total_ms, 1),
+                                                  round(rng.uniform(2, 12), 1), round(rng.uniform(2, 12), 1),
+                                                  None, None, None))
+                    crisis_flagged = True
+                else:
+                    ttft = rng.lognormvariate(-0.2, 0.4)  # median ~0.8 s
+                    stream = ttft + rng.uniform(1.0, 4.0)
+                    clock += stream + rng.uniform(0.003, 0.02)
+                    completion_tokens = rng.randint(40, 110)
+                    cached = (prompt_tokens // 128) * 128 if num > 1 else 0
+                    retries = 1 if rng.random() < 0.01 else 0
+                    meta = meta_template % (prompt_tokens, completion_tokens, cached)
+                    message_id += 1
+                    batch['messages'].append((message_id, pid, num, 'bot', bots[int(rng.random() * n_bots)], ts(clock),
+                                              False, meta, trace_id))
+                    batch['turn_metrics'].append((metric_id, pid, message_id, num, bot_type, "openai", model,
+                                                  retries, "stop", False, ts(user_at), round(ttft * 1000.0, 1),
+                                                  round(stream * 1000.0, 1), round((clock - user_at) * 1000.0, 1),
+                                                  round(rng.uniform(2, 12), 1), round(rng.uniform(2, 12), 1),
+                                                  prompt_tokens, completion_tokens, cached))
+                    prompt_tokens += completion_tokens + rng.randint(20, 150)
+                taken += 1
+                if crisis and not completed and rng.random() < 0.5:
+                    break
+            end_time = feedback_text = feedback_rating = feedback_time = None
+            if completed:
+                end_time = ts(clock + rng.uniform(5, 40))
+                if rng.random() < self.feedback_rate:
+                    feedback_rating = rng.choices(FEEDBACK_RATINGS, FEEDBACK_WEIGHTS)[0]
+                    feedback_text = FEEDBACK_TEXTS[rng.randrange(len(FEEDBACK_TEXTS))] if rng.random() < 0.5 else None
+                    feedback_time = ts(clock + rng.uniform(45, 240))
+            batch['participants'].append((pid, bot_type, ts(arrival), end_time, taken, completed, crisis_flagged,
+                                          f"{rng.getrandbits(96):024x}", feedback_text, feedback_rating,
+                                          feedback_time))
+            index += 1
+            if len(batch['messages']) >= batch_messages:
+                yield batch
+                batch = {table.name: [] for table, _ in TABLES}
+        if any(batch.values()):
+            yield batch
+
+    # ---------- Bulk writing ----------
+
+    def write(self, engine, batch_messages: int = 50_000,
+              progress: Optional[Callable[[Dict[str, int]], None]] = None) -> Dict[str, int]:
+        """
+        Create the tables if needed and bulk-insert the generated rows.
+
+        Args:
+            engine: SQLAlchemy engine of an empty study database
+            batch_messages: Messages per insert batch (and per commit)
+            progress: Called with the running row counts after each batch
+
+        Returns:
+            Rows written per table
+
+        Raises:
+            ValueError: If the study tables already contain rows
+        """
+        Base.metadata.create_all(engine)
+        raw = engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            for table, _ in TABLES:
+                cursor.execute(f"SELECT COUNT(*) FROM {table.name}")
+                if cursor.fetchone()[0]:
+                    raise ValueError(f"Table {table.name} is not empty; generate into a new database")
+            dialect = engine.dialect.name
+            if dialect == "sqlite":
+                # Scratch data: no rollback journal or fsync per commit during the load
+                cursor.execute("PRAGMA journal_mode=OFF")
+                cursor.execute("PRAGMA synchronous=OFF")
+            counts = {table.name: 0 for table, _ in TABLES}
+            for batch in self.batches(batch_messages):
+                for table, columns in TABLES:
+                    rows = batch[table.name]
+                    if not rows:
+                        continue
+                    if dialect == "postgresql":
+                        _copy_rows(cursor, table.name, columns, rows)
+                    else:
+                        marker = "?" if engine.dialect.paramstyle == "qmark" else "%s"
+                        cursor.executemany(
+                            f"INSERT INTO {table.name} ({', '.join(columns)}) "
+                            f"VALUES ({', '.join([marker] * len(columns))})", rows)
+                    counts[table.name] += len(rows)
+                raw.commit()
+                if progress is not None:
+                    progress(dict(counts))
+            if dialect == "postgresql":
+                # Explicit IDs bypassed the sequences; move them past the loaded rows
+                for table, _ in TABLES[1:]:
+                    cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                                   f"GREATEST(COALESCE(MAX(id), 0), 1)) FROM {table.name}")
+                raw.commit()
+            elif dialect == "sqlite":
+                cursor.execute("PRAGMA synchronous=FULL")
+                cursor.execute("PRAGMA journal_mode=DELETE")
+            cursor.close()
+        finally:
+            raw.close()
+        return counts
+
+
+def _copy_rows(cursor, table: str, columns: Sequence[str], rows: List[tuple]):
+    """COPY rows into a PostgreSQL table (psycopg2); None becomes NULL."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["\\N" if value is None else value for value in row])
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
@@ -4,16 +4,20 @@ Researcher interface for monitoring conversations, exporting data, and viewing s
 """
 
 import streamlit as st
-import pandas as pd
 from typing import Dict
 from datetime import datetime
 from src.utils.timezone import fmt_az
 
 from src.database.db_manager import DatabaseManager
-from src.database.models import Message
 from src.database.csv_exporter import CSVExporter
 
 
+def _dataframe(data):
+    """Build a table for display. pandas is imported here, not at module load, to keep app startup light."""
+    import pandas as pd
+    return pd.DataFrame(data)
+
+
 class AdminDashboard:
     """
     Researcher dashboard for monitoring and managing the research study.
@@ -44,7 +48,7 @@ class AdminDashboard:
         # Sidebar navigation
         page = st.sidebar.selectbox(
             "Navigation",
-            ["Overview", "Participants", "Data Export", "Crisis Flags", "Bot Comparison", "Feedback"]
+            ["Overview", "Participants", "Data Export", "Crisis Flags", "Bot Comparison", "Performance", "Feedback"]
         )
         
         # Display selected page
@@ -58,6 +62,8 @@ class AdminDashboard:
             self.display_crisis_flags()
         elif page == "Bot Comparison":
             self.display_bot_comparison()
+        elif page == "Performance":
+            self.display_performance()
         elif page == "Feedback":
             self.display_feedback()
     
@@ -90,7 +96,7 @@ class AdminDashboard:
         st.subheader("Participant Distribution by Bot Type")
         
         dist_data = stats.get('bot_distribution', {})
-        df_dist = pd.DataFrame({'Bot Type': list(dist_data.keys()), 'Count': list(dist_data.values())})
+        df_dist = _dataframe({'Bot Type': list(dist_data.keys()), 'Count': list(dist_data.values())})
         
         col1, col2 = st.columns([2, 1])
         
@@ -135,7 +141,7 @@ class AdminDashboard:
                 'Start Time (AZ)': fmt_az(p.start_time, "%Y-%m-%d %H:%M")
             })
         
-        df = pd.DataFrame(data)
+        df = _dataframe(data)
         
         # Display table
         st.dataframe(df, hide_index=True, use_container_width=True)
@@ -235,21 +241,19 @@ class AdminDashboard:
         
         st.warning(f"⚠ {len(unreviewed_flags)} unreviewed crisis flags")
         
+        # Message text for every flag in one query
+        contents = self.db_manager.get_message_contents([flag.message_id for flag in unreviewed_flags])
+        
         # Display each flag
         for flag in unreviewed_flags:
             with st.expander(f"Participant {flag.participant_id} - {flag.keyword_detected}"):
                 st.write(f"**Timestamp (AZ):** {fmt_az(flag.timestamp, '%Y-%m-%d %H:%M:%S')}")
                 st.write(f"**Keyword Detected:** {flag.keyword_detected}")
                 
-                # Get the message content
-                session = self.db_manager.get_session()
-                try:
-                    message = session.query(Message).filter_by(id=flag.message_id).first()
-                    if message:
-                        st.write("**Message:**")
-                        st.info(message.content)
-                finally:
-                    session.close()
+                content = contents.get(flag.message_id)
+                if content is not None:
+                    st.write("**Message:**")
+                    st.info(content)
                 
                 # Mark as reviewed
                 if st.button("Mark as Reviewed", key=f"review_{flag.id}"):
@@ -264,49 +268,33 @@ class AdminDashboard:
         """Display bot type comparison statistics."""
         st.header("Bot Type Comparison")
         
-        # Get statistics by bot type
-        stats = self.db_manager.get_statistics()
-        bot_dist = stats.get('bot_distribution', {})
-        
         # Create comparison data
         comparison_data = []
         
-        # Use dynamic bot types from DB; fallback to common list
-        try:
-            bot_types = self.db_manager.get_distinct_bot_types() or ['emotional', 'cognitive', 'motivational', 'neutral', 'control']
-        except Exception:
-            bot_types = ['emotional', 'cognitive', 'motivational', 'neutral', 'control']
+        # Per-bot-type totals in one aggregate query (bot types present in the DB, sorted)
+        summary = self.db_manager.get_bot_type_summary()
 
-        for bot_type in bot_types:
-            # Get participants for this bot type
-            session = self.db_manager.get_session()
-            try:
-                from src.database.models import Participant
-                participants = session.query(Participant).filter_by(bot_type=bot_type).all()
+        for bot_type in sorted(summary):
+            stats = summary[bot_type]
+            total = stats['participants']
+            if total:
+                completed = stats['completed']
+                avg_msgs = stats['total_messages'] / total
+                completion_pct = completed / total * 100
                 
-                if participants:
-                    total = len(participants)
-                    completed = sum(1 for p in participants if p.completed)
-                    total_msgs = sum(p.total_messages for p in participants)
-                    avg_msgs = total_msgs / total if total > 0 else 0
-                    crisis = sum(1 for p in participants if p.crisis_flagged)
-                    completion_pct = (completed/total*100) if total > 0 else 0.0
-                    
-                    comparison_data.append({
-                        'Bot Type': bot_type.capitalize(),
-                        'Participants': total,
-                        'Completed': completed,
-                        'Completion %': f"{completion_pct:.1f}",
-                        'Completion_Pct': round(completion_pct, 1),
-                        'Avg Messages': f"{avg_msgs:.1f}",
-                        'Crisis Flags': crisis
-                    })
-            finally:
-                session.close()
+                comparison_data.append({
+                    'Bot Type': bot_type.capitalize(),
+                    'Participants': total,
+                    'Completed': completed,
+                    'Completion %': f"{completion_pct:.1f}",
+                    'Completion_Pct': round(completion_pct, 1),
+                    'Avg Messages': f"{avg_msgs:.1f}",
+                    'Crisis Flags': stats['crisis_flagged']
+                })
         
         # Display as table
         if comparison_data:
-            df = pd.DataFrame(comparison_data)
+            df = _dataframe(comparison_data)
             st.dataframe(df, hide_index=True, use_container_width=True)
             
             # Visualizations
@@ -327,6 +315,51 @@ class AdminDashboard:
         else:
             st.info("No data available for comparison yet.")
 
+    def display_performance(self):
+        """Display per-bot-type latency (p50/p95) and token usage from turn metrics."""
+        st.header("Performance")
+        
+        summary = self.db_manager.get_turn_metrics_summary()
+        if not summary:
+            st.info("No turn metrics recorded yet.")
+            return
+        
+        def ms(value):
+            return f"{value:.0f}" if value is not None else ''
+        
+        rows = []
+        for bot_type, s in summary.items():
+            rows.append({
+                'Bot Type': bot_type.capitalize(),
+                'Turns': s['turns'],
+                'TTFT p50 (ms)': ms(s['ttft_ms_p50']),
+                'TTFT p95 (ms)': ms(s['ttft_ms_p95']),
+                'Reply p50 (ms)': ms(s['stream_ms_p50']),
+                'Reply p95 (ms)': ms(s['stream_ms_p95']),
+                'With Writes p95 (ms)': ms(s['total_ms_p95']),
+                'Bot Write p95 (ms)': ms(s['bot_write_ms_p95']),
+                'Completion Tokens p50': s['completion_tokens_p50'] or '',
+                'Total Tokens': s['total_tokens'],
+                'Cached Tokens': s['cached_tokens'],
+                'Retries': s['retries'],
+                'TTFT_P95': s['ttft_ms_p95'] or 0,
+                'Reply_P95': s['stream_ms_p95'] or 0,
+            })
+        df = _dataframe(rows)
+        st.dataframe(df.drop(columns=['TTFT_P95', 'Reply_P95']), hide_index=True, use_container_width=True)
+        st.caption("Timings are measured from the start of the turn as the participant experiences it. "
+                   "Crisis turns (scripted replies) are excluded.")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.write("**Time to First Token p95 (ms)**")
+            st.bar_chart(df[['Bot Type', 'TTFT_P95']].set_index('Bot Type'))
+        
+        with col2:
+            st.write("**Full Reply p95 (ms)**")
+            st.bar_chart(df[['Bot Type', 'Reply_P95']].set_index('Bot Type'))
+
     def display_feedback(self):
         """Show participant feedback entries (if any)."""
         st.header("Participant Feedback")
@@ -352,8 +385,7 @@ class AdminDashboard:
                     'Feedback Time (AZ)': fmt_az(getattr(p, 'feedback_time', None), "%Y-%m-%d %H:%M:%S"),
                     'Feedback Text': getattr(p, 'feedback_text', '') or ''
                 })
-            import pandas as pd
-            df = pd.DataFrame(data)
+            df = _dataframe(data)
             st.dataframe(df, use_container_width=True, hide_index=True)
         finally:
             session.close()
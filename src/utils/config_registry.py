@@ -0,0 +1,426 @@
+"""
+Config Registry
+One shared, hot-reloadable view of app_config.yaml, the empathy prompts and the
+crisis response text.
+
+Every reader (app.load_config, BotManager, CrisisDetector, EmpathyBot) used to
+open and parse these files itself, several times per Streamlit rerun. The
+registry loads and validates them once per process:
+
+- snapshot() returns an immutable ConfigSnapshot (config sections are
+  read-only dicts, lists become tuples), so callers can share it safely
+- Files are re-checked at most every config_registry.check_interval seconds:
+  a stat (mtime, size) first, then a content hash; unchanged content is
+  never re-parsed
+- An invalid edit is logged and ignored; the previous snapshot stays live
+- subscribe() calls back (on the checking thread) when the named parts change:
+  a top-level config section ("safety", "api", ...), "prompts" or "crisis_text"
+- artifact() caches something compiled from a snapshot (a keyword matcher,
+  prompt templates) and rebuilds it only when its parts' contents change
+
+Usage:
+    from src.utils.config_registry import get_registry
+
+    registry = get_registry("config/app_config.yaml")
+    snapshot = registry.snapshot()
+    snapshot.config["api"]["model"], snapshot.prompts["cognitive"], snapshot.crisis_text
+    matcher = registry.artifact("crisis_matcher", ("safety",), build_matcher)
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+try:
+    from src.utils.structured_logging import get_logger
+except Exception:
+    from structured_logging import get_logger
+
+log = get_logger("config")
+
+# Prompt files per bot type, next to app_config.yaml ("control" has no prompt)
+PROMPT_FILES = {
+    "cognitive": "cognitive_empathy_prompt.txt",
+    "emotional": "emotional_empathy_prompt.txt",
+    "motivational": "motivational_empathy_prompt.txt",
+}
+CRISIS_TEXT_FILE = "crisis_response.txt"
+
+# Seconds between file checks unless config_registry.check_interval says otherwise
+DEFAULT_CHECK_INTERVAL = 2.0
+
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+
+class ConfigError(ValueError):
+    """Raised when the configuration cannot be read or fails validation."""
+
+
+class FrozenDict(dict):
+    """Read-only dict: still a dict for isinstance checks and .get(), but never mutated in place."""
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Config snapshots are read-only; edit app_config.yaml instead")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = __ior__ = _readonly
+
+    def __reduce__(self):
+        # Pickle/copy through the constructor (the default path calls __setitem__)
+        return (type(self), (dict(self),))
+
+
+def freeze(value: Any) -> Any:
+    """Recursively convert dicts to FrozenDict and lists to tuples."""
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+class ConfigSnapshot(NamedTuple):
+    """One consistent, immutable view of the configuration files."""
+
+    version: int
+    config: FrozenDict
+    prompts: FrozenDict  # bot_type -> system prompt ("" when missing)
+    crisis_text: str  # "" when crisis_response.txt is missing
+    digests: FrozenDict  # part -> content hash
+    loaded_at: float
+
+
+def validate_config(config: Any) -> List[str]:
+    """
+    Check the settings the app relies on.
+
+    Args:
+        config: Parsed app_config.yaml
+
+    Returns:
+        Problems found (empty when valid)
+    """
+    if not isinstance(config, dict):
+        return ["top level must be a mapping of sections"]
+    problems = []
+    for name, section in config.items():
+        if section is not None and not isinstance(section, dict):
+            problems.append(f"{name}: expected a mapping, got {type(section).__name__}")
+    if problems:
+        return problems
+
+    def number(section: str, key: str, minimum: float = 0.0, integer: bool = False):
+        value = (config.get(section) or {}).get(key)
+        if value is None:
+            return
+        kind = int if integer else (int, float)
+        if isinstance(value, bool) or not isinstance(value, kind) or value < minimum:
+            problems.append(f"{section}.{key}: expected a {'whole ' if integer else ''}number >= {minimum}, "
+                            f"got {value!r}")
+
+    number("conversation", "max_messages", 1, integer=True)
+    number("conversation", "session_timeout", 0)
+    number("api", "temperature", 0)
+    number("api", "max_tokens", 1, integer=True)
+    number("api", "max_words", 1, integer=True)
+    number("api", "timeout", 0)
+    number("database", "slow_query_ms", 0)
+    number("startup", "import_budget_ms", 1)
+    number("startup", "initialize_budget_ms", 1)
+
+    db_path = (config.get("database") or {}).get("path")
+    if db_path is not None and (not isinstance(db_path, str) or not db_path.strip()):
+        problems.append("database.path: expected a non-empty string")
+
+    keywords = (config.get("safety") or {}).get("crisis_keywords")
+    if keywords is not None:
+        if not isinstance(keywords, list) or not all(isinstance(k, str) and k.strip() for k in keywords):
+            problems.append("safety.crisis_keywords: expected a list of non-empty strings")
+
+    level = (config.get("logging") or {}).get("level")
+    if level is not None and str(level).upper() not in LOG_LEVELS:
+        problems.append(f"logging.level: expected one of {', '.join(LOG_LEVELS)}, got {level!r}")
+    return problems
+
+
+def _digest(value: Any) -> str:
+    if isinstance(value, bytes):
+        data = value
+    else:
+        data = json.dumps(value, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+class _Subscription:
+    """Subscriber callback held weakly when it is a bound method (the owner may be discarded on rerun)."""
+
+    __slots__ = ("_ref", "parts")
+
+    def __init__(self, callback: Callable, parts: Optional[FrozenSet[str]]):
+        if hasattr(callback, "__self__") and hasattr(callback, "__func__"):
+            self._ref = weakref.WeakMethod(callback)
+        else:
+            self._ref = lambda: callback
+        self.parts = parts
+
+    def callback(self) -> Optional[Callable]:
+        return self._ref()
+
+
+class ConfigRegistry:
+    """Loads the config directory once and reloads it when file contents change."""
+
+    def __init__(self, config_path: str, check_interval: Optional[float] = None):
+        """
+        Args:
+            config_path: Path to app_config.yaml; prompts and crisis text are read from its directory
+            check_interval: Seconds between file checks (None = config_registry.check_interval,
+                default 2; 0 = check on every snapshot() call)
+
+        Raises:
+            ConfigError: If the files cannot be read or fail validation on first load
+        """
+        self.config_path = os.path.abspath(config_path)
+        directory = os.path.dirname(self.config_path)
+        self.files: Dict[str, str] = {"config": self.config_path}
+        for bot_type, name in PROMPT_FILES.items():
+            self.files[f"prompt.{bot_type}"] = os.path.join(directory, name)
+        self.files["crisis_text"] = os.path.join(directory, CRISIS_TEXT_FILE)
+
+        self._fixed_interval = check_interval
+        self.check_interval = DEFAULT_CHECK_INTERVAL if check_interval is None else float(check_interval)
+        self._lock = threading.RLock()
+        self._stats: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._file_digests: Dict[str, Optional[str]] = {}
+        self._snapshot: Optional[ConfigSnapshot] = None
+        self._checked_at = 0.0
+        self._subscriptions: List[_Subscription] = []
+        self._artifacts: Dict[str, Tuple[Tuple[str, ...], Any]] = {}
+        self.reloads = 0
+        self.failed_reloads = 0
+
+        self.last_error: Optional[str] = None
+        stats = self._stat_all()
+        raw = self._read_all()
+        snapshot = self._load(raw)
+        if snapshot is None:
+            raise ConfigError(self.last_error)
+        self._install(snapshot, stats, raw)
+
+    # ---------- Loading ----------
+
+    def _stat_all(self) -> Dict[str, Optional[Tuple[int, int]]]:
+        stats = {}
+        for part, path in self.files.items():
+            try:
+                st = os.stat(path)
+                stats[part] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                stats[part] = None
+        return stats
+
+    def _read_all(self) -> Dict[str, Optional[bytes]]:
+        raw = {}
+        for part, path in self.files.items():
+            try:
+                with open(path, "rb") as f:
+                    raw[part] = f.read()
+            except OSError:
+                raw[part] = None
+        return raw
+
+    @staticmethod
+    def _file_digests_of(raw: Dict[str, Optional[bytes]]) -> Dict[str, Optional[str]]:
+        return {part: None if data is None else _digest(data) for part, data in raw.items()}
+
+    def _load(self, raw: Dict[str, Optional[bytes]]) -> Optional[ConfigSnapshot]:
+        """Parse and validate file contents; None (with last_error set) when invalid."""
+        if raw["config"] is None:
+            self.last_error = f"Cannot read {self.config_path}"
+            return None
+        import yaml  # deferred so importing the registry stays cheap
+        try:
+            config = yaml.safe_load(raw["config"].decode("utf-8")) or {}
+        except (yaml.YAMLError, UnicodeDecodeError) as e:
+            self.last_error = f"Invalid YAML in {self.config_path}: {e}"
+            return None
+        problems = validate_config(config)
+        if problems:
+            self.last_error = f"Invalid {self.config_path}: " + "; ".join(problems)
+            return None
+
+        def text(part: str) -> str:
+            data = raw[part]
+            return data.decode("utf-8", errors="replace").strip() if data is not None else ""
+
+        prompts = {bot_type: text(f"prompt.{bot_type}") for bot_type in PROMPT_FILES}
+        prompts["control"] = ""  # neutral baseline
+        crisis_text = text("crisis_text")
+
+        digests = {name: _digest(section) for name, section in config.items()}
+        digests["prompts"] = _digest(prompts)
+        digests["crisis_text"] = _digest(crisis_text)
+        version = self._snapshot.version + 1 if self._snapshot is not None else 1
+        self.last_error = None
+        return ConfigSnapshot(version, freeze(config), freeze(prompts), crisis_text, freeze(digests), time.time())
+
+    def _install(self, snapshot: ConfigSnapshot, stats: Dict[str, Optional[Tuple[int, int]]],
+                 raw: Dict[str, Optional[bytes]]):
+        self._snapshot = snapshot
+        self._stats = stats
+        self._file_digests = self._file_digests_of(raw)
+        self._checked_at = time.monotonic()
+        if self._fixed_interval is None:
+            interval = (snapshot.config.get("config_registry") or {}).get("check_interval")
+            if interval is not None:
+                self.check_interval = max(0.0, float(interval))
+
+    # ---------- Public API ----------
+
+    def snapshot(self) -> ConfigSnapshot:
+        """Current snapshot; files are re-checked when check_interval has passed."""
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.check()
+        return self._snapshot
+
+    def check(self) -> bool:
+        """
+        Re-check the files now and reload if their contents changed.
+
+        Returns:
+            True if a new snapshot was installed
+        """
+        notify: List[Tuple[Callable, FrozenSet[str]]] = []
+        with self._lock:
+            self._checked_at = time.monotonic()
+            stats = self._stat_all()
+            if stats == self._stats:
+                return False
+            raw = self._read_all()
+            if self._file_digests_of(raw) == self._file_digests:
+                # Touched but not changed (editor save, checkout): remember the new stats only
+                self._stats = stats
+                return False
+
+            previous = self._snapshot
+            snapshot = self._load(raw)
+            if snapshot is None:
+                self.failed_reloads += 1
+                # Remember the broken files' stats: reported once, re-checked on the next edit
+                self._stats = stats
+                log.error("Config reload rejected, keeping version %d: %s", previous.version, self.last_error)
+                return False
+            changed = frozenset(part for part in set(snapshot.digests) | set(previous.digests)
+                                if snapshot.digests.get(part) != previous.digests.get(part))
+            self._install(snapshot, stats, raw)
+            self.reloads += 1
+            if not changed:
+                return False
+            log.info("Config reloaded (version %d): %s changed", snapshot.version, ", ".join(sorted(changed)),
+                     extra={"config_version": snapshot.version, "changed": sorted(changed)})
+
+            live = []
+            for sub in self._subscriptions:
+                callback = sub.callback()
+                if callback is None:
+                    continue
+                live.append(sub)
+                if sub.parts is None or sub.parts & changed:
+                    notify.append((callback, changed))
+            self._subscriptions = live
+
+        # Outside the lock: callbacks may call snapshot() or artifact()
+        for callback, parts in notify:
+            try:
+                callback(snapshot, parts)
+            except Exception as e:
+                log.warning("Config subscriber %r failed: %s", callback, e)
+        return True
+
+    def subscribe(self, callback: Callable[[ConfigSnapshot, FrozenSet[str]], None],
+                  parts: Optional[Iterable[str]] = None) -> Callable[[], None]:
+        """
+        Call `callback(snapshot, changed_parts)` after a reload that changes any of `parts`.
+
+        Bound methods are held weakly, so subscribing does not keep their object alive;
+        their dead entries are dropped on the next subscribe or reload. Other callables
+        are held until the returned function is called.
+
+        Args:
+            callback: Called on the thread that detected the change
+            parts: Config section names, "prompts" or "crisis_text" (None = any change)
+
+        Returns:
+            Function that removes the subscription
+        """
+        sub = _Subscription(callback, frozenset(parts) if parts is not None else None)
+        with self._lock:
+            # Owners discarded on rerun leave dead weak refs; drop them even if no reload ever happens
+            self._subscriptions = [s for s in self._subscriptions if s.callback() is not None]
+            self._subscriptions.append(sub)
+
+        def unsubscribe():
+            with self._lock:
+                if sub in self._subscriptions:
+                    self._subscriptions.remove(sub)
+        return unsubscribe
+
+    def artifact(self, name: str, parts: Iterable[str], build: Callable[[ConfigSnapshot], Any]) -> Any:
+        """
+        Shared value compiled from the snapshot, rebuilt only when `parts` change.
+
+        Args:
+            name: Cache key, unique per kind of artefact
+            parts: Parts the artefact is built from (e.g. ("safety",))
+            build: Called with the current snapshot on first use and after those parts change
+
+        Returns:
+            The cached or freshly built artefact
+        """
+        snapshot = self.snapshot()
+        key = tuple(snapshot.digests.get(part, "") for part in parts)
+        with self._lock:
+            cached = self._artifacts.get(name)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+            value = build(snapshot)
+            self._artifacts[name] = (key, value)
+            return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Version, reload counters and check interval (for the admin dashboard / tests)."""
+        with self._lock:
+            return {
+                'version': self._snapshot.version,
+                'reloads': self.reloads,
+                'failed_reloads': self.failed_reloads,
+                'subscribers': len(self._subscriptions),
+                'artifacts': sorted(self._artifacts),
+                'check_interval': self.check_interval,
+            }
+
+
+# ---- Process-wide registries ---------------------------------------------------
+
+_REGISTRIES: Dict[str, ConfigRegistry] = {}
+_REGISTRIES_LOCK = threading.Lock()
+
+
+def get_registry(config_path: str = "config/app_config.yaml") -> ConfigRegistry:
+    """
+    Return the process-wide registry for `config_path`, loading it on first use.
+
+    Raises:
+        ConfigError: If the files cannot be read or fail validation on first load
+    """
+    key = os.path.abspath(config_path)
+    with _REGISTRIES_LOCK:
+        registry = _REGISTRIES.get(key)
+        if registry is None:
+            registry = _REGISTRIES[key] = ConfigRegistry(key)
+        return registry
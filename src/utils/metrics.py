@@ -0,0 +1,498 @@
+"""
+Metrics
+Small in-process metrics registry with Prometheus text exposition.
+
+- Counter: monotonically increasing value per label set
+- Gauge: current value per label set, either set directly or read from a
+  callback when metrics are rendered (e.g. session registry size)
+- Histogram: quantile sketch per label set (relative-error log buckets, so
+  sketches from several replicas can be merged by adding bucket counts);
+  exposed as a Prometheus summary with p50/p90/p95/p99, _sum and _count
+
+Metrics are served from a local HTTP endpoint (`/metrics`, `/metrics.json`)
+and/or dumped to a file periodically, configured by the `metrics:` section.
+
+Usage:
+    from src.utils import metrics
+    DB_SECONDS = metrics.histogram("db_operation_seconds", "Database call duration", ["op"])
+    with DB_SECONDS.time(op="save_message"):
+        ...
+"""
+
+import functools
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+LabelKey = Tuple[str, ...]
+
+
+# ---------- Quantile sketch ----------
+
+class QuantileSketch:
+    """
+    Log-bucketed quantile sketch with bounded relative error (DDSketch-style).
+
+    Values in bucket i lie in (gamma^(i-1), gamma^i]; a quantile is reported as
+    the bucket midpoint, within `relative_accuracy` of the true value. Sketches
+    with the same accuracy merge exactly by adding bucket counts.
+    """
+
+    __slots__ = ("relative_accuracy", "_gamma", "_log_gamma", "_bins", "_zeros", "max_bins",
+                 "count", "sum", "min", "max")
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 2048):
+        self.relative_accuracy = float(relative_accuracy)
+        self._gamma = (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._bins: Dict[int, int] = {}
+        self._zeros = 0  # Values <= 0 (durations and sizes are never negative)
+        self.max_bins = max(16, int(max_bins))
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        value = float(value)
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value <= 0:
+            self._zeros += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self._bins[index] = self._bins.get(index, 0) + 1
+        if len(self._bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        """Fold the lowest buckets together so memory stays bounded (tail accuracy is kept)."""
+        keys = sorted(self._bins)
+        keep = keys[-(self.max_bins - 1):]
+        folded = sum(self._bins.pop(k) for k in keys[:len(keys) - len(keep)])
+        self._bins[keep[0]] += folded
+
+    def merge(self, other: "QuantileSketch"):
+        if abs(other.relative_accuracy - self.relative_accuracy) > 1e-12:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for index, n in other._bins.items():
+            self._bins[index] = self._bins.get(index, 0) + n
+        self._zeros += other._zeros
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(self._bins) > self.max_bins:
+            self._collapse()
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = min(max(float(q), 0.0), 1.0) * (self.count - 1)
+        seen = self._zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self._bins):
+            seen += self._bins[index]
+            if rank < seen:
+                value = 2 * self._gamma ** index / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {"relative_accuracy": self.relative_accuracy, "zeros": self._zeros,
+                "bins": {str(k): v for k, v in self._bins.items()},
+                "count": self.count, "sum": self.sum,
+                "min": self.min if self.count else None, "max": self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketch":
+        sketch = cls(data.get("relative_accuracy", 0.01))
+        sketch._bins = {int(k): int(v) for k, v in (data.get("bins") or {}).items()}
+        sketch._zeros = int(data.get("zeros", 0))
+        sketch.count = int(data.get("count", 0))
+        sketch.sum = float(data.get("sum", 0.0))
+        if sketch.count:
+            sketch.min, sketch.max = float(data["min"]), float(data["max"])
+        return sketch
+
+
+# ---------- Metric types ----------
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "NaN"
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str = "", labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames: Tuple[str, ...] = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelKey:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str = "", labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[Tuple[str, LabelKey, Optional[Tuple[str, str]], float]]:
+        with self._lock:
+            return [(self.name, k, None, v) for k, v in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str = "", labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+        self._functions: Dict[LabelKey, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels):
+        """Read the value from `fn()` whenever metrics are rendered (replaces any previous one)."""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def value(self, **labels) -> Optional[float]:
+        return dict((k, v) for _, k, _, v in self.samples()).get(self._key(labels))
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                result = fn()
+            except Exception:
+                result = None
+            if result is not None:
+                values[key] = float(result)
+        return [(self.name, k, None, v) for k, v in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    """Observed values per label set, kept in mergeable quantile sketches."""
+
+    kind = "summary"
+
+    def __init__(self, name: str, help: str = "", labelnames: Iterable[str] = (),
+                 relative_accuracy: float = 0.01):
+        super().__init__(name, help, labelnames)
+        self.relative_accuracy = relative_accuracy
+        self._sketches: Dict[LabelKey, QuantileSketch] = {}
+
+    def _sketch(self, key: LabelKey) -> QuantileSketch:
+        sketch = self._sketches.get(key)
+        if sketch is None:
+            sketch = self._sketches[key] = QuantileSketch(self.relative_accuracy)
+        return sketch
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._sketch(key).add(value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block in seconds (also when it raises)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def merge(self, sketch: QuantileSketch, **labels):
+        """Fold in a sketch from another process or replica."""
+        key = self._key(labels)
+        with self._lock:
+            self._sketch(key).merge(sketch)
+
+    def snapshot(self, **labels) -> Optional[QuantileSketch]:
+        with self._lock:
+            sketch = self._sketches.get(self._key(labels))
+            return QuantileSketch.from_dict(sketch.to_dict()) if sketch else None
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = sorted(self._sketches.items())
+            for key, sketch in items:
+                for q in QUANTILES:
+                    out.append((self.name, key, ("quantile", f"{q:g}"), sketch.quantile(q)))
+                out.append((f"{self.name}_sum", key, None, sketch.sum))
+                out.append((f"{self.name}_count", key, None, sketch.count))
+        return out
+
+
+# ---------- Registry ----------
+
+class MetricsRegistry:
+    """Named metrics for one process; get-or-create by name."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help: str, labelnames: Iterable[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, help: str = "", labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str = "", labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str = "", labelnames: Iterable[str] = (),
+                  relative_accuracy: float = 0.01) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, relative_accuracy=relative_accuracy)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        with self._lock:
+            return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.header())
+            for name, key, extra, value in metric.samples():
+                lines.append(f"{name}{_format_labels(metric.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self) -> Dict[str, dict]:
+        """Current values keyed by metric name, then by label string."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        out: Dict[str, dict] = {}
+        for metric in metrics:
+            values = {}
+            for name, key, extra, value in metric.samples():
+                label = _format_labels(metric.labelnames, key, extra)
+                values[f"{name}{label}"] = value
+            out[metric.name] = {"type": metric.kind, "help": metric.help, "values": values}
+        return out
+
+    def dump(self, path: str):
+        """Write the exposition text to `path` atomically (node-exporter textfile style)."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name: str, help: str = "", labelnames: Iterable[str] = ()) -> Counter:
+    """Get or create a counter in the process-wide registry."""
+    return REGISTRY.counter(name, help, labelnames)
+
+
+def gauge(name: str, help: str = "", labelnames: Iterable[str] = ()) -> Gauge:
+    """Get or create a gauge in the process-wide registry."""
+    return REGISTRY.gauge(name, help, labelnames)
+
+
+def histogram(name: str, help: str = "", labelnames: Iterable[str] = ()) -> Histogram:
+    """Get or create a histogram in the process-wide registry."""
+    return REGISTRY.histogram(name, help, labelnames)
+
+
+def instrumented(hist: Histogram, errors: Optional[Counter] = None, label: str = "op"):
+    """
+    Decorator timing every call of a function, labelled with its name.
+
+    Args:
+        hist: Histogram with a single `label` label
+        errors: Optional counter (same label) incremented when the call raises
+        label: Label name receiving the function name
+    """
+    def decorate(fn):
+        name = fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(**{label: name})
+                raise
+            finally:
+                hist.observe(time.perf_counter() - started, **{label: name})
+        return wrapper
+    return decorate
+
+
+# ---------- Exposition ----------
+
+class MetricsServer:
+    """Serves `/metrics` (Prometheus text) and `/metrics.json` from a daemon thread."""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, host: str = "127.0.0.1", port: int = 9464):
+        self.registry = registry
+        self._httpd = ThreadingHTTPServer((host, int(port)), self._handler())
+        self._httpd.daemon_threads = True
+        self.host, self.port = self._httpd.server_address[:2]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def _handler(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0].rstrip("/")
+                if path == "/metrics":
+                    body, ctype = registry.render().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body, ctype = json.dumps(registry.to_json()).encode("utf-8"), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class MetricsDumper:
+    """Rewrites the exposition file every `interval` seconds from a daemon thread."""
+
+    def __init__(self, path: str, interval: float = 15.0, registry: MetricsRegistry = REGISTRY):
+        self.path = path
+        self.interval = max(1.0, float(interval))
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-dump", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.registry.dump(self.path)
+            except OSError as e:
+                print(f"⚠ Could not write metrics to {self.path}: {e}")
+
+    def close(self):
+        self._stop.set()
+        self.registry.dump(self.path)
+
+
+_EXPORTERS: Dict[str, object] = {}
+_EXPORTERS_LOCK = threading.Lock()
+
+
+def start_from_config(config: Optional[dict]) -> Dict[str, object]:
+    """
+    Start the HTTP endpoint and/or file dumper from the `metrics` config section.
+
+    Safe to call on every Streamlit rerun; each exporter starts once per process.
+
+    Returns:
+        Running exporters ("server", "dumper")
+    """
+    cfg = (config or {}).get("metrics") or {}
+    if not cfg.get("enabled", False):
+        return {}
+    with _EXPORTERS_LOCK:
+        if cfg.get("port") is not None and "server" not in _EXPORTERS:
+            try:
+                server = MetricsServer(REGISTRY, cfg.get("host", "127.0.0.1"), int(cfg["port"]))
+                _EXPORTERS["server"] = server
+                print(f"✓ Metrics available at {server.url}")
+            except OSError as e:
+                # Another replica on this host may hold the port; the dump file still works
+                print(f"⚠ Metrics endpoint not started: {e}")
+        if cfg.get("dump_path") and "dumper" not in _EXPORTERS:
+            _EXPORTERS["dumper"] = MetricsDumper(cfg["dump_path"], float(cfg.get("dump_interval", 15)))
+        return dict(_EXPORTERS)
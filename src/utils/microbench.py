@@ -0,0 +1,280 @@
+"""
+Microbenchmarks
+Small timing harness for the hot functions, with a JSON Lines result history
+so a slowdown shows up as a change between two commits.
+
+- A case is a zero-argument callable; its fixture (database, detector, text)
+  is built by an optional `setup` factory before timing starts, and only if
+  the case is selected.
+- Each case runs in batches sized so one batch takes at least `min_time`
+  seconds (as timeit's autorange does). `repeat` batches are timed with the
+  garbage collector off, and the per-call median, min, max and spread are kept.
+- A run record adds the commit, Python version and machine, and is appended
+  to the history file (one JSON object per line).
+- compare() sets a run against a baseline (by default the latest run from
+  another commit) and marks cases whose median moved more than `threshold`.
+
+Usage:
+    suite = BenchmarkSuite()
+    suite.add("fmt_az", lambda: fmt_az(ts))
+    suite.add("export[1k]", setup=lambda: make_export(1000), repeat=3)
+    run = suite.run()
+    baseline = find_baseline(load_history(path), run)
+    append_history(path, run)
+    for row in compare(run, baseline):
+        ...
+"""
+
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+HISTORY_VERSION = 1
+
+
+def measure(fn: Callable[[], Any], min_time: float = 0.05, repeat: int = 5,
+            max_loops: int = 1_000_000) -> Dict[str, Any]:
+    """
+    Time `fn` per call.
+
+    Args:
+        fn: Zero-argument callable to time
+        min_time: Minimum seconds per timed batch (the batch size grows until this is reached)
+        repeat: Number of timed batches
+        max_loops: Upper bound on calls per batch
+
+    Returns:
+        {"median_us", "min_us", "max_us", "stdev_us", "loops", "repeat"} (microseconds per call)
+    """
+    loops = 1
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        # Autorange: 1, 2, 5, 10, 20, 50, ... calls until one batch takes min_time
+        while True:
+            elapsed = _batch(fn, loops)
+            if elapsed >= min_time or loops >= max_loops:
+                break
+            loops = min(max_loops, _next_loops(loops))
+        samples = [elapsed / loops]
+        for _ in range(max(0, repeat - 1)):
+            samples.append(_batch(fn, loops) / loops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {
+        'median_us': round(statistics.median(samples) * 1e6, 3),
+        'min_us': round(min(samples) * 1e6, 3),
+        'max_us': round(max(samples) * 1e6, 3),
+        'stdev_us': round(statistics.stdev(samples) * 1e6, 3) if len(samples) > 1 else 0.0,
+        'loops': loops,
+        'repeat': len(samples),
+    }
+
+
+def _batch(fn: Callable[[], Any], loops: int) -> float:
+    started = time.perf_counter()
+    for _ in range(loops):
+        fn()
+    return time.perf_counter() - started
+
+
+def _next_loops(loops: int) -> int:
+    """1 -> 2 -> 5 -> 10 -> 20 -> 50 -> 100 ..."""
+    magnitude = 1
+    while magnitude * 10 <= loops:
+        magnitude *= 10
+    lead = loops // magnitude
+    return magnitude * (2 if lead < 2 else 5 if lead < 5 else 10)
+
+
+class BenchmarkSuite:
+    """Named benchmark cases, run in registration order."""
+
+    def __init__(self, min_time: float = 0.05, repeat: int = 5):
+        """
+        Args:
+            min_time: Default minimum seconds per timed batch
+            repeat: Default number of timed batches per case
+        """
+        self.min_time = float(min_time)
+        self.repeat = int(repeat)
+        self.cases: List[Dict[str, Any]] = []
+
+    def add(self, name: str, fn: Optional[Callable[[], Any]] = None,
+            setup: Optional[Callable[[], Callable[[], Any]]] = None,
+            repeat: Optional[int] = None, min_time: Optional[float] = None,
+            info: Optional[Callable[[], Dict[str, Any]]] = None):
+        """
+        Register a case.
+
+        Args:
+            name: Unique case name, e.g. "export_all_conversations[100k]"
+            fn: Callable to time (give either fn or setup)
+            setup: Factory returning the callable to time; runs untimed, only if the case is selected
+            repeat: Timed batches for this case (e.g. 1 for multi-second exports)
+            min_time: Minimum seconds per batch for this case
+            info: Called after timing; its dict is stored with the result (e.g. rows exported)
+        """
+        if (fn is None) == (setup is None):
+            raise ValueError(f"Benchmark {name}: pass exactly one of fn or setup")
+        if any(case['name'] == name for case in self.cases):
+            raise ValueError(f"Duplicate benchmark name: {name}")
+        self.cases.append({'name': name, 'fn': fn, 'setup': setup, 'repeat': repeat,
+                           'min_time': min_time, 'info': info})
+
+    def names(self) -> List[str]:
+        return [case['name'] for case in self.cases]
+
+    def run(self, select: Optional[Iterable[str]] = None,
+            progress: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Run the selected cases and return a run record.
+
+        Args:
+            select: Substrings; a case runs if its name contains any of them (None: all cases)
+            progress: Called as progress(name, result) after each case
+
+        Returns:
+            Run record (see run_record()) with results keyed by case name
+        """
+        patterns = list(select or [])
+        results: Dict[str, Dict[str, Any]] = {}
+        for case in self.cases:
+            if patterns and not any(p in case['name'] for p in patterns):
+                continue
+            fn = case['fn'] if case['fn'] is not None else case['setup']()
+            result = measure(fn,
+                             min_time=case['min_time'] if case['min_time'] is not None else self.min_time,
+                             repeat=case['repeat'] if case['repeat'] is not None else self.repeat)
+            if case['info'] is not None:
+                result['info'] = case['info']()
+            results[case['name']] = result
+            if progress is not None:
+                progress(case['name'], result)
+        return run_record(results)
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        out = subprocess.run(["git", *args], capture_output=True, text=True, timeout=10,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    except Exception:
+        return None
+    return out.stdout.strip() if out.returncode == 0 else None
+
+
+def run_record(results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Wrap results with the commit, interpreter and machine they were measured on."""
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        'version': HISTORY_VERSION,
+        'timestamp': datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        'commit': _git("rev-parse", "--short", "HEAD"),
+        'dirty': bool(status) if status is not None else None,
+        'python': platform.python_version(),
+        'machine': f"{platform.system()}-{platform.machine()}-{os.cpu_count()}cpu",
+        'host': platform.node(),
+        'results': results,
+    }
+
+
+def append_history(path: str, record: Dict[str, Any]):
+    """Append one run record to the JSON Lines history."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+
+def load_history(path: str) -> List[Dict[str, Any]]:
+    """Run records from the history file, oldest first (empty if missing; bad lines are skipped)."""
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('version') == HISTORY_VERSION and isinstance(record.get('results'), dict):
+                records.append(record)
+    return records
+
+
+def find_baseline(history: List[Dict[str, Any]], current: Optional[Dict[str, Any]] = None,
+                  ref: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Pick the run to compare against.
+
+    Args:
+        history: Records from load_history()
+        current: The new run; by default the latest run from a different commit on the same host is used
+        ref: Commit (prefix) to compare against instead
+
+    Returns:
+        The baseline record, or None if there is none
+    """
+    for record in reversed(history):
+        commit = record.get('commit') or ""
+        if ref is not None:
+            if commit and (commit.startswith(ref) or ref.startswith(commit)):
+                return record
+            continue
+        if current is None:
+            return record
+        if record.get('host') != current.get('host'):
+            continue
+        if commit != current.get('commit') or record.get('dirty') != current.get('dirty'):
+            return record
+    return None
+
+
+def compare(current: Dict[str, Any], baseline: Optional[Dict[str, Any]],
+            threshold: float = 0.2) -> List[Dict[str, Any]]:
+    """
+    Median change per case between a baseline and the current run.
+
+    Args:
+        current: Run record
+        baseline: Earlier run record (None: every case is "new")
+        threshold: Relative change beyond which a case is a "regression" or "improvement"
+
+    Returns:
+        [{"name", "before_us", "after_us", "change", "status"}], status in
+        regression / improvement / same / new
+    """
+    before = (baseline or {}).get('results') or {}
+    rows = []
+    for name, result in current.get('results', {}).items():
+        after_us = result['median_us']
+        old = before.get(name)
+        if not old or not old.get('median_us'):
+            rows.append({'name': name, 'before_us': None, 'after_us': after_us, 'change': None, 'status': 'new'})
+            continue
+        change = (after_us - old['median_us']) / old['median_us']
+        status = 'regression' if change > threshold else 'improvement' if change < -threshold else 'same'
+        rows.append({'name': name, 'before_us': old['median_us'], 'after_us': after_us,
+                     'change': round(change, 4), 'status': status})
+    return rows
+
+
+def format_us(value: Optional[float]) -> str:
+    """Microseconds as a short human-readable duration."""
+    if value is None:
+        return "-"
+    if value >= 1e6:
+        return f"{value / 1e6:.2f} s"
+    if value >= 1e3:
+        return f"{value / 1e3:.2f} ms"
+    return f"{value:.2f} us"
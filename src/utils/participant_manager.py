@@ -7,6 +7,19 @@ import uuid
 from datetime import datetime
 from typing import Optional, Dict
 from src.database.db_manager import DatabaseManager
+from src.utils.session_registry import SessionRecord, SessionRegistry
+from src.utils.structured_logging import get_logger
+
+log = get_logger("participants")
+
+
+class ParticipantSession(SessionRecord):
+    """Compact active-session record (supports dict-style access)."""
+
+    __slots__ = (
+        'session_id', 'participant_id', 'bot_type', 'created_at',
+        'message_count', 'conversation_complete'
+    )
 
 
 class ParticipantManager:
@@ -15,15 +28,20 @@ class ParticipantManager:
     Generates unique IDs and tracks active sessions.
     """
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, session_registry: Optional[SessionRegistry] = None):
         """
         Initialize participant manager.
         
         Args:
             db_manager: DatabaseManager instance
+            session_registry: Optional bounded registry (defaults to 1-hour idle TTL)
         """
         self.db_manager = db_manager
-        self.active_sessions = {}  # In-memory storage of active sessions
+        # In-memory storage of active sessions (bounded; abandoned sessions expire)
+        self.active_sessions = (session_registry if session_registry is not None
+                                else SessionRegistry(record_type=ParticipantSession))
+        if self.active_sessions.on_evict is None:
+            self.active_sessions.on_evict = self._on_session_evicted
     
     
     def generate_participant_id(self, prefix: str = "P") -> str:
@@ -77,14 +95,14 @@ class ParticipantManager:
         participant = self.db_manager.create_participant(participant_id, bot_type)
         
         # Create session data
-        session_data = {
-            'session_id': session_id,
-            'participant_id': participant_id,
-            'bot_type': bot_type,
-            'created_at': datetime.utcnow(),
-            'message_count': 0,
-            'conversation_complete': False
-        }
+        session_data = ParticipantSession(
+            session_id=session_id,
+            participant_id=participant_id,
+            bot_type=bot_type,
+            created_at=datetime.utcnow(),
+            message_count=0,
+            conversation_complete=False
+        )
         
         # Store in active sessions (in-memory)
         self.active_sessions[session_id] = session_data
@@ -114,8 +132,9 @@ class ParticipantManager:
         Args:
             session_id: The session's unique ID
         """
-        if session_id in self.active_sessions:
-            self.active_sessions[session_id]['message_count'] += 1
+        session = self.active_sessions.get(session_id)
+        if session is not None:
+            session['message_count'] += 1
     
     
     def mark_session_complete(self, session_id: str):
@@ -125,8 +144,8 @@ class ParticipantManager:
         Args:
             session_id: The session's unique ID
         """
-        if session_id in self.active_sessions:
-            session = self.active_sessions[session_id]
+        session = self.active_sessions.get(session_id)
+        if session is not None:
             session['conversation_complete'] = True
             
             # Update database
@@ -144,8 +163,8 @@ class ParticipantManager:
         Args:
             session_id: The session's unique ID
         """
-        if session_id in self.active_sessions:
-            session = self.active_sessions[session_id]
+        session = self.active_sessions.pop(session_id)
+        if session is not None:
             participant_id = session['participant_id']
             
             # Ensure database is updated
@@ -154,12 +173,28 @@ class ParticipantManager:
                 completed=session['conversation_complete']
             )
             
-            # Remove from active sessions
-            del self.active_sessions[session_id]
-            
             print(f"✓ Ended session {session_id}")
     
     
+    def _on_session_evicted(self, session_id: str, session, reason: str):
+        """
+        Record the end state of an expired session, since end_session() can no longer find it.
+
+        Sessions pushed out by the entry or byte budget may still be in progress, so
+        they are only dropped from memory; stamping end_time would end them mid-conversation.
+        """
+        if reason != "ttl":
+            log.warning("Session %s evicted from memory (%s)", session_id, reason,
+                        extra={"participant_id": session['participant_id']})
+            return
+        self.db_manager.update_participant_completion(
+            session['participant_id'],
+            completed=bool(session['conversation_complete'])
+        )
+        log.info("Session %s expired; end state saved", session_id,
+                 extra={"participant_id": session['participant_id']})
+    
+    
     def get_active_session_count(self) -> int:
         """
         Get count of currently active sessions.
@@ -170,6 +205,16 @@ class ParticipantManager:
         return len(self.active_sessions)
     
     
+    def get_registry_stats(self) -> Dict:
+        """
+        Get size and eviction counters of the active-session registry.
+        
+        Returns:
+            Dictionary with entries, bytes and eviction counts
+        """
+        return self.active_sessions.stats()
+    
+    
     def cleanup_stale_sessions(self, timeout_hours: int = 2):
         """
         Remove sessions that have been inactive for too long.
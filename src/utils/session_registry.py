@@ -0,0 +1,420 @@
+"""
+Session Registry
+Bounded, thread-safe in-memory store for per-session state.
+
+Used by BotManager, ConversationHandler and ParticipantManager in place of plain
+dicts so abandoned sessions cannot grow memory without bound:
+- LRU eviction when an entry or byte budget is exceeded
+- Idle-TTL eviction (conversation.session_timeout), checked on access and by a
+  periodic sweep so untouched sessions are evicted (and on_evict runs) too
+- Striped locking so concurrent Streamlit threads rarely contend
+- Eviction counters for monitoring
+- One registry per kind of state for the whole process (get_session_registry),
+  since Streamlit rebuilds the managers on every rerun
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+# Fixed per-record overhead used by the byte estimate (object header, slots, keys)
+_RECORD_OVERHEAD = 256
+
+
+class SessionRecord:
+    """
+    Compact base class for session objects.
+
+    Subclasses declare their fields in __slots__. Item access (`rec["bot_type"]`)
+    is supported so existing dict-style callers keep working.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError(f"Unknown fields for {type(self).__name__}: {sorted(fields)}")
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SessionRecord":
+        """Build a record from a dict, ignoring keys the record does not define."""
+        return cls(**{k: v for k, v in (data or {}).items() if k in cls.__slots__})
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def keys(self) -> List[str]:
+        return list(self.__slots__)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def approx_bytes(self) -> int:
+        """Rough memory estimate used for the registry byte budget."""
+        total = _RECORD_OVERHEAD
+        for name in self.__slots__:
+            total += _approx_size(getattr(self, name, None))
+        return total
+
+    def __repr__(self):
+        return f"<{type(self).__name__}({', '.join(f'{k}={getattr(self, k)!r}' for k in self.__slots__[:3])})>"
+
+
+def _approx_size(value) -> int:
+    """Cheap size estimate for strings and shallow containers of strings/dicts."""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_approx_size(v) + 16 for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_approx_size(v) + 8 for v in value)
+    return 16
+
+
+class _Stripe:
+    """One lock-protected LRU segment of the registry."""
+
+    __slots__ = ("lock", "entries", "bytes", "hits", "misses",
+                 "evicted_lru", "evicted_ttl", "evicted_bytes", "removed")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> (value, size, last_access); ordered oldest access first
+        self.entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+        self.evicted_bytes = 0
+        self.removed = 0
+
+
+class SessionRegistry:
+    """
+    Bounded session map with LRU + idle-TTL eviction.
+
+    Supports the dict operations the managers use (`in`, `[]`, `get`, `del`,
+    `len`, `values`, `items`). Budgets are split evenly across lock stripes.
+    """
+
+    def __init__(self, max_entries: int = 5000, max_bytes: int = 64 * 1024 * 1024,
+                 idle_ttl: Optional[float] = 3600, stripes: int = 16,
+                 record_type: Optional[type] = None,
+                 on_evict: Optional[Callable[[str, Any, str], None]] = None,
+                 sweep_interval: Optional[float] = 60,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize session registry.
+
+        Args:
+            max_entries: Maximum number of sessions held in memory
+            max_bytes: Approximate memory budget for all sessions
+            idle_ttl: Seconds without access before a session expires (None/0 disables)
+            stripes: Number of independently locked segments
+            record_type: SessionRecord subclass used to convert dicts on insert
+            on_evict: Optional callback(key, value, reason) run outside the lock
+            sweep_interval: Seconds between full expiry sweeps, run by whichever put/get
+                comes due (None/0 disables; expired entries are then evicted only when touched)
+            clock: Monotonic time source (injectable for tests)
+        """
+        self.stripe_count = max(1, int(stripes))
+        self.max_entries = max(self.stripe_count, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes or 0))
+        self.idle_ttl = float(idle_ttl) if idle_ttl else None
+        self.record_type = record_type
+        self.on_evict = on_evict
+        self._clock = clock
+        self._stripes = [_Stripe() for _ in range(self.stripe_count)]
+        self._entries_per_stripe = max(1, self.max_entries // self.stripe_count)
+        self._bytes_per_stripe = self.max_bytes // self.stripe_count if self.max_bytes else 0
+        self.sweep_interval = float(sweep_interval) if sweep_interval else None
+        self._sweep_lock = threading.Lock()
+        self._next_sweep = clock() + (self.sweep_interval or 0)
+
+    @classmethod
+    def from_config(cls, config: Optional[dict], record_type: Optional[type] = None,
+                    on_evict: Optional[Callable[[str, Any, str], None]] = None) -> "SessionRegistry":
+        """
+        Build a registry from the `conversation` config section.
+
+        Uses conversation.session_timeout as the idle TTL and the optional
+        conversation.session_registry block for budgets.
+        """
+        conv = (config or {}).get("conversation") or {}
+        reg = conv.get("session_registry") or {}
+        return cls(
+            max_entries=int(reg.get("max_entries", 5000)),
+            max_bytes=int(reg.get("max_bytes", 64 * 1024 * 1024)),
+            idle_ttl=conv.get("session_timeout", 3600),
+            stripes=int(reg.get("lock_stripes", 16)),
+            record_type=record_type,
+            on_evict=on_evict,
+            sweep_interval=reg.get("sweep_interval", 60),
+        )
+
+    # ---------- Internals ----------
+
+    def _stripe(self, key: str) -> _Stripe:
+        return self._stripes[hash(key) % self.stripe_count]
+
+    def _coerce(self, value):
+        if self.record_type is not None and isinstance(value, dict):
+            return self.record_type.from_dict(value)
+        return value
+
+    @staticmethod
+    def _size_of(value) -> int:
+        measure = getattr(value, "approx_bytes", None)
+        if measure:
+            return int(measure())
+        return _RECORD_OVERHEAD + _approx_size(value)
+
+    def _expired(self, last_access: float, now: float) -> bool:
+        return self.idle_ttl is not None and (now - last_access) > self.idle_ttl
+
+    def _drop(self, stripe: _Stripe, key: str) -> Any:
+        value, size, _ = stripe.entries.pop(key)
+        stripe.bytes -= size
+        return value
+
+    def _enforce(self, stripe: _Stripe, now: float, evicted: List[Tuple[str, Any, str]]):
+        """Evict expired entries, then LRU entries over budget. Caller holds the lock."""
+        # Oldest access first, so expired entries are at the front
+        while stripe.entries:
+            key, (_, _, last) = next(iter(stripe.entries.items()))
+            if not self._expired(last, now):
+                break
+            evicted.append((key, self._drop(stripe, key), "ttl"))
+            stripe.evicted_ttl += 1
+        while len(stripe.entries) > self._entries_per_stripe:
+            key = next(iter(stripe.entries))
+            evicted.append((key, self._drop(stripe, key), "lru"))
+            stripe.evicted_lru += 1
+        while self._bytes_per_stripe and stripe.bytes > self._bytes_per_stripe and len(stripe.entries) > 1:
+            key = next(iter(stripe.entries))
+            evicted.append((key, self._drop(stripe, key), "bytes"))
+            stripe.evicted_bytes += 1
+
+    def _maybe_sweep(self):
+        """Run sweep() if it is due; one caller sweeps, the others carry on."""
+        if self.sweep_interval is None or self.idle_ttl is None or self._clock() < self._next_sweep:
+            return
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sweep = self._clock() + self.sweep_interval
+            self.sweep()
+        finally:
+            self._sweep_lock.release()
+
+    def _notify(self, evicted: List[Tuple[str, Any, str]]):
+        if not self.on_evict:
+            return
+        for key, value, reason in evicted:
+            try:
+                self.on_evict(key, value, reason)
+            except Exception:
+                pass
+
+    # ---------- Public API ----------
+
+    def put(self, key: str, value) -> Any:
+        """
+        Insert or refresh a session and re-measure its size.
+
+        Call again after mutating a session in place (e.g. appending history)
+        so the byte budget stays accurate.
+
+        Returns:
+            The stored value (converted to record_type if a dict was given)
+        """
+        value = self._coerce(value)
+        size = self._size_of(value)
+        stripe = self._stripe(key)
+        evicted: List[Tuple[str, Any, str]] = []
+        with stripe.lock:
+            now = self._clock()
+            if key in stripe.entries:
+                self._drop(stripe, key)
+            stripe.entries[key] = (value, size, now)
+            stripe.bytes += size
+            self._enforce(stripe, now, evicted)
+        self._notify(evicted)
+        self._maybe_sweep()
+        return value
+
+    def get(self, key: str, default=None):
+        """Return a live session (refreshing its LRU position) or default."""
+        stripe = self._stripe(key)
+        evicted: List[Tuple[str, Any, str]] = []
+        with stripe.lock:
+            item = stripe.entries.get(key)
+            now = self._clock()
+            if item is None:
+                stripe.misses += 1
+                return default
+            value, size, last = item
+            if self._expired(last, now):
+                self._drop(stripe, key)
+                stripe.evicted_ttl += 1
+                stripe.misses += 1
+                evicted.append((key, value, "ttl"))
+            else:
+                stripe.entries[key] = (value, size, now)
+                stripe.entries.move_to_end(key)
+                stripe.hits += 1
+        self._maybe_sweep()
+        if evicted:
+            self._notify(evicted)
+            return default
+        return value
+
+    def pop(self, key: str, default=None):
+        """Remove and return a session."""
+        stripe = self._stripe(key)
+        with stripe.lock:
+            if key not in stripe.entries:
+                return default
+            stripe.removed += 1
+            return self._drop(stripe, key)
+
+    def sweep(self) -> int:
+        """
+        Evict all expired sessions across every stripe.
+
+        Returns:
+            Number of sessions evicted
+        """
+        evicted: List[Tuple[str, Any, str]] = []
+        for stripe in self._stripes:
+            with stripe.lock:
+                self._enforce(stripe, self._clock(), evicted)
+        self._notify(evicted)
+        return len(evicted)
+
+    def __setitem__(self, key: str, value):
+        self.put(key, value)
+
+    def __getitem__(self, key: str):
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            raise KeyError(key)
+        return value
+
+    def __delitem__(self, key: str):
+        sentinel = object()
+        if self.pop(key, sentinel) is sentinel:
+            raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        stripe = self._stripe(key)
+        with stripe.lock:
+            item = stripe.entries.get(key)
+            return item is not None and not self._expired(item[2], self._clock())
+
+    def __len__(self) -> int:
+        """Live sessions (expired entries not yet evicted are not counted)."""
+        total = 0
+        now = self._clock()
+        for stripe in self._stripes:
+            with stripe.lock:
+                expired = 0
+                # Oldest access first: expired entries are a prefix
+                for _, _, last in stripe.entries.values():
+                    if not self._expired(last, now):
+                        break
+                    expired += 1
+                total += len(stripe.entries) - expired
+        return total
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """Snapshot of (key, session) pairs; does not refresh LRU order."""
+        out: List[Tuple[str, Any]] = []
+        for stripe in self._stripes:
+            with stripe.lock:
+                out.extend((k, v[0]) for k, v in stripe.entries.items())
+        return out
+
+    def keys(self) -> List[str]:
+        return [k for k, _ in self.items()]
+
+    def values(self) -> List[Any]:
+        return [v for _, v in self.items()]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get registry size and eviction counters.
+
+        Returns:
+            Dictionary with entries, bytes, hits, misses and eviction counts by reason
+        """
+        totals = {
+            'entries': 0, 'bytes': 0, 'hits': 0, 'misses': 0,
+            'evicted_lru': 0, 'evicted_ttl': 0, 'evicted_bytes': 0, 'removed': 0,
+        }
+        for stripe in self._stripes:
+            with stripe.lock:
+                totals['entries'] += len(stripe.entries)
+                totals['bytes'] += stripe.bytes
+                totals['hits'] += stripe.hits
+                totals['misses'] += stripe.misses
+                totals['evicted_lru'] += stripe.evicted_lru
+                totals['evicted_ttl'] += stripe.evicted_ttl
+                totals['evicted_bytes'] += stripe.evicted_bytes
+                totals['removed'] += stripe.removed
+        totals['evictions'] = totals['evicted_lru'] + totals['evicted_ttl'] + totals['evicted_bytes']
+        return totals
+
+
+# ---- Process-wide registries ---------------------------------------------------
+
+_REGISTRIES: Dict[str, SessionRegistry] = {}
+_REGISTRIES_LOCK = threading.Lock()
+
+
+def get_session_registry(kind: str, config: Optional[dict] = None, record_type: Optional[type] = None,
+                         on_evict: Optional[Callable[[str, Any, str], None]] = None) -> SessionRegistry:
+    """
+    Return the process-wide registry for one kind of session state, creating it on first use.
+
+    BotManager and ConversationHandler are rebuilt on every Streamlit rerun; a shared
+    registry lets sessions age into idle-TTL eviction and keeps the LRU and byte
+    budgets process-wide. `config`, `record_type` and `on_evict` are used only when
+    the registry is created, so `on_evict` must not depend on the calling instance.
+
+    Args:
+        kind: Registry name (e.g. "bot", "conversation")
+        config: Full app config (see SessionRegistry.from_config)
+        record_type: SessionRecord subclass used to convert dicts on insert
+        on_evict: Optional callback(key, value, reason)
+    """
+    with _REGISTRIES_LOCK:
+        registry = _REGISTRIES.get(kind)
+        if registry is None:
+            registry = _REGISTRIES[kind] = SessionRegistry.from_config(config, record_type=record_type,
+                                                                        on_evict=on_evict)
+        return registry
@@ -0,0 +1,139 @@
+"""
+Startup Profile
+What a fresh Streamlit process pays before the first participant sees a page:
+the time to `import src.app`, the first initialize_app() call, and per-module
+import cost from `python -X importtime`.
+
+- Each profile runs in a new interpreter, so nothing is already imported.
+- The child runs in a temporary working directory holding a copy of config/,
+  with DATABASE_URL pointing at a throwaway SQLite file there. The study
+  database and the repo's data/ directory are never touched.
+- OPENAI_API_KEY gets a placeholder if unset. Clients are created lazily, so
+  no request is made.
+- `heavy` records which of HEAVY_MODULES were loaded after the import and
+  after initialize_app(); openai and pandas should appear in neither.
+
+Usage:
+    profile = profile_startup()
+    print(profile['import_ms'], profile['initialize_ms'])
+    for module in profile['modules'][:20]:
+        ...
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional
+
+# Dependencies whose import cost matters on a cold start
+HEAVY_MODULES = ("streamlit", "sqlalchemy", "openai", "pandas", "yaml", "dotenv")
+
+_MARKER = "@@startup-profile@@"
+
+# Runs in the child interpreter; prints one JSON line after the marker
+_CHILD = r"""
+import json, sys, time
+heavy = %(heavy)r
+started = time.perf_counter()
+import src.app as app
+imported = time.perf_counter()
+after_import = [m for m in heavy if m in sys.modules]
+app.initialize_app()
+initialized = time.perf_counter()
+after_initialize = [m for m in heavy if m in sys.modules]
+print(%(marker)r + json.dumps({
+    'import_ms': round((imported - started) * 1000, 1),
+    'initialize_ms': round((initialized - imported) * 1000, 1),
+    'heavy': {'after_import': after_import, 'after_initialize': after_initialize},
+}), flush=True)
+"""
+
+
+def parse_importtime(text: str) -> List[Dict[str, Any]]:
+    """
+    Parse `-X importtime` output.
+
+    Args:
+        text: The child's stderr; lines not starting with "import time:" are ignored
+
+    Returns:
+        [{"module", "self_us", "cumulative_us", "depth"}] in import order (depth 0: imported directly)
+    """
+    modules = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|", 2)
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # header line
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append({'module': name.strip(), 'self_us': self_us,
+                        'cumulative_us': cumulative_us, 'depth': max(0, depth)})
+    return modules
+
+
+def by_package(modules: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Self import time (us) summed per top-level package, largest first."""
+    totals: Dict[str, int] = {}
+    for module in modules:
+        package = module['module'].split(".")[0]
+        totals[package] = totals.get(package, 0) + module['self_us']
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def profile_startup(project_root: Optional[str] = None, importtime: bool = True,
+                    timeout: float = 120.0) -> Dict[str, Any]:
+    """
+    Import src.app and call initialize_app() once in a fresh interpreter.
+
+    Args:
+        project_root: Repository root (default: two levels above this file)
+        importtime: Also collect per-module import times (-X importtime adds a little overhead)
+        timeout: Seconds before the child is killed
+
+    Returns:
+        {"import_ms", "initialize_ms", "total_ms", "heavy": {"after_import", "after_initialize"},
+         "modules": [...] slowest self time first, "packages": {package: self_us}}
+
+    Raises:
+        RuntimeError: If the child fails or prints no result
+    """
+    root = os.path.abspath(project_root or os.path.join(os.path.dirname(__file__), "..", ".."))
+    workdir = tempfile.mkdtemp(prefix="startup-profile-")
+    try:
+        shutil.copytree(os.path.join(root, "config"), os.path.join(workdir, "config"))
+        env = dict(os.environ)
+        env["PYTHONPATH"] = root + (os.pathsep + env["PYTHONPATH"] if env.get("PYTHONPATH") else "")
+        env["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "startup.db")
+        env.setdefault("OPENAI_API_KEY", "startup-profile")
+        env.pop("PYTHONPROFILEIMPORTTIME", None)
+
+        command = [sys.executable]
+        if importtime:
+            command += ["-X", "importtime"]
+        command += ["-c", _CHILD % {'heavy': HEAVY_MODULES, 'marker': _MARKER}]
+        out = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True, timeout=timeout)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = None
+    for line in out.stdout.splitlines():
+        if line.startswith(_MARKER):
+            result = json.loads(line[len(_MARKER):])
+    if out.returncode != 0 or result is None:
+        tail = "\n".join(out.stderr.strip().splitlines()[-15:])
+        raise RuntimeError(f"Startup profile failed (exit {out.returncode}):\n{tail}")
+
+    modules = parse_importtime(out.stderr) if importtime else []
+    result['total_ms'] = round(result['import_ms'] + result['initialize_ms'], 1)
+    result['modules'] = sorted(modules, key=lambda m: m['self_us'], reverse=True)
+    result['packages'] = by_package(modules)
+    return result
@@ -0,0 +1,258 @@
+"""
+Structured Logging
+Queue-based JSON logging configured from the `logging:` config section.
+
+Callers only format the message and put the record on a bounded in-memory
+queue; a background listener thread does all stdout and disk I/O, so the
+chat turn never waits on a slow terminal, pipe or disk. When the queue is
+full records are dropped (and counted) rather than blocking.
+
+Streams (one JSON object per line, rotated by size):
+
+- <log_path>/app.jsonl: every record at or above its logger's level
+- <error_log_path>/errors.jsonl: ERROR and above
+- <crisis_flag_path>/crisis_flags.jsonl: only the `empathic.crisis_flags` logger
+- console: short human-readable lines (replaces the old print() output)
+
+Loggers live under the `empathic.` namespace so names stay stable whether
+modules are imported as `src.database.db_manager` or `db_manager`; levels can
+be set per logger with `logging.module_levels` (e.g. {db: WARNING}).
+
+Usage:
+    from src.utils.structured_logging import get_logger
+    log = get_logger("db")
+    log.info("Saved message %s from %s", num, sender, extra={"participant_id": pid})
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+try:
+    from src.utils import metrics, tracing
+except Exception:
+    import metrics
+    import tracing
+
+
+ROOT = "empathic"
+CRISIS_FLAGS = f"{ROOT}.crisis_flags"
+
+DROPPED = metrics.counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+
+# Attributes every LogRecord has; anything else came from `extra=` and is a structured field
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger `empathic.<name>` (e.g. "db", "bot", "crisis", "crisis_flags")."""
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg, trace_id and `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value if isinstance(value, (bool, int, float, str, type(None))) else str(value)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+
+class _ContextFilter(logging.Filter):
+    """Copies the caller's trace id onto the record before it leaves the caller's thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "trace_id"):
+            trace_id = tracing.current_trace_id()
+            if trace_id:
+                record.trace_id = trace_id
+        return True
+
+
+class _NameFilter(logging.Filter):
+    def __init__(self, prefix: str, include: bool = True):
+        super().__init__()
+        self.prefix = prefix
+        self.include = include
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.name.startswith(self.prefix) == self.include
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when the queue is full."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Args are merged into the message now (they may change later); the traceback is
+        # rendered here because the base class drops exc_info before queueing
+        exc_text = self.formatter.formatException(record.exc_info) if record.exc_info else record.exc_text
+        record = super().prepare(record)
+        record.exc_text = exc_text
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED.inc()
+
+
+class _MessageFormatter(logging.Formatter):
+    """Used by the queue handler: the message only (the traceback travels in exc_text)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return record.getMessage()
+
+
+class LoggingSetup:
+    """The running queue listener and its handlers."""
+
+    def __init__(self, listener: logging.handlers.QueueListener, handler: DroppingQueueHandler,
+                 log_queue: "queue.Queue"):
+        self.listener = listener
+        self.handler = handler
+        self.queue = log_queue
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every queued record has been written; returns False on timeout."""
+        done = threading.Event()
+        marker = logging.LogRecord(ROOT, logging.CRITICAL, "", 0, "", None, None)
+        marker._flush = done  # handled by _FlushAwareListener
+        try:
+            self.queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stop(self):
+        logging.getLogger(ROOT).removeHandler(self.handler)
+        self.listener.stop()
+        for h in self.listener.handlers:
+            h.close()
+
+
+class _FlushAwareListener(logging.handlers.QueueListener):
+    def handle(self, record: logging.LogRecord):
+        done = getattr(record, "_flush", None)
+        if done is not None:
+            for h in self.handlers:
+                h.flush()
+            done.set()
+            return
+        super().handle(record)
+
+
+def _file_handler(directory: str, filename: str, max_bytes: int, backup_count: int) -> logging.Handler:
+    os.makedirs(directory, exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(os.path.join(directory, filename), maxBytes=max_bytes,
+                                                   backupCount=backup_count, encoding="utf-8", delay=True)
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def _level(value, default=logging.INFO) -> int:
+    if isinstance(value, int):
+        return value
+    level = logging.getLevelName(str(value or "").upper())
+    return level if isinstance(level, int) else default
+
+
+_SETUP: Optional[LoggingSetup] = None
+_SETUP_LOCK = threading.Lock()
+
+
+def configure_logging(config: Optional[dict], stream=None) -> Optional[LoggingSetup]:
+    """
+    Start queue-based logging from the `logging` config section.
+
+    Safe to call on every Streamlit rerun; the listener starts once per process.
+
+    Args:
+        config: Full app config
+        stream: Console stream (defaults to stdout)
+
+    Returns:
+        The running LoggingSetup, or None if logging is disabled
+    """
+    global _SETUP
+    cfg = (config or {}).get("logging") or {}
+    if not cfg.get("enabled", False):
+        return _SETUP
+    with _SETUP_LOCK:
+        if _SETUP is not None:
+            return _SETUP
+        max_bytes = int(cfg.get("max_bytes", 10 * 1024 * 1024))
+        backups = int(cfg.get("backup_count", 5))
+        handlers = []
+
+        if cfg.get("log_path"):
+            app_handler = _file_handler(cfg["log_path"], "app.jsonl", max_bytes, backups)
+            app_handler.addFilter(_NameFilter(CRISIS_FLAGS, include=False))
+            handlers.append(app_handler)
+        if cfg.get("error_log_path"):
+            error_handler = _file_handler(cfg["error_log_path"], "errors.jsonl", max_bytes, backups)
+            error_handler.setLevel(logging.ERROR)
+            handlers.append(error_handler)
+        if cfg.get("crisis_flag_path"):
+            crisis_handler = _file_handler(cfg["crisis_flag_path"], "crisis_flags.jsonl", max_bytes, backups)
+            crisis_handler.addFilter(_NameFilter(CRISIS_FLAGS))
+            handlers.append(crisis_handler)
+        if cfg.get("console", True):
+            console = logging.StreamHandler(stream or sys.stdout)
+            console.setLevel(_level(cfg.get("console_level"), logging.NOTSET))
+            console.setFormatter(logging.Formatter("%(levelname).1s %(name)s: %(message)s"))
+            handlers.append(console)
+
+        log_queue: "queue.Queue" = queue.Queue(maxsize=int(cfg.get("queue_size", 10000)))
+        queue_handler = DroppingQueueHandler(log_queue)
+        queue_handler.setFormatter(_MessageFormatter())
+        queue_handler.addFilter(_ContextFilter())
+        listener = _FlushAwareListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+
+        root = logging.getLogger(ROOT)
+        root.setLevel(_level(cfg.get("level")))
+        root.addHandler(queue_handler)
+        # Records stop here instead of also reaching the (synchronous) root logger handlers
+        root.propagate = False
+        # The crisis-flag stream keeps every record regardless of the global level
+        logging.getLogger(CRISIS_FLAGS).setLevel(logging.INFO)
+        for name, level in (cfg.get("module_levels") or {}).items():
+            get_logger(name).setLevel(_level(level))
+
+        _SETUP = LoggingSetup(listener, queue_handler, log_queue)
+        return _SETUP
+
+
+def shutdown_logging():
+    """Flush and stop the listener (tests, scripts); loggers fall back to the root logger."""
+    global _SETUP
+    with _SETUP_LOCK:
+        if _SETUP is None:
+            return
+        _SETUP.flush()
+        _SETUP.stop()
+        root = logging.getLogger(ROOT)
+        root.propagate = True
+        root.setLevel(logging.NOTSET)
+        for logger in list(logging.Logger.manager.loggerDict.values()):
+            if isinstance(logger, logging.Logger) and logger.name.startswith(f"{ROOT}."):
+                logger.setLevel(logging.NOTSET)
+        _SETUP = None
@@ -0,0 +1,469 @@
+"""
+Tracing
+Lightweight spans across one chat turn, with OpenTelemetry-compatible context.
+
+A turn touches Streamlit, the database, the LLM provider and the crisis
+detector; per-component metrics show which one is slow in aggregate, spans
+show it for one participant's turn:
+
+    streamlit.rerun
+      chat.turn
+        crisis.check
+        ui.stream_render
+          bot.stream
+            llm.attempt   (events: connect_tcp, start_tls, ttfb, first_token)
+        db.save_message   (written on a lane thread, parented explicitly)
+          db.execute      (SQLAlchemy cursor events; pool checkout as event)
+
+Ids follow W3C trace context (32-hex trace id, 16-hex span id) and spans are
+exported as one JSON object per line using OTLP/JSON field names, so files can
+be converted or loaded into any OpenTelemetry backend. Exporters:
+
+- JsonlExporter: appends to a local file from a background thread
+- MemoryExporter: keeps finished spans in a list (tests, collector stand-in)
+
+The active span lives in a ContextVar. Generators must not hold a span active
+across `yield`; use `use_span()` around each step instead. Threads do not
+inherit context: pass `parent=` or start them with `contextvars.copy_context().run`.
+
+Tracing is configured by the `tracing:` config section and is a no-op when
+disabled.
+
+Usage:
+    from src.utils import tracing
+    with tracing.span("db.save_message", participant_id=pid) as s:
+        s.set_attribute("rows", 1)
+"""
+
+import functools
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+# ---------- Spans ----------
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits) or 1:0{bits // 4}x}"
+
+
+def _attr(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+class Span:
+    """One timed operation. Finished spans are handed to the tracer's exporter."""
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str] = None,
+                 sampled: bool = True, attributes: Optional[dict] = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = {k: _attr(v) for k, v in (attributes or {}).items()}
+        self.events: List[dict] = []
+        self.status = "UNSET"
+        self.status_message = ""
+
+    @property
+    def recording(self) -> bool:
+        return self.sampled and self.end_ns is None
+
+    @property
+    def traceparent(self) -> str:
+        """W3C traceparent header value for this span."""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set_attribute(self, key: str, value: Any):
+        if self.recording:
+            self.attributes[key] = _attr(value)
+
+    def add_event(self, name: str, **attributes):
+        if self.recording:
+            self.events.append({"name": name, "timeUnixNano": time.time_ns(),
+                                "attributes": {k: _attr(v) for k, v in attributes.items()}})
+
+    def record_error(self, exc: BaseException):
+        if self.recording:
+            self.status, self.status_message = "ERROR", f"{type(exc).__name__}: {exc}"[:500]
+            self.add_event("exception", type=type(exc).__name__, message=str(exc)[:500])
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self.sampled:
+            self.tracer._export(self)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return round((self.end_ns - self.start_ns) / 1e6, 3)
+
+    def to_dict(self) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": self.duration_ms,
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": {"code": self.status, "message": self.status_message},
+            "resource": {"service.name": self.tracer.service_name},
+        }
+
+
+class _NoopSpan:
+    """Returned while tracing is disabled; every operation does nothing."""
+
+    trace_id = None
+    span_id = None
+    parent_id = None
+    sampled = False
+    recording = False
+    traceparent = None
+    duration_ms = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def add_event(self, name, **attributes):
+        pass
+
+    def record_error(self, exc):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_CURRENT: ContextVar = ContextVar("current_span", default=None)
+
+
+# ---------- Exporters ----------
+
+class MemoryExporter:
+    """Keeps finished spans in memory (tests, or a stand-in for a collector)."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def find(self, name: str) -> List[Span]:
+        with self._lock:
+            return [s for s in self.spans if s.name == name]
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonlExporter:
+    """Appends finished spans to a JSONL file from a background thread."""
+
+    def __init__(self, path: str, batch_size: int = 256):
+        self.path = path
+        self.batch_size = max(1, int(batch_size))
+        self._queue: "queue.Queue" = queue.Queue()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span):
+        self._queue.put(span.to_dict())
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            records = [b for b in batch if b is not None and not callable(b)]
+            if records:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write("".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records))
+                except OSError as e:
+                    print(f"⚠ Could not write traces to {self.path}: {e}")
+            for b in batch:
+                if callable(b):
+                    b()
+            if stop:
+                return
+
+    def flush(self, timeout: float = 5.0):
+        """Block until every span exported so far is on disk."""
+        done = threading.Event()
+        self._queue.put(done.set)
+        done.wait(timeout)
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+# ---------- Tracer ----------
+
+class Tracer:
+    """Creates spans and hands finished, sampled ones to an exporter."""
+
+    def __init__(self, exporter=None, sample_rate: float = 1.0, service_name: str = "empathic-chat"):
+        """
+        Args:
+            exporter: JsonlExporter / MemoryExporter (None disables tracing)
+            sample_rate: Share of new traces that are recorded (decided at the root span)
+            service_name: resource service.name written with every span
+        """
+        self.exporter = exporter
+        self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        self.service_name = service_name
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def _export(self, span: Span):
+        try:
+            self.exporter.export(span)
+        except Exception as e:
+            print(f"⚠ Span export failed: {e}")
+
+    def start_span(self, name: str, parent=None, **attributes):
+        """
+        Start a span without activating it; call `.end()` when done.
+
+        Args:
+            name: Span name
+            parent: Parent span (defaults to the current span; a new trace if none)
+            **attributes: Initial span attributes
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = parent if parent is not None else _CURRENT.get()
+        if isinstance(parent, Span):
+            return Span(self, name, parent.trace_id, parent.span_id, parent.sampled, attributes)
+        sampled = self.sample_rate >= 1.0 or random.random() < self.sample_rate
+        return Span(self, name, _new_id(128), None, sampled, attributes)
+
+
+_TRACER = Tracer()
+_CONFIG_LOCK = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    return _TRACER
+
+
+def set_tracer(tracer: Tracer) -> Tracer:
+    """Install a process-wide tracer (returns the previous one)."""
+    global _TRACER
+    previous, _TRACER = _TRACER, tracer
+    return previous
+
+
+def configure_from_config(config: Optional[dict]) -> Tracer:
+    """
+    Install the tracer described by the `tracing` config section.
+
+    Safe to call on every Streamlit rerun; the tracer is built once per process.
+    """
+    cfg = (config or {}).get("tracing") or {}
+    with _CONFIG_LOCK:
+        if not cfg.get("enabled", False) or _TRACER.enabled:
+            return _TRACER
+        exporter_name = cfg.get("exporter", "jsonl")
+        if exporter_name == "memory":
+            exporter = MemoryExporter()
+        else:
+            path = cfg.get("path", "data/traces/spans.jsonl")
+            exporter = JsonlExporter(path)
+            print(f"✓ Writing traces to {path}")
+        set_tracer(Tracer(exporter, float(cfg.get("sample_rate", 1.0)),
+                          cfg.get("service_name", "empathic-chat")))
+        return _TRACER
+
+
+# ---------- Context helpers ----------
+
+def start_span(name: str, parent=None, **attributes):
+    """Start (but do not activate) a span on the process tracer."""
+    return _TRACER.start_span(name, parent, **attributes)
+
+
+@contextmanager
+def use_span(span, end: bool = False) -> Iterator:
+    """
+    Make `span` current for the block (and optionally end it afterwards).
+
+    Exceptions raised in the block are recorded on the span (control-flow
+    BaseExceptions such as Streamlit's rerun or GeneratorExit are not errors).
+    """
+    if span is NOOP_SPAN or span is None:
+        yield NOOP_SPAN
+        return
+    token = _CURRENT.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.record_error(e)
+        raise
+    finally:
+        _CURRENT.reset(token)
+        if end:
+            span.end()
+
+
+@contextmanager
+def span(name: str, parent=None, **attributes) -> Iterator:
+    """Start a span, make it current for the block and end it afterwards."""
+    with use_span(_TRACER.start_span(name, parent, **attributes), end=True) as s:
+        yield s
+
+
+def traced(name: Optional[str] = None):
+    """Decorator running the function inside a span (default name: the function's)."""
+    def decorate(fn: Callable) -> Callable:
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _TRACER.enabled:
+                return fn(*args, **kwargs)
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def current_span():
+    """The active span (NOOP_SPAN if none)."""
+    return _CURRENT.get() or NOOP_SPAN
+
+
+def current_trace_id() -> Optional[str]:
+    """Trace id of the active span, e.g. to store with a message row."""
+    current = _CURRENT.get()
+    return current.trace_id if current is not None else None
+
+
+# ---------- Integrations ----------
+
+# httpcore trace events worth keeping on the LLM attempt span; per-chunk body
+# reads are left out so a long stream does not produce hundreds of events
+_HTTP_EVENTS = {
+    "connection.connect_tcp.complete": "http.connect_tcp",
+    "connection.start_tls.complete": "http.start_tls",
+    "http11.send_request_headers.complete": "http.request_sent",
+    "http2.send_request_headers.complete": "http.request_sent",
+    "http11.receive_response_headers.complete": "http.ttfb",
+    "http2.receive_response_headers.complete": "http.ttfb",
+}
+
+
+def httpx_event_hooks() -> Dict[str, list]:
+    """
+    Event hooks for an httpx client (as passed to the OpenAI SDK).
+
+    The request hook attaches a trace callback so connect/TLS/time-to-first-byte
+    land as events on the current span, and propagates the W3C traceparent header.
+    """
+    def on_request(request):
+        current = _CURRENT.get()
+        if current is None or not current.recording:
+            return
+        request.headers["traceparent"] = current.traceparent
+
+        def trace(event_name, info):
+            label = _HTTP_EVENTS.get(event_name)
+            if label:
+                current.add_event(label)
+            elif event_name.endswith(".failed"):
+                current.add_event("http.failed", stage=event_name)
+
+        request.extensions["trace"] = trace
+
+    def on_response(response):
+        current = _CURRENT.get()
+        if current is not None and current.recording:
+            current.set_attribute("http.status_code", response.status_code)
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+def instrument_sqlalchemy(engine, max_statement: int = 200):
+    """
+    Record a `db.execute` child span per cursor execution on `engine`, and pool
+    connect/checkout (which includes pre-ping) as events on the current span.
+
+    Args:
+        engine: SQLAlchemy Engine
+        max_statement: Characters of SQL kept in the db.statement attribute
+    """
+    from sqlalchemy import event
+
+    system = engine.dialect.name
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if not _TRACER.enabled:
+            return
+        s = _TRACER.start_span("db.execute", None, **{"db.system": system,
+                                                      "db.statement": statement[:max_statement]})
+        if executemany:
+            s.set_attribute("db.executemany", True)
+        conn.info.setdefault("_trace_spans", []).append(s)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("_trace_spans")
+        if spans:
+            s = spans.pop()
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                s.set_attribute("db.rowcount", cursor.rowcount)
+            s.end()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        spans = context.connection.info.get("_trace_spans") if context.connection is not None else None
+        if spans:
+            s = spans.pop()
+            s.record_error(context.original_exception)
+            s.end()
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        current_span().add_event("db.pool.connect")
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        current_span().add_event("db.pool.checkout")
@@ -0,0 +1,134 @@
+"""
+Turn cancellation tests: in-flight replies stop promptly and are never retried.
+
+Run: python -m pytest -q tests/test_cancellation.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.llm_stub import LLMStubServer
+from src.chatbot import resilience
+from src.chatbot.bot_manager import BotManager
+from src.chatbot.cancellation import CancellationRegistry, TurnCancelled
+
+
+REPLY = " ".join(f"word{i}" for i in range(60)) + "."
+CHUNK_DELAY = 0.05
+
+
+@pytest.fixture
+def stub():
+    with LLMStubServer(reply=REPLY, chunk_delay=CHUNK_DELAY) as server:
+        yield server
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+
+
+def make_bot(stub, **api):
+    bot = BotManager(None, {
+        "api": dict({"base_url": stub.base_url, "max_tokens": 200, "max_words": 500,
+                     "retry_attempts": 2, "retry_backoff_base": 0.01, "retry_backoff_max": 0.02,
+                     "scheduler": {"enabled": False}}, **api),
+        "session_store": {"backend": "none"},
+    })
+    bot.cancellations = CancellationRegistry()
+    session_id = bot.create_new_session()["session_id"]
+    bot.set_bot_type(session_id, "control")
+    return bot, session_id
+
+
+def cancel_after_chunks(bot, session_id, chunks, reason="navigation"):
+    """Consume a turn, cancelling it from another thread after `chunks` chunks."""
+    received = []
+    for chunk in bot.stream_bot_response(session_id, "hello"):
+        received.append(chunk)
+        if len(received) == chunks:
+            threading.Thread(target=bot.cancel_turn, args=(session_id, reason)).start()
+    return received
+
+
+def test_cancel_stops_stream_promptly(stub):
+    bot, sid = make_bot(stub)
+    started = time.perf_counter()
+    received = cancel_after_chunks(bot, sid, 3)
+
+    assert len(received) < 10
+    assert time.perf_counter() - started < 60 * CHUNK_DELAY / 2
+    assert not bot.cancellations.is_active(sid)
+    assert bot.get_last_call(sid)["cancelled"] == "navigation"
+
+
+def test_cancelled_turn_is_not_retried_or_kept(stub):
+    bot, sid = make_bot(stub)
+    stub.add_fault(drop_after=2)
+    received = cancel_after_chunks(bot, sid, 1)
+
+    # The dropped connection would normally resume on a second request
+    time.sleep(0.1)
+    assert stub.request_count() == 1
+    assert len(received) <= 2
+    assert bot.sessions[sid]["history"] == []
+
+
+def test_end_session_cancels_in_flight_turn(stub):
+    bot, sid = make_bot(stub)
+    stream = bot.stream_bot_response(sid, "hello")
+    next(stream)
+    assert bot.cancellations.is_active(sid)
+
+    bot.end_session(sid)
+    rest = list(stream)
+    assert len(rest) <= 1
+    assert bot.cancellation_stats()["by_reason"] == {"session_ended": 1}
+
+
+def test_closing_stream_counts_savings(stub):
+    bot, sid = make_bot(stub)
+    stream = bot.stream_bot_response(sid, "hello")
+    for _ in range(5):
+        next(stream)
+    stream.close()
+
+    stats = bot.cancellation_stats()
+    assert stats["cancelled"] == 1
+    assert stats["by_reason"] == {"abandoned": 1}
+    assert stats["tokens_saved_est"] == 200 - 5
+    assert stats["seconds_saved_est"] > 0
+    assert stats["in_flight"] == 0
+
+
+def test_word_cap_is_an_early_stop_not_a_cancellation(stub):
+    stub.reply = "One two three. Four five six. Seven eight nine."
+    bot, sid = make_bot(stub, max_words=3)
+
+    assert "".join(bot.stream_bot_response(sid, "hello")).strip() == "One two three."
+    stats = bot.cancellation_stats()
+    assert stats["early_stops"] == 1
+    assert stats["cancelled"] == 0
+    assert len(bot.sessions[sid]["history"]) == 2
+
+
+def test_newer_turn_supersedes_older_token():
+    registry = CancellationRegistry()
+    first = registry.begin("s1")
+    second = registry.begin("s1")
+
+    assert first.reason == "superseded"
+    with pytest.raises(TurnCancelled):
+        first.raise_if_cancelled()
+    registry.finish(first)
+    assert registry.is_active("s1")
+    registry.finish(second)
+    assert not registry.is_active("s1")
@@ -0,0 +1,113 @@
+"""
+Cassette tests: record a turn against the local LLM stub, replay it offline,
+fingerprints that follow the routed request, and failed streams left unrecorded.
+
+Run: python -m pytest -q tests/test_cassette.py
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.llm_stub import LLMStubServer
+from src.chatbot import providers, resilience
+from src.chatbot.bot_manager import BotManager
+from src.chatbot.cassette import Cassette, CassetteMiss
+
+
+REPLY = "Recorded reply from the stub."
+
+
+@pytest.fixture
+def stub():
+    with LLMStubServer(reply=REPLY) as server:
+        yield server
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setattr(providers, "_HEALTH", {})
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+
+
+def make_bot(base_url, cassette, bot_type="control"):
+    cfg = {
+        "api": {
+            "max_tokens": 200,
+            "max_words": 100,
+            "retry_attempts": 1,
+            "retry_backoff_base": 0.01,
+            "scheduler": {"enabled": False},
+            "token_calibration": {"enabled": False},
+            "cassette": cassette,
+            "providers": {
+                "alpha": {"model": "alpha-model", "base_url": base_url},
+                "beta": {"model": "beta-model", "base_url": base_url},
+            },
+            "routing": {"routes": {"default": ["alpha"], "emotional": ["beta", "alpha"]}},
+        },
+        "session_store": {"backend": "none"},
+    }
+    bot = BotManager(None, cfg)
+    session_id = bot.create_new_session()["session_id"]
+    bot.set_bot_type(session_id, bot_type)
+    return bot, session_id
+
+
+def test_record_then_replay_offline(stub, tmp_path):
+    path = str(tmp_path / "calls.jsonl")
+    bot, sid = make_bot(stub.base_url, {"mode": "record", "path": path}, bot_type="emotional")
+    assert "".join(bot.stream_bot_response(sid, "hello")) == REPLY
+
+    with open(path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    assert len(entries) == 1 and entries[0]["model"] == "beta-model"
+    requests = stub.request_count()
+
+    # Nothing listens on this port: replay must not touch the network
+    replay_bot, replay_sid = make_bot("http://127.0.0.1:9/v1", {"mode": "replay", "path": path},
+                                      bot_type="emotional")
+    assert "".join(replay_bot.stream_bot_response(replay_sid, "hello")) == REPLY
+    assert stub.request_count() == requests
+
+
+def test_fingerprint_follows_routed_model_and_cap(stub, tmp_path):
+    path = str(tmp_path / "calls.jsonl")
+    bot, sid = make_bot(stub.base_url, {"mode": "record", "path": path}, bot_type="emotional")
+    messages = bot._build_messages(bot.sessions[sid], "hello")
+    "".join(bot.stream_bot_response(sid, "hello"))
+    with open(path, encoding="utf-8") as f:
+        recorded = json.loads(f.readline())["fp"]
+
+    # Keyed by the emotional route's model (beta), not api.model or the default route
+    assert recorded == bot._fingerprint(messages, "emotional", 200)
+    assert recorded != bot._fingerprint(messages, "control", 200)
+    # A different completion cap (e.g. after calibration) is a different request
+    assert recorded != bot._fingerprint(messages, "emotional", 120)
+    with pytest.raises(CassetteMiss):
+        Cassette(path, mode="replay").replay_text(bot._fingerprint(messages, "control", 200))
+
+
+def test_failed_stream_is_not_recorded(tmp_path):
+    path = str(tmp_path / "calls.jsonl")
+    cassette = Cassette(path, mode="record")
+
+    def failing():
+        yield "partial "
+        raise ConnectionError("dropped")
+
+    with pytest.raises(ConnectionError):
+        "".join(cassette.record_stream("fp-failed", "m", failing()))
+    assert not os.path.exists(path)
+
+    # Stopping early (word cap) keeps what the caller consumed
+    tokens = cassette.record_stream("fp-capped", "m", iter(["a ", "b ", "c "]))
+    assert next(tokens) == "a "
+    tokens.close()
+    assert Cassette(path, mode="replay").replay_text("fp-capped") == "a "
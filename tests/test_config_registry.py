@@ -0,0 +1,144 @@
+"""
+Config registry tests: read-only snapshots, hash-checked hot reload, rejected
+edits, change subscriptions and shared compiled artefacts.
+
+Run: python -m pytest -q tests/test_config_registry.py
+"""
+
+import os
+import pickle
+import sys
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.chatbot.crisis_detector import CrisisDetector
+from src.utils.config_registry import ConfigError, ConfigRegistry, FrozenDict, get_registry
+
+CONFIG = """\
+api:
+  model: "gpt-test"
+  max_words: 50
+safety:
+  crisis_keywords: ["suicide", "want to die"]
+  normalization: {enabled: true}
+"""
+
+
+def write(path, text, bump=0):
+    path.write_text(text, encoding="utf-8")
+    # Filesystems with coarse mtimes: make every write visible to the stat check
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + bump * 1_000_000_000))
+
+
+@pytest.fixture
+def config_dir(tmp_path):
+    write(tmp_path / "app_config.yaml", CONFIG)
+    write(tmp_path / "cognitive_empathy_prompt.txt", "Understand their view.\n")
+    write(tmp_path / "crisis_response.txt", "Call 988.\n")
+    return tmp_path
+
+
+def test_snapshot_is_read_only_and_picklable(config_dir):
+    snapshot = ConfigRegistry(str(config_dir / "app_config.yaml")).snapshot()
+    assert snapshot.config["api"]["model"] == "gpt-test"
+    assert snapshot.prompts["cognitive"] == "Understand their view." and snapshot.prompts["emotional"] == ""
+    assert snapshot.crisis_text == "Call 988."
+    assert isinstance(snapshot.config["safety"], dict)
+    assert snapshot.config["safety"]["crisis_keywords"] == ("suicide", "want to die")
+    with pytest.raises(TypeError):
+        snapshot.config["api"]["model"] = "other"
+    with pytest.raises(TypeError):
+        snapshot.config.setdefault("new", {})
+    copy = pickle.loads(pickle.dumps(snapshot.config))
+    assert isinstance(copy, FrozenDict) and copy == snapshot.config
+
+
+def test_reload_only_when_content_changes(config_dir):
+    registry = ConfigRegistry(str(config_dir / "app_config.yaml"), check_interval=0)
+    seen = []
+    registry.subscribe(lambda snapshot, changed: seen.append((snapshot.version, sorted(changed))),
+                       parts=("safety", "crisis_text"))
+
+    # Touched, same bytes: hashed, not re-parsed
+    write(config_dir / "app_config.yaml", CONFIG, bump=1)
+    assert registry.check() is False and registry.snapshot().version == 1
+
+    # A section nobody subscribed to: new snapshot, no callback
+    write(config_dir / "app_config.yaml", CONFIG.replace("gpt-test", "gpt-next"), bump=2)
+    assert registry.snapshot().config["api"]["model"] == "gpt-next" and seen == []
+
+    write(config_dir / "crisis_response.txt", "Call or text 988.", bump=3)
+    assert registry.snapshot().crisis_text == "Call or text 988."
+    assert seen == [(3, ["crisis_text"])]
+
+
+def test_discarded_subscribers_do_not_accumulate(config_dir):
+    registry = ConfigRegistry(str(config_dir / "app_config.yaml"), check_interval=0)
+
+    class Owner:
+        def on_change(self, snapshot, changed):
+            pass
+
+    # One owner per rerun, each discarded before the next; the config never changes
+    for _ in range(50):
+        registry.subscribe(Owner().on_change, parts=("safety",))
+    assert registry.stats()['subscribers'] == 1
+
+    seen = []
+    unsubscribe = registry.subscribe(lambda snapshot, changed: seen.append(snapshot.version))
+    unsubscribe()
+    write(config_dir / "crisis_response.txt", "Call or text 988.", bump=1)
+    registry.check()
+    assert seen == [] and registry.stats()['subscribers'] == 0
+
+
+def test_invalid_edit_keeps_previous_snapshot(config_dir):
+    path = config_dir / "app_config.yaml"
+    registry = ConfigRegistry(str(path), check_interval=0)
+    write(path, CONFIG.replace("max_words: 50", "max_words: -5"), bump=1)
+    assert registry.snapshot().config["api"]["max_words"] == 50
+    write(path, "api: [unbalanced", bump=2)
+    assert registry.snapshot().version == 1 and registry.stats()['failed_reloads'] == 2
+
+    with pytest.raises(ConfigError):
+        ConfigRegistry(str(path))
+
+
+def test_artifact_rebuilt_only_when_its_parts_change(config_dir):
+    registry = ConfigRegistry(str(config_dir / "app_config.yaml"), check_interval=0)
+    builds = []
+
+    def build(snapshot):
+        builds.append(snapshot.version)
+        return tuple(snapshot.config["safety"]["crisis_keywords"])
+
+    assert registry.artifact("keywords", ("safety",), build) == ("suicide", "want to die")
+    write(config_dir / "cognitive_empathy_prompt.txt", "New prompt.", bump=1)
+    assert registry.artifact("keywords", ("safety",), build) == ("suicide", "want to die")
+    assert builds == [1]
+
+    write(config_dir / "app_config.yaml", CONFIG.replace('"suicide", ', ""), bump=2)
+    assert registry.artifact("keywords", ("safety",), build) == ("want to die",)
+    assert builds == [1, 3]
+
+
+def test_crisis_detectors_share_matcher_and_hot_reload(config_dir):
+    path = str(config_dir / "app_config.yaml")
+    registry = get_registry(path)
+    registry.check_interval = 0
+    first, second = CrisisDetector(config_path=path), CrisisDetector(config_path=path)
+    assert first.matcher is second.matcher
+
+    # Runtime edits stay local and survive a reload
+    second.add_keyword("hopeless")
+    write(config_dir / "app_config.yaml", CONFIG.replace('"suicide"', '"end it all"'), bump=1)
+    assert first.get_crisis_response() == "Call 988."  # any snapshot() call runs the check
+    assert first.get_keyword_list() == ["end it all", "want to die"]
+    assert second.get_keyword_list() == ["end it all", "want to die", "hopeless"]
+    assert first.check_message("I want to end it all") == (True, "end it all")
+    assert second.check_message("so hopeless") == (True, "hopeless")
+    assert first.check_message("suicide") == (False, None)
@@ -0,0 +1,188 @@
+"""
+Crisis keyword matcher tests: all matches with offsets, word boundaries,
+agreement with the old per-keyword regexes, normalised variants, one flag
+per matched keyword and incremental scanning of streamed bot replies.
+
+Run: python -m pytest -q tests/test_crisis_matcher.py
+"""
+
+import csv
+import os
+import re
+import sys
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.llm_stub import LLMStubServer
+from src.chatbot import resilience
+from src.chatbot.bot_manager import BotManager
+from src.chatbot.crisis_detector import CrisisDetector
+from src.chatbot.keyword_matcher import KeywordMatch, KeywordMatcher
+from src.chatbot.text_normalizer import TextNormalizer
+from src.chatbot.turn_pipeline import StageTimings, TurnPipeline, WriteLanes
+from src.database.db_manager import DatabaseManager
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+KEYWORDS = ["suicide", "kill myself", "end it all", "want to die", "no reason to live",
+            "better off dead", "hopeless", "alone", "die", "self harm", "can't go on"]
+APP_CONFIG = os.path.join(ROOT, "config", "app_config.yaml")
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    with LLMStubServer(reply="unused") as stub:
+        db = DatabaseManager(str(tmp_path / "study.db"))
+        bot = BotManager(db, {
+            "api": {"base_url": stub.base_url, "scheduler": {"enabled": False}},
+            "session_store": {"backend": "none"},
+        })
+        bot.crisis = CrisisDetector(config_path=APP_CONFIG)
+        yield TurnPipeline(db, bot, lanes=WriteLanes(1), timings=StageTimings()), stub
+
+
+def test_reports_every_occurrence_with_offsets():
+    matcher = KeywordMatcher(["want to die", "die", "kill myself", "Hopeless"])
+    text = "I WANT TO DIE. hopeless... I could kill myself, die"
+
+    assert matcher.find_all(text) == [
+        KeywordMatch("want to die", 2, 13),
+        KeywordMatch("die", 10, 13),
+        KeywordMatch("Hopeless", 15, 23),
+        KeywordMatch("kill myself", 35, 46),
+        KeywordMatch("die", 48, 51),
+    ]
+    assert all(text[m.start:m.end].lower() == m.keyword.lower() for m in matcher.find_all(text))
+
+
+def test_word_boundaries_and_chunked_scanning():
+    matcher = KeywordMatcher(["die", "end it all", "self-harm"])
+    assert matcher.find_all("diet studied died dies") == []
+    assert matcher.find_all("the end it allows") == []
+    assert [m.start for m in matcher.find_all("die, (die) _die die_ die")] == [0, 6, 21]
+    assert [m.keyword for m in matcher.find_all("no self-harm today")] == ["self-harm"]
+
+    # Same result when the text arrives in pieces, including mid-keyword splits
+    text = "i want to end it all and die. diet"
+    scanner = matcher.scanner()
+    streamed = []
+    for i in range(0, len(text), 3):
+        streamed += scanner.feed(text[i:i + 3])
+    streamed += scanner.finish()
+    assert streamed == matcher.find_all(text)
+
+
+def test_matches_old_per_keyword_regexes_on_reddit_posts():
+    with open(os.path.join(ROOT, "docs", "emotional-reactions-reddit-kb2.csv"), newline="", encoding="utf-8") as f:
+        posts = [row["seeker_post"] for row in csv.DictReader(f)]
+    patterns = [(k, re.compile(r'\b' + re.escape(k) + r'\b', re.IGNORECASE)) for k in KEYWORDS]
+    matcher = KeywordMatcher(KEYWORDS)
+
+    hits = 0
+    for post in posts:
+        expected = sorted((m.start(), m.end(), k) for k, p in patterns for m in p.finditer(post))
+        assert sorted((m.start, m.end, m.keyword) for m in matcher.find_all(post)) == expected
+        hits += bool(expected)
+    assert hits > 100
+
+
+def test_detector_reports_all_keywords_in_configured_order():
+    detector = CrisisDetector(config_path=APP_CONFIG)
+    message = "There is no reason to live. I want to die, suicide feels like the only way"
+
+    assert detector.check_message(message) == (True, "suicide")
+    assert detector.matched_keywords(detector.find_all(message)) == ["suicide", "want to die", "no reason to live"]
+    assert detector.check_message("I want to diet") == (False, None)
+
+    detector.add_keyword("hopeless")
+    assert detector.check_message("so hopeless") == (True, "hopeless")
+    detector.remove_keyword("hopeless")
+    assert detector.check_message("so hopeless") == (False, None)
+
+
+def run_turn(pipeline, text):
+    sess = pipeline.bot_manager.create_new_session()
+    pipeline.db.create_participant(sess["participant_id"], sess["bot_type"])
+    turn = pipeline.begin(sess["session_id"], sess["participant_id"], 1, text)
+    "".join(turn.stream())
+    turn.wait(timeout=5)
+    return turn, pipeline.db.get_conversation(sess["participant_id"])
+
+
+def test_crisis_turn_flags_every_matched_keyword(pipeline):
+    pipeline, _ = pipeline
+    sess = pipeline.bot_manager.create_new_session()
+    pipeline.db.create_participant(sess["participant_id"], sess["bot_type"])
+    turn = pipeline.begin(sess["session_id"], sess["participant_id"], 1, "I want to die, better off dead")
+    "".join(turn.stream())
+    turn.wait(timeout=5)
+
+    assert turn.detected_keyword == "want to die"
+    flags = pipeline.db.get_unreviewed_crisis_flags()
+    assert sorted(f.keyword_detected for f in flags) == ["better off dead", "want to die"]
+
+
+def test_normalised_variants_match_with_original_offsets():
+    matcher = KeywordMatcher(["suicide", "kill myself", "want to die", "can't go on"],
+                             normalizer=TextNormalizer(stemming=True))
+    for text, keyword, original in [
+        ("ok so i wanna k1ll mys3lf lol", "kill myself", "k1ll mys3lf"),
+        ("I want\u200b  to   die", "want to die", "want\u200b  to   die"),
+        ("feeling really suicidal today", "suicide", "suicidal"),
+        ("I can’t go on", "can't go on", "can’t go on"),
+        ("ѕuicide", "suicide", "ѕuicide"),
+        ("ＳＵＩＣＩＤＥ", "suicide", "ＳＵＩＣＩＤＥ"),
+        ("thinking about killing myself", "kill myself", "killing myself"),
+        ("want-to-die", "want to die", "want-to-die"),
+    ]:
+        [match] = matcher.find_all(text)
+        assert (match.keyword, text[match.start:match.end]) == (keyword, original)
+
+    # Numbers stay numbers and boundaries still hold
+    assert matcher.find_all("call 988 or text 741741") == []
+    assert matcher.find_all("suicideprevention.org") == []
+
+
+def test_streamed_matches_equal_whole_text_matches():
+    matcher = KeywordMatcher(["suicide", "kill myself", "want to die"], normalizer=TextNormalizer(stemming=True))
+    text = "people who want  to d1e or feel suicidal, or think of k1lling myself, deserve help"
+    expected = matcher.find_all(text)
+    assert [m.keyword for m in expected] == ["want to die", "suicide", "kill myself"]
+    for size in (1, 2, 5, 13):
+        scanner = matcher.scanner()
+        streamed = []
+        for i in range(0, len(text), size):
+            streamed += scanner.feed(text[i:i + size])
+        assert streamed + scanner.finish() == expected
+
+
+def test_streamed_reply_is_scanned_and_marked(pipeline):
+    pipeline, stub = pipeline
+    stub.reply = "Some people feel they want to die. You are not alone."
+    turn, messages = run_turn(pipeline, "I had a rough week")
+
+    assert turn.response == stub.reply
+    assert messages[1].contains_crisis_keyword
+    assert turn.call_meta["crisis_keywords"] == ["want to die"]
+    assert pipeline.db.get_unreviewed_crisis_flags() == []
+
+    stub.reply = "That sounds like a lot to carry."
+    _, messages = run_turn(pipeline, "work was busy")
+    assert not messages[1].contains_crisis_keyword
+
+
+def test_streamed_reply_aborts_on_match(pipeline):
+    pipeline, stub = pipeline
+    pipeline.bot_manager.abort_on_output_crisis = True
+    stub.reply = "Some people feel they want to die. Here is how to cope with that in ten easy steps."
+    turn, messages = run_turn(pipeline, "I had a rough week")
+
+    shown, note = turn.response.split("\n\n", 1)
+    assert shown == "Some people feel they want to "
+    assert note == pipeline.bot_manager._crisis_text()
+    assert messages[1].content == turn.response and messages[1].contains_crisis_keyword
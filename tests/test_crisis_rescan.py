@@ -0,0 +1,148 @@
+"""
+Crisis rescan tests: retroactive flags, idempotent re-runs (also when runs
+overlap), checkpoint resume and process-pool scanning.
+
+Run: python -m pytest -q tests/test_crisis_rescan.py
+"""
+
+import json
+import os
+import sys
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.chatbot.crisis_detector import CrisisDetector
+from src.chatbot.crisis_rescan import CrisisRescan
+from src.database.db_manager import DatabaseManager
+from src.database.models import CrisisFlag, Message, Participant
+from src.database.query_stats import count_queries
+
+
+APP_CONFIG = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'config', 'app_config.yaml'))
+USER_MESSAGES = [
+    ("PR1", "I feel h0peless and I want to die"),
+    ("PR1", "nothing new"),
+    ("PR2", "work was fine"),
+    ("PR2", "so hopeless lately"),
+    ("PR3", "had a nice walk"),
+    ("PR3", "thinking about self-harm again"),
+    ("PR4", "suicide crossed my mind"),
+]
+
+
+def seeded_db(path):
+    db = DatabaseManager(str(path))
+    for pid in ("PR1", "PR2", "PR3", "PR4"):
+        db.create_participant(pid, "control")
+    ids = []
+    for n, (pid, text) in enumerate(USER_MESSAGES, 1):
+        ids.append(db.save_message(pid, n, "user", text).id)
+        db.save_message(pid, n, "bot", "I hear you. It sounds hopeless right now.")
+    # Flagged live when it was sent
+    db.create_crisis_flag("PR4", ids[6], "suicide")
+    return db, ids
+
+
+def flags(db):
+    session = db.get_session()
+    try:
+        return sorted((f.message_id, f.keyword_detected, f.flag_type) for f in session.query(CrisisFlag).all())
+    finally:
+        session.close()
+
+
+def detector(*extra):
+    d = CrisisDetector(config_path=APP_CONFIG)
+    for keyword in extra:
+        d.add_keyword(keyword)
+    return d
+
+
+def test_rescan_flags_new_keywords_once_and_resumes(tmp_path):
+    db, ids = seeded_db(tmp_path / "study.db")
+    checkpoint = str(tmp_path / "checkpoint.json")
+    rescan = CrisisRescan(db, detector("hopeless"), chunk_size=3, workers=0, checkpoint_path=checkpoint)
+
+    report = rescan.run()
+    assert report['messages'] == 7 and report['chunks'] == 3 and report['flags_created'] == 3
+    assert report['messages_per_second'] > 0
+    assert flags(db) == [
+        (ids[0], "hopeless", "rescan"), (ids[0], "want to die", "rescan"),
+        (ids[3], "hopeless", "rescan"), (ids[6], "suicide", "automatic"),
+    ]
+    session = db.get_session()
+    try:
+        assert {p.id for p in session.query(Participant).filter_by(crisis_flagged=True)} == {"PR1", "PR2", "PR4"}
+        flagged = {m.id for m in session.query(Message).filter_by(contains_crisis_keyword=True)}
+        assert flagged == {ids[0], ids[3], ids[6]}
+    finally:
+        session.close()
+    assert json.load(open(checkpoint))["last_message_id"] == ids[6]
+
+    # Resumes after the checkpoint: only the new message is read
+    later = db.save_message("PR3", 9, "user", "still hopeless")
+    report = rescan.run()
+    assert (report['resumed_from'], report['messages'], report['flags_created']) == (ids[6], 1, 1)
+
+    # A restart re-reads everything but creates nothing twice
+    assert rescan.run(restart=True)['flags_created'] == 0
+    assert len(flags(db)) == 5
+
+    # New keyword set: the old checkpoint no longer applies
+    report = CrisisRescan(db, detector("hopeless", "self-harm"), chunk_size=3, workers=0,
+                          checkpoint_path=checkpoint).run()
+    assert (report['resumed_from'], report['messages'], report['flags_created']) == (0, 8, 1)
+    assert (ids[5], "self-harm", "rescan") in flags(db) and (later.id, "hopeless", "rescan") in flags(db)
+
+
+def test_live_flag_on_bot_reply_covers_the_turn(tmp_path):
+    db = DatabaseManager(str(tmp_path / "study.db"))
+    db.create_participant("PL1", "control")
+    db.save_message("PL1", 1, "user", "I want to die")
+    reply = db.save_message("PL1", 1, "bot", "I'm really sorry you're feeling this way.")
+    # The live pipeline flags the crisis reply, not the user message
+    db.create_crisis_flag("PL1", reply.id, "want to die")
+
+    report = CrisisRescan(db, detector("hopeless"), workers=0).run()
+    assert report['messages'] == 1 and report['flags_created'] == 0
+    assert flags(db) == [(reply.id, "want to die", "automatic")]
+
+
+def test_overlapping_runs_leave_one_row_per_flag(tmp_path):
+    db, ids = seeded_db(tmp_path / "study.db")
+    batch = [("PR2", ids[3], "hopeless"), ("PR1", ids[0], "hopeless")]
+    insert_ignoring_duplicates = db._insert_ignoring_duplicates
+
+    def other_run_commits_first(table):
+        # A second rescan inserts the same batch between this run's read and its insert
+        if not started:
+            started.append(True)
+            other_run.append(db.bulk_create_crisis_flags(batch))
+        return insert_ignoring_duplicates(table)
+
+    started, other_run = [], []
+    db._insert_ignoring_duplicates = other_run_commits_first
+    assert db.bulk_create_crisis_flags(batch) == 0
+    assert other_run == [2]
+    assert flags(db).count((ids[3], "hopeless", "rescan")) == 1
+    assert flags(db).count((ids[0], "hopeless", "rescan")) == 1
+
+
+def test_process_pool_matches_in_process_scan(tmp_path):
+    results = []
+    for workers in (0, 2):
+        db, _ = seeded_db(tmp_path / f"study{workers}.db")
+        report = CrisisRescan(db, detector("hopeless"), chunk_size=2, workers=workers).run()
+        results.append((report['messages'], report['flags_created'], flags(db)))
+    assert results[0] == results[1]
+
+
+def test_bulk_flags_use_a_fixed_number_of_statements(tmp_path):
+    db, ids = seeded_db(tmp_path / "study.db")
+    counts = []
+    for batch in ([("PR1", ids[0], "a")], [("PR1", ids[0], f"k{i}") for i in range(20)]):
+        with count_queries(db) as queries:
+            db.bulk_create_crisis_flags(batch)
+        counts.append(queries.count)
+    assert counts[0] == counts[1]
@@ -0,0 +1,156 @@
+"""
+Hedged streaming request tests against the local LLM stub.
+
+Run: python -m pytest -q tests/test_hedging.py
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.llm_stub import LLMStubServer
+from src.chatbot import hedging, resilience
+from src.chatbot.bot_manager import BotManager
+from src.chatbot.hedging import HedgeBudget, TTFTTracker
+
+
+REPLY = "one two three four five six seven eight nine ten."
+
+
+@pytest.fixture
+def stub():
+    with LLMStubServer(reply=REPLY) as server:
+        yield server
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setattr(hedging, "_HEDGERS", {})
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+
+
+def make_bot(stub, **settings):
+    cfg = {
+        "api": {
+            "model": "stub-model",
+            "max_tokens": 200,
+            "max_words": 100,
+            "base_url": stub.base_url,
+            "timeout": 10,
+            "ttft_timeout": 5,
+            "retry_attempts": 0,
+            "scheduler": {"enabled": False},
+            "hedging": dict({"enabled": True, "default_delay": 0.2, "min_delay": 0.1,
+                             "min_samples": 1000, "max_extra_ratio": 1.0}, **settings),
+        },
+        "session_store": {"backend": "none"},
+    }
+    bot = BotManager(None, cfg)
+    # Create the SDK client up front: otherwise both attempts wait on it and the
+    # hedge's request can reach the stub first and take the primary's fault
+    warm_up = bot.router.warm_up()
+    if warm_up is not None:
+        warm_up.join(30)
+    session_id = bot.create_new_session()["session_id"]
+    bot.set_bot_type(session_id, "control")
+    return bot, session_id
+
+
+def turn(bot, session_id, text="hello"):
+    return "".join(bot.stream_bot_response(session_id, text))
+
+
+def test_hedge_wins_when_primary_stalls(stub):
+    bot, sid = make_bot(stub)
+    stub.add_fault(stall=3.0)
+
+    started = time.perf_counter()
+    assert turn(bot, sid) == REPLY
+    assert time.perf_counter() - started < 1.5
+    assert stub.request_count() == 2
+
+    meta = bot.get_last_call(sid)
+    assert meta["hedged"] is True
+    assert meta["winner"] == "hedge"
+    # The research record holds exactly one reply
+    assert [m["content"] for m in bot.sessions[sid]["history"]] == ["hello", REPLY]
+
+
+def test_fast_primary_is_not_hedged(stub):
+    bot, sid = make_bot(stub, default_delay=1.0)
+
+    assert turn(bot, sid) == REPLY
+    assert stub.request_count() == 1
+    assert bot.get_last_call(sid)["hedged"] is False
+
+
+def test_budget_limits_extra_requests(stub):
+    bot, sid = make_bot(stub, max_extra_ratio=0.0)
+    stub.add_fault(stall=0.5)
+
+    assert turn(bot, sid) == REPLY
+    assert stub.request_count() == 1
+    assert bot.hedger.stats()["denied_by_budget"] == 1
+
+
+def test_budget_is_shared_across_bot_managers(stub):
+    # The app builds a BotManager per rerun; the shipped 10% budget must still allow hedges
+    for _ in range(10):
+        bot, sid = make_bot(stub, max_extra_ratio=0.1, min_samples=20)
+        assert turn(bot, sid) == REPLY
+        assert bot.get_last_call(sid)["hedged"] is False
+
+    bot, sid = make_bot(stub, max_extra_ratio=0.1, min_samples=20)
+    stub.add_fault(stall=3.0)
+    started = time.perf_counter()
+    assert turn(bot, sid) == REPLY
+    assert time.perf_counter() - started < 1.5
+    assert bot.get_last_call(sid)["winner"] == "hedge"
+    stats = bot.hedger.stats()
+    assert stats["requests"] == 11 and stats["hedged"] == 1
+
+
+def test_ttft_percentile_sets_hedge_delay():
+    tracker = TTFTTracker(window=100, percentile=0.9, min_samples=10, min_delay=0.0, max_delay=10.0)
+    assert tracker.hedge_delay() == tracker.default_delay
+    for i in range(100):
+        tracker.record(i / 100)
+    assert tracker.hedge_delay() == pytest.approx(0.9)
+
+
+def test_budget_ratio():
+    budget = HedgeBudget(max_ratio=0.1)
+    for _ in range(20):
+        budget.note_request()
+    assert [budget.try_spend() for _ in range(3)] == [True, True, False]
+
+
+def test_losing_attempt_cannot_overwrite_winner_metadata(stub, monkeypatch):
+    bot, sid = make_bot(stub)
+    attempts = []
+
+    def fake_provider_stream(provider, messages, register=None, max_tokens=None, meta=None):
+        attempts.append(meta)
+        if len(attempts) == 1:
+            # Primary stalls past the hedge delay, then reports its own usage anyway
+            time.sleep(0.4)
+            meta.update(completion_tokens=999, finish_reason="length")
+            yield "late "
+        else:
+            yield REPLY
+            meta.update(completion_tokens=10, finish_reason="stop")
+
+    monkeypatch.setattr(bot, "_provider_stream", fake_provider_stream)
+    assert turn(bot, sid) == REPLY
+    time.sleep(0.5)  # let the losing primary finish
+
+    meta = bot.get_last_call(sid)
+    assert meta["winner"] == "hedge"
+    assert meta["completion_tokens"] == 10 and meta["finish_reason"] == "stop"
+    assert attempts[0] is not attempts[1] and attempts[0]["completion_tokens"] == 999
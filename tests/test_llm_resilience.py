@@ -0,0 +1,183 @@
+"""
+Resilience tests for BotManager's model calls against the local LLM stub.
+
+Run: python -m pytest -q tests/test_llm_resilience.py
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.llm_stub import LLMStubServer
+from src.chatbot import providers, resilience
+from src.chatbot.bot_manager import BotManager, ERROR_REPLY
+from src.chatbot.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, resilient_stream
+
+
+REPLY = "one two three four five six seven eight nine ten."
+
+
+@pytest.fixture
+def stub():
+    with LLMStubServer(reply=REPLY) as server:
+        yield server
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    # Breakers are process-wide; isolate each test
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setattr(providers, "_HEALTH", {})
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+
+
+def make_bot(stub, **api):
+    cfg = {
+        "api": {
+            "model": "stub-model",
+            "max_tokens": 200,
+            "max_words": 100,
+            "base_url": stub.base_url,
+            "timeout": 3,
+            "connect_timeout": 1,
+            "ttft_timeout": 0.5,
+            "retry_attempts": 3,
+            "retry_backoff_base": 0.01,
+            "retry_backoff_max": 0.05,
+            "scheduler": {"enabled": False},
+            "circuit_breaker": {"failure_threshold": 3, "reset_timeout": 60},
+        },
+        "session_store": {"backend": "none"},
+    }
+    cfg["api"].update(api)
+    bot = BotManager(None, cfg)
+    session_id = bot.create_new_session()["session_id"]
+    bot.set_bot_type(session_id, "control")
+    return bot, session_id
+
+
+def turn(bot, session_id, text="hello"):
+    return "".join(bot.stream_bot_response(session_id, text))
+
+
+def test_retries_server_errors_and_appends_history_once(stub):
+    bot, sid = make_bot(stub)
+    stub.add_fault(status=500)
+    stub.add_fault(status=503)
+
+    assert turn(bot, sid) == REPLY
+    assert stub.request_count() == 3
+    history = bot.sessions[sid]["history"]
+    assert [m["role"] for m in history] == ["user", "assistant"]
+
+
+def test_ttft_stall_is_cut_by_deadline(stub):
+    bot, sid = make_bot(stub)
+    stub.add_fault(stall=5.0)
+
+    started = time.perf_counter()
+    assert turn(bot, sid) == REPLY
+    assert time.perf_counter() - started < 2.0
+    assert stub.request_count() == 2
+
+
+def test_mid_stream_drop_resumes_without_duplicates(stub):
+    bot, sid = make_bot(stub)
+    stub.add_fault(drop_after=3)
+
+    out = turn(bot, sid)
+    # Delivered prefix is kept; the continuation request carries it as assistant text
+    assert out.startswith("one two three ")
+    continuation = stub.requests[1]["messages"]
+    assert continuation[-2] == {"role": "assistant", "content": "one two three "}
+    assert continuation[-1]["role"] == "system"
+    assert len(bot.sessions[sid]["history"]) == 2
+
+
+def test_exhausted_retries_show_friendly_error_without_history(stub):
+    bot, sid = make_bot(stub, retry_attempts=1)
+    stub.add_fault(status=500)
+    stub.add_fault(status=500)
+
+    assert turn(bot, sid) == ERROR_REPLY
+    assert stub.request_count() == 2
+    assert bot.sessions[sid]["history"] == []
+
+
+def test_client_errors_are_not_retried(stub):
+    bot, sid = make_bot(stub)
+    stub.add_fault(status=400)
+
+    assert turn(bot, sid) == ERROR_REPLY
+    assert stub.request_count() == 1
+
+
+def test_circuit_breaker_fails_fast(stub):
+    bot, sid = make_bot(stub, retry_attempts=0)
+    for _ in range(3):
+        stub.add_fault(status=503)
+        turn(bot, sid)
+    assert bot.breaker.state == "open"
+
+    before = stub.request_count()
+    started = time.perf_counter()
+    assert turn(bot, sid) == ERROR_REPLY
+    assert time.perf_counter() - started < 0.1
+    assert stub.request_count() == before
+
+
+def test_non_streaming_call_retries(stub):
+    bot, sid = make_bot(stub)
+    stub.add_fault(status=502)
+
+    assert bot.get_bot_response(sid, "hi", 1)["bot_response"] == REPLY
+    assert stub.request_count() == 2
+
+
+def test_half_open_probe_closes_circuit():
+    now = [0.0]
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+    now[0] = 11.0
+    breaker.allow()  # Probe admitted
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()  # Only one probe at a time
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_early_stop_releases_half_open_probe():
+    now = [0.0]
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] = 11.0
+
+    tokens = resilient_stream(lambda prefix: iter(["a", "b"]), RetryPolicy(), breaker)
+    assert next(tokens) == "a"
+    tokens.close()
+    assert breaker.state == "closed"
+
+
+def test_latency_tail_with_periodic_stalls(stub):
+    bot, sid = make_bot(stub)
+    latencies = []
+    for i in range(20):
+        if i % 5 == 0:
+            stub.add_fault(stall=5.0)
+        started = time.perf_counter()
+        assert turn(bot, sid, f"message {i}") == REPLY
+        latencies.append(time.perf_counter() - started)
+
+    latencies.sort()
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    # Stalled turns cost one ttft_timeout (0.5s) plus a short backoff, never the 5s stall
+    assert p95 < 1.5
+    assert max(latencies) < 2.0
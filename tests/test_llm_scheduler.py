@@ -0,0 +1,217 @@
+"""
+LLM scheduler tests: FIFO order per participant, round-robin fairness across
+participants, request and token buckets, rate-limit headers, 429 pauses,
+max_queue_wait, and a BotManager turn with the scheduler enabled.
+
+Run: python -m pytest -q tests/test_llm_scheduler.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.llm_stub import LLMStubServer
+from src.chatbot import llm_scheduler, resilience
+from src.chatbot.bot_manager import BotManager
+from src.chatbot.llm_scheduler import LLMScheduler, SchedulerTimeout, parse_reset
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setattr(llm_scheduler, "_SCHEDULER", None)
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.005)
+
+
+def test_fifo_per_participant_and_round_robin_across_participants():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue_wait=10)
+    holder = scheduler.acquire("holder")
+    order, threads = [], []
+
+    def turn(key, label):
+        ticket = scheduler.acquire(key)
+        order.append(label)
+        scheduler.release(ticket)
+
+    # Participant A queues three turns before B and C queue one each
+    for key, label in (("A", "A1"), ("A", "A2"), ("A", "A3"), ("B", "B1"), ("C", "C1")):
+        thread = threading.Thread(target=turn, args=(key, label))
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda n=len(threads): scheduler.queue_depth() == n)
+
+    scheduler.release(holder)
+    for thread in threads:
+        thread.join(5)
+    assert order == ["A1", "B1", "C1", "A2", "A3"]
+    assert scheduler.stats()['in_flight'] == 0
+
+
+def test_request_and_token_buckets():
+    clock = FakeClock()
+    scheduler = LLMScheduler(max_concurrency=10, requests_per_minute=2, tokens_per_minute=1000, clock=clock)
+
+    scheduler.release(scheduler.acquire("p", est_tokens=600), used_tokens=100)  # 500 refunded
+    scheduler.release(scheduler.acquire("p", est_tokens=600))
+    # Both buckets are short now: 0 requests and 300 tokens left
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire("p", est_tokens=100, timeout=0)
+    clock.now += 30  # +1 request, +500 tokens
+    scheduler.release(scheduler.acquire("p", est_tokens=700, timeout=0))
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire("p", est_tokens=700, timeout=0)
+    assert scheduler.stats()['timeouts'] == 2
+
+
+def test_rate_limit_headers_and_429_pause():
+    assert parse_reset("6m0s") == 360 and parse_reset("250ms") == 0.25 and parse_reset("12") == 12
+    assert parse_reset("soon") is None and parse_reset(None) is None
+
+    clock = FakeClock()
+    scheduler = LLMScheduler(max_concurrency=10, clock=clock)
+    # A limit header creates the bucket; an exhausted budget pauses until the reset
+    scheduler.observe_headers({"x-ratelimit-limit-requests": "100", "x-ratelimit-remaining-requests": "0",
+                               "x-ratelimit-reset-requests": "2s"})
+    assert scheduler._requests.capacity == 100
+    assert scheduler.stats()['paused_for'] == 2.0
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire("p", timeout=0)
+    clock.now += 2.1
+    scheduler.release(scheduler.acquire("p", timeout=0))
+
+    scheduler.note_rate_limited(3)
+    scheduler.note_rate_limited(None)  # default 1s never shortens a longer pause
+    stats = scheduler.stats()
+    assert stats['rate_limited'] == 2 and stats['paused_for'] == 3.0
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire("p", timeout=0)
+
+
+def test_max_queue_wait_and_cancel_leave_the_queue():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue_wait=0.2)
+    holder = scheduler.acquire("holder")
+    started = time.monotonic()
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire("late")
+    assert 0.15 <= time.monotonic() - started < 2
+    assert scheduler.queue_depth() == 0 and scheduler.stats()['timeouts'] == 1
+
+    class Cancelled(Exception):
+        pass
+
+    class Token:
+        def raise_if_cancelled(self):
+            raise Cancelled()
+
+    with pytest.raises(Cancelled):
+        scheduler.acquire("gone", timeout=5, cancel=Token())
+    assert scheduler.queue_depth() == 0
+    scheduler.release(holder)
+
+
+def test_bot_turn_with_scheduler_enabled():
+    with LLMStubServer(reply="Scheduled reply.") as stub:
+        cfg = {
+            "api": {
+                "model": "stub-model", "base_url": stub.base_url, "max_tokens": 200, "max_words": 100,
+                "retry_attempts": 2, "retry_backoff_base": 0.01, "retry_backoff_max": 0.05,
+                "token_calibration": {"enabled": False},
+                "scheduler": {"enabled": True, "max_concurrency": 2, "requests_per_minute": 600,
+                              "tokens_per_minute": 1000000, "max_queue_wait": 5},
+            },
+            "session_store": {"backend": "none"},
+        }
+        bot = BotManager(None, cfg)
+        sid = bot.create_new_session()["session_id"]
+        bot.set_bot_type(sid, "control")
+
+        # A 429 pauses admissions for Retry-After, then the retry goes through
+        stub.add_fault(status=429, retry_after=0.3)
+        started = time.monotonic()
+        assert "".join(bot.stream_bot_response(sid, "hello")) == "Scheduled reply."
+        assert time.monotonic() - started >= 0.25
+
+        stats = bot.scheduler.stats()
+        assert stats['admitted'] == 2 and stats['rate_limited'] == 1
+        assert stats['in_flight'] == 0 and stats['queued'] == 0
+
+
+def test_queue_wait_does_not_count_against_the_attempt_deadline():
+    # Each turn takes ~1.1s of a 1.5s deadline; with one slot the third waits ~2.2s in the queue
+    reply = "one two three four five six seven eight nine."
+    with LLMStubServer(reply=reply, ttft=0.3, chunk_delay=0.1) as stub:
+        cfg = {
+            "api": {
+                "model": "stub-model", "base_url": stub.base_url, "max_tokens": 200, "max_words": 100,
+                "timeout": 1.5, "ttft_timeout": 1.0, "retry_attempts": 2, "retry_backoff_base": 0.01,
+                "token_calibration": {"enabled": False},
+                "scheduler": {"enabled": True, "max_concurrency": 1, "max_queue_wait": 10},
+            },
+            "session_store": {"backend": "none"},
+        }
+        bot = BotManager(None, cfg)
+        replies = {}
+
+        def turn(i):
+            sid = bot.create_new_session()["session_id"]
+            bot.set_bot_type(sid, "control")
+            replies[i] = "".join(bot.stream_bot_response(sid, f"hello {i}"))
+
+        threads = [threading.Thread(target=turn, args=(i,)) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(20)
+
+        assert list(replies.values()) == [reply] * 3
+        assert stub.request_count() == 3
+        assert bot.scheduler.stats()['wait_max'] > 1.5
+
+
+def test_provider_ttft_excludes_queue_wait():
+    with LLMStubServer(reply="Short reply.", ttft=0.3) as stub:
+        cfg = {
+            "api": {
+                "model": "stub-model", "base_url": stub.base_url, "max_tokens": 200, "max_words": 100,
+                "retry_attempts": 1, "token_calibration": {"enabled": False},
+                "scheduler": {"enabled": True, "max_concurrency": 1, "max_queue_wait": 10},
+            },
+            "session_store": {"backend": "none"},
+        }
+        bot = BotManager(None, cfg)
+        sids = []
+        for _ in range(3):
+            sids.append(bot.create_new_session()["session_id"])
+            bot.set_bot_type(sids[-1], "control")
+
+        threads = [threading.Thread(target=lambda s=sid: "".join(bot.stream_bot_response(s, "hi"))) for sid in sids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(20)
+
+        # The last turn queued behind two ~0.3s turns; its provider TTFT is still ~0.3s
+        assert bot.scheduler.stats()['wait_max'] > 0.5
+        ttfts = [bot.get_last_call(sid)["route"][-1]["ttft"] for sid in sids]
+        assert all(0.25 <= ttft < 0.5 for ttft in ttfts), ttfts
@@ -0,0 +1,72 @@
+"""
+Load generator tests: virtual participants take the app's turn path and the
+report counts what reached the database.
+
+Run: python -m pytest -q tests/test_load_generator.py
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.llm_stub import LLMStubServer
+from src.chatbot import resilience
+from src.chatbot.load_generator import LoadGenerator, PromptSampler, percentiles, render_html
+from src.database.db_manager import DatabaseManager
+from src.database.models import CrisisFlag, Message, Participant
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    with LLMStubServer(reply="That sounds really hard. I am here to listen.", ttft=0.01) as server:
+        yield server
+
+
+def test_sampler_is_seeded_and_reads_both_corpora():
+    sampler = PromptSampler(seed=3)
+    assert any(p.startswith("What is a panic attack") for p in sampler.posts)  # parquet human turns
+    assert sampler.messages(5) == PromptSampler(seed=3).messages(5)
+    assert set(PromptSampler(crisis_rate=1.0).messages(3)) <= {
+        "Honestly I just want to die.", "Some days I think everyone would be better off dead without me.",
+        "I keep thinking about suicide.",
+    }
+
+
+def test_virtual_participants_complete_the_turn_path(stub, tmp_path):
+    config = {
+        "api": {"base_url": stub.base_url, "scheduler": {"enabled": False}},
+        "conversation": {"max_messages": 3},
+        "session_store": {"backend": "none"},
+    }
+    db = DatabaseManager(str(tmp_path / "load.db"))
+    sampler = PromptSampler(csv_path=None, crisis_rate=0.3, seed=1)
+    report = LoadGenerator(config, db, participants=4, concurrency=2, sampler=sampler).run()
+
+    assert (report['participants'], report['completed'], report['turns']) == (4, 4, 12)
+    assert report['errors']['error_rate'] == 0 and report['errors']['write_errors'] == 0
+    assert report['throughput']['turns_per_second'] > 0
+    assert report['latency_ms']['turn_with_writes']['count'] == 12
+    assert report['db']['statements'] > 0 and report['db']['bot_write_ms']['count'] == 12
+
+    session = db.get_session()
+    try:
+        assert session.query(Participant).filter_by(completed=True).count() == 4
+        assert session.query(Message).count() == 24
+        assert session.query(CrisisFlag).count() >= report['crisis_turns'] > 0
+    finally:
+        session.close()
+
+    page = render_html(report)
+    assert page.startswith("<!DOCTYPE html>") and "turn_with_writes" in page
+
+
+def test_percentiles():
+    stats = percentiles([float(v) for v in range(1, 101)])
+    assert (stats['p50'], stats['p95'], stats['p99'], stats['max']) == (51.0, 96.0, 100.0, 100.0)
+    assert percentiles([])['p50'] is None
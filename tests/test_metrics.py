@@ -0,0 +1,116 @@
+"""
+Metrics registry tests: sketch accuracy, exposition format and instrumentation.
+
+Run: python -m pytest -q tests/test_metrics.py
+"""
+
+import os
+import random
+import sys
+import urllib.request
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.llm_stub import LLMStubServer
+from src.chatbot import resilience
+from src.chatbot.bot_manager import BotManager
+from src.database.db_manager import DatabaseManager
+from src.utils import metrics, session_registry
+from src.utils.metrics import MetricsRegistry, MetricsServer, QuantileSketch
+
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def test_sketch_quantiles_within_relative_accuracy():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(-2, 1) for _ in range(20000)]
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for v in values:
+        sketch.add(v)
+
+    for q in (0.5, 0.9, 0.99):
+        assert sketch.quantile(q) == pytest.approx(exact_quantile(values, q), rel=0.011)
+    assert sketch.count == len(values)
+
+
+def test_merged_sketches_match_a_single_sketch():
+    rng = random.Random(3)
+    a, b, whole = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for i in range(5000):
+        v = rng.expovariate(5)
+        (a if i % 2 else b).add(v)
+        whole.add(v)
+
+    a.merge(QuantileSketch.from_dict(b.to_dict()))
+    for q in (0.5, 0.95, 0.99):
+        assert a.quantile(q) == whole.quantile(q)
+    assert a.count == whole.count
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    registry.counter("jobs_total", "Jobs run", ["kind"]).inc(2, kind="export")
+    registry.gauge("queue_depth", "Queued turns").set_function(lambda: 3)
+    hist = registry.histogram("latency_seconds", "Latency", ["op"])
+    for v in (0.1, 0.2, 0.3):
+        hist.observe(v, op="save")
+
+    text = registry.render()
+    assert '# TYPE jobs_total counter' in text
+    assert 'jobs_total{kind="export"} 2' in text
+    assert 'queue_depth 3' in text
+    assert '# TYPE latency_seconds summary' in text
+    assert 'latency_seconds_count{op="save"} 3' in text
+    [median] = [line.split()[-1] for line in text.splitlines()
+                if line.startswith('latency_seconds{op="save",quantile="0.5"}')]
+    assert float(median) == pytest.approx(0.2, rel=0.01)
+    with pytest.raises(ValueError):
+        hist.observe(1.0, wrong="label")
+
+
+def test_http_endpoint_and_dump(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter("hits_total", "Hits").inc()
+    server = MetricsServer(registry, port=0)
+    try:
+        body = urllib.request.urlopen(server.url, timeout=5).read().decode()
+        assert "hits_total 1" in body
+    finally:
+        server.close()
+
+    path = tmp_path / "metrics" / "app.prom"
+    registry.dump(str(path))
+    assert "hits_total 1" in path.read_text()
+
+
+def test_database_and_bot_turns_are_instrumented(monkeypatch):
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setattr(session_registry, "_REGISTRIES", {})
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    db_ops = metrics.REGISTRY.get("db_operation_seconds")
+    before = (db_ops.snapshot(op="save_message") or QuantileSketch()).count
+
+    db = DatabaseManager(db_url="sqlite:///:memory:")
+    db.create_participant("PMETRICS1", "control")
+    db.save_message("PMETRICS1", 1, "user", "hello")
+    assert db_ops.snapshot(op="save_message").count == before + 1
+
+    turns = metrics.REGISTRY.get("bot_turns_total")
+    ok_before = turns.value(bot_type="control", outcome="ok")
+    with LLMStubServer(reply="Hi there.") as stub:
+        bot = BotManager(db, {"api": {"base_url": stub.base_url, "scheduler": {"enabled": False}},
+                              "session_store": {"backend": "none"}})
+        sid = bot.create_new_session()["session_id"]
+        bot.set_bot_type(sid, "control")
+        "".join(bot.stream_bot_response(sid, "hello"))
+
+    assert turns.value(bot_type="control", outcome="ok") == ok_before + 1
+    assert metrics.REGISTRY.get("bot_ttft_seconds").snapshot(bot_type="control").count >= 1
+    assert metrics.REGISTRY.get("llm_tokens_total").value(kind="completion") >= 2
+    assert metrics.REGISTRY.get("bot_sessions_in_memory").value() == 1
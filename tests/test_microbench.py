@@ -0,0 +1,69 @@
+"""
+Microbenchmark tests: the timing harness, the result history and baseline
+comparison, and a quick pass of the suite's cases over a tiny fixture.
+
+Run: python -m pytest -q tests/test_microbench.py
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.benchmark_suite import Fixtures, add_cases, build_study_fixture
+from src.database.db_manager import DatabaseManager
+from src.utils.microbench import (BenchmarkSuite, append_history, compare, find_baseline, load_history,
+                                  measure, run_record)
+
+
+def test_measure_autoranges_batches():
+    calls = []
+    result = measure(lambda: calls.append(1), min_time=0.002, repeat=3)
+    assert result['repeat'] == 3 and result['loops'] > 1
+    assert len(calls) >= result['loops'] * 3
+    assert 0 < result['min_us'] <= result['median_us'] <= result['max_us']
+
+
+def test_history_baseline_and_regressions(tmp_path):
+    path = str(tmp_path / "history.jsonl")
+    old = dict(run_record({'a': {'median_us': 10.0}, 'b': {'median_us': 10.0}, 'c': {'median_us': 10.0}}),
+               commit="aaaa111", dirty=False)
+    append_history(path, old)
+    with open(path, "a") as f:
+        f.write("not json\n")
+    new = dict(run_record({'a': {'median_us': 13.0}, 'b': {'median_us': 10.5}, 'c': {'median_us': 5.0},
+                           'd': {'median_us': 1.0}}), commit="bbbb222", dirty=False)
+
+    history = load_history(path)
+    assert len(history) == 1
+    assert find_baseline(history, new)['commit'] == "aaaa111"
+    # A second run of the same commit still compares against the previous commit
+    append_history(path, new)
+    assert find_baseline(load_history(path), new)['commit'] == "aaaa111"
+    assert find_baseline(load_history(path), ref="bbbb")['commit'] == "bbbb222"
+
+    status = {row['name']: row['status'] for row in compare(new, old, threshold=0.2)}
+    assert status == {'a': 'regression', 'b': 'same', 'c': 'improvement', 'd': 'new'}
+
+
+def test_suite_cases_run_on_tiny_fixture(tmp_path):
+    build_study_fixture(tmp_path / "study.db", 105, seed=1)
+    db = DatabaseManager(str(tmp_path / "study.db"), db_url=f"sqlite:///{tmp_path / 'study.db'}")
+    try:
+        stats = db.get_statistics()
+        assert stats['total_messages'] == 105 and stats['total_participants'] > 0
+    finally:
+        db.close()
+
+    fx = Fixtures(tmp_path, Path(tmp_path / "fixtures"))
+    suite = BenchmarkSuite(min_time=0.001, repeat=1)
+    add_cases(suite, fx, sizes=[200])
+    try:
+        run = suite.run()
+    finally:
+        fx.close()
+    assert set(run['results']) == set(suite.names())
+    assert "export.export_all_conversations[200]" in run['results']
+    assert all(result['median_us'] > 0 for result in run['results'].values())
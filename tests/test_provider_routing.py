@@ -0,0 +1,170 @@
+"""
+Provider routing and failover tests against two local LLM stubs.
+
+Run: python -m pytest -q tests/test_provider_routing.py
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.llm_stub import LLMStubServer
+from src.chatbot import providers, resilience
+from src.chatbot.bot_manager import BotManager, ERROR_REPLY
+from src.database.db_manager import DatabaseManager
+
+
+REPLY_A = "Reply from provider alpha."
+REPLY_B = "Reply from provider beta."
+
+
+@pytest.fixture
+def stubs():
+    with LLMStubServer(reply=REPLY_A) as a, LLMStubServer(reply=REPLY_B) as b:
+        yield a, b
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setattr(providers, "_HEALTH", {})
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+
+
+def make_bot(stubs, routes=None, bot_type="control", db=None, **routing):
+    a, b = stubs
+    cfg = {
+        "api": {
+            "max_tokens": 200,
+            "max_words": 100,
+            "ttft_timeout": 2,
+            "retry_attempts": 2,
+            "retry_backoff_base": 0.01,
+            "retry_backoff_max": 0.02,
+            "scheduler": {"enabled": False},
+            "circuit_breaker": {"failure_threshold": 3, "reset_timeout": 60},
+            "providers": {
+                "alpha": {"model": "alpha-model", "base_url": a.base_url},
+                "beta": {"model": "beta-model", "base_url": b.base_url},
+            },
+            "routing": dict({"routes": routes or {"default": ["alpha", "beta"]}}, **routing),
+        },
+        "session_store": {"backend": "none"},
+    }
+    bot = BotManager(db, cfg)
+    session_id = bot.create_new_session()["session_id"]
+    bot.set_bot_type(session_id, bot_type)
+    return bot, session_id
+
+
+def turn(bot, session_id, text="hello"):
+    return "".join(bot.stream_bot_response(session_id, text))
+
+
+def test_primary_serves_when_healthy(stubs):
+    a, b = stubs
+    bot, sid = make_bot(stubs)
+
+    assert turn(bot, sid) == REPLY_A
+    meta = bot.get_last_call(sid)
+    assert meta["provider"] == "alpha"
+    assert meta["model"] == "alpha-model"
+    assert meta["route"][0]["reason"] == "primary"
+    assert b.request_count() == 0
+
+
+def test_errors_fail_over_to_next_provider(stubs):
+    a, b = stubs
+    bot, sid = make_bot(stubs)
+    a.add_fault(status=503)
+
+    assert turn(bot, sid) == REPLY_B
+    route = bot.get_last_call(sid)["route"]
+    assert [d["provider"] for d in route] == ["alpha", "beta"]
+    assert "503" in route[0]["error"]
+    assert route[1]["reason"] == "failover"
+    assert [m["content"] for m in bot.sessions[sid]["history"]] == ["hello", REPLY_B]
+
+
+def test_route_is_chosen_per_bot_type(stubs):
+    a, b = stubs
+    routes = {"default": ["alpha", "beta"], "cognitive": ["beta", "alpha"]}
+    bot, sid = make_bot(stubs, routes=routes, bot_type="cognitive")
+
+    assert turn(bot, sid) == REPLY_B
+    assert a.request_count() == 0
+
+
+def test_slo_breach_deprioritizes_slow_provider(stubs):
+    a, b = stubs
+    a.ttft = 0.2
+    bot, sid = make_bot(stubs, slo_ttft=0.1, min_samples=2)
+
+    assert turn(bot, sid) == REPLY_A
+    assert turn(bot, sid) == REPLY_A
+    assert turn(bot, sid) == REPLY_B
+    decision = bot.get_last_call(sid)["route"][0]
+    assert decision["reason"] == "rerouted"
+    assert "SLO" in decision["skipped"][0]
+    assert bot.router.stats()["alpha"]["deprioritized"]
+
+
+def test_slo_breach_reroutes_the_next_bot_manager(stubs):
+    a, b = stubs
+    a.ttft = 0.2
+    # The app builds a new BotManager (and router) on every rerun
+    for _ in range(2):
+        bot, sid = make_bot(stubs, slo_ttft=0.1, min_samples=2)
+        assert turn(bot, sid) == REPLY_A
+
+    bot, sid = make_bot(stubs, slo_ttft=0.1, min_samples=2)
+    assert turn(bot, sid) == REPLY_B
+    assert bot.get_last_call(sid)["route"][0]["reason"] == "rerouted"
+
+
+def test_open_circuit_skips_provider_without_calling_it(stubs):
+    a, b = stubs
+    bot, sid = make_bot(stubs)
+    for _ in range(3):
+        a.add_fault(status=500)
+        turn(bot, sid)
+    assert bot.router.providers["alpha"].breaker.state == "open"
+
+    before = a.request_count()
+    assert turn(bot, sid) == REPLY_B
+    assert a.request_count() == before
+    assert "circuit open" in bot.get_last_call(sid)["route"][0]["skipped"][0]
+
+
+def test_failover_stays_within_modality(stubs):
+    a, b = stubs
+    bot, sid = make_bot(stubs)
+    bot.router.providers["beta"].modality = "vision"
+    for _ in range(3):
+        a.add_fault(status=500)
+
+    assert turn(bot, sid) == ERROR_REPLY
+    assert b.request_count() == 0
+    assert bot.get_last_call(sid)["failed"] is True
+
+
+def test_routing_decision_is_stored_with_the_message(stubs):
+    a, b = stubs
+    db = DatabaseManager(db_url="sqlite:///:memory:")
+    bot, sid = make_bot(stubs, db=db)
+    participant_id = bot.sessions[sid]["participant_id"]
+    db.create_participant(participant_id, "control")
+    a.add_fault(status=502)
+
+    reply = turn(bot, sid)
+    db.save_message(participant_id, 1, "bot", reply, call_meta=bot.get_last_call(sid))
+
+    saved = db.get_conversation(participant_id)[-1]
+    meta = json.loads(saved.call_meta)
+    assert meta["provider"] == "beta"
+    assert [d["provider"] for d in meta["route"]] == ["alpha", "beta"]
@@ -0,0 +1,102 @@
+"""
+Query budget tests: statement counting, slow-query logging and pinned query
+counts for dashboard pages and exports (an N+1 pattern changes the count as
+the study grows and fails here).
+
+Run: python -m pytest -q tests/test_query_budget.py
+"""
+
+import contextlib
+import io
+import logging
+import os
+import sys
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts import diagnose_participants
+from src.database.db_manager import DatabaseManager
+from src.database.query_stats import QueryBudgetExceeded, count_queries, query_budget
+from src.ui.admin_dashboard import AdminDashboard
+
+
+# Statements per page / export, independent of the number of participants
+PINNED = {
+    'display_overview': 5,
+    'display_participants': 1,
+    'display_crisis_flags': 2,
+    'display_bot_comparison': 1,
+    'display_performance': 1,
+    'display_feedback': 1,
+    'export_all_conversations': 3,
+    'export_participant_summary': 1,
+    'export_crisis_flags': 1,
+    'export_bot_comparison': 1,
+    'diagnose_participants': 3,
+}
+
+
+def seeded_dashboard(n, tmp_path):
+    db = DatabaseManager(db_url="sqlite:///:memory:")
+    for i in range(n):
+        pid = f"PQ{i}"
+        db.create_participant(pid, ["emotional", "cognitive", "control"][i % 3])
+        db.save_message(pid, 1, "user", "I feel hopeless")
+        bot = db.save_message(pid, 1, "bot", "I'm sorry you're feeling this way.")
+        db.create_crisis_flag(pid, bot.id, "hopeless")
+        db.save_turn_metrics(pid, 1, {"message_id": bot.id, "ttft_ms": 120.0, "completion_tokens": 9})
+    dashboard = AdminDashboard(db)
+    tmp_path.mkdir()
+    dashboard.csv_exporter.export_dir = str(tmp_path)
+    return db, dashboard
+
+
+def query_counts(db, dashboard):
+    pages = {name: getattr(dashboard, name) for name in PINNED if name.startswith("display_")}
+    pages.update({name: getattr(dashboard.csv_exporter, name) for name in PINNED if name.startswith("export_")})
+    pages['diagnose_participants'] = lambda: diagnose_participants.diagnose(db)
+    counts = {}
+    for name, page in pages.items():
+        with contextlib.redirect_stdout(io.StringIO()), count_queries(db) as queries:
+            page()
+        counts[name] = queries.count
+    return counts
+
+
+def test_query_budget_counts_and_fails_over_budget():
+    db = DatabaseManager(db_url="sqlite:///:memory:")
+    db.create_participant("PQB1", "control")
+
+    with query_budget(1, "one lookup", engine=db) as queries:
+        db.get_participant("PQB1")
+    assert queries.count == 1
+
+    with pytest.raises(QueryBudgetExceeded, match="per-row lookups ran 3 queries"):
+        with query_budget(2, "per-row lookups"):
+            for _ in range(3):
+                db.get_participant("PQB1")
+
+
+def test_slow_statements_are_logged_with_parameters(caplog):
+    db = DatabaseManager(db_url="sqlite:///:memory:", slow_query_ms=1e-6)
+    db.create_participant("PQSLOW", "control")
+    caplog.clear()
+    with caplog.at_level(logging.WARNING, logger="empathic.db.slow"):
+        db.get_participant("PQSLOW")
+
+    [record] = [r for r in caplog.records if r.name == "empathic.db.slow" and "PQSLOW" in r.params]
+    assert record.getMessage().startswith("Slow query")
+    assert "FROM participants" in record.statement
+    assert record.duration_ms > 0
+
+
+def test_dashboard_and_export_query_counts_are_pinned(tmp_path):
+    small = query_counts(*seeded_dashboard(2, tmp_path / "small"))
+    large = query_counts(*seeded_dashboard(6, tmp_path / "large"))
+
+    assert small == PINNED
+    # Same statements for 6 participants as for 2: no per-row queries
+    assert large == small
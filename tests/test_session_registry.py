@@ -0,0 +1,135 @@
+"""
+Session registry tests: LRU and byte-budget eviction, idle TTL on access and by
+the periodic sweep, live-only length, ParticipantManager saving the end state
+of expired sessions (and only those), and registries shared across reruns.
+
+Run: python -m pytest -q tests/test_session_registry.py
+"""
+
+import os
+import sys
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.chatbot.bot_manager import BotManager
+from src.chatbot.cancellation import get_cancellation_registry
+from src.database.db_manager import DatabaseManager
+from src.utils import session_registry
+from src.utils.participant_manager import ParticipantManager, ParticipantSession
+from src.utils.session_registry import SessionRegistry, get_session_registry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_evicts_least_recently_used():
+    evicted = []
+    reg = SessionRegistry(max_entries=3, stripes=1, idle_ttl=None,
+                          on_evict=lambda k, v, reason: evicted.append((k, reason)))
+    for key in ("a", "b", "c"):
+        reg[key] = {"n": key}
+    assert reg.get("a") == {"n": "a"}  # refresh a; b is now oldest
+    reg["d"] = {"n": "d"}
+    assert evicted == [("b", "lru")]
+    assert sorted(reg.keys()) == ["a", "c", "d"]
+    assert reg.stats()['evicted_lru'] == 1
+
+
+def test_byte_budget_keeps_newest():
+    reg = SessionRegistry(max_entries=100, max_bytes=2000, stripes=1, idle_ttl=None)
+    for i in range(5):
+        reg[f"s{i}"] = {"history": "x" * 600}
+    assert "s4" in reg and "s0" not in reg
+    assert reg.stats()['evicted_bytes'] >= 1
+
+
+def test_ttl_expiry_and_live_length():
+    clock = FakeClock()
+    evicted = []
+    reg = SessionRegistry(idle_ttl=60, stripes=2, sweep_interval=None, clock=clock,
+                          on_evict=lambda k, v, reason: evicted.append((k, reason)))
+    reg["old"] = {"n": 1}
+    clock.now += 50
+    reg["new"] = {"n": 2}
+    clock.now += 20  # old idle 70s, new idle 20s
+
+    assert len(reg) == 1
+    assert "old" not in reg and "new" in reg
+    assert reg.stats()['entries'] == 2  # still held until touched or swept
+    assert reg.get("old") is None
+    assert evicted == [("old", "ttl")]
+
+
+def test_periodic_sweep_evicts_untouched_sessions():
+    clock = FakeClock()
+    evicted = []
+    reg = SessionRegistry(idle_ttl=60, stripes=4, sweep_interval=30, clock=clock,
+                          on_evict=lambda k, v, reason: evicted.append(k))
+    for i in range(10):
+        reg[f"idle{i}"] = {"n": i}
+    clock.now += 120
+    # Any access after the interval sweeps every stripe, not just the touched key's
+    reg["active"] = {"n": -1}
+    assert sorted(evicted) == sorted(f"idle{i}" for i in range(10))
+    assert reg.stats()['entries'] == 1
+
+
+def test_participant_manager_saves_state_of_evicted_session(tmp_path):
+    db = DatabaseManager(str(tmp_path / "p.db"), db_url=f"sqlite:///{tmp_path / 'p.db'}")
+    clock = FakeClock()
+    try:
+        manager = ParticipantManager(db, SessionRegistry(idle_ttl=60, sweep_interval=10, clock=clock,
+                                                         record_type=ParticipantSession))
+        done = manager.create_session("control")
+        manager.mark_session_complete(done['session_id'])
+        abandoned = manager.create_session("emotional")
+        clock.now += 100
+        manager.create_session("control")  # triggers the sweep
+
+        assert manager.get_active_session_count() == 1
+        for session, completed in ((done, True), (abandoned, False)):
+            participant = db.get_participant(session['participant_id'])
+            assert participant.end_time is not None and participant.completed is completed
+    finally:
+        db.close()
+
+
+def test_budget_eviction_does_not_end_the_participant(tmp_path):
+    db = DatabaseManager(str(tmp_path / "p.db"), db_url=f"sqlite:///{tmp_path / 'p.db'}")
+    try:
+        manager = ParticipantManager(db, SessionRegistry(max_entries=1, stripes=1, idle_ttl=None,
+                                                         record_type=ParticipantSession))
+        pushed_out = manager.create_session("control")
+        manager.create_session("emotional")  # over the entry budget: the first is dropped
+
+        assert manager.get_active_session_count() == 1
+        participant = db.get_participant(pushed_out['participant_id'])
+        assert participant.end_time is None and not participant.completed
+    finally:
+        db.close()
+
+
+def test_managers_share_process_wide_registries(monkeypatch):
+    monkeypatch.setattr(session_registry, "_REGISTRIES", {})
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    cfg = {"api": {"scheduler": {"enabled": False}}, "session_store": {"backend": "none"}}
+
+    # Streamlit builds a new BotManager on every rerun; sessions must outlive it
+    first = BotManager(None, cfg)
+    sid = first.create_new_session()["session_id"]
+    rerun = BotManager(None, cfg)
+    assert rerun.sessions is first.sessions and sid in rerun.sessions
+    assert get_session_registry("conversation") is get_session_registry("conversation")
+    assert get_session_registry("conversation") is not first.sessions
+
+    # Expiry cancels the session's in-flight turn whichever instance created the registry
+    token = get_cancellation_registry().begin(sid)
+    rerun.sessions.on_evict(sid, rerun.sessions[sid], "ttl")
+    assert token.cancelled
+    get_cancellation_registry().finish(token)
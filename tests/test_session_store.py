@@ -0,0 +1,124 @@
+"""
+Session store tests: round trips through the memory and SQLite backends, the
+last_call column added to older tables, a BotManager restart that resumes
+a session (history and latest call metadata) from the study database, and the
+scheduled purge of abandoned sessions.
+
+Run: python -m pytest -q tests/test_session_store.py
+"""
+
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, text
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.llm_stub import LLMStubServer
+from src.chatbot import resilience
+from src.chatbot.bot_manager import BotManager
+from src.database.db_manager import DatabaseManager
+from src.database import session_store
+from src.database.session_store import InMemorySessionStore, SQLiteSessionStore, session_store_from_config
+from src.utils import session_registry
+
+
+HISTORY = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "Hello, \"friend\" ✓"}]
+CALL = {"provider": "openai", "model": "gpt-test", "max_tokens": 150, "route": [{"reason": "primary"}]}
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setattr(session_registry, "_REGISTRIES", {})
+    monkeypatch.setattr(session_store, "_NEXT_PURGE", {})
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_store_round_trip(backend, tmp_path):
+    if backend == "memory":
+        store = InMemorySessionStore(shared=False)
+    else:
+        store = SQLiteSessionStore(create_engine(f"sqlite:///{tmp_path / 's.db'}"))
+
+    assert store.load("missing") is None
+    store.save("s1", "P1", "emotional", HISTORY, CALL)
+    assert store.load("s1") == {"participant_id": "P1", "bot_type": "emotional", "history": HISTORY,
+                                "last_call": CALL}
+    # Upsert replaces every field
+    store.save("s1", "P1", "control", HISTORY[:1])
+    assert store.load("s1") == {"participant_id": "P1", "bot_type": "control", "history": HISTORY[:1],
+                                "last_call": None}
+    store.delete("s1")
+    assert store.load("s1") is None
+
+
+def test_sqlite_store_adds_last_call_to_old_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE chat_sessions (session_id VARCHAR PRIMARY KEY, participant_id VARCHAR, "
+                          "bot_type VARCHAR NOT NULL, history TEXT NOT NULL, updated_at DATETIME)"))
+        conn.execute(text("INSERT INTO chat_sessions VALUES ('old', 'P0', 'control', '[[\"u\",\"x\"]]', NULL)"))
+    store = SQLiteSessionStore(engine)
+    assert store.load("old")["last_call"] is None
+    store.save("new", "P1", "control", HISTORY, CALL)
+    assert store.load("new")["last_call"] == CALL
+
+
+def test_session_and_last_call_survive_restart(tmp_path, monkeypatch):
+    db = DatabaseManager(str(tmp_path / "study.db"), db_url=f"sqlite:///{tmp_path / 'study.db'}")
+    try:
+        with LLMStubServer(reply="First reply.") as stub:
+            cfg = {
+                "api": {"model": "stub-model", "base_url": stub.base_url, "max_tokens": 200, "max_words": 100,
+                        "retry_attempts": 1, "scheduler": {"enabled": False},
+                        "token_calibration": {"enabled": False}},
+                "session_store": {"backend": "database"},
+            }
+            assert isinstance(session_store_from_config(cfg["session_store"], db), SQLiteSessionStore)
+            bot = BotManager(db, cfg)
+            sid = bot.create_new_session()["session_id"]
+            bot.set_bot_type(sid, "control")
+            assert "".join(bot.stream_bot_response(sid, "hello")) == "First reply."
+            before = bot.get_last_call(sid)
+
+            # A new process (or replica) has an empty cache and reads the store
+            monkeypatch.setattr(session_registry, "_REGISTRIES", {})
+            restarted = BotManager(db, cfg)
+            assert restarted.get_last_call(sid) == before
+            assert before["model"] == "stub-model" and before["finish_reason"] == "stop"
+            "".join(restarted.stream_bot_response(sid, "again"))
+            sent = [m["content"] for m in stub.requests[-1]["messages"] if m["role"] != "system"]
+            assert sent == ["hello", "First reply.", "again"]
+    finally:
+        db.close()
+
+
+def test_abandoned_sessions_are_purged_on_schedule(tmp_path):
+    db = DatabaseManager(str(tmp_path / "study.db"), db_url=f"sqlite:///{tmp_path / 'study.db'}")
+    try:
+        store = SQLiteSessionStore(db.engine)
+        store.save("abandoned", "P0", "control", HISTORY)
+        with db.engine.begin() as conn:
+            conn.execute(text("UPDATE chat_sessions SET updated_at = '2020-01-01 00:00:00'"))
+
+        cfg = {"api": {"scheduler": {"enabled": False}, "token_calibration": {"enabled": False}},
+               "conversation": {"session_timeout": 3600},
+               "session_store": {"backend": "database", "purge_interval": 600}}
+        # The first session write of the process purges right away
+        sid = BotManager(db, cfg).create_new_session()["session_id"]
+        assert store.load("abandoned") is None and store.load(sid) is not None
+
+        # Later purges wait for the interval, across BotManager instances
+        store.save("abandoned", "P0", "control", HISTORY)
+        with db.engine.begin() as conn:
+            conn.execute(text("UPDATE chat_sessions SET updated_at = '2020-01-01 00:00:00' "
+                              "WHERE session_id = 'abandoned'"))
+        BotManager(db, cfg).create_new_session()
+        assert store.load("abandoned") is not None
+        assert store.purge_if_due(3600, 600, clock=lambda: 10 ** 9) == 1
+    finally:
+        db.close()
@@ -0,0 +1,65 @@
+"""
+Startup budget tests: a fresh `import src.app` and the first initialize_app()
+stay within the startup budgets in app_config.yaml, heavy dependencies stay
+lazy, and LLM SDK clients are created on first use or by warm_up().
+
+Run: python -m pytest -q tests/test_startup_budget.py
+"""
+
+import os
+import sys
+
+import yaml
+
+# Add project root to path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from src.chatbot.providers import ProviderRouter
+from src.utils.startup_profile import by_package, parse_importtime, profile_startup
+
+
+def load_budgets():
+    with open(os.path.join(ROOT, "config", "app_config.yaml"), "r", encoding="utf-8") as f:
+        return (yaml.safe_load(f) or {}).get("startup") or {}
+
+
+def test_cold_start_within_budget():
+    budgets = load_budgets()
+    profile = profile_startup(ROOT, importtime=False)
+
+    assert profile['import_ms'] <= budgets['import_budget_ms'], \
+        f"import src.app took {profile['import_ms']} ms (budget {budgets['import_budget_ms']} ms)"
+    assert profile['initialize_ms'] <= budgets['initialize_budget_ms'], \
+        f"initialize_app() took {profile['initialize_ms']} ms (budget {budgets['initialize_budget_ms']} ms)"
+    # The SDK and the exporter's pandas load on first use, not before the first page
+    for module in ("openai", "pandas"):
+        assert module not in profile['heavy']['after_initialize']
+
+
+def test_parse_importtime():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |     yaml.error",
+        "import time:       300 |        420 |   yaml",
+        "some warning from the child",
+        "import time:        50 |        50 | json",
+    ])
+    modules = parse_importtime(stderr)
+    assert [m['module'] for m in modules] == ["yaml.error", "yaml", "json"]
+    assert [m['depth'] for m in modules] == [2, 1, 0]
+    assert modules[1]['cumulative_us'] == 420
+    assert by_package(modules) == {"yaml": 420, "json": 50}
+
+
+def test_clients_created_lazily_and_by_warm_up(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    router = ProviderRouter.from_config({"model": "gpt-test", "base_url": "http://127.0.0.1:9/v1"})
+    router.init_clients()
+    provider = router.primary
+    assert not provider.ready
+
+    thread = router.warm_up()
+    thread.join(timeout=30)
+    assert provider.ready and provider.client is provider.client
+    assert router.warm_up() is None
@@ -0,0 +1,98 @@
+"""
+Structured logging tests: JSON streams, crisis-flag routing and non-blocking writes.
+
+Run: python -m pytest -q tests/test_structured_logging.py
+"""
+
+import json
+import os
+import sys
+import time
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.database.db_manager import DatabaseManager
+from src.utils import structured_logging, tracing
+from src.utils.structured_logging import configure_logging, get_logger, shutdown_logging
+
+
+class SlowStream:
+    def __init__(self, delay):
+        self.delay = delay
+        self.text = ""
+
+    def write(self, text):
+        time.sleep(self.delay)
+        self.text += text
+
+    def flush(self):
+        pass
+
+
+def read_jsonl(path):
+    return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+
+
+@pytest.fixture
+def log_config(tmp_path):
+    yield {"logging": {
+        "enabled": True, "level": "INFO",
+        "log_path": str(tmp_path / "app"), "error_log_path": str(tmp_path / "errors"),
+        "crisis_flag_path": str(tmp_path / "crisis"), "module_levels": {"noisy": "ERROR"},
+    }}
+    shutdown_logging()
+
+
+def test_records_are_json_with_fields_and_routed_by_stream(log_config, tmp_path):
+    stream = SlowStream(0)
+    setup = configure_logging(log_config, stream=stream)
+    previous = tracing.set_tracer(tracing.Tracer(tracing.MemoryExporter()))
+    try:
+        db = DatabaseManager(db_url="sqlite:///:memory:")
+        db.create_participant("PLOG1", "control")
+        with tracing.span("turn") as span:
+            msg = db.save_message("PLOG1", 1, "user", "hello")
+        db.create_crisis_flag("PLOG1", msg.id, "hopeless")
+        get_logger("noisy").info("dropped by module level")
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            get_logger("db").exception("Write failed")
+    finally:
+        tracing.set_tracer(previous)
+    assert setup.flush()
+
+    app = read_jsonl(tmp_path / "app" / "app.jsonl")
+    saved = [r for r in app if r["msg"] == "Saved message 1 from user"]
+    assert saved and saved[0]["participant_id"] == "PLOG1" and saved[0]["message_num"] == 1
+    assert saved[0]["logger"] == "empathic.db" and saved[0]["trace_id"] == span.trace_id
+    assert not any("dropped by module level" in r["msg"] for r in app)
+    assert not any(r["logger"] == "empathic.crisis_flags" for r in app)
+
+    [flag] = read_jsonl(tmp_path / "crisis" / "crisis_flags.jsonl")
+    assert flag["keyword"] == "hopeless" and flag["message_id"] == msg.id
+
+    [error] = read_jsonl(tmp_path / "errors" / "errors.jsonl")
+    assert error["msg"] == "Write failed" and "RuntimeError: boom" in error["exc"]
+    assert "Saved message 1 from user" in stream.text
+
+
+def test_slow_console_never_blocks_and_full_queue_drops(log_config):
+    log_config["logging"]["queue_size"] = 5
+    stream = SlowStream(0.05)
+    setup = configure_logging(log_config, stream=stream)
+    dropped = structured_logging.DROPPED.value()
+
+    log = get_logger("bench")
+    started = time.perf_counter()
+    for i in range(50):
+        log.info("record %d", i)
+    elapsed = time.perf_counter() - started
+
+    # 50 synchronous writes would take 2.5s
+    assert elapsed < 0.5
+    assert structured_logging.DROPPED.value() > dropped
+    assert setup.flush(timeout=10)
@@ -0,0 +1,76 @@
+"""
+Synthetic study generator tests: reproducible from a seed, exact message
+budgets, and rows shaped like the app's own writes.
+
+Run: python -m pytest -q tests/test_synthetic_study.py
+"""
+
+import os
+import sqlite3
+import sys
+from collections import Counter
+
+import pytest
+from sqlalchemy import create_engine
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.database.db_manager import DatabaseManager
+from src.database.synthetic_study import SyntheticStudy
+
+
+def generate(path, **kwargs):
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        return SyntheticStudy(**kwargs).write(engine, batch_messages=500)
+    finally:
+        engine.dispose()
+
+
+def dump(path):
+    with sqlite3.connect(str(path)) as conn:
+        return {table: conn.execute(f"SELECT * FROM {table} ORDER BY 1").fetchall()
+                for table in ("participants", "messages", "turn_metrics", "crisis_flags")}
+
+
+def test_same_seed_same_database(tmp_path):
+    generate(tmp_path / "a.db", participants=200, seed=5)
+    generate(tmp_path / "b.db", participants=200, seed=5)
+    generate(tmp_path / "c.db", participants=200, seed=6)
+    assert dump(tmp_path / "a.db") == dump(tmp_path / "b.db")
+    assert dump(tmp_path / "a.db")['messages'] != dump(tmp_path / "c.db")['messages']
+
+
+def test_rows_follow_the_app(tmp_path):
+    path = tmp_path / "study.db"
+    counts = generate(path, participants=400, seed=1, crisis_rate=0.05)
+    rows = dump(path)
+    assert counts['participants'] == 400 and counts['messages'] == len(rows['messages'])
+
+    # Balanced assignment blocks
+    assert set(Counter(p[1] for p in rows['participants']).values()) == {100}
+    # total_messages counts user turns; early exits have no end time
+    users = Counter(m[1] for m in rows['messages'] if m[3] == 'user')
+    for pid, _, _, end_time, total, completed, *_ in rows['participants']:
+        assert users.get(pid, 0) == total
+        assert (end_time is not None) == bool(completed)
+    # One metric per bot message; crisis flags sit on flagged (scripted) bot replies
+    bot_ids = {m[0] for m in rows['messages'] if m[3] == 'bot'}
+    assert {t[2] for t in rows['turn_metrics']} == bot_ids
+    flagged = {m[0] for m in rows['messages'] if m[6]}
+    assert rows['crisis_flags'] and {f[2] for f in rows['crisis_flags']} == flagged
+
+    db = DatabaseManager(str(path), db_url=f"sqlite:///{path}")
+    try:
+        assert db.get_statistics()['total_participants'] == 400
+        assert len(db.get_conversation("P00000001")) == 2 * users["P00000001"]
+    finally:
+        db.close()
+
+
+def test_message_budget_is_exact_and_tables_must_be_empty(tmp_path):
+    path = tmp_path / "study.db"
+    assert generate(path, messages=1001, seed=2)['messages'] == 1001
+    with pytest.raises(ValueError):
+        generate(path, participants=5)
@@ -0,0 +1,144 @@
+"""
+Token calibration tests: per-bot-type max_tokens derived from tokens-per-word.
+
+Run: python -m pytest -q tests/test_token_calibration.py
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.llm_stub import LLMStubServer
+from src.chatbot import llm_scheduler, resilience, token_calibration
+from src.chatbot.bot_manager import BotManager
+from src.chatbot.token_calibration import TokenCalibrator, flush_calibrators
+
+
+REPLY = " ".join(f"w{i}" for i in range(20))
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setattr(token_calibration, "_CALIBRATORS", {})
+    monkeypatch.setattr(llm_scheduler, "_SCHEDULER", None)
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+
+
+def test_cap_fits_max_words_at_percentile():
+    cal = TokenCalibrator(max_words=50, percentile=0.9, headroom=1.0, min_samples=10)
+    for i in range(10):
+        cal.record("emotional", tokens=60 + 4 * i, words=50, finish_reason="stop", max_tokens=80)
+
+    assert cal.max_tokens_for("emotional", 80) == 96
+    # Other bot types keep the configured cap until they have samples
+    assert cal.max_tokens_for("control", 80) == 80
+
+
+def test_samples_persist_across_instances(tmp_path):
+    path = str(tmp_path / "calibration" / "token_stats.json")
+    cal = TokenCalibrator(path=path, max_words=10, min_samples=2, save_every=2)
+    cal.record("control", tokens=15, words=10, finish_reason="stop", max_tokens=80)
+    cal.record("control", tokens=15, words=10, finish_reason="stop", max_tokens=80)
+
+    reloaded = TokenCalibrator(path=path, max_words=10, min_samples=2, headroom=1.0, floor=1)
+    assert len(reloaded.samples("control")) == 2
+    assert reloaded.max_tokens_for("control", 80) == 15
+
+
+def test_report_compares_truncation_and_spend():
+    cal = TokenCalibrator(max_words=50, percentile=0.9, headroom=1.2, min_samples=5)
+    for _ in range(5):
+        # Cut by a 40-token cap after 30 words
+        cal.record("cognitive", tokens=40, words=30, finish_reason="length", max_tokens=40)
+
+    r = cal.report(default=40)["cognitive"]
+    assert r["max_tokens_after"] > r["max_tokens_before"]
+    assert r["truncation_rate_before"] == 1.0
+    assert r["truncation_rate_after"] == 0.0
+    assert r["avg_tokens_after"] > r["avg_tokens_before"]
+
+
+def test_bot_manager_learns_cap_from_streamed_turns(tmp_path):
+    with LLMStubServer(reply=REPLY) as stub:
+        bot = BotManager(None, {
+            "api": {
+                "base_url": stub.base_url, "max_tokens": 8, "max_words": 10,
+                "scheduler": {"enabled": False},
+                "token_calibration": {"enabled": True, "min_samples": 3, "headroom": 1.2, "min_tokens": 1,
+                                      "path": str(tmp_path / "token_stats.json")},
+            },
+            "session_store": {"backend": "none"},
+        })
+        sid = bot.create_new_session()["session_id"]
+        bot.set_bot_type(sid, "emotional")
+
+        for _ in range(3):
+            "".join(bot.stream_bot_response(sid, "hello"))
+            assert stub.requests[-1]["max_tokens"] == 8
+        meta = bot.get_last_call(sid)
+        assert meta["finish_reason"] == "length"
+        assert meta["completion_tokens"] == 8
+
+        "".join(bot.stream_bot_response(sid, "hello"))
+        # One token per word in the stub: 10 words * 1.2 headroom
+        assert stub.requests[-1]["max_tokens"] == 12
+        assert bot.calibrator.report(8)["emotional"]["truncation_rate_before"] == 1.0
+
+
+def test_scheduler_is_charged_the_calibrated_cap(tmp_path, monkeypatch):
+    with LLMStubServer(reply=REPLY) as stub:
+        bot = BotManager(None, {
+            "api": {
+                "base_url": stub.base_url, "max_tokens": 200, "max_words": 10,
+                "scheduler": {"enabled": True, "max_concurrency": 2},
+                "token_calibration": {"enabled": True, "min_samples": 1, "headroom": 1.2, "min_tokens": 1},
+            },
+            "session_store": {"backend": "none"},
+        })
+        charged = []
+        acquire = bot.scheduler.acquire
+        monkeypatch.setattr(bot.scheduler, "acquire",
+                            lambda key, est_tokens=0, **kw: charged.append(est_tokens) or acquire(key, est_tokens, **kw))
+        sid = bot.create_new_session()["session_id"]
+        bot.set_bot_type(sid, "emotional")
+
+        for _ in range(2):
+            "".join(bot.stream_bot_response(sid, "hello"))
+        assert stub.requests[-1]["max_tokens"] == 12
+        # Same prompt-size estimate, but the completion part follows the cap actually sent
+        assert charged[0] - charged[1] > 150
+        assert bot._estimate_tokens([{"content": "x" * 40}], "emotional") == 10 + 12
+        assert bot._estimate_tokens([{"content": "x" * 40}], "control") == 10 + 200
+
+
+def test_bot_managers_share_one_calibrator_and_flush_it(tmp_path):
+    path = tmp_path / "token_stats.json"
+    with LLMStubServer(reply=REPLY) as stub:
+        cfg = {
+            "api": {
+                "base_url": stub.base_url, "max_tokens": 8, "max_words": 10,
+                "scheduler": {"enabled": False},
+                "token_calibration": {"enabled": True, "min_samples": 2, "headroom": 1.2, "min_tokens": 1,
+                                      "path": str(path)},
+            },
+            "session_store": {"backend": "none"},
+        }
+        # One BotManager per session (or Streamlit rerun), each with a single turn
+        for _ in range(2):
+            bot = BotManager(None, cfg)
+            sid = bot.create_new_session()["session_id"]
+            bot.set_bot_type(sid, "emotional")
+            "".join(bot.stream_bot_response(sid, "hello"))
+
+        assert bot.calibrator is BotManager(None, cfg).calibrator
+        assert len(bot.calibrator.samples("emotional")) == 2
+        assert bot._max_tokens_for("emotional") == 12
+        assert not path.exists()  # below save_every
+
+    flush_calibrators()
+    assert len(TokenCalibrator(path=str(path)).samples("emotional")) == 2
@@ -0,0 +1,123 @@
+"""
+Tracing tests: span context, JSONL export and spans across a streamed turn.
+
+Run: python -m pytest -q tests/test_tracing.py
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.llm_stub import LLMStubServer
+from src.chatbot import resilience
+from src.chatbot.bot_manager import BotManager
+from src.chatbot.turn_pipeline import StageTimings, TurnPipeline, WriteLanes
+from src.database.db_manager import DatabaseManager
+from src.database.models import Message
+from src.utils import tracing
+
+
+@pytest.fixture
+def collector():
+    exporter = tracing.MemoryExporter()
+    previous = tracing.set_tracer(tracing.Tracer(exporter))
+    yield exporter
+    tracing.set_tracer(previous)
+
+
+def test_child_spans_share_trace_and_export_as_jsonl(tmp_path):
+    path = tmp_path / "traces" / "spans.jsonl"
+    exporter = tracing.JsonlExporter(str(path))
+    previous = tracing.set_tracer(tracing.Tracer(exporter, service_name="test"))
+    try:
+        with tracing.span("parent", stage="outer") as parent:
+            with tracing.span("child") as child:
+                assert tracing.current_trace_id() == parent.trace_id
+                child.add_event("step", n=1)
+            with pytest.raises(ValueError):
+                with tracing.span("failing"):
+                    raise ValueError("boom")
+        assert tracing.current_span() is tracing.NOOP_SPAN
+    finally:
+        tracing.set_tracer(previous)
+        exporter.close()
+
+    spans = {s["name"]: s for s in map(json.loads, path.read_text().splitlines())}
+    assert set(spans) == {"parent", "child", "failing"}
+    assert len(spans["parent"]["traceId"]) == 32 and len(spans["parent"]["spanId"]) == 16
+    assert spans["child"]["traceId"] == spans["parent"]["traceId"]
+    assert spans["child"]["parentSpanId"] == spans["parent"]["spanId"]
+    assert spans["parent"]["parentSpanId"] == ""
+    assert spans["child"]["events"][0]["name"] == "step"
+    assert spans["failing"]["status"]["code"] == "ERROR"
+    assert spans["parent"]["attributes"] == {"stage": "outer"}
+    assert spans["parent"]["resource"]["service.name"] == "test"
+
+
+def test_disabled_tracing_is_a_noop():
+    assert not tracing.get_tracer().enabled
+    with tracing.span("ignored") as s:
+        assert s is tracing.NOOP_SPAN
+        assert tracing.current_trace_id() is None
+
+    db = DatabaseManager(db_url="sqlite:///:memory:")
+    db.create_participant("PTRACE0", "control")
+    db.save_message("PTRACE0", 1, "user", "hello")
+    with db.get_session() as session:
+        assert session.query(Message).one().trace_id is None
+
+
+def test_database_calls_record_statement_spans(collector):
+    db = DatabaseManager(db_url="sqlite:///:memory:")
+    db.create_participant("PTRACE1", "control")
+    with tracing.span("request") as root:
+        db.save_message("PTRACE1", 1, "user", "hello")
+
+    [method] = collector.find("db.save_message")
+    assert method.parent_id == root.span_id
+    statements = [s for s in collector.find("db.execute") if s.parent_id == method.span_id]
+    assert any(s.attributes["db.statement"].startswith("INSERT INTO messages") for s in statements)
+    assert all(s.attributes["db.system"] == "sqlite" for s in statements)
+    with db.get_session() as session:
+        assert session.query(Message).one().trace_id == root.trace_id
+
+
+def test_streamed_turn_is_one_trace(collector, tmp_path, monkeypatch):
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    with LLMStubServer(reply="Thanks for telling me about that.") as stub:
+        db = DatabaseManager(str(tmp_path / "study.db"))
+        bot = BotManager(db, {"api": {"base_url": stub.base_url, "scheduler": {"enabled": False}},
+                              "session_store": {"backend": "none"}})
+        sess = bot.create_new_session()
+        db.create_participant(sess["participant_id"], sess["bot_type"])
+        pipeline = TurnPipeline(db, bot, lanes=WriteLanes(1), timings=StageTimings(), record_metrics=False)
+
+        turn = pipeline.begin(sess["session_id"], sess["participant_id"], 1, "hello")
+        "".join(turn.stream())
+        # Drained lanes have also run the write callbacks that end the turn span
+        assert pipeline.lanes.drain(timeout=5)
+        assert stub.request_headers[-1]["traceparent"].split("-")[1] == turn.trace_id
+
+    [root] = collector.find("chat.turn")
+    [stream] = collector.find("bot.stream")
+    [attempt] = collector.find("llm.attempt")
+    assert root.parent_id is None
+    assert stream.parent_id == root.span_id
+    assert attempt.parent_id == stream.span_id
+    events = [e["name"] for e in attempt.events]
+    assert {"http.connect_tcp", "http.ttfb", "first_token"} <= set(events)
+    assert events.index("http.ttfb") < events.index("first_token")
+    assert attempt.attributes["finish_reason"] == "stop"
+    assert "timing.bot_write_ms" in root.attributes
+
+    writes = collector.find("db.save_message")
+    assert len(writes) == 2 and all(w.parent_id == root.span_id for w in writes)
+    with db.get_session() as session:
+        rows = session.query(Message).filter_by(participant_id=sess["participant_id"]).all()
+    assert [m.trace_id for m in rows] == [turn.trace_id, turn.trace_id]
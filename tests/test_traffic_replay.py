@@ -0,0 +1,98 @@
+"""
+Traffic replay tests: traces keep arrival and think-time gaps (and nothing
+identifying), and a replay re-drives them, accelerated, through the turn path.
+
+Run: python -m pytest -q tests/test_traffic_replay.py
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.llm_stub import LLMStubServer
+from src.chatbot import resilience
+from src.chatbot.load_generator import PromptSampler
+from src.chatbot.traffic_replay import TraceReplayer, load_trace, record_trace, save_trace
+from src.database.db_manager import DatabaseManager
+from src.database.models import Message, Participant
+
+T0 = datetime(2025, 3, 4, 15, 0, 0)
+
+
+def recorded_db(path):
+    """Two participants: one completes 3 turns, one leaves after a crisis message."""
+    db = DatabaseManager(str(path))
+    timeline = {
+        "PA": (T0, True, [(10, 14, "My week was hard"), (30, 33, "Work again"), (40, 42, "Thanks")]),
+        "PB": (T0 + timedelta(seconds=5), False, [(25, 26, "I want to die")]),
+    }
+    session = db.get_session()
+    try:
+        for pid, (start, completed, turns) in timeline.items():
+            session.add(Participant(id=pid, bot_type="emotional", start_time=start, completed=completed,
+                                    prolific_id=f"prolific-{pid}"))
+            for num, (user_at, bot_at, text) in enumerate(turns, 1):
+                session.add(Message(participant_id=pid, message_num=num, sender="user", content=text,
+                                    timestamp=T0 + timedelta(seconds=user_at),
+                                    contains_crisis_keyword="die" in text))
+                session.add(Message(participant_id=pid, message_num=num, sender="bot", content="I hear you.",
+                                    timestamp=T0 + timedelta(seconds=bot_at)))
+        session.commit()
+    finally:
+        session.close()
+    return db
+
+
+def test_trace_keeps_timing_but_no_identifiers(tmp_path):
+    db = recorded_db(tmp_path / "study.db")
+    path = tmp_path / "trace.jsonl"
+    save_trace(record_trace(db), str(path))
+    trace = load_trace(str(path))
+
+    first, second = trace['participants']
+    assert (first['arrival'], first['delays'], first['lengths']) == (0.0, [10.0, 16.0, 7.0], [16, 10, 6])
+    assert (second['arrival'], second['delays'], second['crisis'], second['completed']) == (5.0, [20.0], [0], False)
+    assert trace['header']['participants'] == 2 and trace['header']['early_exits'] == 1
+
+    raw = path.read_text()
+    assert not any(secret in raw for secret in ("PA", "PB", "prolific", "week", "2025"))
+
+    # Window filter on participant start time
+    assert record_trace(db, since=T0 + timedelta(seconds=1))['header']['participants'] == 1
+
+
+def test_replay_redrives_trace_accelerated(tmp_path, monkeypatch):
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    trace = record_trace(recorded_db(tmp_path / "study.db"))
+    target = DatabaseManager(str(tmp_path / "replay.db"))
+
+    with LLMStubServer(reply="I hear you.", ttft=0.0) as stub:
+        config = {"api": {"base_url": stub.base_url, "scheduler": {"enabled": False}},
+                  "session_store": {"backend": "none"}}
+        replayer = TraceReplayer(config, target, trace, speed=100, sampler=PromptSampler(csv_path=None, seed=2))
+        report = replayer.run()
+
+    # 33 recorded seconds at 100x
+    assert report['seconds'] < 5
+    assert (report['participants'], report['turns'], report['crisis_turns']) == (2, 4, 1)
+    assert report['latency_ms']['start_lag']['count'] == 2
+    session = target.get_session()
+    try:
+        assert session.query(Message).filter_by(sender="user").count() == 4
+        # The early exit is not marked completed
+        assert sorted(p.completed for p in session.query(Participant)) == [False, True]
+    finally:
+        session.close()
+
+
+def test_load_trace_rejects_other_files(tmp_path):
+    path = tmp_path / "other.jsonl"
+    path.write_text('{"format": "something-else"}\n')
+    with pytest.raises(ValueError):
+        load_trace(str(path))
@@ -0,0 +1,170 @@
+"""
+TurnPipeline tests: writes overlap with streaming and keep message order.
+
+Run: python -m pytest -q tests/test_turn_pipeline.py
+"""
+
+import os
+import sys
+import time
+
+import pandas as pd
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.llm_stub import LLMStubServer
+from src.chatbot import resilience
+from src.chatbot.bot_manager import BotManager
+from src.chatbot.turn_pipeline import StageTimings, TurnPipeline, WriteLanes
+from src.database.db_manager import DatabaseManager
+
+
+REPLY = "Thanks for telling me about that."
+WRITE_DELAY = 0.3
+
+
+class SlowDatabaseManager(DatabaseManager):
+    """Adds a fixed round-trip delay to message writes (a remote database)."""
+
+    def save_message(self, *args, **kwargs):
+        time.sleep(WRITE_DELAY)
+        return super().save_message(*args, **kwargs)
+
+
+class KeywordCrisis:
+    def check_message(self, text):
+        return ("hopeless" in text, "hopeless" if "hopeless" in text else None)
+
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    with LLMStubServer(reply=REPLY, ttft=0.05) as stub:
+        db = SlowDatabaseManager(str(tmp_path / "study.db"))
+        bot = BotManager(db, {
+            "api": {"base_url": stub.base_url, "retry_attempts": 0, "scheduler": {"enabled": False}},
+            "session_store": {"backend": "none"},
+        })
+        bot.crisis = KeywordCrisis()
+        sess = bot.create_new_session()
+        db.create_participant(sess["participant_id"], sess["bot_type"])
+        pipeline = TurnPipeline(db, bot, lanes=WriteLanes(2), timings=StageTimings())
+        yield pipeline, sess
+
+
+def test_first_token_does_not_wait_for_user_write(setup):
+    pipeline, sess = setup
+    turn = pipeline.begin(sess["session_id"], sess["participant_id"], 1, "hello")
+
+    assert "".join(turn.stream()) == REPLY
+    assert turn.timings["first_token"] < WRITE_DELAY * 1000
+    assert not turn.persisted
+
+    turn.wait(timeout=5)
+    assert turn.timings["user_write"] >= WRITE_DELAY * 1000
+
+
+def test_writes_keep_order_and_message_num(setup):
+    pipeline, sess = setup
+    for num, text in ((1, "first"), (2, "second")):
+        turn = pipeline.begin(sess["session_id"], sess["participant_id"], num, text)
+        "".join(turn.stream())
+    turn.wait(timeout=5)
+    assert pipeline.lanes.drain(timeout=5)
+
+    messages = pipeline.db.get_conversation(sess["participant_id"])
+    assert [(m.message_num, m.sender) for m in messages] == [(1, "user"), (1, "bot"), (2, "user"), (2, "bot")]
+    # Insertion order matches the sequential flow
+    assert [m.id for m in messages] == sorted(m.id for m in messages)
+    assert messages[1].call_meta
+
+
+def test_crisis_reply_is_saved_and_flagged(setup):
+    pipeline, sess = setup
+    turn = pipeline.begin(sess["session_id"], sess["participant_id"], 1, "I feel hopeless")
+
+    assert turn.crisis_detected
+    text = "".join(turn.stream())
+    assert text
+    turn.wait(timeout=5)
+
+    messages = pipeline.db.get_conversation(sess["participant_id"])
+    assert [m.sender for m in messages] == ["user", "bot"]
+    assert messages[1].contains_crisis_keyword
+    flags = pipeline.db.get_unreviewed_crisis_flags()
+    assert [f.keyword_detected for f in flags] == ["hopeless"]
+
+
+def test_stage_timings_are_recorded(setup):
+    pipeline, sess = setup
+    turn = pipeline.begin(sess["session_id"], sess["participant_id"], 1, "hello")
+    "".join(turn.stream())
+    turn.wait(timeout=5)
+    assert pipeline.lanes.drain(timeout=5)
+    time.sleep(0.05)
+
+    stages = pipeline.stats()["stages"]
+    for stage in ("crisis_check", "first_token", "reply_complete", "user_write", "bot_write", "total_with_writes"):
+        assert stages[stage]["count"] == 1
+
+
+def test_turn_metrics_are_saved_and_exported(setup, tmp_path, monkeypatch):
+    pipeline, sess = setup
+    turn = pipeline.begin(sess["session_id"], sess["participant_id"], 1, "hello")
+    "".join(turn.stream())
+    turn.wait(timeout=5)
+    assert pipeline.lanes.drain(timeout=5)
+
+    [metric] = pipeline.db.get_turn_metrics()
+    bot_message = pipeline.db.get_conversation(sess["participant_id"])[-1]
+    assert metric.message_id == bot_message.id
+    assert metric.bot_type == sess["bot_type"]
+    assert metric.retries == 0 and not metric.crisis
+    assert metric.completion_tokens == len(REPLY.split())
+    assert metric.prompt_tokens > 0
+    assert 0 < metric.ttft_ms <= metric.stream_ms <= metric.total_ms
+    assert metric.bot_write_ms >= WRITE_DELAY * 1000
+
+    summary = pipeline.db.get_turn_metrics_summary()[sess["bot_type"]]
+    assert summary["turns"] == 1
+    assert summary["ttft_ms_p95"] == metric.ttft_ms
+
+    from src.database.csv_exporter import CSVExporter
+    monkeypatch.chdir(tmp_path)
+    rows = pd.read_csv(CSVExporter(pipeline.db).export_all_conversations("conversations.csv"))
+    assert rows.loc[rows.sender == "bot", "completion_tokens"].tolist() == [len(REPLY.split())]
+    assert rows.loc[rows.sender == "user", "ttft_ms"].isna().all()
+
+
+def test_replayed_reply_without_call_metadata_is_saved(setup, tmp_path):
+    pipeline, sess = setup
+    path = str(tmp_path / "calls.jsonl")
+    recorder = BotManager(None, {
+        "api": {"base_url": pipeline.bot_manager.router.primary.base_url, "retry_attempts": 0,
+                "scheduler": {"enabled": False}, "cassette": {"mode": "record", "path": path}},
+        "session_store": {"backend": "none"},
+    })
+    recorded = recorder.create_new_session()
+    recorder.set_bot_type(recorded["session_id"], sess["bot_type"])
+    assert "".join(recorder.stream_bot_response(recorded["session_id"], "hello")) == REPLY
+
+    # Replay makes no model call, so the turn has no call metadata to save with it
+    replay = BotManager(pipeline.db, {
+        "api": {"base_url": "http://127.0.0.1:9/v1", "retry_attempts": 0, "scheduler": {"enabled": False},
+                "cassette": {"mode": "replay", "path": path}},
+        "session_store": {"backend": "none"},
+    })
+    session = replay.create_new_session()
+    replay.set_bot_type(session["session_id"], sess["bot_type"])
+    pipeline.db.create_participant(session["participant_id"], sess["bot_type"])
+    pipeline.bot_manager = replay
+    turn = pipeline.begin(session["session_id"], session["participant_id"], 1, "hello")
+    assert "".join(turn.stream()) == REPLY
+    assert not replay.get_last_call(session["session_id"])
+    turn.wait(timeout=5)
+
+    messages = pipeline.db.get_conversation(session["participant_id"])
+    assert [(m.sender, m.content) for m in messages] == [("user", "hello"), ("bot", REPLY)]